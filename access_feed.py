@@ -0,0 +1,160 @@
+"""
+Transmissão ao vivo do log de acessos para o painel admin (SSE)
+Cada acesso gravado por Database.registrar_ip é publicado aqui, em memória,
+para todas as conexões de /api/admin/ips/stream deste processo. Cada assinante
+tem um buffer limitado: quem não consome a tempo é desconectado e volta com o
+Last-Event-ID, retomando do histórico recente.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from cache_registry import tamanho_aproximado
+
+class AssinaturasEsgotadas(Exception):
+    """Já há o máximo de conexões abertas no stream deste processo"""
+
+class Assinante:
+    def __init__(self, buffer: int):
+        self.fila = deque()
+        self.buffer = buffer
+        self.expulso = False
+        self.conectado_em = time.time()
+        self.entregues = 0
+
+class TransmissorAcessos:
+    def __init__(self, historico: int = None, buffer: int = None, max_assinantes: int = None):
+        # Eventos guardados para retomar uma conexão (Last-Event-ID)
+        self.historico = historico or int(os.getenv('ACESSOS_STREAM_HISTORICO', '500'))
+        # Eventos pendentes por assinante antes de ele ser desconectado
+        self.buffer = buffer or int(os.getenv('ACESSOS_STREAM_BUFFER', '256'))
+        # Cada stream ocupa uma thread do worker: abaixo do --threads do Procfile
+        self.max_assinantes = max_assinantes or int(os.getenv('ACESSOS_STREAM_MAX_CONEXOES', '4'))
+
+        self._reiniciar()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        # Cada processo (worker) tem a sua sequência: IDs de outro processo não são retomados
+        self._condicao = threading.Condition()
+        self.instancia = secrets.token_hex(4)
+        self._sequencia = 0
+        self._recentes = deque(maxlen=self.historico)
+        self._assinantes = []
+        self._publicados = 0
+        self._expulsos = 0
+        self._descartados = 0
+
+    def publicar(self, evento: Dict):
+        """Entrega o evento a todos os assinantes (nunca bloqueia quem publica)"""
+        with self._condicao:
+            self._sequencia += 1
+            item = (self._sequencia, evento)
+            self._recentes.append(item)
+            self._publicados += 1
+            for assinante in self._assinantes:
+                if assinante.expulso:
+                    continue
+                if len(assinante.fila) >= assinante.buffer:
+                    # Consumidor lento: não segura memória nem atrasa os demais
+                    assinante.expulso = True
+                    assinante.fila.clear()
+                    self._expulsos += 1
+                else:
+                    assinante.fila.append(item)
+            self._condicao.notify_all()
+
+    def assinar(self, ultimo_id: str = None, recentes: int = 0) -> Tuple[Assinante, bool]:
+        """
+        Novo assinante, já com o que perdeu desde `ultimo_id` (ou os `recentes`
+        últimos eventos). Retorna também se houve lacuna: o ID não é deste
+        processo ou já saiu do histórico.
+        """
+        with self._condicao:
+            if len(self._assinantes) >= self.max_assinantes:
+                raise AssinaturasEsgotadas()
+            assinante = Assinante(self.buffer)
+            lacuna = False
+            if ultimo_id:
+                sequencia = self._sequencia_do_id(ultimo_id)
+                mais_antigo = self._recentes[0][0] if self._recentes else self._sequencia + 1
+                if sequencia is None or sequencia < mais_antigo - 1:
+                    lacuna = True
+                    perdidos = list(self._recentes)
+                else:
+                    perdidos = [item for item in self._recentes if item[0] > sequencia]
+            else:
+                perdidos = list(self._recentes)[-recentes:] if recentes > 0 else []
+            assinante.fila.extend(perdidos[-assinante.buffer:])
+            self._assinantes.append(assinante)
+        return assinante, lacuna
+
+    def cancelar(self, assinante: Assinante):
+        with self._condicao:
+            if assinante in self._assinantes:
+                self._assinantes.remove(assinante)
+
+    def aguardar(self, assinante: Assinante, timeout: float) -> Optional[List[Tuple[int, Dict]]]:
+        """Eventos pendentes (lista vazia no timeout); None se o assinante foi expulso"""
+        with self._condicao:
+            if not assinante.fila and not assinante.expulso:
+                self._condicao.wait_for(lambda: assinante.fila or assinante.expulso, timeout)
+            if assinante.expulso:
+                return None
+            itens = list(assinante.fila)
+            assinante.fila.clear()
+        assinante.entregues += len(itens)
+        return itens
+
+    def formatar_id(self, sequencia: int) -> str:
+        return f'{self.instancia}-{sequencia}'
+
+    def _sequencia_do_id(self, ultimo_id: str) -> Optional[int]:
+        instancia, _, sequencia = ultimo_id.partition('-')
+        if instancia != self.instancia or not sequencia.isdigit():
+            return None
+        return int(sequencia)
+
+    def uso_memoria(self) -> Dict:
+        """
+        Histórico e filas dos assinantes, para o RegistroCaches (cache_registry.py).
+        Estimativa: o evento mais recente vezes o tamanho do histórico (os eventos
+        são todos do mesmo formato); as filas guardam referências aos mesmos itens.
+        """
+        with self._condicao:
+            por_evento = tamanho_aproximado(self._recentes[-1]) if self._recentes else 0
+            pendentes = sum(len(a.fila) for a in self._assinantes)
+            return {'bytes': por_evento * len(self._recentes) + 8 * pendentes,
+                    'entradas': len(self._recentes), 'remocoes': self._descartados}
+
+    def reduzir(self, bytes_alvo: int) -> int:
+        """Descarta o início do histórico (só afeta quem retomar de um ID antigo)"""
+        with self._condicao:
+            if not self._recentes:
+                return 0
+            por_evento = max(tamanho_aproximado(self._recentes[-1]), 1)
+            quantidade = min(len(self._recentes), -(-int(bytes_alvo) // por_evento))
+            for _ in range(quantidade):
+                self._recentes.popleft()
+            self._descartados += quantidade
+        return quantidade * por_evento
+
+    @property
+    def assinantes(self) -> int:
+        return len(self._assinantes)
+
+    def estado(self) -> Dict:
+        with self._condicao:
+            return {
+                'instancia': self.instancia,
+                'conexoes': len(self._assinantes),
+                'max_conexoes': self.max_assinantes,
+                'publicados': self._publicados,
+                'expulsos': self._expulsos,
+                'historico': len(self._recentes),
+                'pendentes_por_conexao': [len(a.fila) for a in self._assinantes]
+            }
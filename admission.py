@@ -0,0 +1,119 @@
+"""
+Controle de admissão: recusa requisições cedo (503 + Retry-After) quando o
+processo está saturado, em vez de deixá-las acumular até o timeout do gunicorn
+"""
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+# Grupos com capacidade reservada: não disputam o limite total com os demais
+GRUPOS_RESERVADOS = ('health', 'admin', 'jobs')
+
+# Limites padrão de requisições simultâneas por grupo (ADMISSAO_LIMITE_<GRUPO>)
+LIMITES_PADRAO = {
+    'search': 16,
+    'jobs': 16,
+    'auth': 8,
+    'default': 16,
+    'admin': 4,
+    'health': 2
+}
+
+def classificar_rota(path: str) -> str:
+    """Grupo de rota usado para os limites de admissão"""
+    if path in ('/health', '/healthz', '/ping'):
+        return 'health'
+    if path.startswith('/api/admin/') or path == '/admin' or path == '/metrics':
+        return 'admin'
+    if path.startswith('/api/auth/') or path == '/login':
+        return 'auth'
+    if path.startswith('/api/buscar/'):
+        return 'search'
+    # Acompanhar um job (GET e stream) é barato e não pode ser recusado pela
+    # fila de jobs que ele mesmo está esperando esvaziar
+    if path.startswith('/api/jobs/'):
+        return 'jobs'
+    return 'default'
+
+class AdmissionController:
+    def __init__(self, limites: Dict[str, int] = None, limite_total: int = None, retry_after: int = None):
+        self.limites = {
+            grupo: int(os.getenv(f'ADMISSAO_LIMITE_{grupo.upper()}', str(padrao)))
+            for grupo, padrao in LIMITES_PADRAO.items()
+        }
+        if limites:
+            self.limites.update(limites)
+        # Limite somado dos grupos não reservados (search, auth, default)
+        self.limite_total = limite_total or int(os.getenv('ADMISSAO_LIMITE_TOTAL', '24'))
+        self.retry_after = retry_after or int(os.getenv('ADMISSAO_RETRY_AFTER', '2'))
+
+        self._lock = threading.Lock()
+        self._em_andamento = {grupo: 0 for grupo in self.limites}
+        self._recusadas = {grupo: 0 for grupo in self.limites}
+        self._sondas = {}
+
+    def registrar_sonda(self, nome: str, funcao: Callable[[], int], limite: int, grupos=('search',)):
+        """
+        Registra um indicador de pressão (fila do banco, pool de APIs externas...)
+        Enquanto funcao() >= limite, novas requisições dos grupos indicados são recusadas
+        """
+        self._sondas[nome] = {'funcao': funcao, 'limite': limite, 'grupos': tuple(grupos)}
+
+    def _total_compartilhado(self) -> int:
+        return sum(n for grupo, n in self._em_andamento.items() if grupo not in GRUPOS_RESERVADOS)
+
+    def tentar_admitir(self, grupo: str) -> Tuple[bool, Optional[str]]:
+        """Retorna (admitida, motivo_da_recusa)"""
+        grupo = grupo if grupo in self.limites else 'default'
+
+        # Sondas são lidas fora do lock (podem consultar outros componentes)
+        for nome, sonda in self._sondas.items():
+            if grupo in sonda['grupos']:
+                try:
+                    valor = sonda['funcao']()
+                except Exception:
+                    continue
+                if valor >= sonda['limite']:
+                    with self._lock:
+                        self._recusadas[grupo] += 1
+                    return False, nome
+
+        with self._lock:
+            if self._em_andamento[grupo] >= self.limites[grupo]:
+                self._recusadas[grupo] += 1
+                return False, f'limite_{grupo}'
+            if grupo not in GRUPOS_RESERVADOS and self._total_compartilhado() >= self.limite_total:
+                self._recusadas[grupo] += 1
+                return False, 'limite_total'
+            self._em_andamento[grupo] += 1
+        return True, None
+
+    def liberar(self, grupo: str):
+        """Libera a vaga ocupada por uma requisição admitida"""
+        grupo = grupo if grupo in self.limites else 'default'
+        with self._lock:
+            self._em_andamento[grupo] = max(0, self._em_andamento[grupo] - 1)
+
+    def carga(self) -> int:
+        """Requisições em andamento nos grupos não reservados"""
+        with self._lock:
+            return self._total_compartilhado()
+
+    def estado(self) -> Dict:
+        """Requisições em andamento, recusas e valor atual das sondas"""
+        sondas = {}
+        for nome, sonda in self._sondas.items():
+            try:
+                valor = sonda['funcao']()
+            except Exception:
+                valor = None
+            sondas[nome] = {'valor': valor, 'limite': sonda['limite'], 'grupos': list(sonda['grupos'])}
+
+        with self._lock:
+            return {
+                'em_andamento': dict(self._em_andamento),
+                'recusadas': dict(self._recusadas),
+                'limites': dict(self.limites),
+                'limite_total': self.limite_total,
+                'sondas': sondas
+            }
@@ -1,23 +1,112 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from database import Database
-from osint_tools import OSINTTools
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g, send_file
+from database import ORDENS_USUARIOS
 from auth_system import criar_conta, fazer_login, fazer_logout, is_authenticated, get_user_info, alterar_senha
-from middleware import log_request, is_admin, has_permission, get_client_ip
+from middleware import log_request, is_admin, has_permission, get_client_ip, obter_permissao
+from admission import classificar_rota
+from metrics import ProvedorJSONMedido
+from profiling import ProfilerRequisicoes, perfil_solicitado
+from snapshots import OperacaoEmAndamento
+from ip_logs import obter_particoes
+from access_feed import AssinaturasEsgotadas
+from services import (SECRET_KEY, db, osint, quotas, jobs, admissao, metricas, rastreador_sql, retencao,
+                      manutencao, snapshots, transmissor, registro_caches, iniciar_segundo_plano,
+                      salvar_busca, concluir_busca_cpf)
 import json
 import os
 import secrets
+import time
 from datetime import datetime
 from functools import wraps
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
-app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
-db = Database()
-osint = OSINTTools()
+app.secret_key = SECRET_KEY
+app.json = ProvedorJSONMedido(app)
 
-# Middleware para capturar IPs em todas as requisições
+# Perfilamento sob demanda de uma requisição (admin: X-Profile: 1 ou ?__profile=1)
+profiler = ProfilerRequisicoes()
+
+# Tamanho máximo de página da listagem de usuários do admin
+USUARIOS_POR_PAGINA_MAX = int(os.getenv('USUARIOS_POR_PAGINA_MAX', '200'))
+
+# Cada conexão do log de acessos ao vivo termina depois disso e o navegador
+# reconecta com o Last-Event-ID (a thread do worker não fica presa a um cliente)
+ACESSOS_STREAM_DURACAO = float(os.getenv('ACESSOS_STREAM_DURACAO_SEGUNDOS', '25'))
+
+# Este é o ponto de entrada do gunicorn: as threads de fundo começam aqui
+iniciar_segundo_plano()
+
+def usuario_atual():
+    """Usuário da sessão no formato usado pelo controle de quota"""
+    user = get_user_info() if is_authenticated() else None
+    if not user:
+        return None
+    return {'email': user.get('email'), 'permissao': obter_permissao(user.get('email'))}
+
+# Métricas: registrado primeiro para medir também as requisições recusadas
 @app.before_request
-def before_request():
-    log_request()
+def iniciar_metricas():
+    metricas.iniciar_requisicao()
+
+@app.after_request
+def status_metricas(response):
+    g.status_metricas = response.status_code
+    return response
+
+@app.teardown_request
+def finalizar_metricas(exc=None):
+    rota = request.url_rule.rule if request.url_rule else 'nao_encontrada'
+    status = g.pop('status_metricas', 500 if exc else 200)
+    metricas.finalizar_requisicao(rota, request.method, status, caminho=request.path)
+
+# Controle de admissão (requisições recusadas não são registradas no log de acessos)
+@app.before_request
+def controlar_admissao():
+    grupo = classificar_rota(request.path)
+    admitida, motivo = admissao.tentar_admitir(grupo)
+    if not admitida:
+        resposta = jsonify({'erro': 'Service overloaded, try again later', 'motivo': motivo})
+        resposta.headers['Retry-After'] = str(admissao.retry_after)
+        return resposta, 503
+    g.grupo_admissao = grupo
+
+@app.teardown_request
+def liberar_admissao(exc=None):
+    grupo = g.pop('grupo_admissao', None)
+    if grupo:
+        admissao.liberar(grupo)
+
+# Perfilamento: só admins; sem o cabeçalho/parâmetro nada é feito
+@app.before_request
+def iniciar_perfil():
+    if perfil_solicitado(request.headers, request.args) and is_authenticated() and is_admin():
+        g.perfil_inicio = time.perf_counter()
+        g.perfil = profiler.iniciar()
+
+@app.after_request
+def finalizar_perfil(response):
+    perfil = g.pop('perfil', None)
+    if perfil:
+        nome = profiler.finalizar(
+            perfil, request.method, request.path, response.status_code,
+            time.perf_counter() - g.pop('perfil_inicio'), (get_user_info() or {}).get('email', '')
+        )
+        if nome:
+            response.headers['X-Profile-Id'] = nome
+    return response
+
+@app.teardown_request
+def descartar_perfil(exc=None):
+    perfil = g.pop('perfil', None)
+    if perfil:
+        perfil.disable()
+
+# Middleware para capturar IPs em todas as requisições (após a resposta, com o status)
+@app.after_request
+def registrar_acesso(response):
+    # Recusadas pelo controle de admissão não custam uma escrita no banco
+    if 'grupo_admissao' in g:
+        log_request(response.status_code)
+    return response
 
 # Health check endpoint para serviços de hospedagem (Render, Railway, etc.)
 @app.route('/health')
@@ -109,18 +198,7 @@ def buscar_nome():
         resultado = osint.buscar_nome(nome)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_busca_nome(
-                nome=nome,
-                resultado=fonte.get('resultado', ''),
-                fonte=fonte.get('nome', ''),
-                tipo_busca='nome'
-            )
-            db.salvar_historico(
-                tipo_busca='nome',
-                termo_busca=nome,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('nome', nome, resultado)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -144,18 +222,7 @@ def buscar_processo():
         resultado = osint.buscar_processo(numero_processo)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_busca_processo(
-                numero_processo=numero_processo,
-                resultado=fonte.get('resultado', ''),
-                fonte=fonte.get('nome', ''),
-                status=resultado.get('status', 'pendente')
-            )
-            db.salvar_historico(
-                tipo_busca='processo',
-                termo_busca=numero_processo,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('processo', numero_processo, resultado)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -176,19 +243,7 @@ def buscar_foto():
         resultado = osint.buscar_foto(termo_busca, url_imagem if url_imagem else None)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_busca_foto(
-                termo_busca=termo_busca,
-                url_imagem=url_imagem if url_imagem else '',
-                resultado=fonte.get('resultado', ''),
-                fonte=fonte.get('nome', ''),
-                hash_imagem=resultado.get('hash_imagem', '')
-            )
-            db.salvar_historico(
-                tipo_busca='foto',
-                termo_busca=termo_busca,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('foto', termo_busca, resultado, url_imagem=url_imagem)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -204,37 +259,20 @@ def buscar_cpf():
         if not cpf:
             return jsonify({'erro': 'CPF não fornecido'}), 400
         
-        # Realizar busca OSINT
-        resultado = osint.buscar_cpf(cpf)
-        
-        # Se houver erro na validação
-        if resultado.get('erro'):
-            return jsonify(resultado), 400
-        
-        # Salvar no banco de dados
-        cpf_limpo = resultado.get('cpf_limpo', '')
-        cpf_formatado = resultado.get('cpf', '')
-        informacoes = json.dumps(resultado.get('informacoes', {}), ensure_ascii=False)
-        
-        for fonte in resultado.get('fontes', []):
-            db.salvar_busca_cpf(
-                cpf=cpf_limpo,
-                cpf_formatado=cpf_formatado,
-                resultado=fonte.get('resultado', ''),
-                fonte=fonte.get('nome', ''),
-                informacoes=informacoes,
-                status=resultado.get('status', 'encontrado')
-            )
-            db.salvar_historico(
-                tipo_busca='cpf',
-                termo_busca=cpf_formatado,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        if modo_assincrono(data):
+            return submeter_job('cpf', processar_busca_cpf, cpf, usuario_atual())
         
-        return jsonify(resultado), 200
+        resultado, codigo = processar_busca_cpf(cpf, usuario_atual())
+        return jsonify(resultado), codigo
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+def processar_busca_cpf(cpf: str, usuario):
+    """Executa a busca de CPF e salva no banco; retorna (resultado, codigo_http)"""
+    # Realizar busca OSINT
+    resultado = osint.buscar_cpf(cpf, usuario=usuario)
+    return concluir_busca_cpf(resultado)
+
 @app.route('/api/buscar/email', methods=['POST'])
 def buscar_email():
     """API para buscar por email"""
@@ -249,12 +287,7 @@ def buscar_email():
         resultado = osint.buscar_email(email)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_historico(
-                tipo_busca='email',
-                termo_busca=email,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('email', email, resultado)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -274,12 +307,7 @@ def buscar_telefone():
         resultado = osint.buscar_telefone(telefone)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_historico(
-                tipo_busca='telefone',
-                termo_busca=telefone,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('telefone', telefone, resultado)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -299,12 +327,7 @@ def buscar_username():
         resultado = osint.buscar_username(username)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_historico(
-                tipo_busca='username',
-                termo_busca=username,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('username', username, resultado)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -324,12 +347,7 @@ def buscar_dominio():
         resultado = osint.buscar_dominio_ip(dominio_ip)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_historico(
-                tipo_busca='dominio',
-                termo_busca=dominio_ip,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('dominio', dominio_ip, resultado)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -349,12 +367,7 @@ def buscar_veiculo():
         resultado = osint.buscar_veiculo(placa)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_historico(
-                tipo_busca='veiculo',
-                termo_busca=placa,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('veiculo', placa, resultado)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -374,12 +387,7 @@ def buscar_endereco():
         resultado = osint.buscar_endereco(endereco)
         
         # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_historico(
-                tipo_busca='endereco',
-                termo_busca=endereco,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        salvar_busca('endereco', endereco, resultado)
         
         return jsonify(resultado), 200
     except Exception as e:
@@ -395,21 +403,90 @@ def verificar_vazamentos():
         if not email:
             return jsonify({'erro': 'Email não fornecido'}), 400
         
-        # Realizar busca OSINT
-        resultado = osint.verificar_vazamentos(email)
-        
-        # Salvar no banco de dados
-        for fonte in resultado.get('fontes', []):
-            db.salvar_historico(
-                tipo_busca='vazamentos',
-                termo_busca=email,
-                resultado=json.dumps(resultado, ensure_ascii=False)
-            )
+        if modo_assincrono(data):
+            return submeter_job('vazamentos', processar_vazamentos, email)
         
-        return jsonify(resultado), 200
+        resultado, codigo = processar_vazamentos(email)
+        return jsonify(resultado), codigo
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+def processar_vazamentos(email: str):
+    """Executa a verificação de vazamentos e salva no banco; retorna (resultado, codigo_http)"""
+    # Realizar busca OSINT
+    resultado = osint.verificar_vazamentos(email)
+    
+    # Salvar no banco de dados
+    salvar_busca('vazamentos', email, resultado)
+    return resultado, 200
+
+def modo_assincrono(data) -> bool:
+    """Verifica se o cliente pediu execução em segundo plano (?async=1 ou {"async": true})"""
+    if request.args.get('async', '').lower() in ('1', 'true', 'sim'):
+        return True
+    return bool(data.get('async')) if isinstance(data, dict) else False
+
+def dono_job():
+    """Identifica quem pode consultar o job (usuário logado ou sessão)"""
+    user = get_user_info() if is_authenticated() else None
+    if user:
+        return user.get('email')
+    if 'session_id' not in session:
+        session['session_id'] = secrets.token_hex(16)
+    return session['session_id']
+
+def submeter_job(tipo: str, funcao, *args):
+    """Agenda a busca no pool e responde 202 com o ID do job"""
+    job_id = jobs.submeter(tipo, funcao, *args, dono=dono_job())
+    if job_id is None:
+        resposta = jsonify({'erro': 'Too many pending searches, try again later'})
+        resposta.headers['Retry-After'] = '5'
+        return resposta, 503
+    
+    url = url_for('obter_job', job_id=job_id)
+    resposta = jsonify({'job_id': job_id, 'status': 'pendente', 'url': url})
+    resposta.headers['Location'] = url
+    return resposta, 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def obter_job(job_id):
+    """Consulta o status/resultado de uma busca em segundo plano (JSON ou SSE)"""
+    job = jobs.obter(job_id)
+    if not job or job.get('dono') != dono_job():
+        return jsonify({'erro': 'Job not found'}), 404
+    
+    quer_stream = (request.args.get('stream') == '1' or
+                   'text/event-stream' in request.headers.get('Accept', ''))
+    if quer_stream:
+        return Response(stream_with_context(stream_job(job_id)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    return jsonify(formatar_job(job)), 200 if job['concluido_em'] else 202
+
+def formatar_job(job):
+    """Campos públicos de um job"""
+    return {
+        'job_id': job['id'],
+        'tipo': job['tipo'],
+        'status': job['status'],
+        'codigo': job['codigo'],
+        'resultado': job['resultado']
+    }
+
+def stream_job(job_id):
+    """Eventos SSE: 'status' enquanto executa e 'resultado' ao terminar"""
+    while True:
+        concluido = jobs.aguardar(job_id, timeout=15)
+        job = jobs.obter(job_id)
+        if not job:
+            yield 'event: erro\ndata: {"erro": "Job expired"}\n\n'
+            return
+        dados = json.dumps(formatar_job(job), ensure_ascii=False)
+        if concluido:
+            yield f'event: resultado\ndata: {dados}\n\n'
+            return
+        yield f'event: status\ndata: {dados}\n\n'
+
 @app.route('/api/historico', methods=['GET'])
 def obter_historico():
     """API para obter histórico de buscas"""
@@ -434,20 +511,11 @@ def obter_historico():
 def obter_estatisticas():
     """API para obter estatísticas do banco de dados"""
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
         # Contar buscas por tipo
-        cursor.execute('SELECT COUNT(*) FROM nome_buscas')
-        total_nomes = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM processo_buscas')
-        total_processos = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM foto_buscas')
-        total_fotos = cursor.fetchone()[0]
-        
-        conn.close()
+        contagens = db.contar_buscas_por_tipo()
+        total_nomes = contagens.get('nome', 0)
+        total_processos = contagens.get('processo', 0)
+        total_fotos = contagens.get('foto', 0)
         
         return jsonify({
             'total_nomes': total_nomes,
@@ -508,19 +576,10 @@ def user_profile():
             permissao = usuario.get('permissao', 'user') if usuario else 'user'
             
             # Get user statistics from database
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT COUNT(*) FROM nome_buscas WHERE fonte LIKE ?', (f'%{user_id}%',))
-            name_searches = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM processo_buscas WHERE fonte LIKE ?', (f'%{user_id}%',))
-            process_searches = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM foto_buscas WHERE fonte LIKE ?', (f'%{user_id}%',))
-            photo_searches = cursor.fetchone()[0]
-            
-            conn.close()
+            contagens = db.contar_buscas_por_tipo(fonte=user_id)
+            name_searches = contagens.get('nome', 0)
+            process_searches = contagens.get('processo', 0)
+            photo_searches = contagens.get('foto', 0)
             
             return jsonify({
                 'authenticated': True,
@@ -580,6 +639,55 @@ def admin_get_ips():
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@app.route('/api/admin/ips/stream', methods=['GET'])
+@admin_required
+def admin_ips_stream():
+    """Live access log via SSE (resumes from Last-Event-ID or ?ultimo_id=; ?recentes=N replays the last N)"""
+    if not request.environ.get('wsgi.multithread'):
+        # Worker sync do gunicorn: cada stream aberto seguraria o processo inteiro
+        resposta = jsonify({'erro': 'Streaming needs a threaded worker (gunicorn --worker-class gthread), '
+                                    'poll /api/admin/ips instead'})
+        resposta.headers['Retry-After'] = '60'
+        return resposta, 503
+    ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('ultimo_id')
+    recentes = min(max(0, request.args.get('recentes', 0, type=int)), transmissor.historico)
+    try:
+        assinante, lacuna = transmissor.assinar(ultimo_id, recentes)
+    except AssinaturasEsgotadas:
+        resposta = jsonify({'erro': 'Too many open streams, try again later'})
+        resposta.headers['Retry-After'] = '5'
+        return resposta, 503
+    # Sem stream_with_context: a vaga da admissão é liberada ao começar o stream
+    resposta = Response(stream_acessos(assinante, lacuna), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Também se o stream nunca chegar a ser iterado (cliente desconectou antes)
+    resposta.call_on_close(lambda: transmissor.cancelar(assinante))
+    return resposta
+
+def stream_acessos(assinante, lacuna: bool):
+    """Eventos SSE 'acesso'; 'lacuna' se algo se perdeu; 'expulso' se o cliente não acompanhou"""
+    fim = time.monotonic() + ACESSOS_STREAM_DURACAO
+    try:
+        yield 'retry: 1000\n\n'
+        if lacuna:
+            # O ID é de outro worker ou já saiu do histórico: recarregar de /api/admin/ips
+            yield 'event: lacuna\ndata: {}\n\n'
+        while time.monotonic() < fim:
+            itens = transmissor.aguardar(assinante, min(15, max(0.1, fim - time.monotonic())))
+            if itens is None:
+                yield 'event: expulso\ndata: {"erro": "Client too slow, reconnect with Last-Event-ID"}\n\n'
+                return
+            if not itens:
+                yield ': ping\n\n'
+                continue
+            yield ''.join(
+                f'id: {transmissor.formatar_id(sequencia)}\nevent: acesso\n'
+                f'data: {json.dumps(acesso, ensure_ascii=False)}\n\n'
+                for sequencia, acesso in itens
+            )
+    finally:
+        transmissor.cancelar(assinante)
+
 @app.route('/api/admin/ips/stats', methods=['GET'])
 @admin_required
 def admin_ip_stats():
@@ -590,13 +698,63 @@ def admin_ip_stats():
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@app.route('/api/admin/ips/serie', methods=['GET'])
+@admin_required
+def admin_ip_serie():
+    """Get hourly access series from the rollups (?horas=24)"""
+    try:
+        horas = min(request.args.get('horas', 24, type=int), 24 * 90)
+        return jsonify({
+            'serie': db.serie_acessos(horas),
+            'rotas': db.acessos_por_rota(horas)
+        }), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/admin/ips/particoes', methods=['GET'])
+@admin_required
+def admin_ip_particoes():
+    """List monthly ip_logs partitions"""
+    return jsonify(obter_particoes(db).estado()), 200
+
+@app.route('/api/admin/ips/particoes/<mes>', methods=['DELETE'])
+@admin_required
+def admin_descartar_particao(mes):
+    """Drop a whole monthly ip_logs partition (AAAAMM)"""
+    particoes = obter_particoes(db)
+    if mes not in particoes.listar():
+        return jsonify({'erro': 'Partition not found'}), 404
+    if mes == datetime.utcnow().strftime('%Y%m'):
+        return jsonify({'erro': 'Cannot drop the current month'}), 400
+    particoes.descartar(mes)
+    return jsonify({'sucesso': True, 'mes': mes}), 200
+
 @app.route('/api/admin/usuarios', methods=['GET'])
 @admin_required
 def admin_get_usuarios():
-    """Get all users"""
+    """List users, one page at a time (?pagina=1&por_pagina=50&ordem=data_criacao&direcao=desc&permissao=&busca=&ativo=)"""
     try:
-        usuarios = db.listar_usuarios()
-        return jsonify(usuarios), 200
+        pagina = max(1, request.args.get('pagina', 1, type=int))
+        por_pagina = min(max(1, request.args.get('por_pagina', 50, type=int)), USUARIOS_POR_PAGINA_MAX)
+        ordem = request.args.get('ordem', 'data_criacao')
+        direcao = request.args.get('direcao', 'desc').lower()
+        if ordem not in ORDENS_USUARIOS or direcao not in ('asc', 'desc'):
+            return jsonify({'erro': f'Invalid sort; use ordem={"|".join(ORDENS_USUARIOS)} and direcao=asc|desc'}), 400
+        ativo = request.args.get('ativo')
+        filtros = {
+            'permissao': request.args.get('permissao') or None,
+            'busca': (request.args.get('busca') or '').strip() or None,
+            'ativo': None if ativo in (None, '') else ativo.lower() in ('1', 'true', 'sim')
+        }
+        usuarios = db.listar_usuarios(pagina, por_pagina, ordem, direcao, **filtros)
+        total = db.contar_usuarios(**filtros)
+        return jsonify({
+            'usuarios': usuarios,
+            'total': total,
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'paginas': (total + por_pagina - 1) // por_pagina
+        }), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
@@ -625,6 +783,220 @@ def admin_update_permissao():
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@app.route('/api/admin/admissao', methods=['GET'])
+@admin_required
+def admin_admissao():
+    """Get admission control state"""
+    return jsonify(admissao.estado()), 200
+
+@app.route('/api/admin/quotas', methods=['GET'])
+@admin_required
+def admin_quotas():
+    """Get paid provider quota usage"""
+    try:
+        dia = request.args.get('dia') or None
+        return jsonify({
+            'limites': quotas.limites,
+            'uso': quotas.uso(dia)
+        }), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    """Métricas no formato do Prometheus (admin ou Bearer METRICS_TOKEN)"""
+    token = os.getenv('METRICS_TOKEN', '')
+    if not (token and secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        if not is_authenticated():
+            return jsonify({'erro': 'Authentication required'}), 401
+        if not is_admin(get_user_info().get('email')):
+            return jsonify({'erro': 'Admin access required'}), 403
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/admin/metrics/lentas', methods=['GET'])
+@admin_required
+def admin_requisicoes_lentas():
+    """Get slow requests with stage timings"""
+    limite = request.args.get('limit', 50, type=int)
+    return jsonify({
+        'limite_ms': metricas.limite_lenta * 1000,
+        'requisicoes': metricas.requisicoes_lentas(limite)
+    }), 200
+
+@app.route('/api/admin/sql-trace', methods=['GET'])
+@admin_required
+def admin_sql_trace():
+    """Get traced SQL statements (?ordenar=total|max|chamadas|media&limit=50)"""
+    ordenar = request.args.get('ordenar', 'total')
+    limite = request.args.get('limit', 50, type=int)
+    return jsonify(rastreador_sql.relatorio(ordenar, limite)), 200
+
+@app.route('/api/admin/sql-trace', methods=['POST'])
+@admin_required
+def admin_configurar_sql_trace():
+    """Enable/disable SQL tracing: {"ativo": true, "limite_lenta_ms": 50, "limpar": false}"""
+    try:
+        data = request.get_json() or {}
+        if data.get('limpar'):
+            rastreador_sql.limpar()
+        if 'ativo' in data:
+            if data['ativo']:
+                rastreador_sql.ativar(data.get('limite_lenta_ms'))
+            else:
+                rastreador_sql.desativar()
+        return jsonify({
+            'sucesso': True,
+            'ativo': rastreador_sql.ativo,
+            'limite_lenta_ms': rastreador_sql.limite_lenta * 1000
+        }), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def admin_listar_perfis():
+    """List stored request profiles"""
+    return jsonify({
+        'max_arquivos': profiler.max_arquivos,
+        'perfis': profiler.listar()
+    }), 200
+
+@app.route('/api/admin/profiles/<nome>', methods=['GET'])
+@admin_required
+def admin_obter_perfil(nome):
+    """Get a profile summary, or download the .prof file with ?download=1"""
+    arquivo = profiler.caminho(nome)
+    if not arquivo:
+        return jsonify({'erro': 'Profile not found'}), 404
+    if request.args.get('download'):
+        return send_file(os.path.abspath(arquivo), mimetype='application/octet-stream',
+                         as_attachment=True, download_name=nome)
+    return jsonify(profiler.obter(nome)), 200
+
+@app.route('/api/admin/retencao', methods=['GET'])
+@admin_required
+def admin_retencao():
+    """Get retention windows, purge lag and throughput"""
+    try:
+        return jsonify(retencao.estado()), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/admin/retencao/executar', methods=['POST'])
+@admin_required
+def admin_executar_retencao():
+    """Run a purge cycle now (same batch and time limits; only in the worker holding the maintenance lease)"""
+    try:
+        resultado = retencao.executar_ciclo()
+        if not resultado['lider']:
+            return jsonify({'sucesso': False, **resultado,
+                            'erro': 'Another worker holds the maintenance lease, try again'}), 409
+        return jsonify({'sucesso': True, **resultado}), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/admin/retencao/vacuum', methods=['POST'])
+@admin_required
+def admin_converter_vacuum():
+    """Enable incremental auto_vacuum on an existing database (full VACUUM, blocks writes)"""
+    resultado = db.converter_vacuum_incremental()
+    return jsonify(resultado), 200 if resultado.get('sucesso') else 500
+
+@app.route('/api/admin/snapshots', methods=['GET'])
+@admin_required
+def admin_listar_snapshots():
+    """List database snapshots and the progress of the current/last operation"""
+    try:
+        return jsonify(snapshots.estado()), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/admin/snapshots', methods=['POST'])
+@admin_required
+def admin_criar_snapshot():
+    """Start an online snapshot in the background (progress in GET /api/admin/snapshots)"""
+    data = request.get_json(silent=True) or {}
+    comprimir = data.get('comprimir')
+    if not snapshots.iniciar_criacao(None if comprimir is None else bool(comprimir)):
+        return jsonify({'erro': 'Another snapshot or restore is in progress',
+                        'progresso': snapshots.progresso()}), 409
+    return jsonify({'sucesso': True, 'mensagem': 'Snapshot started'}), 202
+
+@app.route('/api/admin/snapshots/<nome>', methods=['GET'])
+@admin_required
+def admin_obter_snapshot(nome):
+    """Get snapshot metadata, or download the file with ?download=1"""
+    arquivo = snapshots.caminho(nome)
+    if not arquivo:
+        return jsonify({'erro': 'Snapshot not found'}), 404
+    if request.args.get('download'):
+        return send_file(os.path.abspath(arquivo), mimetype='application/octet-stream',
+                         as_attachment=True, download_name=nome)
+    return jsonify(snapshots.obter(nome)), 200
+
+@app.route('/api/admin/snapshots/<nome>/verificar', methods=['POST'])
+@admin_required
+def admin_verificar_snapshot(nome):
+    """Check a snapshot's checksum and run integrity_check on its contents"""
+    if not snapshots.caminho(nome):
+        return jsonify({'erro': 'Snapshot not found'}), 404
+    resultado = snapshots.verificar(nome)
+    return jsonify(resultado), 200 if resultado['sucesso'] else 422
+
+@app.route('/api/admin/snapshots/<nome>/restaurar', methods=['POST'])
+@admin_required
+def admin_restaurar_snapshot(nome):
+    """Restore the live database from a snapshot (a snapshot of the current state is taken first)"""
+    if not snapshots.caminho(nome):
+        return jsonify({'erro': 'Snapshot not found'}), 404
+    try:
+        resultado = snapshots.restaurar(nome)
+    except OperacaoEmAndamento as e:
+        return jsonify({'erro': str(e), 'progresso': snapshots.progresso()}), 409
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+    return jsonify(resultado), 200 if resultado['sucesso'] else 422
+
+@app.route('/api/admin/manutencao', methods=['GET'])
+@admin_required
+def admin_manutencao():
+    """Get maintenance tasks, current leader and recent runs"""
+    try:
+        estado = manutencao.estado()
+        tarefa = request.args.get('tarefa')
+        if tarefa:
+            estado['execucoes'] = db.historico_manutencao(request.args.get('limite', 50, type=int), tarefa)
+        return jsonify(estado), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/admin/manutencao/<tarefa>', methods=['POST'])
+@admin_required
+def admin_executar_manutencao(tarefa):
+    """Run a maintenance task now in this worker (ignores load and leader election)"""
+    if tarefa not in manutencao.intervalos:
+        return jsonify({'erro': 'Unknown maintenance task'}), 404
+    resultado = manutencao.executar(tarefa)
+    return jsonify(resultado), 200 if resultado['sucesso'] else 500
+
+@app.route('/api/admin/caches', methods=['GET'])
+@admin_required
+def admin_caches():
+    """Get memory usage, hit rate and value of each registered cache in this worker"""
+    try:
+        return jsonify(registro_caches.estado()), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/admin/caches/reduzir', methods=['POST'])
+@admin_required
+def admin_reduzir_caches():
+    """Enforce the memory budget now in this worker (evicts from the lowest-value caches)"""
+    try:
+        return jsonify(registro_caches.aplicar_orcamento()), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
 if __name__ == '__main__':
     print("=" * 50)
     print("Seita Research starting...")
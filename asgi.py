@@ -0,0 +1,278 @@
+"""
+Ponto de entrada ASGI para a API de buscas (/api/buscar/*)
+As chamadas às APIs externas usam httpx assíncrono e o SQLite roda em threads,
+então poucos processos seguram muitas buscas lentas ao mesmo tempo.
+O app Flask (gunicorn app:app) continua sendo o padrão; este é opcional:
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+
+Login e cookies de sessão são os do app Flask (mesma SECRET_KEY). Os objetos
+compartilhados vêm de services.py (sem importar app.py e suas rotas); as
+threads de fundo começam aqui, no startup. Admissão, métricas e log de
+acessos são os mesmos do app Flask.
+"""
+import asyncio
+import json
+import time
+from http.cookies import SimpleCookie
+from typing import Dict, Optional
+from flask import Flask
+from admission import classificar_rota
+from async_clients import criar_http_client, AsyncCPFAPIClient, AsyncVazamentosAPIClient
+from middleware import obter_permissao
+from osint_results import Resultado
+from services import (SECRET_KEY, db, osint, quotas, admissao, metricas, iniciar_segundo_plano,
+                      salvar_busca, concluir_busca_cpf)
+
+# Só para ler o cookie de sessão assinado pelo app Flask (nenhuma rota)
+flask_app = Flask(__name__)
+flask_app.secret_key = SECRET_KEY
+
+# Tamanho máximo do corpo JSON aceito
+MAX_CORPO = 1024 * 1024
+
+# Buscas que só geram links: tipo -> (campo do JSON, mensagem de erro, gerador)
+BUSCAS_LINKS = {
+    'nome': ('nome', 'Nome não fornecido', osint.buscar_nome),
+    'processo': ('numero_processo', 'Número do processo não fornecido', osint.buscar_processo),
+    'email': ('email', 'Email não fornecido', osint.buscar_email),
+    'telefone': ('telefone', 'Telefone não fornecido', osint.buscar_telefone),
+    'username': ('username', 'Username não fornecido', osint.buscar_username),
+    'dominio': ('dominio_ip', 'Domínio ou IP não fornecido', osint.buscar_dominio_ip),
+    'veiculo': ('placa', 'Placa não fornecida', osint.buscar_veiculo),
+    'endereco': ('endereco', 'Endereço não fornecido', osint.buscar_endereco),
+}
+
+class SearchASGIApp:
+    def __init__(self):
+        self.http = None
+        self.cpf_api = None
+        self.vazamentos_api = None
+
+    def _iniciar_clientes(self):
+        """Cria o cliente HTTP e os clientes assíncronos e inicia as threads de fundo (uma vez por processo)"""
+        if self.http is None:
+            iniciar_segundo_plano()
+            self.http = criar_http_client()
+            self.cpf_api = AsyncCPFAPIClient(self.http)
+            self.cpf_api.quota = quotas
+            self.cpf_api.capacidades = osint.cache
+            self.vazamentos_api = AsyncVazamentosAPIClient(self.http)
+            self.vazamentos_api.capacidades = osint.cache
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        self._iniciar_clientes()
+        inicio = time.perf_counter()
+        path, method = scope['path'], scope['method']
+        rota = self._rota(path)
+        grupo = classificar_rota(path)
+        admitida, motivo = admissao.tentar_admitir(grupo)
+        if not admitida:
+            # Recusada: não custa uma escrita no log de acessos
+            await self._responder(send, 503, {'erro': 'Service overloaded, try again later', 'motivo': motivo},
+                                  [(b'retry-after', str(admissao.retry_after).encode())])
+            metricas.registrar_requisicao(rota, method, 503, time.perf_counter() - inicio, caminho=path)
+            return
+
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+        try:
+            try:
+                codigo, corpo = await self._rotear(scope, receive, headers)
+            except Exception as e:
+                codigo, corpo = 500, {'erro': str(e)}
+            await self._responder(send, codigo, corpo)
+        finally:
+            admissao.liberar(grupo)
+        metricas.registrar_requisicao(rota, method, codigo, time.perf_counter() - inicio, caminho=path)
+        await asyncio.to_thread(self._registrar_acesso, scope, headers, codigo, rota)
+
+    @staticmethod
+    def _rota(path: str) -> str:
+        """Regra da rota (como no url_map do Flask) para as métricas e o log de acessos"""
+        if path in ('/health', '/healthz', '/ping'):
+            return path
+        tipo = path[len('/api/buscar/'):] if path.startswith('/api/buscar/') else None
+        if tipo in ('cpf', 'vazamentos', 'foto') or tipo in BUSCAS_LINKS:
+            return path
+        return 'nao_encontrada'
+
+    async def _lifespan(self, receive, send):
+        """Abre e fecha o cliente HTTP junto com o processo"""
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                self._iniciar_clientes()
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                if self.http is not None:
+                    await self.http.aclose()
+                await asyncio.to_thread(quotas.flush)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _rotear(self, scope, receive, headers: Dict):
+        """Retorna (codigo_http, corpo)"""
+        path = scope['path']
+        method = scope['method']
+
+        if path in ('/health', '/healthz', '/ping'):
+            return 200, {'status': 'ok', 'service': 'OSINT Tool'}
+
+        if not path.startswith('/api/buscar/'):
+            return 404, {'erro': 'Not found'}
+        if method != 'POST':
+            return 405, {'erro': 'Method not allowed'}
+
+        try:
+            data = json.loads(await self._ler_corpo(receive) or b'{}')
+        except ValueError:
+            return 400, {'erro': 'JSON inválido'}
+        if not isinstance(data, dict):
+            return 400, {'erro': 'JSON inválido'}
+
+        tipo = path[len('/api/buscar/'):]
+        if tipo == 'cpf':
+            return await self._buscar_cpf(data, headers)
+        if tipo == 'vazamentos':
+            return await self._verificar_vazamentos(data)
+        if tipo == 'foto':
+            return await self._buscar_foto(data)
+        if tipo in BUSCAS_LINKS:
+            return await self._buscar_links(tipo, data)
+        return 404, {'erro': 'Not found'}
+
+    async def _ler_corpo(self, receive) -> bytes:
+        corpo = b''
+        while True:
+            mensagem = await receive()
+            corpo += mensagem.get('body', b'')
+            if len(corpo) > MAX_CORPO:
+                raise ValueError('Corpo da requisição muito grande')
+            if not mensagem.get('more_body'):
+                return corpo
+
+    async def _responder(self, send, codigo: int, corpo, headers=()):
+        if isinstance(corpo, Resultado):
+            dados = corpo.para_json().encode()
+        else:
+            dados = json.dumps(corpo).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': codigo,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(dados)).encode()),
+                *headers
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': dados})
+
+    def _registrar_acesso(self, scope, headers: Dict, status: int, rota: str):
+        """Mesmo registro de IP do middleware Flask (log_request), após a resposta (roda em thread)"""
+        try:
+            ip = headers.get('x-forwarded-for', '').split(',')[0].strip() or headers.get('x-real-ip')
+            if not ip and scope.get('client'):
+                ip = scope['client'][0]
+            sessao = self._sessao(headers) or {}
+            db.registrar_ip(
+                ip_address=ip or '',
+                user_agent=headers.get('user-agent', ''),
+                path=scope['path'],
+                method=scope['method'],
+                user_id=(sessao.get('user') or {}).get('id'),
+                session_id=sessao.get('session_id', ''),
+                status=status,
+                rota=rota
+            )
+        except Exception as e:
+            print(f"Error logging request: {e}")
+
+    def _usuario_da_sessao(self, headers: Dict) -> Optional[Dict]:
+        """Lê o usuário do cookie de sessão assinado pelo app Flask"""
+        return (self._sessao(headers) or {}).get('user')
+
+    def _sessao(self, headers: Dict) -> Optional[Dict]:
+        """Conteúdo do cookie de sessão assinado pelo app Flask (None se ausente ou inválido)"""
+        cookies = SimpleCookie(headers.get('cookie', ''))
+        nome_cookie = flask_app.config['SESSION_COOKIE_NAME']
+        if nome_cookie not in cookies:
+            return None
+        serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        if serializer is None:
+            return None
+        try:
+            dados = serializer.loads(
+                cookies[nome_cookie].value,
+                max_age=int(flask_app.permanent_session_lifetime.total_seconds())
+            )
+        except Exception:
+            return None
+        return dados
+
+    async def _buscar_links(self, tipo: str, data: Dict):
+        campo, mensagem_erro, gerador = BUSCAS_LINKS[tipo]
+        termo = str(data.get(campo, '')).strip()
+        if not termo:
+            return 400, {'erro': mensagem_erro}
+        if tipo == 'processo' and not osint.validar_processo(termo):
+            return 400, {'erro': 'Formato de processo inválido'}
+
+        resultado = gerador(termo)
+        await asyncio.to_thread(salvar_busca, tipo, termo, resultado)
+        return 200, resultado
+
+    async def _buscar_foto(self, data: Dict):
+        termo_busca = str(data.get('termo_busca', '')).strip()
+        url_imagem = str(data.get('url_imagem', '')).strip()
+        if not termo_busca:
+            return 400, {'erro': 'Termo de busca não fornecido'}
+
+        resultado = osint.buscar_foto(termo_busca, url_imagem if url_imagem else None)
+        await asyncio.to_thread(salvar_busca, 'foto', termo_busca, resultado, url_imagem)
+        return 200, resultado
+
+    async def _buscar_cpf(self, data: Dict, headers: Dict):
+        cpf = str(data.get('cpf', '')).strip()
+        if not cpf:
+            return 400, {'erro': 'CPF não fornecido'}
+
+        resultados = osint.preparar_busca_cpf(cpf)
+        if resultados.get('erro'):
+            return 400, resultados
+
+        usuario = self._usuario_da_sessao(headers)
+        if usuario and usuario.get('email'):
+            permissao = await asyncio.to_thread(obter_permissao, usuario['email'])
+            usuario = {'email': usuario['email'], 'permissao': permissao}
+        else:
+            usuario = None
+
+        cpf_limpo = resultados['cpf_limpo']
+        api_result = await asyncio.to_thread(osint.resultado_em_cache, 'cpf', cpf_limpo, usuario)
+        if api_result is None:
+            api_result = await self.cpf_api.consultar_multiplas_apis(cpf_limpo, usuario)
+            await asyncio.to_thread(osint.guardar_resultado, 'cpf', cpf_limpo, api_result, usuario)
+        resultado = osint.montar_resultado_cpf(resultados, api_result)
+        resultado, codigo = await asyncio.to_thread(concluir_busca_cpf, resultado)
+        return codigo, resultado
+
+    async def _verificar_vazamentos(self, data: Dict):
+        email = str(data.get('email', '')).strip()
+        if not email:
+            return 400, {'erro': 'Email não fornecido'}
+
+        resultado_api = await asyncio.to_thread(osint.resultado_em_cache, 'vazamentos', email)
+        if resultado_api is None:
+            resultado_api = await self.vazamentos_api.verificar_multiplas_fontes(email)
+            await asyncio.to_thread(osint.guardar_resultado, 'vazamentos', email, resultado_api)
+        resultado = osint.montar_resultado_vazamentos(email, resultado_api)
+        await asyncio.to_thread(salvar_busca, 'vazamentos', email, resultado)
+        return 200, resultado
+
+app = SearchASGIApp()
@@ -0,0 +1,259 @@
+"""
+Versões assíncronas (httpx) dos clientes de CPF e de vazamentos
+Usadas pelo ponto de entrada ASGI (asgi.py); formatação e URLs vêm dos clientes síncronos
+"""
+import asyncio
+import os
+from typing import Dict, Optional
+from cpf_api import CPFAPIClient, QuotaExcedidaError
+from vazamentos_api import VazamentosAPIClient
+from metrics import aberta
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # httpx não instalado; apenas o app Flask (síncrono) fica disponível
+
+async def _upstream(requisicao):
+    """Aguarda uma chamada ao upstream contando-a como etapa 'upstream' aberta (sonda da admissão)"""
+    with aberta('upstream'):
+        return await requisicao
+
+def criar_http_client() -> 'httpx.AsyncClient':
+    """Cria o cliente HTTP compartilhado (um por processo ASGI)"""
+    if httpx is None:
+        raise RuntimeError('httpx não instalado. Execute: pip install httpx')
+    limites = httpx.Limits(
+        max_connections=int(os.getenv('ASGI_UPSTREAM_MAX_CONEXOES', '200')),
+        max_keepalive_connections=int(os.getenv('ASGI_UPSTREAM_MAX_KEEPALIVE', '50'))
+    )
+    return httpx.AsyncClient(limits=limites, timeout=15, follow_redirects=True)
+
+class AsyncCPFAPIClient(CPFAPIClient):
+    def __init__(self, http: 'httpx.AsyncClient'):
+        super().__init__()
+        self.http = http
+
+    async def _reservar_quota_async(self, provedor: str, usuario: Optional[Dict]):
+        """A quota pode gravar no SQLite, então roda fora do event loop"""
+        await asyncio.to_thread(self._reservar_quota, provedor, usuario)
+
+    async def _devolver_quota_async(self, provedor: str, usuario: Optional[Dict]):
+        await asyncio.to_thread(self._devolver_quota, provedor, usuario)
+
+    async def consultar_serasa(self, cpf: str, usuario: Optional[Dict] = None) -> Optional[Dict]:
+        """Consulta CPF na API Serasa (assíncrono)"""
+        if not self.serasa_api_key:
+            return None
+
+        await self._reservar_quota_async('serasa', usuario)
+
+        try:
+            response = await _upstream(self.http.post(
+                self.serasa_api_url,
+                headers={
+                    **self.headers,
+                    'Authorization': f'Bearer {self.serasa_api_key}'
+                },
+                json={'cpf': cpf},
+                timeout=10
+            ))
+
+            # Só a resposta 200 é cobrada: qualquer outra (429, 401, 403, 5xx) devolve a consulta
+            if response.status_code != 200:
+                await self._devolver_quota_async('serasa', usuario)
+            if response.status_code == 200:
+                return response.json()
+        except httpx.TransportError as e:
+            await self._devolver_quota_async('serasa', usuario)
+            print(f"Erro ao consultar Serasa: {e}")
+        except Exception as e:
+            print(f"Erro ao consultar Serasa: {e}")
+
+        return None
+
+    async def consultar_queromeusdados(self, cpf: str, usuario: Optional[Dict] = None) -> Optional[Dict]:
+        """Consulta CPF na API Quero Meus Dados (assíncrono)"""
+        if not self.queromeusdados_api_key:
+            return None
+
+        await self._reservar_quota_async('queromeusdados', usuario)
+
+        try:
+            response = await _upstream(self.http.post(
+                self.queromeusdados_url,
+                headers={
+                    **self.headers,
+                    'X-API-Key': self.queromeusdados_api_key
+                },
+                json={'cpf': cpf},
+                timeout=10
+            ))
+
+            # Só a resposta 200 é cobrada: qualquer outra (429, 401, 403, 5xx) devolve a consulta
+            if response.status_code != 200:
+                await self._devolver_quota_async('queromeusdados', usuario)
+            if response.status_code == 200:
+                return response.json()
+        except httpx.TransportError as e:
+            await self._devolver_quota_async('queromeusdados', usuario)
+            print(f"Erro ao consultar Quero Meus Dados: {e}")
+        except Exception as e:
+            print(f"Erro ao consultar Quero Meus Dados: {e}")
+
+        return None
+
+    async def consultar_api_brasil(self, cpf: str) -> Optional[Dict]:
+        """Consulta usando API Brasil (assíncrono)"""
+        if not await asyncio.to_thread(self._api_brasil_disponivel):
+            return None
+        sem_cpf = True
+        for url in await asyncio.to_thread(self._endpoints_api_brasil, cpf):
+            try:
+                response = await _upstream(self.http.get(url, headers=self.headers, timeout=10))
+                if response.status_code == 200:
+                    await asyncio.to_thread(self._lembrar_endpoint_api_brasil, url, cpf)
+                    return self._formatar_api_brasil(response.json())
+                sem_cpf = sem_cpf and response.status_code == 404
+            except Exception:
+                sem_cpf = False
+                continue
+        if sem_cpf:
+            await asyncio.to_thread(self._marcar_api_brasil_sem_cpf)
+        return None
+
+    async def consultar_multiplas_apis(self, cpf: str, usuario: Optional[Dict] = None) -> Dict:
+        """
+        Consulta CPF em múltiplas APIs e consolida resultados (mesma ordem do cliente síncrono)
+        """
+        resultados = {
+            'cpf': cpf,
+            'fontes': [],
+            'informacoes': {},
+            'erro': None
+        }
+        quota_excedida = []
+
+        provedores = [
+            # consultar_api_brasil já devolve o formato interno
+            ('API Brasil', lambda: self.consultar_api_brasil(cpf), lambda dados: dados),
+            ('Serasa', lambda: self.consultar_serasa(cpf, usuario), self._formatar_serasa),
+            ('Quero Meus Dados', lambda: self.consultar_queromeusdados(cpf, usuario), self._formatar_qmd),
+        ]
+
+        for nome, consultar, formatar in provedores:
+            try:
+                dados = await consultar()
+            except QuotaExcedidaError:
+                quota_excedida.append(nome)
+                continue
+
+            if dados:
+                resultados['informacoes'] = formatar(dados)
+                resultados['fontes'].append({
+                    'nome': nome,
+                    'resultado': 'Consulta realizada com sucesso',
+                    'tipo': 'api',
+                    'confiabilidade': 'alta'
+                })
+                return resultados
+
+        if quota_excedida:
+            resultados['quota_excedida'] = quota_excedida
+            resultados['erro'] = f"Quota diária excedida para: {', '.join(quota_excedida)}"
+            return resultados
+
+        resultados['erro'] = 'Nenhuma API configurada ou disponível. Configure as variáveis de ambiente.'
+        return resultados
+
+class AsyncVazamentosAPIClient(VazamentosAPIClient):
+    def __init__(self, http: 'httpx.AsyncClient'):
+        super().__init__()
+        self.http = http
+
+    async def verificar_hibp(self, email: str) -> Dict:
+        """Verifica vazamentos usando Have I Been Pwned API (assíncrono)"""
+        resultado = {
+            'fonte': 'Have I Been Pwned',
+            'comprometido': False,
+            'breaches': [],
+            'senhas': [],
+            'erro': None
+        }
+
+        try:
+            # Tentar API v3 primeiro (requer key; pulada enquanto recusada ou limitada)
+            usar_v3 = self.hibp_api_key and await asyncio.to_thread(self._hibp_v3_disponivel)
+            if usar_v3:
+                response = await _upstream(self.http.get(
+                    self._url_hibp(email, 'v3'),
+                    headers={**self.headers, 'hibp-api-key': self.hibp_api_key}
+                ))
+
+                if response.status_code == 200:
+                    resultado['comprometido'] = True
+                    resultado['breaches'] = [self._formatar_breach(b) for b in response.json()]
+                elif response.status_code == 404:
+                    resultado['comprometido'] = False
+                elif response.status_code == 429:
+                    resultado['erro'] = 'Rate limit atingido'
+                await asyncio.to_thread(self._registrar_resposta_hibp_v3, response)
+
+            # Sem key ou com falha, tentar endpoint público
+            if not usar_v3 or resultado.get('erro'):
+                response = await _upstream(self.http.get(self._url_hibp(email, 'v2'), headers=self.headers))
+
+                if response.status_code == 200:
+                    resultado['comprometido'] = True
+                    resultado['erro'] = None
+                    resultado['breaches'].extend(self._formatar_breach(b) for b in response.json())
+
+        except Exception as e:
+            resultado['erro'] = str(e)
+
+        return resultado
+
+    async def _verificar_google(self, email: str, fonte: str, site: str, descricao: str, tipo: str) -> Dict:
+        """Busca o email no Google restrito a um site (assíncrono)"""
+        resultado = {
+            'fonte': fonte,
+            'comprometido': False,
+            'breaches': [],
+            'senhas': [],
+            'resultados': []
+        }
+
+        try:
+            url = self._url_busca_google(email, site)
+            response = await _upstream(self.http.get(url, headers=self.headers))
+
+            if response.status_code == 200 and self._encontrado_no_google(response.text, email, site):
+                resultado['comprometido'] = True
+                resultado['resultados'].append({
+                    'url': url,
+                    'descricao': descricao,
+                    'tipo': tipo
+                })
+        except Exception as e:
+            resultado['erro'] = str(e)
+
+        return resultado
+
+    async def verificar_pastebin(self, email: str) -> Dict:
+        """Busca email em vazamentos do Pastebin via Google (assíncrono)"""
+        return await self._verificar_google(email, 'Pastebin (via Google)', 'pastebin.com',
+                                            'Email encontrado em posts do Pastebin', 'Pastebin Leak')
+
+    async def verificar_github(self, email: str) -> Dict:
+        """Busca email em repositórios públicos do GitHub (assíncrono)"""
+        return await self._verificar_google(email, 'GitHub (via Google)', 'github.com',
+                                            'Email encontrado em repositórios do GitHub', 'GitHub Leak')
+
+    async def verificar_multiplas_fontes(self, email: str) -> Dict:
+        """Consulta as três fontes em paralelo e consolida"""
+        hibp_result, pastebin_result, github_result = await asyncio.gather(
+            self.verificar_hibp(email),
+            self.verificar_pastebin(email),
+            self.verificar_github(email)
+        )
+        return self._consolidar(email, hibp_result, pastebin_result, github_result)
@@ -59,11 +59,8 @@ def fazer_login(email: str, senha: str) -> dict:
     }
     
     # Atualizar último acesso
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE usuarios SET ultimo_acesso = CURRENT_TIMESTAMP WHERE email = ?', (email,))
-    conn.commit()
-    conn.close()
+    with db.escrita(invalidar=('usuarios',)) as conn:
+        conn.execute('UPDATE usuarios SET ultimo_acesso = CURRENT_TIMESTAMP WHERE email = ?', (email,))
     
     return {'sucesso': True, 'usuario': usuario}
 
@@ -102,12 +99,9 @@ def alterar_senha(email: str, senha_atual: str, nova_senha: str) -> dict:
     # Atualizar senha
     try:
         nova_senha_hash = generate_password_hash(nova_senha)
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE usuarios SET senha_hash = ? WHERE email = ?', 
-                      (nova_senha_hash, email))
-        conn.commit()
-        conn.close()
+        with db.escrita(invalidar=('usuarios',)) as conn:
+            conn.execute('UPDATE usuarios SET senha_hash = ? WHERE email = ?', 
+                         (nova_senha_hash, email))
         
         return {'sucesso': True, 'mensagem': 'Password changed successfully'}
     except Exception as e:
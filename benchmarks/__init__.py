@@ -0,0 +1,3 @@
+"""
+Ferramentas de benchmark e testes de carga (executar a partir da raiz do projeto)
+"""
@@ -0,0 +1,207 @@
+"""
+Microbenchmarks dos métodos do Database sobre bancos sintéticos de vários tamanhos
+(gerados por benchmarks/gerar_fixtures.py e reaproveitados entre execuções).
+
+Uso:
+    python -m benchmarks.bench_database --tamanhos 1000,100000,1000000
+    python -m benchmarks.bench_database --tamanhos 100000 --metodos obter_todas_buscas,listar_usuarios \\
+        --saida benchmarks/resultados/database.json
+    python -m benchmarks.bench_database --tamanhos 100000 --comparar benchmarks/resultados/database.json
+    python -m benchmarks.bench_database --tamanhos 100000 --memoria
+    python -m benchmarks.bench_database --tamanhos 100000 --cache
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Tuple
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from database import Database, banco_em_memoria
+from ip_logs import obter_particoes
+from benchmarks import gerar_fixtures
+from benchmarks.http_bench import percentil
+
+def termos_de_referencia(banco: str) -> Dict[str, str]:
+    """Termo mais frequente de cada tipo (pior caso das buscas por histórico)"""
+    conn = sqlite3.connect(banco)
+    termos = {}
+    for tipo in ('nome', 'processo', 'foto'):
+        linha = conn.execute('''
+            SELECT termo FROM buscas WHERE tipo = ? GROUP BY termo ORDER BY COUNT(*) DESC LIMIT 1
+        ''', (tipo,)).fetchone()
+        termos[tipo] = linha[0] if linha else ''
+    conn.close()
+    return termos
+
+def montar_casos(db: Database, termos: Dict[str, str]) -> List[Tuple[str, Callable]]:
+    """(nome, chamada) de cada caso medido; leituras primeiro, inserções no fim"""
+    contador = iter(range(10 ** 9))
+    return [
+        ('obter_todas_buscas', lambda: db.obter_todas_buscas(50)),
+        ('buscar_historico_nome[frequente]', lambda: db.buscar_historico_nome(termos['nome'])),
+        ('buscar_historico_nome[ausente]', lambda: db.buscar_historico_nome('Termo Inexistente')),
+        ('buscar_historico_processo[frequente]', lambda: db.buscar_historico_processo(termos['processo'])),
+        ('buscar_historico_processo[ausente]', lambda: db.buscar_historico_processo('0000000-00.0000.0.00.0000')),
+        ('buscar_historico_foto[frequente]', lambda: db.buscar_historico_foto(termos['foto'])),
+        ('buscar_historico_foto[ausente]', lambda: db.buscar_historico_foto('Termo Inexistente')),
+        ('obter_estatisticas_ips', db.obter_estatisticas_ips),
+        ('obter_ips_recentes', lambda: db.obter_ips_recentes(100)),
+        ('listar_usuarios', db.listar_usuarios),
+        ('listar_usuarios[permissao,ultimo_acesso]', lambda: db.listar_usuarios(ordem='ultimo_acesso', permissao='admin')),
+        ('contar_usuarios', db.contar_usuarios),
+        ('salvar_busca_nome', lambda: db.salvar_busca_nome('Bench Nome', 'Buscar "Bench Nome"', 'Google Search')),
+        ('salvar_busca_processo', lambda: db.salvar_busca_processo('0000001-00.2024.8.26.0001', 'Bench', 'Sistema Judicial')),
+        ('salvar_busca_foto', lambda: db.salvar_busca_foto('bench', 'https://exemplo.com/b.jpg', 'Bench', 'TinEye')),
+        ('salvar_busca_cpf', lambda: db.salvar_busca_cpf('52998224725', '529.982.247-25', 'Bench', 'API Brasil', '{}')),
+        ('salvar_historico', lambda: db.salvar_historico('nome', 'Bench Nome', '{"fontes": []}')),
+        ('registrar_ip', lambda: db.registrar_ip('10.0.0.1', 'bench', '/api/buscar/nome', 'POST')),
+        ('criar_usuario', lambda: db.criar_usuario(f'bench{next(contador)}-{time.time_ns()}@exemplo.com', 'Bench')),
+    ]
+
+def medir(funcao: Callable, repeticoes: int, tempo_maximo: float) -> Dict:
+    """Executa `funcao` até `repeticoes` vezes (ou até `tempo_maximo` segundos) após um aquecimento"""
+    funcao()
+    tempos = []
+    inicio = time.perf_counter()
+    while len(tempos) < repeticoes:
+        t0 = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - t0)
+        if time.perf_counter() - inicio > tempo_maximo:
+            break
+    tempos.sort()
+    linhas = len(resultado) if isinstance(resultado, list) else None
+    return {
+        'execucoes': len(tempos),
+        'min_ms': round(tempos[0] * 1000, 3),
+        'p50_ms': round(percentil(tempos, 50) * 1000, 3),
+        'p95_ms': round(percentil(tempos, 95) * 1000, 3),
+        'media_ms': round(sum(tempos) / len(tempos) * 1000, 3),
+        'linhas_retornadas': linhas
+    }
+
+def esquema_antigo(banco: str) -> bool:
+    """Fixture gerada antes de buscas/busca_fontes (ou ainda com tabelas _legado por migrar)"""
+    conn = sqlite3.connect(banco)
+    try:
+        nomes = {n for (n,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    return 'busca_fontes' not in nomes or any(n.endswith('_buscas_legado') for n in nomes)
+
+def preparar_banco(diretorio: str, tamanho: int, regenerar: bool) -> str:
+    """Gera (ou reaproveita) o banco sintético de um tamanho"""
+    banco = os.path.join(diretorio, f'fixture_{tamanho}.db')
+    if regenerar or not os.path.exists(banco) or esquema_antigo(banco):
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(banco + sufixo):
+                os.remove(banco + sufixo)
+        shutil.rmtree(os.path.splitext(banco)[0] + '_ip_logs', ignore_errors=True)
+        gerar_fixtures.gerar(banco, linhas=tamanho, historico=tamanho, ips=tamanho * 4,
+                             usuarios=max(10, tamanho // 20))
+    return banco
+
+def contar_linhas(banco: str) -> Dict[str, int]:
+    conn = sqlite3.connect(banco)
+    tabelas = ['buscas', 'busca_fontes', 'ip_logs', 'ip_rollup_hora', 'ip_unicos_hora', 'usuarios']
+    contagens = {t: conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0] for t in tabelas}
+    conn.close()
+    # ip_logs: tabela antiga + partições mensais
+    particoes = obter_particoes(Database(banco))
+    for mes in particoes.listar():
+        conn = sqlite3.connect(particoes.caminho(mes))
+        contagens['ip_logs'] += conn.execute('SELECT COUNT(*) FROM ip_logs').fetchone()[0]
+        conn.close()
+    return contagens
+
+def comparar(atual: Dict, base: Dict, limite: float) -> List[str]:
+    """Lista os casos cujo p50 piorou mais que o limite relativo (ex: 0.15 = 15%)"""
+    regressoes = []
+    for tamanho, casos in atual['tamanhos'].items():
+        anteriores = base.get('tamanhos', {}).get(tamanho, {}).get('casos', {})
+        for caso, medidas in casos['casos'].items():
+            anterior = anteriores.get(caso)
+            if anterior and anterior['p50_ms'] > 0 and medidas['p50_ms'] > anterior['p50_ms'] * (1 + limite):
+                regressoes.append(f"{tamanho} {caso}: p50_ms {anterior['p50_ms']} -> {medidas['p50_ms']}")
+    return regressoes
+
+def imprimir_tabela(resultados: Dict):
+    tamanhos = list(resultados['tamanhos'])
+    casos = list(next(iter(resultados['tamanhos'].values()))['casos'])
+    largura = max(len(c) for c in casos) + 2
+    print()
+    print('p50 em ms por tamanho (buscas por tipo)')
+    print('caso'.ljust(largura) + ''.join(f'{t:>14s}' for t in tamanhos))
+    for caso in casos:
+        valores = [resultados['tamanhos'][t]['casos'].get(caso, {}).get('p50_ms') for t in tamanhos]
+        print(caso.ljust(largura) + ''.join(f'{v:>14.3f}' if v is not None else f'{"-":>14s}' for v in valores))
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks do Database sobre bancos sintéticos')
+    parser.add_argument('--tamanhos', default='1000,100000', help='buscas por tipo, separadas por vírgula')
+    parser.add_argument('--dir', default=os.path.join(tempfile.gettempdir(), 'painel_fixtures'),
+                        help='onde guardar os bancos gerados')
+    parser.add_argument('--regenerar', action='store_true', help='gera os bancos de novo mesmo se já existirem')
+    parser.add_argument('--metodos', default='', help='filtra os casos (prefixo do nome, separados por vírgula)')
+    parser.add_argument('--repeticoes', type=int, default=50)
+    parser.add_argument('--tempo-maximo', type=float, default=10.0, help='segundos por caso')
+    parser.add_argument('--saida', default='benchmarks/resultados/database.json')
+    parser.add_argument('--comparar', default='', help='JSON de uma execução anterior')
+    parser.add_argument('--limite', type=float, default=0.15)
+    parser.add_argument('--memoria', action='store_true',
+                        help='mede sobre uma cópia em memória do banco (sem fsync; as inserções não alteram o arquivo)')
+    parser.add_argument('--cache', action='store_true',
+                        help='mantém o cache de leitura ligado (sem ele, toda leitura vai ao banco)')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    filtros = [f for f in args.metodos.split(',') if f]
+    resultados = {'gerado_em': time.strftime('%Y-%m-%d %H:%M:%S'), 'sqlite': sqlite3.sqlite_version, 'tamanhos': {}}
+
+    for tamanho in [int(t) for t in args.tamanhos.split(',') if t]:
+        banco = preparar_banco(args.dir, tamanho, args.regenerar)
+        linhas = contar_linhas(banco)
+        print(f'\n== {tamanho:,d} linhas por tabela ({os.path.getsize(banco) / (1024 * 1024):,.1f} MB) ==')
+        casos = {}
+        with banco_em_memoria(banco) if args.memoria else nullcontext(Database(banco)) as db:
+            db.cache.ativo = args.cache
+            for nome, funcao in montar_casos(db, termos_de_referencia(banco)):
+                if filtros and not any(nome.startswith(f) for f in filtros):
+                    continue
+                casos[nome] = medir(funcao, args.repeticoes, args.tempo_maximo)
+                m = casos[nome]
+                print(f"  {nome:40s} p50 {m['p50_ms']:10.3f} ms  p95 {m['p95_ms']:10.3f} ms  ({m['execucoes']} execuções)")
+        resultados['tamanhos'][str(tamanho)] = {'banco': banco, 'memoria': args.memoria, 'cache': args.cache,
+                                                'linhas': linhas, 'casos': casos}
+
+    if resultados['tamanhos']:
+        imprimir_tabela(resultados)
+
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f'\nResultados salvos em {args.saida}')
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regressoes = comparar(resultados, base, args.limite)
+        if regressoes:
+            print('\nRegressões:')
+            for r in regressoes:
+                print(f'  {r}')
+            sys.exit(1)
+        print('\nSem regressões acima do limite')
+
+if __name__ == '__main__':
+    main()
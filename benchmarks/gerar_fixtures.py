@@ -0,0 +1,284 @@
+"""
+Gera um banco sintético grande para benchmarks do Database.
+Preenche buscas/busca_fontes (por tipo e histórico), ip_logs (partições mensais
+e agregados por hora) e usuarios com dados
+fictícios; termos e IPs seguem distribuição enviesada (poucos muito frequentes,
+cauda longa de raros), como no uso real.
+
+Uso:
+    python -m benchmarks.gerar_fixtures --banco /tmp/grande.db --linhas 1000000
+    python -m benchmarks.gerar_fixtures --banco /tmp/grande.db --linhas 100000 \\
+        --ips 2000000 --usuarios 50000 --dias 365
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from database import Database
+from ip_logs import obter_particoes, hora_de
+
+LOTE = 50000
+
+PRIMEIROS_NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Isabela',
+                   'João', 'Karina', 'Lucas', 'Mariana', 'Nicolas', 'Olívia', 'Pedro', 'Rafaela', 'Samuel']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Lima', 'Pereira', 'Costa', 'Rodrigues',
+              'Almeida', 'Nascimento', 'Ferreira', 'Carvalho', 'Gomes', 'Martins', 'Rocha', 'Ribeiro']
+FONTES = ['Google Search', 'Facebook', 'LinkedIn', 'Twitter/X', 'Instagram', 'Pipl',
+          'TruePeopleSearch', 'Whitepages', 'Spokeo', 'Yandex']
+TIPOS_HISTORICO = ['nome', 'processo', 'foto', 'cpf', 'email', 'telefone', 'username',
+                   'dominio', 'veiculo', 'endereco', 'vazamentos']
+PATHS = ['/', '/api/buscar/nome', '/api/buscar/cpf', '/api/buscar/email', '/api/buscar/processo',
+         '/api/buscar/foto', '/api/historico', '/api/estatisticas', '/api/user/profile', '/health',
+         '/api/buscar/vazamentos', '/api/buscar/telefone', '/api/buscar/username']
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148',
+    'Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'curl/8.4.0',
+    'python-requests/2.31.0',
+    'Render/1.0 (health check)',
+]
+
+class Enviesado:
+    """Escolha com distribuição de Zipf (expoente s) sobre uma lista de valores"""
+    def __init__(self, valores: List, s: float, rng: random.Random):
+        self.valores = valores
+        self.rng = rng
+        pesos = [1.0 / (k ** s) for k in range(1, len(valores) + 1)]
+        self.acumulado = list(itertools.accumulate(pesos))
+        self.total = self.acumulado[-1]
+
+    def escolher(self):
+        return self.valores[bisect.bisect_left(self.acumulado, self.rng.random() * self.total)]
+
+def gerar_termos(quantidade: int, rng: random.Random) -> List[str]:
+    """Nomes completos distintos (o primeiro da lista será o mais frequente)"""
+    termos = set()
+    while len(termos) < quantidade:
+        termos.add(f'{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)} {len(termos)}')
+    return list(termos)
+
+def gerar_ips(quantidade: int, rng: random.Random) -> List[str]:
+    return [f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+            for _ in range(quantidade)]
+
+def gerar_cpf(rng: random.Random) -> str:
+    base = [rng.randint(0, 9) for _ in range(9)]
+    for peso in (10, 11):
+        resto = sum(d * (peso - i) for i, d in enumerate(base)) % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    return ''.join(map(str, base))
+
+class GeradorDatas:
+    """Datas crescentes espalhadas pelos últimos `dias` (como seriam inseridas)"""
+    def __init__(self, total: int, dias: int):
+        self.inicio = datetime.utcnow() - timedelta(days=dias)
+        self.passo = (dias * 86400.0) / max(1, total)
+
+    def data(self, indice: int) -> str:
+        return (self.inicio + timedelta(seconds=indice * self.passo)).strftime('%Y-%m-%d %H:%M:%S')
+
+def inserir_em_lotes(conn, sql: str, linhas: Iterator, rotulo: str) -> int:
+    """executemany em lotes, um commit por lote"""
+    total = 0
+    inicio = time.perf_counter()
+    while True:
+        lote = list(itertools.islice(linhas, LOTE))
+        if not lote:
+            break
+        conn.executemany(sql, lote)
+        conn.commit()
+        total += len(lote)
+    duracao = time.perf_counter() - inicio
+    print(f'  {rotulo:20s} {total:>12,d} linhas em {duracao:6.1f}s ({total / max(duracao, 1e-9):,.0f}/s)')
+    return total
+
+def gerar(banco: str, linhas: int, historico: int, ips: int, usuarios: int, dias: int = 365,
+          semente: int = 42, enviesamento: float = 1.1) -> Dict[str, int]:
+    """Cria/preenche o banco e retorna a quantidade de linhas inseridas por tabela"""
+    rng = random.Random(semente)
+    db = Database(banco)  # cria o esquema
+
+    conn = sqlite3.connect(banco)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-200000')
+
+    termos = Enviesado(gerar_termos(max(100, linhas // 20), rng), enviesamento, rng)
+    fontes = Enviesado(FONTES, 0.5, rng)
+    contagens = {}
+
+    print(f'Gerando {banco}')
+
+    proximo_id = itertools.count(1)
+
+    def inserir_buscas(buscas: Iterator, rotulo: str) -> int:
+        """buscas: (tipo, termo, resultado, data, status, url_imagem, hash_imagem, cpf, informacoes, fontes)"""
+        fontes_pendentes = []
+
+        def linhas_buscas():
+            for *colunas, fontes_busca in buscas:
+                busca_id = next(proximo_id)
+                fontes_pendentes.extend((busca_id, f, r) for f, r in fontes_busca)
+                yield (busca_id, *colunas)
+
+        total = inserir_em_lotes(conn, '''
+            INSERT INTO buscas (id, tipo, termo, resultado, data_busca, status, url_imagem, hash_imagem, cpf,
+                                informacoes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', linhas_buscas(), rotulo)
+        contagens['busca_fontes'] = contagens.get('busca_fontes', 0) + inserir_em_lotes(conn, '''
+            INSERT INTO busca_fontes (busca_id, fonte, resultado) VALUES (?, ?, ?)
+        ''', iter(fontes_pendentes), f'{rotulo} (fontes)')
+        return total
+
+    # Uma busca com uma fonte por linha, em cada tipo com tabela própria no esquema antigo
+    datas = GeradorDatas(linhas, dias)
+    contagens['buscas nome'] = inserir_buscas(
+        (('nome', t, None, datas.data(i), None, None, None, None, None, [(f, f'Buscar "{t}" em {f}')])
+         for i, t, f in ((i, termos.escolher(), fontes.escolher()) for i in range(linhas))), 'buscas nome')
+
+    processos = Enviesado([f'{n:07d}-{n % 100:02d}.20{10 + n % 14}.8.26.{n % 10000:04d}'
+                           for n in rng.sample(range(10 ** 7), max(100, linhas // 20))], enviesamento, rng)
+    contagens['buscas processo'] = inserir_buscas(
+        (('processo', p, None, datas.data(i), 'Encontrado', None, None, None, None,
+          [('Sistema Judicial', f'Processo {p} encontrado')])
+         for i, p in ((i, processos.escolher()) for i in range(linhas))), 'buscas processo')
+
+    contagens['buscas foto'] = inserir_buscas(
+        (('foto', t, None, datas.data(i), None, f'https://exemplo.com/img/{i % 5000}.jpg',
+          f'{(i * 2654435761) % (1 << 64):016x}', None, None, [('TinEye', f'Busca reversa para "{t}"')])
+         for i, t in ((i, termos.escolher()) for i in range(linhas))), 'buscas foto')
+
+    cpfs = Enviesado([gerar_cpf(rng) for _ in range(max(100, linhas // 20))], enviesamento, rng)
+
+    def buscas_cpf():
+        for i in range(linhas):
+            cpf = cpfs.escolher()
+            formatado = f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}'
+            informacoes = json.dumps({'cpf': formatado, 'nome': termos.escolher()}, ensure_ascii=False)
+            yield ('cpf', formatado, None, datas.data(i), 'Encontrado', None, None, cpf, informacoes,
+                   [('API Brasil', 'Consulta realizada com sucesso')])
+
+    contagens['buscas cpf'] = inserir_buscas(buscas_cpf(), 'buscas cpf')
+
+    datas_historico = GeradorDatas(historico, dias)
+    tipos = Enviesado(TIPOS_HISTORICO, 1.0, rng)
+
+    def buscas_historico():
+        # Resultado completo e sem fontes, como as buscas de email, telefone etc.
+        for i in range(historico):
+            termo = termos.escolher()
+            resultado = json.dumps({'nome': termo, 'fontes': [{'nome': f, 'resultado': f'Buscar "{termo}"'}
+                                                              for f in FONTES[:3]]}, ensure_ascii=False)
+            yield (tipos.escolher(), termo, resultado, datas_historico.data(i), None, None, None, None, None, [])
+
+    contagens['buscas historico'] = inserir_buscas(buscas_historico(), 'buscas historico')
+
+    ips_enviesados = Enviesado(gerar_ips(max(100, ips // 50), rng), enviesamento, rng)
+    paths = Enviesado(PATHS, 1.0, rng)
+    agentes = Enviesado(USER_AGENTS, 1.2, rng)
+    metodos = ['GET', 'POST']
+    datas_ips = GeradorDatas(ips, dias)
+
+    status_http = Enviesado([200, 304, 400, 404, 429, 500], 2.0, rng)
+    particoes = obter_particoes(db)  # dicionários de user agent e path
+    rollup, ips_por_hora = {}, {}
+
+    def linhas_ips():
+        for i in range(ips):
+            path = paths.escolher()
+            metodo = metodos[path.startswith('/api/buscar/')]
+            ip, data, status = ips_enviesados.escolher(), datas_ips.data(i), status_http.escolher()
+            hora = hora_de(data)
+            rollup[(hora, path, metodo, status)] = rollup.get((hora, path, metodo, status), 0) + 1
+            ips_por_hora[(hora, ip)] = ips_por_hora.get((hora, ip), 0) + 1
+            yield (ip, particoes.user_agents.id(agentes.escolher()), particoes.paths.id(path), metodo,
+                   str(rng.randint(1, max(1, usuarios))),
+                   f'{rng.getrandbits(128):032x}', data, 'BR', 'São Paulo', status)
+
+    # As datas são crescentes: um arquivo de partição por mês, como em produção
+    contagens['ip_logs'] = 0
+    for mes, linhas_mes in itertools.groupby(linhas_ips(), key=lambda r: r[6][:4] + r[6][5:7]):
+        conn_particao = sqlite3.connect(particoes.garantir(mes))
+        conn_particao.execute('PRAGMA synchronous=OFF')
+        contagens['ip_logs'] += inserir_em_lotes(conn_particao, '''
+            INSERT INTO ip_logs (ip_address, user_agent_id, path_id, method, user_id, session_id, data_acesso,
+                                 country, city, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', linhas_mes, f'ip_logs {mes}')
+        conn_particao.execute('ANALYZE')
+        conn_particao.commit()
+        conn_particao.close()
+
+    contagens['ip_rollup_hora'] = inserir_em_lotes(conn, '''
+        INSERT INTO ip_rollup_hora (hora, path, method, status, total) VALUES (?, ?, ?, ?, ?)
+    ''', (chave + (n,) for chave, n in rollup.items()), 'ip_rollup_hora')
+    contagens['ip_unicos_hora'] = inserir_em_lotes(conn, '''
+        INSERT INTO ip_unicos_hora (hora, ip_address, total) VALUES (?, ?, ?)
+    ''', (chave + (n,) for chave, n in ips_por_hora.items()), 'ip_unicos_hora')
+
+    # Mesmo hash para todos: gerar um hash por usuário levaria horas
+    from werkzeug.security import generate_password_hash
+    senha_hash = generate_password_hash('fixture123')
+    datas_usuarios = GeradorDatas(usuarios, dias)
+    permissoes = Enviesado(['user', 'member', 'moderator', 'admin'], 2.0, rng)
+
+    def linhas_usuarios():
+        for i in range(usuarios):
+            acesso = datas_usuarios.data(min(usuarios - 1, i + rng.randint(0, max(1, usuarios // 10))))
+            yield (f'fixture{i}@exemplo.com', termos.escolher(), senha_hash, permissoes.escolher(),
+                   datas_usuarios.data(i), acesso if rng.random() < 0.8 else None)
+
+    contagens['usuarios'] = inserir_em_lotes(conn, '''
+        INSERT OR IGNORE INTO usuarios (email, nome, senha_hash, permissao, data_criacao, ultimo_acesso)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', linhas_usuarios(), 'usuarios')
+
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    return contagens
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera um banco sintético grande para benchmarks')
+    parser.add_argument('--banco', required=True, help='arquivo .db a criar/preencher')
+    parser.add_argument('--linhas', type=int, default=100000, help='buscas por tipo (nome, processo, foto, cpf)')
+    parser.add_argument('--historico', type=int, default=None, help='buscas dos demais tipos, sem fontes (padrão: --linhas)')
+    parser.add_argument('--ips', type=int, default=None, help='linhas de ip_logs (padrão: 4x --linhas)')
+    parser.add_argument('--usuarios', type=int, default=None, help='usuários (padrão: --linhas / 20)')
+    parser.add_argument('--dias', type=int, default=365, help='período coberto pelas datas')
+    parser.add_argument('--enviesamento', type=float, default=1.1, help='expoente de Zipf para termos e IPs')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    contagens = gerar(
+        args.banco,
+        linhas=args.linhas,
+        historico=args.historico if args.historico is not None else args.linhas,
+        ips=args.ips if args.ips is not None else args.linhas * 4,
+        usuarios=args.usuarios if args.usuarios is not None else max(10, args.linhas // 20),
+        dias=args.dias,
+        semente=args.semente,
+        enviesamento=args.enviesamento
+    )
+    tamanho = os.path.getsize(args.banco) / (1024 * 1024)
+    print(f'Total: {sum(contagens.values()):,d} linhas, {tamanho:,.1f} MB em {time.perf_counter() - inicio:.1f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""
+Teste de carga HTTP de todas as rotas de busca, histórico, estatísticas e admin.
+Sobe o app com um banco temporário e o servidor de APIs simuladas (sem rede),
+mede p50/p95/p99, vazão e erros por rota e grava um JSON de referência.
+
+Uso:
+    python -m benchmarks.http_bench --concorrencia 8 --requisicoes 200 \\
+        --saida benchmarks/resultados/base.json
+
+    # Comparar com uma execução anterior (sai com código 1 se houver regressão)
+    python -m benchmarks.http_bench --comparar benchmarks/resultados/base.json --limite 0.15
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import requests
+
+from benchmarks.upstream_stub import ConfiguracaoStub, iniciar as iniciar_stub, variaveis_ambiente
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADMIN_EMAIL = 'admin@seita.com'
+ADMIN_SENHA = 'admin123'
+
+def gerar_cpf(rng: random.Random) -> str:
+    """CPF sintético com dígitos verificadores válidos"""
+    base = [rng.randint(0, 9) for _ in range(9)]
+    for peso in (10, 11):
+        soma = sum(d * (peso - i) for i, d in enumerate(base))
+        resto = soma % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    return ''.join(map(str, base))
+
+def gerar_corpo(tipo: str, rng: random.Random) -> Dict:
+    """Corpo JSON de cada rota de busca"""
+    n = rng.randint(0, 9999)
+    corpos = {
+        'nome': {'nome': f'Pessoa Teste {n}'},
+        'processo': {'numero_processo': f'{n:07d}-12.2023.8.26.{n % 1000:04d}'},
+        'foto': {'termo_busca': f'foto {n}', 'url_imagem': f'https://exemplo.com/img/{n}.jpg'},
+        'cpf': {'cpf': gerar_cpf(rng)},
+        'email': {'email': f'usuario{n}@exemplo.com'},
+        'telefone': {'telefone': f'(11) 9{n:04d}-{n:04d}'},
+        'username': {'username': f'usuario_{n}'},
+        'dominio': {'dominio_ip': f'exemplo{n}.com.br'},
+        'veiculo': {'placa': f'ABC{n % 10}D{n % 100:02d}'},
+        'endereco': {'endereco': f'Rua Teste, {n}, São Paulo'},
+        'vazamentos': {'email': f'usuario{n}@exemplo.com'},
+    }
+    return corpos[tipo]
+
+BUSCAS = ('nome', 'processo', 'foto', 'cpf', 'email', 'telefone', 'username',
+          'dominio', 'veiculo', 'endereco', 'vazamentos')
+
+ROTAS_LEITURA = [
+    ('historico', '/api/historico'),
+    ('historico_filtrado', '/api/historico?tipo=nome&termo=Teste'),
+    ('estatisticas', '/api/estatisticas'),
+]
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def descobrir_rotas_admin(env: Dict, cwd: str) -> List[str]:
+    """
+    Rotas GET /api/admin/* sem parâmetros, lidas do url_map do app. Streams
+    (SSE) ficam de fora: a resposta não termina e prenderia o cliente do teste
+    """
+    codigo = (
+        "import inspect, json, app\n"
+        "def stream(r):\n"
+        "    return r.rule.endswith('/stream') or \\\n"
+        "        'text/event-stream' in inspect.getsource(app.app.view_functions[r.endpoint])\n"
+        "rotas = sorted({r.rule for r in app.app.url_map.iter_rules()\n"
+        "    if r.rule.startswith('/api/admin/') and 'GET' in r.methods and not r.arguments\n"
+        "    and not stream(r)})\n"
+        "print(json.dumps(rotas))\n"
+    )
+    saida = subprocess.run([sys.executable, '-c', codigo], env=env, cwd=cwd,
+                           capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+class ServidorApp:
+    """App Flask rodando em subprocesso com banco temporário"""
+    def __init__(self, servidor: str, workers: int, env_extra: Dict[str, str]):
+        self.dir = tempfile.mkdtemp(prefix='bench_http_')
+        self.porta = porta_livre()
+        self.url = f'http://127.0.0.1:{self.porta}'
+        self.env = {**os.environ, 'PYTHONPATH': RAIZ, 'SECRET_KEY': 'bench-secret', **env_extra}
+
+        if servidor == 'gunicorn':
+            comando = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{self.porta}',
+                       '--workers', str(workers), '--threads', '4', '--chdir', self.dir,
+                       '--pythonpath', RAIZ, '--log-level', 'warning']
+        else:
+            comando = [sys.executable, '-c',
+                       f"from app import app; app.run(host='127.0.0.1', port={self.porta}, threaded=True)"]
+
+        self.comando = comando
+        self.processo = None
+
+    def iniciar(self):
+        self.processo = subprocess.Popen(self.comando, cwd=self.dir, env=self.env,
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def aguardar(self, timeout: float = 30):
+        limite = time.time() + timeout
+        while time.time() < limite:
+            if self.processo.poll() is not None:
+                raise RuntimeError(f'App encerrou: {self.processo.stderr.read().decode()[-2000:]}')
+            try:
+                if requests.get(f'{self.url}/health', timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError('App não respondeu a /health a tempo')
+
+    def parar(self):
+        if self.processo is not None:
+            self.processo.terminate()
+            try:
+                self.processo.wait(10)
+            except subprocess.TimeoutExpired:
+                self.processo.kill()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por posição (nearest-rank) de uma lista ordenada"""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100.0 * len(valores)) - 1))
+    return valores[indice]
+
+def executar_cenario(url: str, cookies, metodo: str, caminho: str, gerador, requisicoes: int,
+                     concorrencia: int, semente: int) -> Dict:
+    """Dispara `requisicoes` chamadas com `concorrencia` threads e resume as latências"""
+    latencias = []
+    status = {}
+    excecoes = 0
+    lock = threading.Lock()
+    restantes = [requisicoes]
+
+    def trabalhador(indice: int):
+        nonlocal excecoes
+        rng = random.Random(semente + indice)
+        sessao = requests.Session()
+        sessao.cookies.update(cookies)
+        while True:
+            with lock:
+                if restantes[0] <= 0:
+                    return
+                restantes[0] -= 1
+            inicio = time.perf_counter()
+            try:
+                if metodo == 'POST':
+                    resposta = sessao.post(url + caminho, json=gerador(rng), timeout=60)
+                else:
+                    resposta = sessao.get(url + caminho, timeout=60)
+                codigo = resposta.status_code
+            except requests.RequestException:
+                codigo = None
+            duracao = time.perf_counter() - inicio
+            with lock:
+                latencias.append(duracao)
+                if codigo is None:
+                    excecoes += 1
+                else:
+                    status[codigo] = status.get(codigo, 0) + 1
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador, args=(i,)) for i in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total_segundos = time.perf_counter() - inicio
+
+    latencias.sort()
+    erros = excecoes + sum(n for codigo, n in status.items() if codigo >= 400)
+    return {
+        'requisicoes': len(latencias),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 2),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+        'media_ms': round(sum(latencias) / len(latencias) * 1000, 2) if latencias else 0,
+        'max_ms': round(latencias[-1] * 1000, 2) if latencias else 0,
+        'vazao_rps': round(len(latencias) / total_segundos, 2) if total_segundos else 0,
+        'erros': erros,
+        'taxa_erros': round(erros / len(latencias), 4) if latencias else 0,
+        'status': {str(k): v for k, v in sorted(status.items())},
+        'excecoes': excecoes
+    }
+
+def comparar(atual: Dict, base: Dict, limite: float) -> List[str]:
+    """Lista as regressões acima do limite relativo (ex: 0.15 = 15%)"""
+    regressoes = []
+    for rota, medidas in atual['rotas'].items():
+        anterior = base.get('rotas', {}).get(rota)
+        if not anterior:
+            continue
+        for campo in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if anterior[campo] > 0 and medidas[campo] > anterior[campo] * (1 + limite):
+                regressoes.append(f'{rota}: {campo} {anterior[campo]} -> {medidas[campo]}')
+        if anterior['vazao_rps'] > 0 and medidas['vazao_rps'] < anterior['vazao_rps'] * (1 - limite):
+            regressoes.append(f"{rota}: vazao_rps {anterior['vazao_rps']} -> {medidas['vazao_rps']}")
+        if medidas['taxa_erros'] > anterior['taxa_erros'] + limite / 10:
+            regressoes.append(f"{rota}: taxa_erros {anterior['taxa_erros']} -> {medidas['taxa_erros']}")
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga HTTP das rotas do app')
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--requisicoes', type=int, default=200, help='requisições por rota')
+    parser.add_argument('--servidor', choices=('gunicorn', 'flask'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='workers do gunicorn')
+    parser.add_argument('--rotas', default='', help='filtro: nomes separados por vírgula')
+    parser.add_argument('--latencia-upstream', default='uniforme:20:80',
+                        help='distribuição de latência das APIs simuladas (ver upstream_stub)')
+    parser.add_argument('--env', action='append', default=[], metavar='CHAVE=VALOR',
+                        help='variável de ambiente extra para o app (ex: ADMISSAO_LIMITE_SEARCH=64)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default=os.path.join('benchmarks', 'resultados', 'http.json'))
+    parser.add_argument('--comparar', help='JSON de referência para detectar regressões')
+    parser.add_argument('--limite', type=float, default=0.15, help='regressão relativa tolerada')
+    args = parser.parse_args()
+
+    latencias = {p: args.latencia_upstream for p in ('hibp', 'brasilapi', 'serasa', 'queromeusdados', 'google')}
+    stub, base_url = iniciar_stub(ConfiguracaoStub(latencias, semente=args.semente))
+
+    env_extra = {
+        **variaveis_ambiente(base_url),
+        # Chaves fictícias para exercitar os caminhos das APIs pagas
+        'SERASA_API_KEY': 'bench', 'QUEROMEUSDADOS_API_KEY': 'bench', 'HIBP_API_KEY': 'bench',
+    }
+    for item in args.env:
+        chave, _, valor = item.partition('=')
+        env_extra[chave] = valor
+
+    app = ServidorApp(args.servidor, args.workers, env_extra)
+    try:
+        # Importar o app uma vez também cria o banco temporário antes de subir os workers
+        rotas_admin = descobrir_rotas_admin(app.env, app.dir)
+        app.iniciar()
+        app.aguardar()
+
+        login = requests.post(f'{app.url}/api/auth/login',
+                              json={'email': ADMIN_EMAIL, 'senha': ADMIN_SENHA}, timeout=10)
+        login.raise_for_status()
+        cookies = login.cookies
+
+        cenarios = [(f'buscar_{tipo}', 'POST', f'/api/buscar/{tipo}', lambda rng, t=tipo: gerar_corpo(t, rng))
+                    for tipo in BUSCAS]
+        cenarios += [(nome, 'GET', caminho, None) for nome, caminho in ROTAS_LEITURA]
+        cenarios += [('admin_' + caminho[len('/api/admin/'):].replace('/', '_'), 'GET', caminho, None)
+                     for caminho in rotas_admin]
+
+        if args.rotas:
+            filtro = set(args.rotas.split(','))
+            cenarios = [c for c in cenarios if c[0] in filtro]
+
+        resultado = {
+            'meta': {
+                'data': datetime.now(timezone.utc).isoformat(),
+                'servidor': args.servidor,
+                'workers': args.workers,
+                'concorrencia': args.concorrencia,
+                'requisicoes_por_rota': args.requisicoes,
+                'latencia_upstream': args.latencia_upstream,
+                'env': args.env
+            },
+            'rotas': {}
+        }
+
+        for nome, metodo, caminho, gerador in cenarios:
+            medidas = executar_cenario(app.url, cookies, metodo, caminho, gerador,
+                                       args.requisicoes, args.concorrencia, args.semente)
+            resultado['rotas'][nome] = medidas
+            print(f"{nome:32s} p50={medidas['p50_ms']:8.2f}ms p95={medidas['p95_ms']:8.2f}ms "
+                  f"p99={medidas['p99_ms']:8.2f}ms {medidas['vazao_rps']:8.2f} req/s erros={medidas['erros']}")
+    finally:
+        app.parar()
+        stub.shutdown()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    with open(args.saida, 'w') as f:
+        json.dump(resultado, f, indent=2)
+    print(f'Resultado salvo em {args.saida}')
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+        regressoes = comparar(resultado, base, args.limite)
+        if regressoes:
+            print(f'Regressões acima de {args.limite:.0%}:')
+            for linha in regressoes:
+                print(f'  - {linha}')
+            sys.exit(1)
+        print('Nenhuma regressão acima do limite.')
+
+if __name__ == '__main__':
+    main()
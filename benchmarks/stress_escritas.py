@@ -0,0 +1,237 @@
+"""
+Teste de estresse das escritas com vários processos no mesmo banco (como os
+workers do gunicorn). O Database é criado no processo pai antes do fork
+(gunicorn --preload) e cada processo também executa o init_database ao mesmo
+tempo que os outros. Ao final confere que nenhuma escrita se perdeu e que a
+latência de cauda ficou abaixo do limite; sai com código 1 se não ficou.
+
+Uso:
+    python -m benchmarks.stress_escritas --processos 8 --operacoes 300
+    python -m benchmarks.stress_escritas --processos 16 --leitores 4 --p99-max-ms 500 \\
+        --saida benchmarks/resultados/stress.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter
+from typing import Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from database import Database
+from ip_logs import obter_particoes
+from benchmarks.http_bench import percentil
+
+PREFIXO = 'stress'
+DIA = '2000-01-01'
+
+# Caminhos de escrita exercitados, em rodízio
+OPERACOES = ('salvar_busca_nome', 'salvar_historico', 'registrar_ip', 'incrementar_quotas',
+             'criar_usuario', 'atualizar_permissao')
+
+def executar_operacao(db: Database, operacao: str, processo: int, seq: int):
+    termo = f'{PREFIXO}-{processo}-{seq}'
+    if operacao == 'salvar_busca_nome':
+        db.salvar_busca_nome(termo, 'resultado', 'stress')
+    elif operacao == 'salvar_historico':
+        db.salvar_historico('nome', termo, '{}')
+    elif operacao == 'registrar_ip':
+        db.registrar_ip(f'10.{processo % 256}.{seq // 256 % 256}.{seq % 256}', f'stress-agent/{processo}',
+                        f'/stress/{seq % 7}', 'GET', status=200, rota='/stress')
+    elif operacao == 'incrementar_quotas':
+        db.incrementar_quotas({(DIA, PREFIXO, 'stress'): 1})
+    elif operacao == 'criar_usuario':
+        resultado = db.criar_usuario(f'{termo}@stress.local', termo)
+        if not resultado['sucesso']:
+            raise RuntimeError(resultado['erro'])
+    elif operacao == 'atualizar_permissao':
+        resultado = db.atualizar_permissao('admin@seita.com', 'admin', termo)
+        if not resultado['sucesso']:
+            raise RuntimeError(resultado['erro'])
+
+def escritor(db: Database, banco: str, processo: int, operacoes: int, barreira, fila):
+    """Processo filho: inicializa o banco junto com os outros e executa as escritas"""
+    erros, tempos, contagem = [], {op: [] for op in OPERACOES}, Counter()
+    try:
+        barreira.wait()
+        inicio = time.perf_counter()
+        Database(banco)  # init_database concorrente (usuários padrão, esquema)
+        tempo_init = time.perf_counter() - inicio
+        barreira.wait()  # escritas medidas só depois que todos terminaram o init
+        for seq in range(operacoes):
+            operacao = OPERACOES[(seq + processo) % len(OPERACOES)]  # processos defasados no rodízio
+            t0 = time.perf_counter()
+            try:
+                executar_operacao(db, operacao, processo, seq)
+                contagem[operacao] += 1
+            except Exception as e:
+                erros.append(f'{operacao}: {e}')
+            tempos[operacao].append(time.perf_counter() - t0)
+        obter_particoes(db).flush()
+        fila.put({'processo': processo, 'tempos': tempos, 'contagem': dict(contagem), 'erros': erros,
+                  'init_s': tempo_init, 'contencao': Database.contencao()})
+    except Exception:
+        fila.put({'processo': processo, 'tempos': tempos, 'contagem': dict(contagem),
+                  'erros': erros + [traceback.format_exc()], 'init_s': 0, 'contencao': Database.contencao()})
+
+def leitor(db: Database, barreira, parar, leituras):
+    """Mantém transações de leitura abertas enquanto os escritores trabalham"""
+    # Sem o cache de leitura: toda consulta abre uma transação no banco
+    db.cache.ativo = False
+    barreira.wait()
+    barreira.wait()
+    while not parar.is_set():
+        db.obter_todas_buscas(50)
+        db.obter_estatisticas_ips()
+        db.listar_usuarios()
+        with leituras.get_lock():
+            leituras.value += 3
+
+def contar_acessos(db: Database) -> Dict[str, int]:
+    """Linhas nas partições e total nos agregados dos acessos do teste"""
+    conn = db.get_connection()
+    try:
+        rollup = conn.execute("SELECT COALESCE(SUM(total), 0) FROM ip_rollup_hora WHERE path = '/stress'").fetchone()[0]
+    finally:
+        conn.close()
+    particoes = obter_particoes(db)
+    with particoes.leitura(meses=len(particoes.listar()) or 1) as (conn, _):
+        linhas = conn.execute("SELECT COUNT(*) FROM ip_logs_recentes WHERE user_agent LIKE 'stress-agent/%'").fetchone()[0]
+    return {'ip_logs': linhas, 'ip_rollup_hora': rollup}
+
+def conferir(banco: str, esperado: Counter) -> Dict[str, Dict[str, int]]:
+    """Compara o que está no banco com as escritas que retornaram sem erro"""
+    db = Database(banco)
+    conn = db.get_connection()
+    try:
+        obtido = {
+            # As duas gravam em buscas: só o histórico tem resultado (o de salvar_busca_nome vai na fonte)
+            'salvar_busca_nome': conn.execute("SELECT COUNT(*) FROM buscas WHERE termo LIKE 'stress-%' AND resultado IS NULL").fetchone()[0],
+            'salvar_historico': conn.execute("SELECT COUNT(*) FROM buscas WHERE termo LIKE 'stress-%' AND resultado IS NOT NULL").fetchone()[0],
+            'incrementar_quotas': db.obter_uso_quota(DIA, PREFIXO, 'stress'),
+            'criar_usuario': conn.execute("SELECT COUNT(*) FROM usuarios WHERE email LIKE '%@stress.local'").fetchone()[0],
+            'atualizar_permissao': conn.execute("SELECT COUNT(*) FROM permissoes WHERE atribuido_por LIKE 'stress-%'").fetchone()[0],
+            'usuarios_padrao': conn.execute("SELECT COUNT(*) FROM usuarios WHERE email IN ('finmogg@gmail.com', 'admin@seita.com')").fetchone()[0]
+        }
+    finally:
+        conn.close()
+    ips = contar_acessos(db)
+    comparacao = {op: {'esperado': esperado.get(op, 0), 'obtido': obtido[op]}
+                  for op in OPERACOES if op != 'registrar_ip'}
+    comparacao['registrar_ip'] = {'esperado': esperado.get('registrar_ip', 0), 'obtido': ips['ip_logs']}
+    comparacao['ip_rollup_hora'] = {'esperado': esperado.get('registrar_ip', 0), 'obtido': ips['ip_rollup_hora']}
+    comparacao['usuarios_padrao'] = {'esperado': 2, 'obtido': obtido['usuarios_padrao']}
+    return comparacao
+
+def resumir(tempos: List[float]) -> Dict:
+    tempos = sorted(tempos)
+    if not tempos:
+        return {'execucoes': 0}
+    return {
+        'execucoes': len(tempos),
+        'p50_ms': round(percentil(tempos, 50) * 1000, 2),
+        'p95_ms': round(percentil(tempos, 95) * 1000, 2),
+        'p99_ms': round(percentil(tempos, 99) * 1000, 2),
+        'max_ms': round(tempos[-1] * 1000, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Estresse de escritas com vários processos no mesmo banco SQLite')
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--operacoes', type=int, default=300, help='escritas por processo')
+    parser.add_argument('--leitores', type=int, default=2, help='processos só de leitura em paralelo')
+    parser.add_argument('--p99-max-ms', type=float, default=1000.0, help='p99 máximo aceito por operação')
+    parser.add_argument('--dir', default='', help='diretório do banco (padrão: temporário, apagado ao final)')
+    parser.add_argument('--saida', default='')
+    args = parser.parse_args()
+
+    try:
+        contexto = multiprocessing.get_context('fork')
+    except ValueError:
+        sys.exit('Este teste precisa de fork (Linux/macOS), como o gunicorn')
+
+    diretorio = args.dir or tempfile.mkdtemp(prefix='painel_stress_')
+    os.makedirs(diretorio, exist_ok=True)
+    banco = os.path.join(diretorio, 'stress.db')
+    os.environ.setdefault('IP_LOGS_DIR', os.path.join(diretorio, 'ip_logs'))
+
+    # Como no gunicorn --preload: o Database nasce no pai e é herdado pelos workers
+    db = Database(banco)
+    barreira = contexto.Barrier(args.processos + args.leitores)
+    fila = contexto.Queue()
+    parar = contexto.Event()
+    leituras = contexto.Value('i', 0)
+
+    leitores = [contexto.Process(target=leitor, args=(db, barreira, parar, leituras)) for _ in range(args.leitores)]
+    escritores = [contexto.Process(target=escritor, args=(db, banco, i, args.operacoes, barreira, fila))
+                  for i in range(args.processos)]
+    inicio = time.perf_counter()
+    for p in leitores + escritores:
+        p.start()
+    resultados = [fila.get() for _ in escritores]
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    total_leituras = leituras.value
+    for p in leitores + escritores:
+        p.join(timeout=30)
+
+    esperado, erros, contencao = Counter(), [], Counter()
+    tempos = {op: [] for op in OPERACOES}
+    for r in resultados:
+        esperado.update(r['contagem'])
+        erros.extend(f"processo {r['processo']}: {e}" for e in r['erros'])
+        contencao.update(r['contencao'])
+        for op, lista in r['tempos'].items():
+            tempos[op].extend(lista)
+
+    comparacao = conferir(banco, esperado)
+    latencias = {op: resumir(lista) for op, lista in tempos.items()}
+    perdidas = {op: c for op, c in comparacao.items() if c['esperado'] != c['obtido']}
+    lentas = {op: m['p99_ms'] for op, m in latencias.items() if m.get('p99_ms', 0) > args.p99_max_ms}
+
+    total = sum(esperado.values())
+    print(f'{args.processos} processos x {args.operacoes} escritas ({args.leitores} leitores): '
+          f'{total} escritas em {duracao:.1f}s ({total / duracao:.0f}/s), {total_leituras} leituras')
+    print(f"init concorrente: máx {max(r['init_s'] for r in resultados) * 1000:.0f} ms; "
+          f"banco ocupado: {contencao['repeticoes']} repetições, {contencao['falhas']} falhas")
+    for op, m in latencias.items():
+        print(f"  {op:22s} p50 {m['p50_ms']:8.2f} ms  p99 {m['p99_ms']:8.2f} ms  máx {m['max_ms']:8.2f} ms")
+    for op, c in comparacao.items():
+        marca = 'ok' if op not in perdidas else 'DIVERGENTE'
+        print(f"  {op:22s} esperado {c['esperado']:6d}  obtido {c['obtido']:6d}  {marca}")
+
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump({'processos': args.processos, 'operacoes': args.operacoes, 'leitores': args.leitores,
+                       'duracao_s': round(duracao, 2), 'leituras': total_leituras, 'latencias': latencias, 'conferencia': comparacao,
+                       'contencao': dict(contencao), 'erros': erros[:100]}, f, ensure_ascii=False, indent=2)
+    if not args.dir:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    falhou = False
+    if erros:
+        print(f'\n{len(erros)} escritas falharam, por exemplo:')
+        for e in erros[:10]:
+            print(f'  {e.strip()}')
+        falhou = True
+    if perdidas:
+        print(f'\nEscritas perdidas ou duplicadas: {", ".join(perdidas)}')
+        falhou = True
+    if lentas:
+        print(f'\np99 acima de {args.p99_max_ms:.0f} ms: ' + ', '.join(f'{op} ({v} ms)' for op, v in lentas.items()))
+        falhou = True
+    if falhou:
+        sys.exit(1)
+    print('\nSem escritas perdidas e p99 dentro do limite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""
+Servidor local que imita as APIs externas (HIBP, API Brasil, Serasa,
+Quero Meus Dados e a busca do Google) para benchmarks e testes sem rede.
+Latência e falhas (404/429/5xx com Retry-After) são configuráveis por provedor.
+
+Uso:
+    python -m benchmarks.upstream_stub --porta 8900 \\
+        --latencia hibp=lognormal:4.5:0.6 --latencia serasa=uniforme:50:300 \\
+        --falha hibp=429:0.05 --falha serasa=500:0.02 --retry-after 2
+
+    # Em outro terminal, apontar os clientes para o servidor:
+    eval "$(python -m benchmarks.upstream_stub --porta 8900 --imprimir-env)"
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+PROVEDORES = ('hibp', 'brasilapi', 'serasa', 'queromeusdados', 'google')
+
+NOMES = ['Ana Souza', 'Bruno Lima', 'Carla Mendes', 'Diego Alves', 'Elisa Rocha',
+         'Fábio Nunes', 'Gabriela Dias', 'Heitor Costa', 'Isabela Reis', 'João Pereira']
+BREACHES = ['Adobe', 'LinkedIn', 'Dropbox', 'Canva', 'MyFitnessPal', 'Zynga', 'Dubsmash', 'Wattpad']
+
+class Latencia:
+    """
+    Distribuição de latência em milissegundos:
+    fixa:<ms> | uniforme:<min>:<max> | exponencial:<media> | lognormal:<mu>:<sigma>
+    """
+    def __init__(self, especificacao: str = 'fixa:0'):
+        partes = especificacao.split(':')
+        self.tipo = partes[0]
+        self.parametros = [float(p) for p in partes[1:]]
+        if self.tipo not in ('fixa', 'uniforme', 'exponencial', 'lognormal'):
+            raise ValueError(f'Distribuição desconhecida: {self.tipo}')
+
+    def amostrar(self, rng: random.Random) -> float:
+        """Retorna uma latência em segundos"""
+        if self.tipo == 'fixa':
+            ms = self.parametros[0]
+        elif self.tipo == 'uniforme':
+            ms = rng.uniform(self.parametros[0], self.parametros[1])
+        elif self.tipo == 'exponencial':
+            ms = rng.expovariate(1.0 / self.parametros[0]) if self.parametros[0] > 0 else 0
+        else:
+            ms = rng.lognormvariate(self.parametros[0], self.parametros[1])
+        return max(0.0, ms) / 1000.0
+
+class ConfiguracaoStub:
+    def __init__(self, latencias: Dict[str, str] = None, falhas: Dict[str, Dict[int, float]] = None,
+                 retry_after: int = 1, semente: Optional[int] = None):
+        self.latencias = {p: Latencia((latencias or {}).get(p, 'fixa:0')) for p in PROVEDORES}
+        # provedor -> {codigo_http: probabilidade}
+        self.falhas = {p: dict((falhas or {}).get(p, {})) for p in PROVEDORES}
+        self.retry_after = retry_after
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+        self.contadores = {p: {} for p in PROVEDORES}
+
+    def sortear(self, provedor: str):
+        """Retorna (atraso_segundos, codigo_de_falha_ou_None)"""
+        with self._lock:
+            atraso = self.latencias[provedor].amostrar(self._rng)
+            sorteio = self._rng.random()
+        acumulado = 0.0
+        for codigo, probabilidade in self.falhas[provedor].items():
+            acumulado += probabilidade
+            if sorteio < acumulado:
+                return atraso, codigo
+        return atraso, None
+
+    def contar(self, provedor: str, codigo: int):
+        with self._lock:
+            self.contadores[provedor][codigo] = self.contadores[provedor].get(codigo, 0) + 1
+
+def _semente(valor: str) -> int:
+    """Número estável derivado do termo consultado (mesma resposta para o mesmo termo)"""
+    return int(hashlib.md5(valor.encode()).hexdigest()[:8], 16)
+
+def _pessoa(cpf: str) -> Dict:
+    n = _semente(cpf)
+    return {
+        'nome': NOMES[n % len(NOMES)],
+        'data_nascimento': f'{1950 + n % 50}-{1 + n % 12:02d}-{1 + n % 28:02d}',
+        'situacao': 'REGULAR' if n % 7 else 'PENDENTE DE REGULARIZAÇÃO',
+        'logradouro': f'Rua {NOMES[(n // 7) % len(NOMES)].split()[1]}',
+        'numero': str(n % 2000),
+        'bairro': 'Centro',
+        'municipio': 'São Paulo',
+        'uf': 'SP',
+        'cep': f'{n % 100000:05d}-{n % 1000:03d}',
+        'telefone': f'(11) 9{n % 10000:04d}-{(n // 10000) % 10000:04d}',
+    }
+
+def _breaches(email: str):
+    n = _semente(email.lower())
+    # Cerca de 1/3 dos emails não aparece em vazamentos
+    if n % 3 == 0:
+        return []
+    total = 1 + n % 4
+    return [{
+        'Name': BREACHES[(n + i) % len(BREACHES)],
+        'Title': BREACHES[(n + i) % len(BREACHES)],
+        'Domain': f'{BREACHES[(n + i) % len(BREACHES)].lower()}.com',
+        'BreachDate': f'20{10 + (n + i) % 14}-0{1 + i % 9}-15',
+        'PwnCount': 100000 * (1 + (n >> i) % 500),
+        'DataClasses': ['Email addresses', 'Passwords', 'Usernames'][:1 + (n + i) % 3],
+        'Description': 'Vazamento sintético gerado pelo servidor de testes.',
+        'IsVerified': bool((n + i) % 2),
+        'LogoPath': ''
+    } for i in range(total)]
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config: ConfiguracaoStub = None
+
+    def log_message(self, format, *args):
+        pass  # Silencioso; os contadores ficam em config.contadores
+
+    def _responder(self, provedor: str, codigo: int, corpo, content_type: str = 'application/json'):
+        dados = corpo if isinstance(corpo, bytes) else (
+            json.dumps(corpo).encode() if content_type == 'application/json' else str(corpo).encode())
+        self.send_response(codigo)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(dados)))
+        if codigo in (429, 503):
+            self.send_header('Retry-After', str(self.config.retry_after))
+        self.end_headers()
+        self.wfile.write(dados)
+        self.config.contar(provedor, codigo)
+
+    def _ler_json(self) -> Dict:
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        if not tamanho:
+            return {}
+        try:
+            return json.loads(self.rfile.read(tamanho))
+        except ValueError:
+            return {}
+
+    def _despachar(self, metodo: str):
+        url = urlparse(self.path)
+        partes = [unquote(p) for p in url.path.strip('/').split('/')]
+        provedor = partes[0] if partes else ''
+        if provedor not in PROVEDORES:
+            self._responder('google', 404, {'erro': 'rota desconhecida'})
+            return
+
+        corpo = self._ler_json() if metodo == 'POST' else {}
+        atraso, falha = self.config.sortear(provedor)
+        if atraso:
+            time.sleep(atraso)
+        if falha:
+            self._responder(provedor, falha, {'erro': f'falha injetada {falha}'})
+            return
+
+        getattr(self, f'_rota_{provedor}')(metodo, partes[1:], parse_qs(url.query), corpo)
+
+    def do_GET(self):
+        self._despachar('GET')
+
+    def do_POST(self):
+        self._despachar('POST')
+
+    def _rota_hibp(self, metodo, partes, query, corpo):
+        # /hibp/api/v3/breachedaccount/<email> e /hibp/api/v2/breachedaccount/<email>
+        if len(partes) != 4 or partes[0] != 'api' or partes[2] != 'breachedaccount':
+            self._responder('hibp', 404, {'erro': 'rota desconhecida'})
+            return
+        if partes[1] == 'v3' and not self.headers.get('hibp-api-key'):
+            self._responder('hibp', 401, {'statusCode': 401, 'message': 'Access denied due to missing hibp-api-key.'})
+            return
+        breaches = _breaches(partes[3])
+        if not breaches:
+            self._responder('hibp', 404, b'', 'text/plain')
+            return
+        self._responder('hibp', 200, breaches)
+
+    def _rota_brasilapi(self, metodo, partes, query, corpo):
+        # /brasilapi/api/cpf/v1/<cpf> e /brasilapi/api/cpf/<cpf>
+        if len(partes) < 3 or partes[:2] != ['api', 'cpf']:
+            self._responder('brasilapi', 404, {'message': 'rota desconhecida'})
+            return
+        cpf = partes[-1]
+        pessoa = _pessoa(cpf)
+        self._responder('brasilapi', 200, {
+            'cpf': cpf,
+            'nome': pessoa['nome'],
+            'dataNascimento': pessoa['data_nascimento'],
+            'situacao': pessoa['situacao'],
+            'logradouro': pessoa['logradouro'],
+            'numero': pessoa['numero'],
+            'complemento': '',
+            'bairro': pessoa['bairro'],
+            'municipio': pessoa['municipio'],
+            'uf': pessoa['uf'],
+            'cep': pessoa['cep']
+        })
+
+    def _endereco(self, pessoa: Dict) -> Dict:
+        return {
+            'logradouro': pessoa['logradouro'],
+            'numero': pessoa['numero'],
+            'bairro': pessoa['bairro'],
+            'cidade': pessoa['municipio'],
+            'estado': pessoa['uf'],
+            'cep': pessoa['cep']
+        }
+
+    def _rota_serasa(self, metodo, partes, query, corpo):
+        if metodo != 'POST':
+            self._responder('serasa', 405, {'erro': 'method not allowed'})
+            return
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self._responder('serasa', 401, {'erro': 'unauthorized'})
+            return
+        cpf = str(corpo.get('cpf', ''))
+        pessoa = _pessoa(cpf)
+        self._responder('serasa', 200, {
+            'cpf': cpf,
+            'nome': pessoa['nome'],
+            'dataNascimento': pessoa['data_nascimento'],
+            'situacao': pessoa['situacao'],
+            'endereco': self._endereco(pessoa),
+            'telefone': pessoa['telefone'],
+            'email': ''
+        })
+
+    def _rota_queromeusdados(self, metodo, partes, query, corpo):
+        if metodo != 'POST':
+            self._responder('queromeusdados', 405, {'erro': 'method not allowed'})
+            return
+        if not self.headers.get('X-API-Key'):
+            self._responder('queromeusdados', 401, {'erro': 'unauthorized'})
+            return
+        cpf = str(corpo.get('cpf', ''))
+        pessoa = _pessoa(cpf)
+        self._responder('queromeusdados', 200, {
+            'cpf': cpf,
+            'nome': pessoa['nome'],
+            'data_nascimento': pessoa['data_nascimento'],
+            'situacao': pessoa['situacao'],
+            'endereco': self._endereco(pessoa),
+            'telefone': pessoa['telefone'],
+            'email': ''
+        })
+
+    def _rota_google(self, metodo, partes, query, corpo):
+        # /google/search?q=site:pastebin.com "email"
+        q = query.get('q', [''])[0]
+        encontrado = _semente(q) % 4 == 0
+        resultados = ''
+        if encontrado and 'site:' in q:
+            site = q.split('site:', 1)[1].split()[0]
+            termo = q.split('"')[1] if '"' in q else q
+            resultados = f'<div class="g"><a href="https://{site}/x">{site}</a><span>{termo}</span></div>'
+        html = f'<html><body><div id="search">{resultados}</div></body></html>'
+        self._responder('google', 200, html, 'text/html; charset=utf-8')
+
+def variaveis_ambiente(base_url: str) -> Dict[str, str]:
+    """Variáveis que apontam os clientes (cpf_api, vazamentos_api) para o servidor"""
+    return {
+        'HIBP_API_URL': f'{base_url}/hibp',
+        'GOOGLE_SEARCH_URL': f'{base_url}/google/search',
+        'BRASILAPI_URL': f'{base_url}/brasilapi',
+        'SERASA_API_URL': f'{base_url}/serasa',
+        'QUEROMEUSDADOS_URL': f'{base_url}/queromeusdados',
+    }
+
+def iniciar(config: ConfiguracaoStub = None, host: str = '127.0.0.1', porta: int = 0):
+    """
+    Inicia o servidor em uma thread; porta=0 escolhe uma porta livre
+    Retorna (servidor, base_url); pare com servidor.shutdown()
+    """
+    handler = type('StubHandlerConfigurado', (StubHandler,), {'config': config or ConfiguracaoStub()})
+    servidor = ThreadingHTTPServer((host, porta), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://{host}:{servidor.server_address[1]}'
+
+def _ler_pares(valores, formato):
+    """Converte ['hibp=429:0.1', ...] em {provedor: valor}"""
+    resultado = {}
+    for item in valores or []:
+        provedor, _, valor = item.partition('=')
+        if provedor not in PROVEDORES:
+            raise SystemExit(f'Provedor desconhecido: {provedor} (use {", ".join(PROVEDORES)})')
+        resultado.setdefault(provedor, []).append(formato(valor))
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor local que imita as APIs externas')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8900)
+    parser.add_argument('--latencia', action='append', metavar='PROVEDOR=DIST',
+                        help='ex: hibp=lognormal:4.5:0.6, serasa=uniforme:50:300, google=fixa:80')
+    parser.add_argument('--falha', action='append', metavar='PROVEDOR=CODIGO:PROB',
+                        help='ex: hibp=429:0.05, serasa=503:0.01')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--semente', type=int, default=None)
+    parser.add_argument('--imprimir-env', action='store_true',
+                        help='apenas imprime os comandos export para apontar os clientes ao servidor')
+    args = parser.parse_args()
+
+    base_url = f'http://{args.host}:{args.porta}'
+    if args.imprimir_env:
+        for nome, valor in variaveis_ambiente(base_url).items():
+            print(f'export {nome}="{valor}"')
+        return
+
+    latencias = {p: v[-1] for p, v in _ler_pares(args.latencia, str).items()}
+    falhas = {}
+    for provedor, itens in _ler_pares(args.falha, lambda v: v.split(':')).items():
+        falhas[provedor] = {int(codigo): float(prob) for codigo, prob in itens}
+
+    config = ConfiguracaoStub(latencias, falhas, args.retry_after, args.semente)
+    servidor, base_url = iniciar(config, args.host, args.porta)
+    print(f'Servidor de APIs simuladas em {base_url}')
+    for nome, valor in variaveis_ambiente(base_url).items():
+        print(f'  {nome}={valor}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+        print(json.dumps(config.contadores, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Registro dos caches e buffers em memória do processo, com um orçamento de
+memória único. Cada cache registrado informa o próprio uso (uso_memoria():
+bytes aproximados, entradas, acertos, falhas, remoções) e, se puder ser
+reduzido, libera memória sob demanda (reduzir(bytes) -> bytes liberados).
+
+Quando o total passa de CACHE_MEMORIA_MAX_MB, os caches de menor valor perdem
+entradas primeiro, até 90% do orçamento. O valor de um cache é a quantidade de
+acertos por MB desde a verificação anterior, multiplicada pelo peso do
+registro: quanto custa refazer o que ele guarda.
+"""
+import os
+import sys
+import threading
+import time
+from typing import Dict, List
+
+def tamanho_aproximado(obj, _profundidade: int = 0) -> int:
+    """Bytes aproximados de um valor (sys.getsizeof somado em dicts, listas e tuplas)"""
+    tamanho = sys.getsizeof(obj)
+    if _profundidade > 20:
+        return tamanho
+    if isinstance(obj, dict):
+        for chave, valor in obj.items():
+            tamanho += tamanho_aproximado(chave, _profundidade + 1) + tamanho_aproximado(valor, _profundidade + 1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            tamanho += tamanho_aproximado(item, _profundidade + 1)
+    return tamanho
+
+class RegistroCaches:
+    def __init__(self, max_mb: float = None, intervalo: float = None):
+        self.max_bytes = int((max_mb or float(os.getenv('CACHE_MEMORIA_MAX_MB', '128'))) * 1024 * 1024)
+        self.intervalo = intervalo or float(os.getenv('CACHE_MEMORIA_INTERVALO_SEGUNDOS', '10'))
+        self._lock = threading.Lock()
+        self._caches = {}      # nome -> (cache, peso)
+        self._acertos = {}     # nome -> acertos na verificação anterior
+        self._parar = threading.Event()
+        self._thread = None
+        self._reducoes = 0
+        self._liberados = 0
+        self._ultima_reducao = None
+
+    def registrar(self, nome: str, cache, peso: float = 1.0):
+        """Registra um cache (uso_memoria() obrigatório; reduzir(bytes) se puder liberar memória)"""
+        with self._lock:
+            self._caches[nome] = (cache, peso)
+
+    def remover(self, nome: str):
+        with self._lock:
+            self._caches.pop(nome, None)
+            self._acertos.pop(nome, None)
+
+    def iniciar(self):
+        """Thread que confere o orçamento a cada `intervalo` segundos"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='orcamento-caches', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.aplicar_orcamento()
+            except Exception as e:
+                print(f"Erro no orçamento de memória dos caches: {e}")
+
+    def coletar(self, atualizar: bool = False) -> List[Dict]:
+        """
+        Uso de cada cache, com o valor (acertos por MB desde a última verificação,
+        vezes o peso); atualizar=True começa uma nova janela de acertos
+        """
+        with self._lock:
+            caches = list(self._caches.items())
+        linhas = []
+        for nome, (cache, peso) in caches:
+            try:
+                uso = cache.uso_memoria()
+            except Exception as e:
+                uso = {'bytes': 0, 'entradas': 0, 'erro': str(e)}
+            acertos = uso.get('acertos') or 0
+            falhas = uso.get('falhas') or 0
+            with self._lock:
+                recentes = max(0, acertos - self._acertos.get(nome, 0))
+                if atualizar:
+                    self._acertos[nome] = acertos
+                valor = peso * (1 + recentes) / max(uso.get('bytes') or 0, 1) * 1024 * 1024
+            linhas.append({
+                'nome': nome,
+                'peso': peso,
+                'valor': round(valor, 2),
+                'redutivel': hasattr(cache, 'reduzir'),
+                'taxa_acertos': round(acertos / (acertos + falhas), 4) if acertos + falhas else None,
+                **uso
+            })
+        return linhas
+
+    def aplicar_orcamento(self) -> Dict:
+        """Se o total passou do orçamento, reduz os caches de menor valor até 90% dele"""
+        linhas = self.coletar(atualizar=True)
+        total = sum(linha.get('bytes') or 0 for linha in linhas)
+        liberados = {}
+        if total > self.max_bytes:
+            excesso = total - self.max_bytes * 0.9
+            with self._lock:
+                caches = dict(self._caches)
+            for linha in sorted(linhas, key=lambda l: l['valor']):
+                if excesso <= 0:
+                    break
+                cache = caches.get(linha['nome'], (None,))[0]
+                if not linha['redutivel'] or cache is None or not linha.get('bytes'):
+                    continue
+                try:
+                    liberado = cache.reduzir(min(excesso, linha['bytes']))
+                except Exception as e:
+                    print(f"Erro ao reduzir o cache '{linha['nome']}': {e}")
+                    continue
+                if liberado:
+                    liberados[linha['nome']] = liberado
+                    excesso -= liberado
+            with self._lock:
+                self._reducoes += 1
+                self._liberados += sum(liberados.values())
+                self._ultima_reducao = {'data': time.strftime('%Y-%m-%d %H:%M:%S'), 'total_bytes': total,
+                                        'liberados': liberados}
+        return {'total_bytes': total, 'max_bytes': self.max_bytes, 'liberados': liberados}
+
+    def totais(self) -> Dict[str, int]:
+        """Bytes de cada cache (sem recalcular o valor; usado nas métricas)"""
+        with self._lock:
+            caches = list(self._caches.items())
+        totais = {}
+        for nome, (cache, _) in caches:
+            try:
+                totais[nome] = cache.uso_memoria().get('bytes') or 0
+            except Exception:
+                totais[nome] = 0
+        return totais
+
+    def estado(self) -> Dict:
+        """Uso de cada cache (do menor valor para o maior), total e reduções feitas"""
+        linhas = sorted(self.coletar(), key=lambda l: l['valor'])
+        total = sum(linha.get('bytes') or 0 for linha in linhas)
+        with self._lock:
+            return {
+                'max_bytes': self.max_bytes,
+                'total_bytes': total,
+                'uso_orcamento': round(total / self.max_bytes, 4) if self.max_bytes else None,
+                'intervalo_segundos': self.intervalo,
+                'ativo': bool(self._thread and self._thread.is_alive()),
+                'reducoes': self._reducoes,
+                'liberados_bytes': self._liberados,
+                'ultima_reducao': self._ultima_reducao,
+                'caches': linhas
+            }
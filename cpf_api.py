@@ -6,6 +6,7 @@ import requests
 import os
 from typing import Dict, Optional
 import json
+from metrics import etapa
 
 # Tentar carregar variáveis de ambiente de arquivo .env
 try:
@@ -14,6 +15,10 @@ try:
 except ImportError:
     pass  # python-dotenv não instalado, usar apenas variáveis de ambiente do sistema
 
+class QuotaExcedidaError(Exception):
+    """Quota diária do usuário para um provedor pago foi atingida"""
+    pass
+
 class CPFAPIClient:
     def __init__(self):
         # Configurações de API (definir em variáveis de ambiente)
@@ -26,34 +31,64 @@ class CPFAPIClient:
         self.queromeusdados_api_key = os.getenv('QUEROMEUSDADOS_API_KEY', '')
         self.queromeusdados_url = os.getenv('QUEROMEUSDADOS_URL', 'https://api.queromeusdados.com.br/v1/cpf')
         
+        self.brasilapi_url = os.getenv('BRASILAPI_URL', 'https://brasilapi.com.br').rstrip('/')
+        
         # Headers padrão
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
+        
+        # Controle de quota dos provedores pagos (ver quotas.QuotaManager)
+        self.quota = None
+        
+        # Estado das APIs externas visto por todos os workers (CacheCompartilhado ou None):
+        # endpoint da API Brasil que respondeu, ou que ela não tem endpoint de CPF
+        self.capacidades = None
+        self.ttl_capacidades = float(os.getenv('CACHE_CAPACIDADES_TTL_SEGUNDOS', '600'))
     
-    def consultar_serasa(self, cpf: str) -> Optional[Dict]:
+    def _reservar_quota(self, provedor: str, usuario: Optional[Dict]):
+        """Reserva uma consulta paga antes da chamada externa"""
+        if self.quota is not None and not self.quota.consumir(usuario, provedor):
+            raise QuotaExcedidaError(provedor)
+    
+    def _devolver_quota(self, provedor: str, usuario: Optional[Dict]):
+        """Devolve a consulta reservada quando o provedor não a atendeu (timeout, resposta diferente de 200)"""
+        if self.quota is not None:
+            self.quota.devolver(usuario, provedor)
+    
+    def consultar_serasa(self, cpf: str, usuario: Optional[Dict] = None) -> Optional[Dict]:
         """
         Consulta CPF na API Serasa
         Requer: SERASA_API_KEY configurada
+        Levanta QuotaExcedidaError se o usuário atingiu a quota do dia
         """
         if not self.serasa_api_key:
             return None
         
+        self._reservar_quota('serasa', usuario)
+        
         try:
-            response = requests.post(
-                self.serasa_api_url,
-                headers={
-                    **self.headers,
-                    'Authorization': f'Bearer {self.serasa_api_key}'
-                },
-                json={'cpf': cpf},
-                timeout=10
-            )
+            with etapa('upstream'):
+                response = requests.post(
+                    self.serasa_api_url,
+                    headers={
+                        **self.headers,
+                        'Authorization': f'Bearer {self.serasa_api_key}'
+                    },
+                    json={'cpf': cpf},
+                    timeout=10
+                )
             
+            # Só a resposta 200 é cobrada: qualquer outra (429, 401, 403, 5xx) devolve a consulta
+            if response.status_code != 200:
+                self._devolver_quota('serasa', usuario)
             if response.status_code == 200:
                 return response.json()
+        except requests.exceptions.RequestException as e:
+            self._devolver_quota('serasa', usuario)
+            print(f"Erro ao consultar Serasa: {e}")
         except Exception as e:
             print(f"Erro ao consultar Serasa: {e}")
         
@@ -69,27 +104,37 @@ class CPFAPIClient:
         # Este é um placeholder para integração futura
         return None
     
-    def consultar_queromeusdados(self, cpf: str) -> Optional[Dict]:
+    def consultar_queromeusdados(self, cpf: str, usuario: Optional[Dict] = None) -> Optional[Dict]:
         """
         Consulta CPF na API Quero Meus Dados
         Requer: QUEROMEUSDADOS_API_KEY configurada
+        Levanta QuotaExcedidaError se o usuário atingiu a quota do dia
         """
         if not self.queromeusdados_api_key:
             return None
         
+        self._reservar_quota('queromeusdados', usuario)
+        
         try:
-            response = requests.post(
-                self.queromeusdados_url,
-                headers={
-                    **self.headers,
-                    'X-API-Key': self.queromeusdados_api_key
-                },
-                json={'cpf': cpf},
-                timeout=10
-            )
+            with etapa('upstream'):
+                response = requests.post(
+                    self.queromeusdados_url,
+                    headers={
+                        **self.headers,
+                        'X-API-Key': self.queromeusdados_api_key
+                    },
+                    json={'cpf': cpf},
+                    timeout=10
+                )
             
+            # Só a resposta 200 é cobrada: qualquer outra (429, 401, 403, 5xx) devolve a consulta
+            if response.status_code != 200:
+                self._devolver_quota('queromeusdados', usuario)
             if response.status_code == 200:
                 return response.json()
+        except requests.exceptions.RequestException as e:
+            self._devolver_quota('queromeusdados', usuario)
+            print(f"Erro ao consultar Quero Meus Dados: {e}")
         except Exception as e:
             print(f"Erro ao consultar Quero Meus Dados: {e}")
         
@@ -102,46 +147,61 @@ class CPFAPIClient:
         Nota: A API Brasil pode não ter endpoint público de CPF
         Este método está preparado para quando a API estiver disponível
         """
+        if not self._api_brasil_disponivel():
+            return None
         try:
-            cpf_limpo = ''.join(filter(str.isdigit, cpf))
-            # Tentar diferentes endpoints possíveis
-            endpoints = [
-                f'https://brasilapi.com.br/api/cpf/v1/{cpf_limpo}',
-                f'https://brasilapi.com.br/api/cpf/{cpf_limpo}',
-            ]
-            
-            for url in endpoints:
+            sem_cpf = True
+            for url in self._endpoints_api_brasil(cpf):
                 try:
-                    response = requests.get(url, headers=self.headers, timeout=10)
+                    with etapa('upstream'):
+                        response = requests.get(url, headers=self.headers, timeout=10)
                     
                     if response.status_code == 200:
-                        data = response.json()
-                        # Formatar resposta da API Brasil
-                        return {
-                            'cpf': data.get('cpf', ''),
-                            'nome': data.get('nome', ''),
-                            'data_nascimento': data.get('dataNascimento', ''),
-                            'situacao_cadastral': data.get('situacao', ''),
-                            'endereco': {
-                                'logradouro': data.get('logradouro', ''),
-                                'numero': data.get('numero', ''),
-                                'complemento': data.get('complemento', ''),
-                                'bairro': data.get('bairro', ''),
-                                'cidade': data.get('municipio', ''),
-                                'estado': data.get('uf', ''),
-                                'cep': data.get('cep', '')
-                            }
-                        }
+                        self._lembrar_endpoint_api_brasil(url, cpf)
+                        return self._formatar_api_brasil(response.json())
+                    sem_cpf = sem_cpf and response.status_code == 404
                 except requests.exceptions.RequestException:
+                    sem_cpf = False
                     continue
+            if sem_cpf:
+                self._marcar_api_brasil_sem_cpf()
         except Exception as e:
             pass  # Silenciar erro, tentar outras APIs
         
         return None
     
-    def consultar_multiplas_apis(self, cpf: str) -> Dict:
+    def _endpoints_api_brasil(self, cpf: str) -> list:
+        """Endpoints possíveis de CPF na API Brasil (o último que respondeu primeiro)"""
+        cpf_limpo = ''.join(filter(str.isdigit, cpf))
+        modelos = [
+            f'{self.brasilapi_url}/api/cpf/v1/{{cpf}}',
+            f'{self.brasilapi_url}/api/cpf/{{cpf}}',
+        ]
+        preferido = self.capacidades.obter('capacidade:api_brasil:endpoint') if self.capacidades else None
+        if preferido in modelos:
+            modelos.remove(preferido)
+            modelos.insert(0, preferido)
+        return [modelo.replace('{cpf}', cpf_limpo) for modelo in modelos]
+    
+    def _lembrar_endpoint_api_brasil(self, url: str, cpf: str):
+        if self.capacidades:
+            cpf_limpo = ''.join(filter(str.isdigit, cpf))
+            self.capacidades.definir('capacidade:api_brasil:endpoint', url.replace(cpf_limpo, '{cpf}'),
+                                     self.ttl_capacidades)
+    
+    def _marcar_api_brasil_sem_cpf(self):
+        """Todos os endpoints deram 404 e nenhum respondeu antes: pula a API Brasil por um tempo"""
+        if self.capacidades and self.capacidades.obter('capacidade:api_brasil:endpoint') is None:
+            self.capacidades.definir('capacidade:api_brasil', {'disponivel': False, 'status': 404},
+                                     self.ttl_capacidades)
+    
+    def _api_brasil_disponivel(self) -> bool:
+        return not (self.capacidades and self.capacidades.obter('capacidade:api_brasil'))
+    
+    def consultar_multiplas_apis(self, cpf: str, usuario: Optional[Dict] = None) -> Dict:
         """
         Consulta CPF em múltiplas APIs e consolida resultados
+        usuario: {'email', 'permissao'} usado no controle de quota dos provedores pagos
         """
         resultados = {
             'cpf': cpf,
@@ -149,6 +209,7 @@ class CPFAPIClient:
             'informacoes': {},
             'erro': None
         }
+        quota_excedida = []
         
         # Tentar API Brasil primeiro (pública e gratuita)
         api_brasil_result = self.consultar_api_brasil(cpf)
@@ -163,7 +224,11 @@ class CPFAPIClient:
             return resultados
         
         # Tentar Serasa (se configurado)
-        serasa_result = self.consultar_serasa(cpf)
+        try:
+            serasa_result = self.consultar_serasa(cpf, usuario)
+        except QuotaExcedidaError:
+            serasa_result = None
+            quota_excedida.append('Serasa')
         if serasa_result:
             resultados['informacoes'] = self._formatar_serasa(serasa_result)
             resultados['fontes'].append({
@@ -175,7 +240,11 @@ class CPFAPIClient:
             return resultados
         
         # Tentar Quero Meus Dados (se configurado)
-        qmd_result = self.consultar_queromeusdados(cpf)
+        try:
+            qmd_result = self.consultar_queromeusdados(cpf, usuario)
+        except QuotaExcedidaError:
+            qmd_result = None
+            quota_excedida.append('Quero Meus Dados')
         if qmd_result:
             resultados['informacoes'] = self._formatar_qmd(qmd_result)
             resultados['fontes'].append({
@@ -187,9 +256,32 @@ class CPFAPIClient:
             return resultados
         
         # Se nenhuma API funcionou
+        if quota_excedida:
+            resultados['quota_excedida'] = quota_excedida
+            resultados['erro'] = f"Quota diária excedida para: {', '.join(quota_excedida)}"
+            return resultados
+        
         resultados['erro'] = 'Nenhuma API configurada ou disponível. Configure as variáveis de ambiente.'
         return resultados
     
+    def _formatar_api_brasil(self, data: Dict) -> Dict:
+        """Formata resposta da API Brasil"""
+        return {
+            'cpf': data.get('cpf', ''),
+            'nome': data.get('nome', ''),
+            'data_nascimento': data.get('dataNascimento', ''),
+            'situacao_cadastral': data.get('situacao', ''),
+            'endereco': {
+                'logradouro': data.get('logradouro', ''),
+                'numero': data.get('numero', ''),
+                'complemento': data.get('complemento', ''),
+                'bairro': data.get('bairro', ''),
+                'cidade': data.get('municipio', ''),
+                'estado': data.get('uf', ''),
+                'cep': data.get('cep', '')
+            }
+        }
+    
     def _formatar_serasa(self, data: Dict) -> Dict:
         """Formata resposta da Serasa"""
         return {
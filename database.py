@@ -1,84 +1,621 @@
 import sqlite3
+import json
 import os
+import random
+import shutil
+import tempfile
+import threading
+import uuid
+import time
+from urllib.parse import quote
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict, Optional
+from ip_logs import obter_particoes, liberar_particoes
+from read_cache import CacheLeitura, incrementar_geracao_local
+from shared_cache import obter_cache_compartilhado
+
+# Escritas em andamento no processo (inclui as que aguardam o lock do SQLite)
+_escritas_lock = threading.Lock()
+_escritas_em_andamento = 0
+
+# Concorrência entre processos (vários workers do gunicorn no mesmo arquivo):
+# prazo para conseguir o lock (busy_timeout das leituras) e espera entre as
+# tentativas de escrita, que dobra até o máximo, sorteada (jitter)
+SQLITE_TIMEOUT = float(os.getenv('SQLITE_TIMEOUT_SEGUNDOS', '5'))
+SQLITE_ESPERA_MS = float(os.getenv('SQLITE_ESPERA_MS', '2'))
+SQLITE_ESPERA_MAX_MS = float(os.getenv('SQLITE_ESPERA_MAX_MS', '50'))
+SQLITE_WAL = os.getenv('SQLITE_WAL', 'True').lower() == 'true'
+
+# Leituras de relatório (admin, estatísticas): conexões somente leitura, em pool,
+# com tempo máximo por bloco de consultas
+SQLITE_LEITURA_POOL = int(os.getenv('SQLITE_LEITURA_POOL', '4'))
+SQLITE_LEITURA_TIMEOUT_MS = float(os.getenv('SQLITE_LEITURA_TIMEOUT_MS', '5000'))
+# Validade do cache de obter_ips_recentes (acessos de outros workers só aparecem depois dela)
+CACHE_IP_LOGS_TTL = float(os.getenv('CACHE_IP_LOGS_TTL_SEGUNDOS', '5'))
+
+# Database(MEMORIA): banco em memória com cache compartilhado (testes e benchmarks)
+MEMORIA = ':memory:'
+
+# Contadores de contenção do processo (expostos em /metrics)
+_contencao = {'repeticoes': 0, 'falhas': 0}
+
+def _reiniciar_apos_fork():
+    # Processo filho (ex: gunicorn --preload): locks copiados do pai podem estar
+    # presos por threads que não existem aqui
+    global _escritas_lock, _escritas_em_andamento
+    _escritas_lock = threading.Lock()
+    _escritas_em_andamento = 0
+    _contencao.update(repeticoes=0, falhas=0)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_apos_fork)
+
+def banco_ocupado(erro: Exception) -> bool:
+    """SQLITE_BUSY/SQLITE_LOCKED (outro processo ou conexão segura o lock)"""
+    if not isinstance(erro, sqlite3.OperationalError):
+        return False
+    codigo = getattr(erro, 'sqlite_errorcode', None)
+    if codigo is not None:
+        return codigo & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    mensagem = str(erro).lower()
+    return 'locked' in mensagem or 'busy' in mensagem
+
+def repetir_se_ocupado(funcao, *args, prazo: float = None):
+    """Executa `funcao`, repetindo em SQLITE_BUSY com espera exponencial e jitter até o prazo"""
+    limite = time.monotonic() + (SQLITE_TIMEOUT if prazo is None else prazo)
+    tentativa = 0
+    while True:
+        try:
+            return funcao(*args)
+        except sqlite3.OperationalError as e:
+            if not banco_ocupado(e):
+                raise
+            if time.monotonic() >= limite:
+                _contencao['falhas'] += 1
+                raise
+            _contencao['repeticoes'] += 1
+            # Jitter completo: processos que colidiram não voltam todos juntos
+            espera = min(SQLITE_ESPERA_MAX_MS, SQLITE_ESPERA_MS * 2 ** tentativa)
+            time.sleep(random.uniform(0, espera) / 1000.0)
+            tentativa += 1
+
+# Hash das senhas padrão, calculado uma vez por processo (o init de cada Database
+# gravaria o mesmo; um banco em memória por teste pagaria o hash a cada vez)
+_hashes_padrao = {}
+
+def _hash_senha_padrao(senha: str) -> str:
+    if senha not in _hashes_padrao:
+        from werkzeug.security import generate_password_hash
+        _hashes_padrao[senha] = generate_password_hash(senha)
+    return _hashes_padrao[senha]
+
+# Observadores de SQL: funcao(sql, duracao_segundos, execucao) chamada após cada
+# execute/executemany/commit (execucao=True) e leitura de linhas (execucao=False)
+_observadores_sql = []
+
+# Funções aplicadas a cada conexão nova (ex: set_trace_callback do rastreamento de SQL)
+_configuradores_conexao = []
+
+# Observadores de acesso: funcao(acesso) chamada após cada registrar_ip gravado
+# (ex: transmissão ao vivo do log de acessos para o admin)
+_observadores_acesso = []
+
+# Muda a cada observador/configurador registrado ou removido: conexões guardadas
+# no pool de leitura com uma geração antiga são descartadas
+_geracao_conexoes = 0
+
+def _nova_geracao():
+    global _geracao_conexoes
+    _geracao_conexoes += 1
+
+def registrar_observador_sql(funcao):
+    """Passa a instrumentar as conexões abertas pelo Database"""
+    if funcao not in _observadores_sql:
+        _observadores_sql.append(funcao)
+        _nova_geracao()
+
+def remover_observador_sql(funcao):
+    if funcao in _observadores_sql:
+        _observadores_sql.remove(funcao)
+        _nova_geracao()
+
+def registrar_configurador_conexao(funcao):
+    if funcao not in _configuradores_conexao:
+        _configuradores_conexao.append(funcao)
+        _nova_geracao()
+
+def remover_configurador_conexao(funcao):
+    if funcao in _configuradores_conexao:
+        _configuradores_conexao.remove(funcao)
+        _nova_geracao()
+
+def registrar_observador_acesso(funcao):
+    if funcao not in _observadores_acesso:
+        _observadores_acesso.append(funcao)
+
+def remover_observador_acesso(funcao):
+    if funcao in _observadores_acesso:
+        _observadores_acesso.remove(funcao)
+
+def _notificar_sql(sql: str, duracao: float, execucao: bool):
+    for funcao in list(_observadores_sql):
+        try:
+            funcao(sql, duracao, execucao)
+        except Exception as e:
+            print(f"Erro no observador de SQL: {e}")
+
+# Coluna de data de cada tabela que cresce indefinidamente (usada pela retenção)
+COLUNAS_DATA = {
+    'buscas': 'data_busca',
+    'buscas_cpf': 'data_busca',
+    'ip_logs': 'data_acesso',
+    'ip_rollup_hora': 'hora',
+    'ip_unicos_hora': 'hora',
+    'manutencao_execucoes': 'inicio'
+}
+
+# Entradas da retenção que são um recorte de outra tabela: nome -> (tabela, condição)
+# (CPF tem janela própria, menor, dentro da tabela única de buscas)
+RECORTES_RETENCAO = {
+    'buscas': ('buscas', "tipo <> 'cpf'"),
+    'buscas_cpf': ('buscas', "tipo = 'cpf'")
+}
+
+# Buscas: uma linha por busca em `buscas` (tipo + colunas de extensão do tipo) e
+# uma por fonte em `busca_fontes`. As tabelas antigas viram views de
+# compatibilidade; as que tinham dados são renomeadas para <tabela>_legado e
+# migradas aos poucos pelo ciclo de retenção (Database.migrar_buscas_legado)
+TABELAS_BUSCA_LEGADO = ('historico_buscas', 'nome_buscas', 'processo_buscas', 'foto_buscas', 'cpf_buscas')
+
+# View de compatibilidade -> (SELECT sobre buscas/busca_fontes, colunas da tabela antiga)
+VIEWS_BUSCAS = {
+    'historico_buscas': ('''
+        SELECT id, tipo AS tipo_busca, termo AS termo_busca, resultado, data_busca FROM buscas
+        WHERE resultado IS NOT NULL
+    ''', 'id, tipo_busca, termo_busca, resultado, data_busca'),
+    'nome_buscas': ('''
+        SELECT f.id, b.termo AS nome, f.resultado, f.fonte, b.data_busca, b.tipo AS tipo_busca
+        FROM busca_fontes f JOIN buscas b ON b.id = f.busca_id WHERE b.tipo = 'nome'
+    ''', 'id, nome, resultado, fonte, data_busca, tipo_busca'),
+    'processo_buscas': ('''
+        SELECT f.id, b.termo AS numero_processo, f.resultado, f.fonte, b.data_busca, b.status
+        FROM busca_fontes f JOIN buscas b ON b.id = f.busca_id WHERE b.tipo = 'processo'
+    ''', 'id, numero_processo, resultado, fonte, data_busca, status'),
+    'foto_buscas': ('''
+        SELECT f.id, b.termo AS termo_busca, b.url_imagem, f.resultado, f.fonte, b.data_busca, b.hash_imagem
+        FROM busca_fontes f JOIN buscas b ON b.id = f.busca_id WHERE b.tipo = 'foto'
+    ''', 'id, termo_busca, url_imagem, resultado, fonte, data_busca, hash_imagem'),
+    'cpf_buscas': ('''
+        SELECT f.id, b.cpf, b.termo AS cpf_formatado, f.resultado, f.fonte, b.informacoes, b.data_busca, b.status
+        FROM busca_fontes f JOIN buscas b ON b.id = f.busca_id WHERE b.tipo = 'cpf'
+    ''', 'id, cpf, cpf_formatado, resultado, fonte, informacoes, data_busca, status')
+}
+
+# Migração de cada tabela antiga: (tipo, coluna do termo, coluna da fonte, colunas de extensão)
+# (sem fonte: o resultado vai para buscas.resultado, como no histórico)
+MIGRACAO_BUSCAS = {
+    'historico_buscas': ('tipo_busca', 'termo_busca', None, ()),
+    'nome_buscas': ("'nome'", 'nome', 'fonte', ()),
+    'processo_buscas': ("'processo'", 'numero_processo', 'fonte', ('status',)),
+    'foto_buscas': ("'foto'", 'termo_busca', 'fonte', ('url_imagem', 'hash_imagem')),
+    'cpf_buscas': ("'cpf'", 'cpf_formatado', 'fonte', ('cpf', 'informacoes', 'status'))
+}
+
+# Tipos com resultados por fonte numa view (nome_buscas...); os demais só aparecem no histórico
+TIPOS_COM_FONTES = ('nome', 'processo', 'foto', 'cpf')
+
+# Colunas de extensão por tipo (NULL nos demais tipos)
+COLUNAS_EXTENSAO_BUSCA = ('status', 'url_imagem', 'hash_imagem', 'cpf', 'informacoes')
+
+# Colunas devolvidas na listagem de usuários (senha_hash fica de fora)
+COLUNAS_USUARIO = ('id', 'email', 'nome', 'google_id', 'permissao', 'ip_whitelist', 'ativo',
+                   'data_criacao', 'ultimo_acesso')
+
+# Colunas aceitas para ordenar a listagem (data_criacao, permissao e ultimo_acesso indexadas)
+ORDENS_USUARIOS = ('data_criacao', 'ultimo_acesso', 'permissao', 'email', 'nome', 'id')
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que mede execute e leitura de linhas (o SQLite avança a consulta no fetch)"""
+    _sql = ''
+
+    def execute(self, sql, parametros=()):
+        self._sql = sql
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            _notificar_sql(sql, time.perf_counter() - inicio, True)
+
+    def executemany(self, sql, parametros):
+        self._sql = sql
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            _notificar_sql(sql, time.perf_counter() - inicio, True)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _notificar_sql(self._sql, time.perf_counter() - inicio, False)
+
+    def fetchmany(self, *args):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            _notificar_sql(self._sql, time.perf_counter() - inicio, False)
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _notificar_sql(self._sql, time.perf_counter() - inicio, False)
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    """Conexão usada enquanto houver observadores de SQL registrados"""
+    def cursor(self, factory=None):
+        return super().cursor(factory or CursorInstrumentado)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _notificar_sql('COMMIT', time.perf_counter() - inicio, True)
+
+class TempoLeituraEsgotado(Exception):
+    """Consulta de leitura interrompida por passar do tempo máximo (SQLITE_LEITURA_TIMEOUT_MS)"""
+    pass
+
+# Conexões abertas antes de um fork: o filho não pode fechá-las (fechar pode
+# apagar o -wal que o pai ainda usa), então ficam aqui até o processo acabar
+_conexoes_herdadas = []
+
+class PoolLeitura:
+    """
+    Conexões somente leitura (URI com mode=ro) reaproveitadas pelas consultas de
+    relatório. Cada bloco roda em uma transação de leitura: com WAL ele enxerga
+    um snapshot fixo e não bloqueia nem é bloqueado pelas escritas.
+    """
+    def __init__(self, db_name: str, tamanho: int = None, timeout_ms: float = None):
+        self.db_name = db_name
+        # Banco em memória: mode=ro não se combina com mode=memory (e query_only
+        # impediria as views temporárias); o pool só é usado para leitura
+        self.em_memoria = 'mode=memory' in db_name
+        self.tamanho = tamanho or SQLITE_LEITURA_POOL
+        self.timeout_ms = SQLITE_LEITURA_TIMEOUT_MS if timeout_ms is None else timeout_ms
+        self._lock = threading.Lock()
+        self._livres = []  # (conexão, geração)
+        self._pid = os.getpid()
+        self.abertas = 0
+        self.interrompidas = 0
+
+    @staticmethod
+    def uri(caminho: str) -> str:
+        return f'file:{quote(os.path.abspath(caminho))}?mode=ro'
+
+    def abrir(self) -> sqlite3.Connection:
+        """Conexão somente leitura avulsa (fora do pool; quem abre fecha)"""
+        fabrica = ConexaoInstrumentada if _observadores_sql else sqlite3.Connection
+        conn = sqlite3.connect(self.db_name if self.em_memoria else self.uri(self.db_name), uri=True,
+                               timeout=SQLITE_TIMEOUT, factory=fabrica, check_same_thread=False)
+        if self.em_memoria:
+            conn.execute('PRAGMA read_uncommitted = 1')
+        for configurar in list(_configuradores_conexao):
+            configurar(conn)
+        return conn
+
+    def _abrir(self):
+        conn = self.abrir()
+        self.abertas += 1
+        return conn, _geracao_conexoes
+
+    def _obter(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Processo filho: as conexões do pai não servem aqui
+                _conexoes_herdadas.extend(conn for conn, _ in self._livres)
+                self._livres, self._pid, self.abertas = [], os.getpid(), 0
+            while self._livres:
+                conn, geracao = self._livres.pop()
+                if geracao == _geracao_conexoes:
+                    return conn, geracao
+                conn.close()
+                self.abertas -= 1
+        return self._abrir()
+
+    def _devolver(self, conn, geracao):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._livres) < self.tamanho:
+                self._livres.append((conn, geracao))
+                return
+            self.abertas -= 1
+        conn.close()
+
+    @contextmanager
+    def conexao(self, timeout_ms: float = None, anexar: Dict[str, str] = None):
+        """
+        Conexão somente leitura com uma transação de leitura aberta
+        `anexar`: {esquema: caminho} de outros arquivos, anexados também como somente leitura
+        """
+        conn, geracao = self._obter()
+        reutilizar = True
+        limite = time.monotonic() + (self.timeout_ms if timeout_ms is None else timeout_ms) / 1000.0
+        try:
+            # ATTACH/DETACH não podem acontecer dentro da transação
+            for esquema, caminho in (anexar or {}).items():
+                conn.execute(f'ATTACH DATABASE ? AS {esquema}', (self.uri(caminho),))
+            # Verificado a cada ~1000 instruções da VM do SQLite; retornar True interrompe
+            conn.set_progress_handler(lambda: time.monotonic() > limite, 1000)
+            conn.execute('BEGIN')
+            yield conn
+        except sqlite3.OperationalError as e:
+            if time.monotonic() > limite and 'interrupted' in str(e):
+                self.interrompidas += 1
+                raise TempoLeituraEsgotado(
+                    f'Consulta interrompida após {self.timeout_ms if timeout_ms is None else timeout_ms:.0f} ms'
+                ) from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            try:
+                # Rollback também desfaz views temporárias criadas dentro do bloco
+                conn.rollback()
+                for esquema in (anexar or {}):
+                    conn.execute(f'DETACH DATABASE {esquema}')
+            except sqlite3.Error:
+                reutilizar = False
+            if reutilizar:
+                self._devolver(conn, geracao)
+            else:
+                with self._lock:
+                    self.abertas -= 1
+                conn.close()
+
+    def fechar(self):
+        """Fecha as conexões livres do pool"""
+        with self._lock:
+            livres, self._livres = self._livres, []
+            self.abertas -= len(livres)
+        for conn, _ in livres:
+            conn.close()
+
+    def estado(self) -> Dict:
+        with self._lock:
+            return {'tamanho': self.tamanho, 'livres': len(self._livres), 'abertas': self.abertas,
+                    'interrompidas': self.interrompidas, 'timeout_ms': self.timeout_ms}
 
 class Database:
     def __init__(self, db_name: str = "osint_database.db"):
+        self.em_memoria = db_name == MEMORIA
+        self._guardia = None
+        # Onde ficam as partições do ip_logs (None: ao lado do banco ou IP_LOGS_DIR)
+        self.diretorio_particoes = None
+        if self.em_memoria:
+            # Nome único: cada instância é um banco isolado, visto por todas as
+            # conexões do processo enquanto a conexão guardiã estiver aberta
+            nome = f'painel_{uuid.uuid4().hex}'
+            db_name = f'file:{nome}?mode=memory&cache=shared'
+            self._guardia = sqlite3.connect(db_name, uri=True, check_same_thread=False)
+            self.diretorio_particoes = tempfile.mkdtemp(prefix=f'{nome}_ip_logs_')
         self.db_name = db_name
+        self.pool_leitura = PoolLeitura(db_name)
+        self.cache = CacheLeitura(self, obter_cache_compartilhado(self))
+        self.init_database()
+    
+    def carregar(self, origem: str):
+        """Copia um banco em arquivo (e as partições do ip_logs) para este banco em memória"""
+        if not self.em_memoria:
+            raise ValueError('carregar() só vale para Database(MEMORIA)')
+        conn = sqlite3.connect(origem)
+        try:
+            conn.backup(self._guardia)
+        finally:
+            conn.close()
+        particoes_origem = os.path.splitext(origem)[0] + '_ip_logs'
+        if os.path.isdir(particoes_origem):
+            shutil.copytree(particoes_origem, self.diretorio_particoes, dirs_exist_ok=True)
         self.init_database()
     
-    def get_connection(self):
-        """Cria e retorna uma conexão com o banco de dados"""
-        return sqlite3.connect(self.db_name)
+    def fechar(self):
+        """Fecha o pool de leitura; no banco em memória, descarta o banco e as partições temporárias"""
+        self.pool_leitura.fechar()
+        if self.em_memoria:
+            liberar_particoes(self)
+            if self._guardia is not None:
+                self._guardia.close()
+                self._guardia = None
+            shutil.rmtree(self.diretorio_particoes, ignore_errors=True)
+    
+    def get_connection(self, caminho: str = None):
+        """
+        Cria e retorna uma conexão com o banco de dados (ou com outro arquivo, ex: partição)
+        
+        Conexões nunca são guardadas entre chamadas: cada processo (worker do
+        gunicorn, mesmo com --preload) abre as suas depois do fork.
+        """
+        alvo = caminho or self.db_name
+        fabrica = ConexaoInstrumentada if _observadores_sql else sqlite3.Connection
+        conn = sqlite3.connect(alvo, timeout=SQLITE_TIMEOUT, factory=fabrica, uri=alvo.startswith('file:'))
+        if self.em_memoria:
+            if alvo == self.db_name:
+                # Com cache compartilhado o lock é por tabela e não espera: sem
+                # read_uncommitted, uma leitura falharia com a tabela em escrita
+                conn.execute('PRAGMA read_uncommitted = 1')
+            else:
+                conn.execute('PRAGMA synchronous = OFF')  # partições temporárias
+        for configurar in list(_configuradores_conexao):
+            configurar(conn)
+        return conn
+    
+    def _iniciar_escrita(self, caminho: str = None):
+        """Conexão já com BEGIN IMMEDIATE (o lock de escrita é pego no início, não no meio)"""
+        conn = self.get_connection(caminho)
+        try:
+            # Na disputa pelo lock, sem o busy handler do SQLite (que volta a
+            # tentar em passos fixos de até 100 ms e deixa a cauda longa)
+            conn.execute('PRAGMA busy_timeout = 0')
+            repetir_se_ocupado(conn.execute, 'BEGIN IMMEDIATE')
+            conn.execute(f'PRAGMA busy_timeout = {int(SQLITE_TIMEOUT * 1000)}')
+        except Exception:
+            conn.close()
+            raise
+        return conn
+    
+    @contextmanager
+    def escrita(self, caminho: str = None, invalidar=()):
+        """
+        Conexão para escrita: transação IMMEDIATE, commit ao final, conta a escrita como pendente
+        
+        `invalidar`: tabelas alteradas, cujas entradas do cache de leitura deixam
+        de valer (a geração compartilhada sobe na mesma transação, só no banco principal)
+        """
+        global _escritas_em_andamento
+        with _escritas_lock:
+            _escritas_em_andamento += 1
+        try:
+            conn = self._iniciar_escrita(caminho)
+            try:
+                yield conn
+                if invalidar and caminho is None:
+                    conn.executemany(
+                        'INSERT INTO contadores (nome, total) VALUES (?, 1) '
+                        'ON CONFLICT(nome) DO UPDATE SET total = total + 1',
+                        [(f'geracao:{tabela}',) for tabela in invalidar]
+                    )
+                repetir_se_ocupado(conn.commit)
+            finally:
+                conn.close()
+            if invalidar:
+                incrementar_geracao_local(self.db_name, invalidar, compartilhada=caminho is None)
+        finally:
+            with _escritas_lock:
+                _escritas_em_andamento -= 1
+    
+    def leitura(self, timeout_ms: float = None, anexar: Dict[str, str] = None):
+        """Conexão somente leitura do pool (relatórios e painel admin), com tempo máximo"""
+        return self.pool_leitura.conexao(timeout_ms, anexar)
+    
+    def ativar_wal(self, caminho: str = None, conn=None):
+        """journal_mode=WAL (persistente no arquivo): leitores não bloqueiam o escritor"""
+        if not SQLITE_WAL or self.em_memoria:
+            return
+        propria = conn is None
+        conn = conn or self.get_connection(caminho)
+        try:
+            repetir_se_ocupado(conn.execute, 'PRAGMA journal_mode=WAL')
+        finally:
+            if propria:
+                conn.close()
+    
+    @staticmethod
+    def escritas_pendentes() -> int:
+        """Quantidade de escritas em andamento ou aguardando o banco neste processo"""
+        return _escritas_em_andamento
+    
+    @staticmethod
+    def contencao() -> Dict:
+        """Repetições e falhas por banco ocupado neste processo"""
+        return dict(_contencao)
+    
+    @staticmethod
+    def _tabela_existe(cursor, tabela: str) -> bool:
+        return cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (tabela,)).fetchone() is not None
+    
+    def _criar_views_buscas(self, cursor):
+        """(Re)cria as views das tabelas antigas, somando o <tabela>_legado ainda não migrado"""
+        for view, (select, colunas) in VIEWS_BUSCAS.items():
+            if self._tabela_existe(cursor, f'{view}_legado'):
+                select += f' UNION ALL SELECT {colunas} FROM {view}_legado'
+            cursor.execute(f'DROP VIEW IF EXISTS {view}')
+            cursor.execute(f'CREATE VIEW {view} AS {select}')
     
     def init_database(self):
         """Inicializa as tabelas do banco de dados"""
         conn = self.get_connection()
-        cursor = conn.cursor()
+        try:
+            # Vacuum incremental (só tem efeito em banco novo; bancos antigos
+            # são convertidos com Database.converter_vacuum_incremental)
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            self.ativar_wal(conn=conn)
+            try:
+                backup_existe = conn.execute('SELECT 1 FROM usuarios WHERE email = ?', ('admin@seita.com',)).fetchone()
+            except sqlite3.OperationalError:
+                backup_existe = None  # banco novo, sem a tabela ainda
+        finally:
+            conn.close()
         
-        # Tabela para buscas por nome
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS nome_buscas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                resultado TEXT,
-                fonte TEXT,
-                data_busca TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                tipo_busca TEXT
-            )
-        ''')
+        # Hashes calculados antes de pegar o lock de escrita (vários workers sobem juntos)
+        senha_principal = _hash_senha_padrao('MOGG1212')
+        senha_backup = None if backup_existe else _hash_senha_padrao('admin123')
         
-        # Tabela para buscas de processos
+        with self.escrita() as conn:
+            self._criar_esquema(conn.cursor(), senha_principal, senha_backup)
+    
+    def _criar_esquema(self, cursor, senha_principal: str, senha_backup: Optional[str]):
+        """Tabelas, índices e usuários padrão (dentro da transação de init_database)"""
+        # Buscas: uma linha por busca (tipo + colunas de extensão do tipo)
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS processo_buscas (
+            CREATE TABLE IF NOT EXISTS buscas (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero_processo TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                termo TEXT NOT NULL,
                 resultado TEXT,
-                fonte TEXT,
                 data_busca TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT
-            )
-        ''')
-        
-        # Tabela para buscas de fotos/imagens
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS foto_buscas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                termo_busca TEXT NOT NULL,
+                status TEXT,
                 url_imagem TEXT,
-                resultado TEXT,
-                fonte TEXT,
-                data_busca TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                hash_imagem TEXT
+                hash_imagem TEXT,
+                cpf TEXT,
+                informacoes TEXT
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_buscas_data_busca ON buscas(data_busca)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_buscas_tipo_data ON buscas(tipo, data_busca)')
         
-        # Tabela para buscas de CPF
+        # Resultado de cada fonte consultada numa busca
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cpf_buscas (
+            CREATE TABLE IF NOT EXISTS busca_fontes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cpf TEXT NOT NULL,
-                cpf_formatado TEXT,
-                resultado TEXT,
+                busca_id INTEGER NOT NULL REFERENCES buscas(id),
                 fonte TEXT,
-                informacoes TEXT,
-                data_busca TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT
+                resultado TEXT
             )
         ''')
-        
-        # Tabela para histórico de buscas
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_busca_fontes_busca ON busca_fontes(busca_id)')
+        # Expurgo e limpeza apagam só em buscas (sem depender de PRAGMA foreign_keys)
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS historico_buscas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tipo_busca TEXT NOT NULL,
-                termo_busca TEXT NOT NULL,
-                resultado TEXT,
-                data_busca TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            CREATE TRIGGER IF NOT EXISTS trg_buscas_apagar_fontes AFTER DELETE ON buscas
+            BEGIN
+                DELETE FROM busca_fontes WHERE busca_id = old.id;
+            END
         ''')
         
+        # Tabelas antigas por tipo: com dados, renomeadas para a migração; vazias, removidas
+        for tabela in TABELAS_BUSCA_LEGADO:
+            if not self._tabela_existe(cursor, tabela):
+                continue
+            if self._tabela_existe(cursor, f'{tabela}_legado'):
+                # Recriada por um worker de versão anterior durante a migração
+                cursor.execute(f'INSERT INTO {tabela}_legado SELECT * FROM {tabela}')
+                cursor.execute(f'DROP TABLE {tabela}')
+            elif cursor.execute(f'SELECT 1 FROM {tabela} LIMIT 1').fetchone():
+                cursor.execute(f'ALTER TABLE {tabela} RENAME TO {tabela}_legado')
+            else:
+                cursor.execute(f'DROP TABLE {tabela}')
+        self._criar_views_buscas(cursor)
+        
         # Tabela para registro de IPs
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS ip_logs (
@@ -111,6 +648,49 @@ class Database:
             )
         ''')
         
+        # Listagem de usuários (ordenação e filtros do admin)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_data_criacao ON usuarios(data_criacao)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_permissao ON usuarios(permissao, data_criacao)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_ultimo_acesso ON usuarios(ultimo_acesso)')
+        
+        # Totais mantidos por trigger (evita COUNT(*) a cada página da listagem)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS contadores (
+                nome TEXT PRIMARY KEY,
+                total INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        if not cursor.execute("SELECT 1 FROM contadores WHERE nome = 'usuarios'").fetchone():
+            # Primeira vez (banco novo ou anterior aos contadores): parte da contagem atual
+            cursor.execute("INSERT INTO contadores (nome, total) SELECT 'usuarios', COUNT(*) FROM usuarios")
+            cursor.execute('''
+                INSERT OR REPLACE INTO contadores (nome, total)
+                SELECT 'usuarios:' || COALESCE(permissao, ''), COUNT(*) FROM usuarios GROUP BY COALESCE(permissao, '')
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_usuarios_contar_insercao AFTER INSERT ON usuarios
+            BEGIN
+                INSERT INTO contadores (nome, total) VALUES ('usuarios', 1), ('usuarios:' || COALESCE(new.permissao, ''), 1)
+                ON CONFLICT(nome) DO UPDATE SET total = total + 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_usuarios_contar_remocao AFTER DELETE ON usuarios
+            BEGIN
+                UPDATE contadores SET total = total - 1
+                WHERE nome IN ('usuarios', 'usuarios:' || COALESCE(old.permissao, ''));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_usuarios_contar_permissao AFTER UPDATE OF permissao ON usuarios
+            WHEN COALESCE(old.permissao, '') <> COALESCE(new.permissao, '')
+            BEGIN
+                UPDATE contadores SET total = total - 1 WHERE nome = 'usuarios:' || COALESCE(old.permissao, '');
+                INSERT INTO contadores (nome, total) VALUES ('usuarios:' || COALESCE(new.permissao, ''), 1)
+                ON CONFLICT(nome) DO UPDATE SET total = total + 1;
+            END
+        ''')
+        
         # Tabela para permissões
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS permissoes (
@@ -124,109 +704,172 @@ class Database:
             )
         ''')
         
+        # Tabela para contadores de quota diária por usuário e provedor pago
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS quota_uso (
+                dia TEXT NOT NULL,
+                usuario TEXT NOT NULL,
+                provedor TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (dia, usuario, provedor)
+            )
+        ''')
+        
+        # Dicionários de user agents e paths (o ip_logs das partições guarda só os IDs)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ip_user_agents (
+                id INTEGER PRIMARY KEY,
+                valor TEXT UNIQUE NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ip_paths (
+                id INTEGER PRIMARY KEY,
+                valor TEXT UNIQUE NOT NULL
+            )
+        ''')
+        
+        # Acessos por hora, rota, método e status (o log bruto fica nas partições mensais)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ip_rollup_hora (
+                hora TEXT NOT NULL,
+                path TEXT NOT NULL,
+                method TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hora, path, method, status)
+            )
+        ''')
+        
+        # IPs distintos por hora
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ip_unicos_hora (
+                hora TEXT NOT NULL,
+                ip_address TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hora, ip_address)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ip_unicos_hora_ip ON ip_unicos_hora(ip_address)')
+        
+        # Buscas em segundo plano (jobs.py): qualquer worker responde /api/jobs/<id>
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                status TEXT NOT NULL,
+                dono TEXT,
+                criado_em REAL NOT NULL,
+                concluido_em REAL,
+                resultado TEXT,
+                codigo INTEGER
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_criado_em ON jobs(criado_em)')
+        
+        # Locks com prazo entre processos (ex: qual worker executa a manutenção)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS leases (
+                nome TEXT PRIMARY KEY,
+                dono TEXT NOT NULL,
+                expira_em REAL NOT NULL
+            )
+        ''')
+        
+        # Execuções das tarefas de manutenção (ANALYZE, checkpoint, integridade...)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS manutencao_execucoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tarefa TEXT NOT NULL,
+                inicio TIMESTAMP NOT NULL,
+                duracao_ms REAL,
+                sucesso INTEGER NOT NULL,
+                detalhe TEXT,
+                processo TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_manutencao_execucoes_tarefa ON manutencao_execucoes(tarefa, inicio)')
+        
+        # Índices nas colunas de data (expurgo por retenção e listagens mais recentes)
+        for tabela, coluna in COLUNAS_DATA.items():
+            if tabela in ('ip_rollup_hora', 'ip_unicos_hora') or tabela in RECORTES_RETENCAO:
+                continue  # já indexadas (chave primária ou índices de buscas)
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{tabela}_{coluna} ON {tabela}({coluna})')
+        
         # Verificar e adicionar coluna senha_hash se não existir
         try:
             cursor.execute('PRAGMA table_info(usuarios)')
             columns = [column[1] for column in cursor.fetchall()]
             if 'senha_hash' not in columns:
                 cursor.execute('ALTER TABLE usuarios ADD COLUMN senha_hash TEXT')
-                conn.commit()
         except Exception as e:
             print(f"Note: Could not add senha_hash column (may already exist): {e}")
         
-        # Criar usuários padrão se não existirem
-        from werkzeug.security import generate_password_hash
+        # Criar usuários padrão se não existirem (INSERT OR IGNORE: outro worker
+        # pode ter criado o mesmo usuário entre a checagem e a inserção)
         
-        # Conta principal do usuário
-        cursor.execute('SELECT COUNT(*) FROM usuarios WHERE email = ?', ('finmogg@gmail.com',))
-        if cursor.fetchone()[0] == 0:
-            senha_hash = generate_password_hash('MOGG1212')
-            cursor.execute('''
-                INSERT INTO usuarios (email, nome, senha_hash, permissao)
-                VALUES (?, ?, ?, ?)
-            ''', ('finmogg@gmail.com', 'Administrator', senha_hash, 'admin'))
-        else:
-            # Atualizar senha
-            senha_hash = generate_password_hash('MOGG1212')
+        # Conta principal do usuário (senha e permissão atualizadas a cada início)
+        cursor.execute('''
+            INSERT OR IGNORE INTO usuarios (email, nome, senha_hash, permissao)
+            VALUES (?, ?, ?, ?)
+        ''', ('finmogg@gmail.com', 'Administrator', senha_principal, 'admin'))
+        if cursor.rowcount == 0:
             cursor.execute('UPDATE usuarios SET senha_hash = ?, permissao = ? WHERE email = ?', 
-                         (senha_hash, 'admin', 'finmogg@gmail.com'))
+                         (senha_principal, 'admin', 'finmogg@gmail.com'))
         
         # Conta admin padrão (backup)
-        cursor.execute('SELECT COUNT(*) FROM usuarios WHERE email = ?', ('admin@seita.com',))
-        if cursor.fetchone()[0] == 0:
-            senha_hash = generate_password_hash('admin123')
+        if senha_backup:
             cursor.execute('''
-                INSERT INTO usuarios (email, nome, senha_hash, permissao)
+                INSERT OR IGNORE INTO usuarios (email, nome, senha_hash, permissao)
                 VALUES (?, ?, ?, ?)
-            ''', ('admin@seita.com', 'Administrator', senha_hash, 'admin'))
-        
-        conn.commit()
-        conn.close()
+            ''', ('admin@seita.com', 'Administrator', senha_backup, 'admin'))
+    
+    def registrar_busca(self, tipo: str, termo: str, resultado: str = None, fontes=(), status: str = None,
+                        url_imagem: str = None, hash_imagem: str = None, cpf: str = None,
+                        informacoes: str = None) -> int:
+        """Grava uma busca e o resultado de cada fonte [(fonte, resultado), ...] numa transação; retorna o id"""
+        with self.escrita(invalidar=('buscas',)) as conn:
+            cursor = conn.execute('''
+                INSERT INTO buscas (tipo, termo, resultado, status, url_imagem, hash_imagem, cpf, informacoes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (tipo, termo, resultado, status, url_imagem, hash_imagem, cpf, informacoes))
+            busca_id = cursor.lastrowid
+            if fontes:
+                conn.executemany('INSERT INTO busca_fontes (busca_id, fonte, resultado) VALUES (?, ?, ?)',
+                                 [(busca_id, fonte, resultado_fonte) for fonte, resultado_fonte in fontes])
+        return busca_id
     
     def salvar_busca_nome(self, nome: str, resultado: str, fonte: str, tipo_busca: str = "nome"):
         """Salva resultado de busca por nome"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO nome_buscas (nome, resultado, fonte, tipo_busca)
-            VALUES (?, ?, ?, ?)
-        ''', (nome, resultado, fonte, tipo_busca))
-        conn.commit()
-        conn.close()
+        self.registrar_busca('nome', nome, fontes=[(fonte, resultado)])
     
     def salvar_busca_processo(self, numero_processo: str, resultado: str, fonte: str, status: str = "pendente"):
         """Salva resultado de busca por processo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO processo_buscas (numero_processo, resultado, fonte, status)
-            VALUES (?, ?, ?, ?)
-        ''', (numero_processo, resultado, fonte, status))
-        conn.commit()
-        conn.close()
+        self.registrar_busca('processo', numero_processo, fontes=[(fonte, resultado)], status=status)
     
     def salvar_busca_foto(self, termo_busca: str, url_imagem: str, resultado: str, fonte: str, hash_imagem: str = ""):
         """Salva resultado de busca por foto"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO foto_buscas (termo_busca, url_imagem, resultado, fonte, hash_imagem)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (termo_busca, url_imagem, resultado, fonte, hash_imagem))
-        conn.commit()
-        conn.close()
+        self.registrar_busca('foto', termo_busca, fontes=[(fonte, resultado)],
+                             url_imagem=url_imagem, hash_imagem=hash_imagem)
     
     def salvar_busca_cpf(self, cpf: str, cpf_formatado: str, resultado: str, fonte: str, informacoes: str, status: str = "encontrado"):
         """Salva resultado de busca por CPF"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO cpf_buscas (cpf, cpf_formatado, resultado, fonte, informacoes, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (cpf, cpf_formatado, resultado, fonte, informacoes, status))
-        conn.commit()
-        conn.close()
+        self.registrar_busca('cpf', cpf_formatado, fontes=[(fonte, resultado)], status=status,
+                             cpf=cpf, informacoes=informacoes)
     
     def salvar_historico(self, tipo_busca: str, termo_busca: str, resultado: str):
         """Salva no histórico geral"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO historico_buscas (tipo_busca, termo_busca, resultado)
-            VALUES (?, ?, ?)
-        ''', (tipo_busca, termo_busca, resultado))
-        conn.commit()
-        conn.close()
+        self.registrar_busca(tipo_busca, termo_busca, resultado)
     
     def buscar_historico_nome(self, nome: str) -> List[Dict]:
         """Busca histórico de buscas por nome"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM nome_buscas WHERE nome LIKE ? ORDER BY data_busca DESC
-        ''', (f'%{nome}%',))
-        results = cursor.fetchall()
-        conn.close()
+        with self.leitura() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM nome_buscas WHERE nome LIKE ? ORDER BY data_busca DESC
+            ''', (f'%{nome}%',))
+            results = cursor.fetchall()
         
         return [{
             'id': r[0],
@@ -239,13 +882,12 @@ class Database:
     
     def buscar_historico_processo(self, numero_processo: str) -> List[Dict]:
         """Busca histórico de buscas por processo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM processo_buscas WHERE numero_processo LIKE ? ORDER BY data_busca DESC
-        ''', (f'%{numero_processo}%',))
-        results = cursor.fetchall()
-        conn.close()
+        with self.leitura() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM processo_buscas WHERE numero_processo LIKE ? ORDER BY data_busca DESC
+            ''', (f'%{numero_processo}%',))
+            results = cursor.fetchall()
         
         return [{
             'id': r[0],
@@ -258,13 +900,12 @@ class Database:
     
     def buscar_historico_foto(self, termo_busca: str) -> List[Dict]:
         """Busca histórico de buscas por foto"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM foto_buscas WHERE termo_busca LIKE ? ORDER BY data_busca DESC
-        ''', (f'%{termo_busca}%',))
-        results = cursor.fetchall()
-        conn.close()
+        with self.leitura() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM foto_buscas WHERE termo_busca LIKE ? ORDER BY data_busca DESC
+            ''', (f'%{termo_busca}%',))
+            results = cursor.fetchall()
         
         return [{
             'id': r[0],
@@ -277,24 +918,26 @@ class Database:
         } for r in results]
     
     def obter_todas_buscas(self, limite: int = 50) -> List[Dict]:
-        """Obtém todas as buscas recentes"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT tipo_busca, termo_busca, resultado, data_busca 
-            FROM historico_buscas 
-            ORDER BY data_busca DESC 
-            LIMIT ?
-        ''', (limite,))
-        results = cursor.fetchall()
-        conn.close()
+        """Obtém todas as buscas recentes (cache de leitura até a próxima busca gravada)"""
+        def carregar():
+            with self.leitura() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT tipo_busca, termo_busca, resultado, data_busca 
+                    FROM historico_buscas 
+                    ORDER BY data_busca DESC 
+                    LIMIT ?
+                ''', (limite,))
+                results = cursor.fetchall()
+            
+            return [{
+                'tipo_busca': r[0],
+                'termo_busca': r[1],
+                'resultado': r[2],
+                'data_busca': r[3]
+            } for r in results]
         
-        return [{
-            'tipo_busca': r[0],
-            'termo_busca': r[1],
-            'resultado': r[2],
-            'data_busca': r[3]
-        } for r in results]
+        return self.cache.obter('todas_buscas', (limite,), ('buscas',), carregar)
     
     def criar_banco_personalizado(self, nome_banco: str) -> Dict:
         """Cria um novo banco de dados personalizado"""
@@ -342,31 +985,38 @@ class Database:
                 'mensagem': f'Erro ao deletar banco: {str(e)}'
             }
     
+    def contar_buscas_por_tipo(self, fonte: str = None) -> Dict[str, int]:
+        """Resultados de fonte gravados por tipo de busca (opcionalmente só fontes LIKE %fonte%), num só GROUP BY"""
+        def carregar():
+            with self.leitura() as conn:
+                partes = ['SELECT b.tipo, f.fonte FROM busca_fontes f JOIN buscas b ON b.id = f.busca_id']
+                for tabela, (tipo, _, coluna_fonte, _) in MIGRACAO_BUSCAS.items():
+                    if coluna_fonte and self._tabela_existe(conn, f'{tabela}_legado'):
+                        partes.append(f'SELECT {tipo}, {coluna_fonte} FROM {tabela}_legado')
+                filtro, parametros = ('WHERE fonte LIKE ?', (f'%{fonte}%',)) if fonte else ('', ())
+                linhas = conn.execute(f'''
+                    SELECT tipo, COUNT(*) FROM ({' UNION ALL '.join(partes)}) {filtro} GROUP BY tipo
+                ''', parametros).fetchall()
+            return dict(linhas)
+        
+        return dict(self.cache.obter('buscas_por_tipo', (fonte,), ('buscas',), carregar))
+    
     def obter_info_banco(self) -> Dict:
         """Obtém informações sobre o banco de dados atual"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Contar registros em cada tabela
-            cursor.execute('SELECT COUNT(*) FROM nome_buscas')
-            total_nomes = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM processo_buscas')
-            total_processos = cursor.fetchone()[0]
+            # Contar registros de cada tipo
+            contagens = self.contar_buscas_por_tipo()
+            total_nomes = contagens.get('nome', 0)
+            total_processos = contagens.get('processo', 0)
+            total_fotos = contagens.get('foto', 0)
             
-            cursor.execute('SELECT COUNT(*) FROM foto_buscas')
-            total_fotos = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM historico_buscas')
-            total_historico = cursor.fetchone()[0]
+            with self.leitura() as conn:
+                total_historico = conn.execute('SELECT COUNT(*) FROM historico_buscas').fetchone()[0]
             
             # Tamanho do arquivo
             tamanho = os.path.getsize(self.db_name) if os.path.exists(self.db_name) else 0
             tamanho_mb = tamanho / (1024 * 1024)
             
-            conn.close()
-            
             return {
                 'nome': self.db_name,
                 'tamanho_mb': round(tamanho_mb, 2),
@@ -384,11 +1034,13 @@ class Database:
     def limpar_banco(self, tabela: str = None) -> Dict:
         """Limpa dados do banco de dados"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Tabelas permitidas (prevenção de SQL injection)
-            tabelas_permitidas = ['nome_buscas', 'processo_buscas', 'foto_buscas', 'historico_buscas']
+            # Tabelas permitidas (prevenção de SQL injection) -> tipo das buscas que elas mostram
+            tabelas_permitidas = {
+                'nome_buscas': 'nome',
+                'processo_buscas': 'processo',
+                'foto_buscas': 'foto',
+                'historico_buscas': None
+            }
             
             if tabela:
                 if tabela not in tabelas_permitidas:
@@ -396,21 +1048,22 @@ class Database:
                         'sucesso': False,
                         'mensagem': f'Tabela "{tabela}" não é permitida!'
                     }
-                cursor.execute(f'DELETE FROM {tabela}')
-                conn.commit()
-                conn.close()
+                with self.escrita(invalidar=('buscas',)) as conn:
+                    if tabelas_permitidas[tabela]:
+                        self._limpar_fontes(conn, tabela, tabelas_permitidas[tabela])
+                    else:
+                        self._limpar_historico(conn)
                 return {
                     'sucesso': True,
                     'mensagem': f'Tabela "{tabela}" limpa com sucesso!'
                 }
             else:
-                # Limpar todas as tabelas
-                cursor.execute('DELETE FROM nome_buscas')
-                cursor.execute('DELETE FROM processo_buscas')
-                cursor.execute('DELETE FROM foto_buscas')
-                cursor.execute('DELETE FROM historico_buscas')
-                conn.commit()
-                conn.close()
+                # Limpar todas as tabelas (as buscas de CPF continuam, como antes)
+                with self.escrita(invalidar=('buscas',)) as conn:
+                    for nome_tabela, tipo in tabelas_permitidas.items():
+                        if tipo:
+                            self._limpar_fontes(conn, nome_tabela, tipo)
+                    self._limpar_historico(conn)
                 return {
                     'sucesso': True,
                     'mensagem': 'Todos os dados foram limpos com sucesso!'
@@ -421,64 +1074,419 @@ class Database:
                 'mensagem': f'Erro ao limpar banco: {str(e)}'
             }
     
-    def registrar_ip(self, ip_address: str, user_agent: str = '', path: str = '', method: str = '', user_id: str = None, session_id: str = None, country: str = None, city: str = None):
-        """Registra acesso de um IP"""
+    def _limpar_fontes(self, conn, tabela: str, tipo: str):
+        """Apaga os resultados por fonte do tipo; a busca fica no histórico se estiver nele"""
+        conn.execute('DELETE FROM busca_fontes WHERE busca_id IN (SELECT id FROM buscas WHERE tipo = ?)', (tipo,))
+        conn.execute('DELETE FROM buscas WHERE tipo = ? AND resultado IS NULL', (tipo,))
+        if self._tabela_existe(conn, f'{tabela}_legado'):
+            conn.execute(f'DELETE FROM {tabela}_legado')
+    
+    def _limpar_historico(self, conn):
+        """Tira as buscas do histórico; as que têm fontes numa view por tipo continuam lá"""
+        conn.execute(f'''
+            DELETE FROM buscas WHERE tipo NOT IN ({', '.join('?' * len(TIPOS_COM_FONTES))})
+                OR NOT EXISTS (SELECT 1 FROM busca_fontes f WHERE f.busca_id = buscas.id)
+        ''', TIPOS_COM_FONTES)
+        conn.execute('UPDATE buscas SET resultado = NULL WHERE resultado IS NOT NULL')
+        if self._tabela_existe(conn, 'historico_buscas_legado'):
+            conn.execute('DELETE FROM historico_buscas_legado')
+    
+    def migrar_buscas_legado(self, lote: int = 500, orcamento: float = 0.5) -> int:
+        """
+        Move lotes das tabelas antigas (<tabela>_legado) para buscas/busca_fontes.
+        Cada lote é uma transação (insere e apaga juntos), então as views nunca
+        contam uma linha duas vezes. As linhas são movidas por chave (tipo,
+        termo e data_busca), todas de uma vez, para separar buscas diferentes
+        com a mesma chave; o histórico é migrado primeiro. Tabela esvaziada é
+        removida e as views recriadas sem ela.
+        """
+        inicio, movidas = time.perf_counter(), 0
+        for tabela in TABELAS_BUSCA_LEGADO:
+            legado = f'{tabela}_legado'
+            tipo, coluna_termo = MIGRACAO_BUSCAS[tabela][:2]
+            while time.perf_counter() - inicio < orcamento:
+                with self.escrita(invalidar=('buscas',)) as conn:
+                    if not self._tabela_existe(conn, legado):
+                        break
+                    chaves = conn.execute(f'''
+                        SELECT DISTINCT {tipo}, {coluna_termo}, data_busca
+                        FROM (SELECT * FROM {legado} ORDER BY rowid LIMIT ?)
+                    ''', (lote,)).fetchall()
+                    if not chaves:
+                        conn.execute(f'DROP TABLE {legado}')
+                        self._criar_views_buscas(conn)
+                        break
+                    for chave in chaves:
+                        movidas += self._migrar_chave_busca(conn, tabela, chave)
+            if time.perf_counter() - inicio >= orcamento:
+                break
+        return movidas
+    
+    def _migrar_chave_busca(self, conn, tabela: str, chave) -> int:
+        """Move as linhas de <tabela>_legado com a chave (tipo, termo, data_busca); retorna quantas"""
+        tipo_sql, coluna_termo, coluna_fonte, extensoes = MIGRACAO_BUSCAS[tabela]
+        legado = f'{tabela}_legado'
+        filtro = f'{tipo_sql} IS ? AND {coluna_termo} IS ? AND data_busca IS ?'
+        colunas = ['resultado', coluna_fonte or 'NULL'] + list(extensoes)
+        linhas = conn.execute(f'SELECT {", ".join(colunas)} FROM {legado} WHERE {filtro} ORDER BY rowid',
+                              chave).fetchall()
+        conn.execute(f'DELETE FROM {legado} WHERE {filtro}', chave)
+        tipo, termo, data_busca = chave
+        chave = (tipo, termo or '', data_busca or datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+        if coluna_fonte is None:
+            self._migrar_historico(conn, chave, [linha[0] for linha in linhas])
+        else:
+            self._migrar_fontes(conn, chave, linhas, extensoes)
+        return len(linhas)
+    
+    def _migrar_historico(self, conn, chave, resultados: List[str]):
+        """
+        O app antigo repetia o histórico uma vez por fonte: cada `por_busca`
+        linhas iguais viram uma busca. Buscas de usuários diferentes com a
+        mesma chave (mesmo termo no mesmo segundo) continuam separadas
+        """
+        por_busca = self._fontes_por_busca(conn, chave)
+        abertas = {}
+        for resultado in resultados:
+            aberta = abertas.get(resultado)
+            if aberta and aberta[1] < por_busca:
+                aberta[1] += 1
+                continue
+            busca_id = conn.execute('INSERT INTO buscas (tipo, termo, data_busca, resultado) VALUES (?, ?, ?, ?)',
+                                    (*chave, resultado)).lastrowid
+            abertas[resultado] = [busca_id, 1]
+    
+    def _fontes_por_busca(self, conn, chave) -> int:
+        """Fontes distintas da chave na tabela antiga do tipo, ainda não migrada (1 se não houver)"""
+        tipo, termo, data_busca = chave
+        for tabela, (tipo_sql, coluna_termo, coluna_fonte, _) in MIGRACAO_BUSCAS.items():
+            if coluna_fonte and tipo_sql == f"'{tipo}'" and self._tabela_existe(conn, f'{tabela}_legado'):
+                total = conn.execute(f'''
+                    SELECT COUNT(DISTINCT {coluna_fonte}) FROM {tabela}_legado
+                    WHERE {coluna_termo} = ? AND data_busca = ?
+                ''', (termo, data_busca)).fetchone()[0]
+                return max(1, total)
+        return 1
+    
+    def _migrar_fontes(self, conn, chave, linhas, extensoes):
+        """
+        Uma busca por grupo de fontes (o grupo acaba quando uma fonte se
+        repete). Os grupos vão, em ordem, para as buscas da chave ainda sem
+        fontes (as do histórico); as que faltarem são criadas
+        """
+        grupos = []
+        for resultado, fonte, *valores in linhas:
+            if not grupos or fonte in grupos[-1][0]:
+                grupos.append((set(), [], dict(zip(extensoes, valores))))
+            grupos[-1][0].add(fonte)
+            grupos[-1][1].append((fonte, resultado))
+        livres = [linha[0] for linha in conn.execute('''
+            SELECT id FROM buscas b WHERE tipo = ? AND termo = ? AND data_busca = ?
+                AND NOT EXISTS (SELECT 1 FROM busca_fontes f WHERE f.busca_id = b.id)
+            ORDER BY id
+        ''', chave).fetchall()]
+        for indice, (_, fontes, valores) in enumerate(grupos):
+            if indice < len(livres):
+                busca_id = livres[indice]
+                if valores:
+                    conn.execute(f'''
+                        UPDATE buscas SET {', '.join(f'{c} = COALESCE({c}, ?)' for c in valores)} WHERE id = ?
+                    ''', (*valores.values(), busca_id))
+            else:
+                colunas = ['tipo', 'termo', 'data_busca'] + list(valores)
+                busca_id = conn.execute(f'''
+                    INSERT INTO buscas ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})
+                ''', (*chave, *valores.values())).lastrowid
+            conn.executemany('INSERT INTO busca_fontes (busca_id, fonte, resultado) VALUES (?, ?, ?)',
+                             [(busca_id, fonte, resultado) for fonte, resultado in fontes])
+    
+    def _alvo_retencao(self, tabela: str):
+        """(tabela real, coluna de data, condição extra) de uma entrada da retenção"""
+        real, condicao = RECORTES_RETENCAO.get(tabela, (tabela, None))
+        return real, COLUNAS_DATA[tabela], f'AND {condicao}' if condicao else ''
+    
+    def expurgar_lote(self, tabela: str, limite_data: str, lote: int = 500) -> int:
+        """Apaga até `lote` linhas mais antigas que limite_data; retorna quantas apagou"""
+        real, coluna, condicao = self._alvo_retencao(tabela)
+        if tabela == 'ip_logs':
+            # Meses inteiros vencidos: descarta o arquivo da partição
+            particoes = obter_particoes(self)
+            particoes.descartar_anteriores(limite_data)
+            apagadas = particoes.expurgar_lote(limite_data, lote)
+            if apagadas:
+                return apagadas
+        with self.escrita(invalidar=(real,)) as conn:
+            cursor = conn.execute(f'''
+                DELETE FROM {real} WHERE rowid IN (
+                    SELECT rowid FROM {real} WHERE {coluna} < ? {condicao} ORDER BY {coluna} LIMIT ?
+                )
+            ''', (limite_data, lote))
+            return cursor.rowcount
+    
+    def contar_expiradas(self, tabela: str, limite_data: str, maximo: int = 100000) -> int:
+        """Linhas mais antigas que limite_data (contagem limitada a `maximo`)"""
+        real, coluna, condicao = self._alvo_retencao(tabela)
+        conn = self.get_connection()
+        try:
+            total = conn.execute(f'''
+                SELECT COUNT(*) FROM (SELECT 1 FROM {real} WHERE {coluna} < ? {condicao} LIMIT ?)
+            ''', (limite_data, maximo)).fetchone()[0]
+        finally:
+            conn.close()
+        if tabela == 'ip_logs' and total < maximo:
+            total += obter_particoes(self).contar_expiradas(limite_data, maximo - total)
+        return total
+    
+    def data_mais_antiga(self, tabela: str) -> Optional[str]:
+        """Data da linha mais antiga da tabela (usa o índice da coluna de data)"""
+        real, coluna, condicao = self._alvo_retencao(tabela)
+        conn = self.get_connection()
+        try:
+            data = conn.execute(f'SELECT MIN({coluna}) FROM {real} WHERE 1 {condicao}').fetchone()[0]
+        finally:
+            conn.close()
+        if tabela == 'ip_logs':
+            datas = [d for d in (data, obter_particoes(self).data_mais_antiga()) if d]
+            data = min(datas) if datas else None
+        return data
+    
+    def estado_vacuum(self) -> Dict:
+        """Modo de auto_vacuum e páginas livres do arquivo"""
+        conn = self.get_connection()
+        try:
+            modo = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            return {
+                'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(modo, str(modo)),
+                'paginas_livres': conn.execute('PRAGMA freelist_count').fetchone()[0],
+                'total_paginas': conn.execute('PRAGMA page_count').fetchone()[0],
+                'tamanho_pagina': conn.execute('PRAGMA page_size').fetchone()[0]
+            }
+        finally:
+            conn.close()
+    
+    def vacuum_incremental(self, paginas: int = 1000) -> int:
+        """Devolve até `paginas` páginas livres ao sistema; retorna quantas foram liberadas"""
+        # Fora do escrita(): o PRAGMA abre e fecha a própria transação de escrita.
+        # Só executescript avança o PRAGMA até o fim (execute libera uma página),
+        # e ele dá COMMIT antes de começar: dentro do escrita() encerraria o
+        # BEGIN IMMEDIATE e o vacuum rodaria sem a transação
+        conn = self.get_connection()
+        try:
+            antes = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            repetir_se_ocupado(conn.executescript, f'PRAGMA incremental_vacuum({int(paginas)});')
+            return antes - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        finally:
+            conn.close()
+    
+    def converter_vacuum_incremental(self) -> Dict:
+        """Ativa auto_vacuum=INCREMENTAL em banco existente (VACUUM completo, bloqueia o banco)"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO ip_logs (ip_address, user_agent, path, method, user_id, session_id, country, city)
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            conn.close()
+            return {'sucesso': True, **self.estado_vacuum()}
+        except Exception as e:
+            return {'sucesso': False, 'erro': str(e)}
+    
+    def adquirir_lease(self, nome: str, dono: str, duracao: float) -> bool:
+        """Pega (ou renova) o lease `nome` por `duracao` segundos; False se outro dono o tem válido"""
+        agora = time.time()
+        with self.escrita() as conn:
+            conn.execute('INSERT OR IGNORE INTO leases (nome, dono, expira_em) VALUES (?, ?, ?)',
+                         (nome, dono, agora + duracao))
+            cursor = conn.execute('''
+                UPDATE leases SET dono = ?, expira_em = ?
+                WHERE nome = ? AND (dono = ? OR expira_em < ?)
+            ''', (dono, agora + duracao, nome, dono, agora))
+            return cursor.rowcount > 0
+    
+    def liberar_lease(self, nome: str, dono: str):
+        """Libera o lease se ainda for deste dono"""
+        with self.escrita() as conn:
+            conn.execute('DELETE FROM leases WHERE nome = ? AND dono = ?', (nome, dono))
+    
+    def gravar_job(self, job: Dict):
+        """Grava (ou atualiza) o estado de um job; o resultado vai como JSON"""
+        resultado = None if job['resultado'] is None else json.dumps(job['resultado'], ensure_ascii=False, default=str)
+        with self.escrita() as conn:
+            conn.execute('''
+                INSERT INTO jobs (id, tipo, status, dono, criado_em, concluido_em, resultado, codigo)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (ip_address, user_agent, path, method, user_id, session_id, country, city))
-            conn.commit()
+                ON CONFLICT(id) DO UPDATE SET status = excluded.status, concluido_em = excluded.concluido_em,
+                                              resultado = excluded.resultado, codigo = excluded.codigo
+            ''', (job['id'], job['tipo'], job['status'], job['dono'], job['criado_em'],
+                  job['concluido_em'], resultado, job['codigo']))
+    
+    def obter_job(self, job_id: str) -> Optional[Dict]:
+        """Job gravado por qualquer worker (None se não existir)"""
+        conn = self.get_connection()
+        try:
+            linha = conn.execute('''
+                SELECT id, tipo, status, dono, criado_em, concluido_em, resultado, codigo FROM jobs WHERE id = ?
+            ''', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if not linha:
+            return None
+        return {
+            'id': linha[0],
+            'tipo': linha[1],
+            'status': linha[2],
+            'dono': linha[3],
+            'criado_em': linha[4],
+            'concluido_em': linha[5],
+            'resultado': json.loads(linha[6]) if linha[6] is not None else None,
+            'codigo': linha[7]
+        }
+    
+    def expurgar_jobs(self, limite: float) -> int:
+        """Apaga os jobs concluídos (ou criados, se nunca concluíram) antes de `limite` (epoch)"""
+        with self.escrita() as conn:
+            return conn.execute('DELETE FROM jobs WHERE COALESCE(concluido_em, criado_em) < ?',
+                                (limite,)).rowcount
+    
+    def obter_lease(self, nome: str) -> Optional[Dict]:
+        """Dono atual do lease (None se livre ou vencido)"""
+        conn = self.get_connection()
+        try:
+            linha = conn.execute('SELECT dono, expira_em FROM leases WHERE nome = ?', (nome,)).fetchone()
+        finally:
+            conn.close()
+        if not linha or linha[1] < time.time():
+            return None
+        return {'dono': linha[0], 'expira_em': datetime.utcfromtimestamp(linha[1]).strftime('%Y-%m-%d %H:%M:%S')}
+    
+    def registrar_manutencao(self, tarefa: str, inicio: str, duracao_ms: float, sucesso: bool,
+                             detalhe: str = None, processo: str = None):
+        """Grava uma execução de tarefa de manutenção"""
+        with self.escrita() as conn:
+            conn.execute('''
+                INSERT INTO manutencao_execucoes (tarefa, inicio, duracao_ms, sucesso, detalhe, processo)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (tarefa, inicio, duracao_ms, 1 if sucesso else 0, detalhe, processo))
+    
+    def ultimas_manutencoes(self) -> Dict[str, str]:
+        """Início da última execução de cada tarefa (gravada por qualquer worker)"""
+        conn = self.get_connection()
+        try:
+            return dict(conn.execute('SELECT tarefa, MAX(inicio) FROM manutencao_execucoes GROUP BY tarefa').fetchall())
+        finally:
             conn.close()
+    
+    def historico_manutencao(self, limite: int = 50, tarefa: str = None) -> List[Dict]:
+        """Execuções mais recentes das tarefas de manutenção"""
+        with self.leitura() as conn:
+            if tarefa:
+                linhas = conn.execute('''
+                    SELECT tarefa, inicio, duracao_ms, sucesso, detalhe, processo FROM manutencao_execucoes
+                    WHERE tarefa = ? ORDER BY inicio DESC LIMIT ?
+                ''', (tarefa, limite)).fetchall()
+            else:
+                linhas = conn.execute('''
+                    SELECT tarefa, inicio, duracao_ms, sucesso, detalhe, processo FROM manutencao_execucoes
+                    ORDER BY inicio DESC LIMIT ?
+                ''', (limite,)).fetchall()
+        return [{
+            'tarefa': l[0],
+            'inicio': l[1],
+            'duracao_ms': l[2],
+            'sucesso': bool(l[3]),
+            'detalhe': json.loads(l[4]) if l[4] else None,
+            'processo': l[5]
+        } for l in linhas]
+    
+    def registrar_ip(self, ip_address: str, user_agent: str = '', path: str = '', method: str = '', user_id: str = None, session_id: str = None, country: str = None, city: str = None, status: int = None, rota: str = None):
+        """Registra acesso de um IP (na partição do mês; agregados por hora em lote)"""
+        try:
+            data_acesso = obter_particoes(self).registrar(
+                ip_address, user_agent, path, method, user_id, session_id, country, city,
+                status=status, rota=rota
+            )
         except Exception as e:
             print(f"Error logging IP: {e}")
+            return
+        if _observadores_acesso:
+            acesso = {
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                'path': path,
+                'method': method,
+                'user_id': user_id,
+                'session_id': session_id,
+                'data_acesso': data_acesso,
+                'country': country,
+                'city': city,
+                'status': status
+            }
+            for funcao in list(_observadores_acesso):
+                try:
+                    funcao(acesso)
+                except Exception as e:
+                    print(f"Erro no observador de acessos: {e}")
     
     def obter_ips_recentes(self, limite: int = 100) -> List[Dict]:
-        """Obtém IPs recentes"""
+        """Obtém IPs recentes (partições mais novas primeiro, depois o ip_logs antigo)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM ip_logs 
-                ORDER BY data_acesso DESC 
-                LIMIT ?
-            ''', (limite,))
-            results = cursor.fetchall()
-            conn.close()
+            def carregar():
+                results = []
+                with obter_particoes(self).leitura() as (conn, anexadas):
+                    # Cada partição usa o próprio índice de data (user agent e path
+                    # resolvidos por join com os dicionários); para quando tiver o suficiente
+                    for consulta in anexadas.values():
+                        results += conn.execute(f'''
+                            {consulta}
+                            ORDER BY l.data_acesso DESC LIMIT ?
+                        ''', (limite - len(results),)).fetchall()
+                        if len(results) >= limite:
+                            break
+                    if len(results) < limite:
+                        results += conn.execute('''
+                            SELECT id, ip_address, user_agent, path, method, user_id, session_id,
+                                   data_acesso, country, city, NULL
+                            FROM main.ip_logs ORDER BY data_acesso DESC LIMIT ?
+                        ''', (limite - len(results),)).fetchall()
+                
+                return [{
+                    'id': r[0],
+                    'ip_address': r[1],
+                    'user_agent': r[2],
+                    'path': r[3],
+                    'method': r[4],
+                    'user_id': r[5],
+                    'session_id': r[6],
+                    'data_acesso': r[7],
+                    'country': r[8],
+                    'city': r[9],
+                    'status': r[10]
+                } for r in results]
             
-            return [{
-                'id': r[0],
-                'ip_address': r[1],
-                'user_agent': r[2],
-                'path': r[3],
-                'method': r[4],
-                'user_id': r[5],
-                'session_id': r[6],
-                'data_acesso': r[7],
-                'country': r[8],
-                'city': r[9]
-            } for r in results]
+            # Acessos de outros workers não sobem a geração compartilhada: TTL curto
+            return self.cache.obter('ips_recentes', (limite,), ('ip_logs',), carregar, CACHE_IP_LOGS_TTL,
+                                    compartilhar=False)
+        except TempoLeituraEsgotado:
+            raise
         except Exception as e:
             return []
     
     def obter_estatisticas_ips(self) -> Dict:
-        """Obtém estatísticas de IPs"""
+        """Obtém estatísticas de IPs (a partir dos agregados por hora)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            obter_particoes(self).flush()
+            with self.leitura() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute('SELECT COUNT(DISTINCT ip_address) FROM ip_logs')
-            ips_unicos = cursor.fetchone()[0]
+                cursor.execute('SELECT COUNT(DISTINCT ip_address) FROM ip_unicos_hora')
+                ips_unicos = cursor.fetchone()[0]
             
-            cursor.execute('SELECT COUNT(*) FROM ip_logs')
-            total_acessos = cursor.fetchone()[0]
+                cursor.execute('SELECT COALESCE(SUM(total), 0) FROM ip_rollup_hora')
+                total_acessos = cursor.fetchone()[0]
             
-            cursor.execute('SELECT COUNT(*) FROM ip_logs WHERE data_acesso > datetime("now", "-24 hours")')
-            acessos_24h = cursor.fetchone()[0]
-            
-            conn.close()
+                cursor.execute('''
+                    SELECT COALESCE(SUM(total), 0) FROM ip_rollup_hora
+                    WHERE hora > strftime('%Y-%m-%d %H:00:00', 'now', '-24 hours')
+                ''')
+                acessos_24h = cursor.fetchone()[0]
             
             return {
                 'ips_unicos': ips_unicos,
@@ -488,18 +1496,59 @@ class Database:
         except Exception as e:
             return {'erro': str(e)}
     
+    def serie_acessos(self, horas: int = 24) -> List[Dict]:
+        """Acessos e IPs únicos por hora nas últimas `horas` (para os gráficos do admin)"""
+        obter_particoes(self).flush()
+        with self.leitura() as conn:
+            desde = f'-{int(horas)} hours'
+            acessos = conn.execute('''
+                SELECT hora, SUM(total), SUM(CASE WHEN status >= 400 THEN total ELSE 0 END)
+                FROM ip_rollup_hora WHERE hora > strftime('%Y-%m-%d %H:00:00', 'now', ?)
+                GROUP BY hora ORDER BY hora
+            ''', (desde,)).fetchall()
+            unicos = dict(conn.execute('''
+                SELECT hora, COUNT(*) FROM ip_unicos_hora
+                WHERE hora > strftime('%Y-%m-%d %H:00:00', 'now', ?) GROUP BY hora
+            ''', (desde,)).fetchall())
+        return [{'hora': hora, 'acessos': total, 'erros': erros, 'ips_unicos': unicos.get(hora, 0)}
+                for hora, total, erros in acessos]
+    
+    def acessos_por_rota(self, horas: int = 24) -> List[Dict]:
+        """Acessos por rota, método e status nas últimas `horas`"""
+        obter_particoes(self).flush()
+        with self.leitura() as conn:
+            linhas = conn.execute('''
+                SELECT path, method, status, SUM(total) AS total FROM ip_rollup_hora
+                WHERE hora > strftime('%Y-%m-%d %H:00:00', 'now', ?)
+                GROUP BY path, method, status ORDER BY total DESC
+            ''', (f'-{int(horas)} hours',)).fetchall()
+        return [{'path': p, 'method': m, 'status': st, 'total': t} for p, m, st, t in linhas]
+    
+    def somar_agregados_acesso(self, contagens: Dict, ips: Dict):
+        """Soma lotes de contagens {(hora, rota, metodo, status): n} e {(hora, ip): n}"""
+        with self.escrita() as conn:
+            conn.executemany('''
+                INSERT INTO ip_rollup_hora (hora, path, method, status, total) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(hora, path, method, status) DO UPDATE SET total = total + excluded.total
+            ''', [chave + (n,) for chave, n in contagens.items()])
+            conn.executemany('''
+                INSERT INTO ip_unicos_hora (hora, ip_address, total) VALUES (?, ?, ?)
+                ON CONFLICT(hora, ip_address) DO UPDATE SET total = total + excluded.total
+            ''', [chave + (n,) for chave, n in ips.items()])
+    
+    def migrar_ip_logs_legado(self, lote: int = 2000, orcamento: float = 0.5) -> int:
+        """Move o ip_logs antigo (tabela única) para as partições, em lotes"""
+        return obter_particoes(self).migrar_legado(lote, orcamento)
+    
     def criar_usuario(self, email: str, nome: str = '', senha_hash: str = None, google_id: str = None, permissao: str = 'user') -> Dict:
         """Cria um novo usuário"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO usuarios (email, nome, senha_hash, google_id, permissao)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (email, nome, senha_hash, google_id, permissao))
-            conn.commit()
-            user_id = cursor.lastrowid
-            conn.close()
+            with self.escrita(invalidar=('usuarios',)) as conn:
+                cursor = conn.execute('''
+                    INSERT INTO usuarios (email, nome, senha_hash, google_id, permissao)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (email, nome, senha_hash, google_id, permissao))
+                user_id = cursor.lastrowid
             return {'sucesso': True, 'id': user_id}
         except Exception as e:
             return {'sucesso': False, 'erro': str(e)}
@@ -538,48 +1587,162 @@ class Database:
     def atualizar_permissao(self, email: str, permissao: str, atribuido_por: str) -> Dict:
         """Atualiza permissão de um usuário"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Atualizar permissão
-            cursor.execute('UPDATE usuarios SET permissao = ? WHERE email = ?', (permissao, email))
-            
-            # Registrar na tabela de permissões
-            cursor.execute('''
-                INSERT INTO permissoes (email, permissao, atribuido_por)
-                VALUES (?, ?, ?)
-            ''', (email, permissao, atribuido_por))
-            
-            conn.commit()
-            conn.close()
+            with self.escrita(invalidar=('usuarios',)) as conn:
+                # Atualizar permissão
+                conn.execute('UPDATE usuarios SET permissao = ? WHERE email = ?', (permissao, email))
+                
+                # Registrar na tabela de permissões
+                conn.execute('''
+                    INSERT INTO permissoes (email, permissao, atribuido_por)
+                    VALUES (?, ?, ?)
+                ''', (email, permissao, atribuido_por))
             return {'sucesso': True}
         except Exception as e:
             return {'sucesso': False, 'erro': str(e)}
     
-    def listar_usuarios(self) -> List[Dict]:
-        """Lista todos os usuários"""
-        try:
-            conn = self.get_connection()
+    def listar_usuarios(self, pagina: int = 1, por_pagina: int = 50, ordem: str = 'data_criacao',
+                        direcao: str = 'desc', permissao: str = None, busca: str = None,
+                        ativo: bool = None) -> List[Dict]:
+        """Uma página de usuários, só com as colunas de COLUNAS_USUARIO (nunca senha_hash)"""
+        if ordem not in ORDENS_USUARIOS:
+            raise ValueError(f'Coluna de ordenação inválida: {ordem}')
+        if direcao.lower() not in ('asc', 'desc'):
+            raise ValueError(f'Direção de ordenação inválida: {direcao}')
+        filtro, parametros = self._filtro_usuarios(permissao, busca, ativo)
+        por_pagina = max(1, por_pagina)
+        pagina = max(1, pagina)
+        
+        def carregar():
+            with self.leitura() as conn:
+                results = conn.execute(f'''
+                    SELECT {', '.join(COLUNAS_USUARIO)} FROM usuarios {filtro}
+                    ORDER BY {ordem} {direcao}, id {direcao} LIMIT ? OFFSET ?
+                ''', (*parametros, por_pagina, (pagina - 1) * por_pagina)).fetchall()
+            return [dict(zip(COLUNAS_USUARIO, r)) for r in results]
+        
+        return self.cache.obter('usuarios', (filtro, tuple(parametros), ordem, direcao.lower(), pagina, por_pagina),
+                                ('usuarios',), carregar)
+    
+    def contar_usuarios(self, permissao: str = None, busca: str = None, ativo: bool = None) -> int:
+        """Total de usuários (do contador mantido por trigger, exceto com busca/ativo)"""
+        def carregar():
+            with self.leitura() as conn:
+                if busca or ativo is not None:
+                    filtro, parametros = self._filtro_usuarios(permissao, busca, ativo)
+                    return conn.execute(f'SELECT COUNT(*) FROM usuarios {filtro}', parametros).fetchone()[0]
+                nome = f'usuarios:{permissao}' if permissao else 'usuarios'
+                linha = conn.execute('SELECT total FROM contadores WHERE nome = ?', (nome,)).fetchone()
+            return linha[0] if linha else 0
+        
+        return self.cache.obter('contar_usuarios', (permissao, busca, ativo), ('usuarios',), carregar)
+    
+    @staticmethod
+    def _filtro_usuarios(permissao: str = None, busca: str = None, ativo: bool = None):
+        condicoes, parametros = [], []
+        if permissao:
+            condicoes.append('permissao = ?')
+            parametros.append(permissao)
+        if busca:
+            condicoes.append('(email LIKE ? OR nome LIKE ?)')
+            parametros += [f'%{busca}%', f'%{busca}%']
+        if ativo is not None:
+            condicoes.append('ativo = ?')
+            parametros.append(1 if ativo else 0)
+        return ('WHERE ' + ' AND '.join(condicoes) if condicoes else ''), parametros
+    
+    def incrementar_quotas(self, incrementos: Dict) -> Dict:
+        """Soma incrementos de quota em lote e retorna os totais atualizados
+        
+        incrementos: {(dia, usuario, provedor): quantidade}
+        """
+        totais = {}
+        with self.escrita() as conn:
+            cursor = conn.cursor()
+            for (dia, usuario, provedor), quantidade in incrementos.items():
+                cursor.execute('''
+                    INSERT INTO quota_uso (dia, usuario, provedor, total)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (dia, usuario, provedor)
+                    DO UPDATE SET total = total + excluded.total, atualizado_em = CURRENT_TIMESTAMP
+                ''', (dia, usuario, provedor, quantidade))
+            # Totais lidos na mesma transação (sem incrementos de outros workers no meio)
+            for (dia, usuario, provedor) in incrementos:
+                cursor.execute('''
+                    SELECT total FROM quota_uso WHERE dia = ? AND usuario = ? AND provedor = ?
+                ''', (dia, usuario, provedor))
+                totais[(dia, usuario, provedor)] = cursor.fetchone()[0]
+        return totais
+    
+    def reservar_quota(self, dia: str, usuario: str, provedor: str, limite: int) -> Optional[int]:
+        """Soma 1 à quota se ela ainda estiver abaixo do limite (vale entre os workers)
+        
+        Retorna o total depois da reserva, ou None se o limite já foi atingido
+        """
+        with self.escrita() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT id, email, nome, google_id, permissao, ip_whitelist, ativo, data_criacao, ultimo_acesso, senha_hash
-                FROM usuarios ORDER BY data_criacao DESC
-            ''')
+                INSERT INTO quota_uso (dia, usuario, provedor, total)
+                VALUES (?, ?, ?, 0)
+                ON CONFLICT (dia, usuario, provedor) DO NOTHING
+            ''', (dia, usuario, provedor))
+            cursor.execute('''
+                UPDATE quota_uso SET total = total + 1, atualizado_em = CURRENT_TIMESTAMP
+                WHERE dia = ? AND usuario = ? AND provedor = ? AND total < ?
+            ''', (dia, usuario, provedor, limite))
+            if cursor.rowcount == 0:
+                return None
+            cursor.execute('''
+                SELECT total FROM quota_uso WHERE dia = ? AND usuario = ? AND provedor = ?
+            ''', (dia, usuario, provedor))
+            return cursor.fetchone()[0]
+    
+    def devolver_quota(self, dia: str, usuario: str, provedor: str):
+        """Desfaz uma reserva de quota (consulta que o provedor não atendeu)"""
+        with self.escrita() as conn:
+            conn.execute('''
+                UPDATE quota_uso SET total = total - 1, atualizado_em = CURRENT_TIMESTAMP
+                WHERE dia = ? AND usuario = ? AND provedor = ? AND total > 0
+            ''', (dia, usuario, provedor))
+    
+    def obter_uso_quota(self, dia: str, usuario: str, provedor: str) -> int:
+        """Obtém o total já registrado de uma quota"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT total FROM quota_uso WHERE dia = ? AND usuario = ? AND provedor = ?
+        ''', (dia, usuario, provedor))
+        result = cursor.fetchone()
+        conn.close()
+        return result[0] if result else 0
+    
+    def listar_uso_quotas(self, dia: str) -> List[Dict]:
+        """Lista o uso de quotas de um dia"""
+        with self.leitura() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT dia, usuario, provedor, total, atualizado_em
+                FROM quota_uso WHERE dia = ? ORDER BY total DESC
+            ''', (dia,))
             results = cursor.fetchall()
-            conn.close()
-            
-            return [{
-                'id': r[0],
-                'email': r[1],
-                'nome': r[2],
-                'google_id': r[3],
-                'permissao': r[4],
-                'ip_whitelist': r[5],
-                'ativo': r[6],
-                'data_criacao': r[7],
-                'ultimo_acesso': r[8],
-                'senha_hash': r[9]
-            } for r in results]
-        except Exception as e:
-            return []
+        
+        return [{
+            'dia': r[0],
+            'usuario': r[1],
+            'provedor': r[2],
+            'total': r[3],
+            'atualizado_em': r[4]
+        } for r in results]
 
+@contextmanager
+def banco_em_memoria(origem: str = None):
+    """
+    Database isolado em memória, descartado ao sair do bloco (testes e benchmarks)
+    `origem`: banco em arquivo copiado para a memória antes (ex: fixture de benchmark)
+    """
+    db = Database(MEMORIA)
+    try:
+        if origem:
+            db.carregar(origem)
+        yield db
+    finally:
+        db.fechar()
@@ -0,0 +1,449 @@
+"""
+Partições mensais do log de acessos (ip_logs) e agregados por hora.
+
+Cada mês fica em um arquivo SQLite próprio (<banco>_ip_logs/ip_logs_AAAAMM.db),
+anexado só às conexões que leem o log; descartar um mês antigo é apagar o
+arquivo. Contagens por hora (rota, método, status) e IPs únicos por hora ficam
+no banco principal, acumuladas em memória e gravadas em lote.
+
+User agent e path são gravados como IDs de tabelas de dicionário do banco
+principal (ip_user_agents, ip_paths); um LRU em memória evita a consulta ao
+dicionário na maioria das inserções. O LRU é descartado quando a geração
+compartilhada GERACAO_DICIONARIOS sobe (restauração de um snapshot, que pode
+trazer os dicionários de volta a um estado anterior).
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from read_cache import incrementar_geracao_local
+
+_RE_PARTICAO = re.compile(r'^ip_logs_(\d{6})\.db$')
+
+COLUNAS = ('ip_address', 'user_agent_id', 'path_id', 'method', 'user_id', 'session_id',
+           'data_acesso', 'country', 'city', 'status')
+
+# Colunas do ip_logs antigo (tabela única, texto completo em cada linha)
+COLUNAS_LEGADO = ('ip_address', 'user_agent', 'path', 'method', 'user_id', 'session_id',
+                  'data_acesso', 'country', 'city')
+
+# Strings maiores são truncadas antes de entrar no dicionário
+TAMANHO_MAXIMO_VALOR = 512
+# Custo aproximado de uma entrada do LRU além da string (nó do OrderedDict e o id)
+TAMANHO_ENTRADA_LRU = 100
+# Geração compartilhada ('geracao:<nome>' em contadores) dos dicionários
+GERACAO_DICIONARIOS = 'ip_dicionarios'
+
+ESQUEMA_PARTICAO = '''
+    CREATE TABLE IF NOT EXISTS ip_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ip_address TEXT NOT NULL,
+        user_agent_id INTEGER,
+        path_id INTEGER,
+        method TEXT,
+        user_id TEXT,
+        session_id TEXT,
+        data_acesso TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        country TEXT,
+        city TEXT,
+        status INTEGER,
+        legado_id INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_ip_logs_data_acesso ON ip_logs(data_acesso);
+    -- id da linha no ip_logs antigo: a migração de um lote pode ser repetida sem duplicar
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_ip_logs_legado_id ON ip_logs(legado_id);
+'''
+
+# Uma instância por arquivo de banco: os agregados em memória são do processo
+_instancias = {}
+_instancias_lock = threading.Lock()
+
+def obter_particoes(db) -> 'ParticoesIPLogs':
+    """Partições do banco `db` (compartilhadas entre as instâncias de Database do processo)"""
+    chave = os.path.abspath(db.db_name)
+    with _instancias_lock:
+        if chave not in _instancias:
+            _instancias[chave] = ParticoesIPLogs(db)
+        return _instancias[chave]
+
+def liberar_particoes(db):
+    """Esquece a instância de partições de `db` (banco em memória descartado)"""
+    with _instancias_lock:
+        _instancias.pop(os.path.abspath(db.db_name), None)
+
+def _reiniciar_apos_fork():
+    # Agregados em memória copiados do pai seriam gravados de novo pelo filho
+    global _instancias_lock
+    _instancias_lock = threading.Lock()
+    for particoes in _instancias.values():
+        particoes.reiniciar_apos_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_apos_fork)
+
+def hora_de(data: str) -> str:
+    """'2024-05-01 13:45:10' -> '2024-05-01 13:00:00'"""
+    return data[:13] + ':00:00'
+
+def consulta_particao(esquema: str, colunas_tabela) -> str:
+    """
+    SELECT das colunas de saída (id, ip_address, user_agent, path, method, user_id,
+    session_id, data_acesso, country, city, status) de uma partição anexada, com os
+    IDs do dicionário resolvidos por join; a tabela tem o apelido `l`
+    """
+    if 'user_agent_id' not in colunas_tabela:
+        # Partição criada antes do dicionário (texto completo)
+        return f'''
+            SELECT l.id, l.ip_address, l.user_agent, l.path, l.method, l.user_id, l.session_id,
+                   l.data_acesso, l.country, l.city, l.status
+            FROM {esquema}.ip_logs l'''
+    return f'''
+        SELECT l.id, l.ip_address, ua.valor AS user_agent, pa.valor AS path, l.method, l.user_id, l.session_id,
+               l.data_acesso, l.country, l.city, l.status
+        FROM {esquema}.ip_logs l
+        LEFT JOIN main.ip_user_agents ua ON ua.id = l.user_agent_id
+        LEFT JOIN main.ip_paths pa ON pa.id = l.path_id'''
+
+class Dicionario:
+    """Tabela de strings internadas (valor -> id) com LRU em memória"""
+    def __init__(self, db, tabela: str, maximo: int):
+        self.db = db
+        self.tabela = tabela
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self._bytes = 0
+        self._geracao = None
+
+    def id(self, valor: Optional[str]) -> Optional[int]:
+        """ID do valor, criando a entrada no dicionário se for novo"""
+        if valor is None:
+            return None
+        valor = valor[:TAMANHO_MAXIMO_VALOR]
+        # Sem como ler a geração (None), o LRU continua valendo
+        geracao = self.db.cache.geracao_compartilhada(GERACAO_DICIONARIOS)
+        with self._lock:
+            if geracao is not None and geracao != self._geracao:
+                if self._geracao is not None:
+                    self._esvaziar()
+                self._geracao = geracao
+            id_valor = self._cache.get(valor)
+            if id_valor is not None:
+                self._cache.move_to_end(valor)
+                self.acertos += 1
+                return id_valor
+            self.falhas += 1
+
+        id_valor = self._buscar(valor)
+        if id_valor is None:
+            # INSERT OR IGNORE: outro processo pode ter criado o mesmo valor
+            with self.db.escrita() as conn:
+                conn.execute(f'INSERT OR IGNORE INTO {self.tabela} (valor) VALUES (?)', (valor,))
+            id_valor = self._buscar(valor)
+
+        with self._lock:
+            if valor not in self._cache:
+                self._bytes += sys.getsizeof(valor) + TAMANHO_ENTRADA_LRU
+            self._cache[valor] = id_valor
+            if len(self._cache) > self.maximo:
+                self._remover_mais_antigo()
+        return id_valor
+
+    def _remover_mais_antigo(self) -> int:
+        valor, _ = self._cache.popitem(last=False)
+        tamanho = sys.getsizeof(valor) + TAMANHO_ENTRADA_LRU
+        self._bytes -= tamanho
+        self.remocoes += 1
+        return tamanho
+
+    def _esvaziar(self):
+        self._cache.clear()
+        self._bytes = 0
+
+    def limpar(self):
+        """Esquece os IDs em memória (os dicionários do banco podem ter mudado)"""
+        with self._lock:
+            self._esvaziar()
+
+    def _buscar(self, valor: str) -> Optional[int]:
+        conn = self.db.get_connection()
+        try:
+            linha = conn.execute(f'SELECT id FROM {self.tabela} WHERE valor = ?', (valor,)).fetchone()
+        finally:
+            conn.close()
+        return linha[0] if linha else None
+
+    def estado(self) -> Dict:
+        with self._lock:
+            return {'em_cache': len(self._cache), 'maximo': self.maximo,
+                    'acertos': self.acertos, 'falhas': self.falhas}
+
+    def uso_memoria(self) -> Dict:
+        """Para o RegistroCaches (cache_registry.py)"""
+        with self._lock:
+            return {'bytes': self._bytes, 'entradas': len(self._cache), 'acertos': self.acertos,
+                    'falhas': self.falhas, 'remocoes': self.remocoes}
+
+    def reduzir(self, bytes_alvo: int) -> int:
+        liberados = 0
+        with self._lock:
+            while self._cache and liberados < bytes_alvo:
+                liberados += self._remover_mais_antigo()
+        return liberados
+
+    def reiniciar_apos_fork(self):
+        # Os IDs continuam válidos (estão no banco); só o lock é recriado
+        self._lock = threading.Lock()
+
+class ParticoesIPLogs:
+    def __init__(self, db, diretorio: str = None):
+        self.db = db
+        base = os.path.splitext(db.db_name)[0]
+        self.diretorio = diretorio or db.diretorio_particoes or os.getenv('IP_LOGS_DIR') or f'{base}_ip_logs'
+        self.meses_recentes = int(os.getenv('IP_LOGS_MESES_RECENTES', '2'))
+        self.lote_agregados = int(os.getenv('IP_ROLLUP_LOTE', '200'))
+        self.intervalo_agregados = float(os.getenv('IP_ROLLUP_SEGUNDOS', '10'))
+        maximo_lru = int(os.getenv('IP_DICIONARIO_LRU', '2048'))
+        self.user_agents = Dicionario(db, 'ip_user_agents', maximo_lru)
+        self.paths = Dicionario(db, 'ip_paths', maximo_lru)
+
+        self._lock = threading.Lock()
+        self._criadas = set()
+        self._contagens = {}   # (hora, rota, metodo, status) -> total
+        self._ips = {}         # (hora, ip) -> total
+        self._pendentes = 0
+        self._ultimo_flush = time.monotonic()
+
+    def reiniciar_apos_fork(self):
+        """No processo filho: descarta os agregados pendentes do pai (o pai grava os seus)"""
+        self._lock = threading.Lock()
+        self._contagens, self._ips, self._pendentes = {}, {}, 0
+        self._ultimo_flush = time.monotonic()
+        self.user_agents.reiniciar_apos_fork()
+        self.paths.reiniciar_apos_fork()
+
+    # Partições
+
+    def caminho(self, mes: str) -> str:
+        return os.path.join(self.diretorio, f'ip_logs_{mes}.db')
+
+    def listar(self) -> List[str]:
+        """Meses (AAAAMM) com partição, do mais recente para o mais antigo"""
+        if not os.path.isdir(self.diretorio):
+            return []
+        meses = [m.group(1) for m in map(_RE_PARTICAO.match, os.listdir(self.diretorio)) if m]
+        return sorted(meses, reverse=True)
+
+    def garantir(self, mes: str) -> str:
+        """Cria o arquivo e o esquema da partição na primeira escrita do processo"""
+        caminho = self.caminho(mes)
+        if mes not in self._criadas:
+            os.makedirs(self.diretorio, exist_ok=True)
+            conn = self.db.get_connection(caminho)
+            try:
+                self.db.ativar_wal(conn=conn)
+                conn.executescript(ESQUEMA_PARTICAO)
+            finally:
+                conn.close()
+            self._criadas.add(mes)
+        return caminho
+
+    def descartar(self, mes: str) -> bool:
+        """Remove a partição inteira (apaga o arquivo, sem DELETE linha a linha)"""
+        caminho = self.caminho(mes)
+        self._criadas.discard(mes)
+        removido = False
+        for sufixo in ('', '-wal', '-shm', '-journal'):
+            try:
+                os.remove(caminho + sufixo)
+                removido = True
+            except FileNotFoundError:
+                pass
+        if removido:
+            incrementar_geracao_local(self.db.db_name, ('ip_logs',))
+        return removido
+
+    def descartar_anteriores(self, limite_data: str) -> List[str]:
+        """Descarta os meses inteiramente anteriores a limite_data ('AAAA-MM-DD ...')"""
+        mes_limite = limite_data[:4] + limite_data[5:7]
+        descartados = [mes for mes in self.listar() if mes < mes_limite]
+        for mes in descartados:
+            self.descartar(mes)
+        return descartados
+
+    @contextmanager
+    def leitura(self, meses: int = None, timeout_ms: float = None):
+        """
+        Conexão somente leitura (pool do Database) com as partições recentes anexadas
+        (p_AAAAMM) e a view temporária ip_logs_recentes (união delas e do ip_logs legado)
+        Retorna (conexão, {esquema: SELECT da partição}), do mês mais recente ao mais antigo
+        """
+        arquivos = {f'p_{mes}': self.caminho(mes) for mes in self.listar()[:meses or self.meses_recentes]}
+        with self.db.leitura(timeout_ms, anexar=arquivos) as conn:
+            anexadas = {}
+            for esquema in arquivos:
+                colunas = [c[1] for c in conn.execute(f'PRAGMA {esquema}.table_info(ip_logs)').fetchall()]
+                anexadas[esquema] = consulta_particao(esquema, colunas)
+            legado = 'SELECT l.id, ' + ', '.join(f'l.{c}' for c in COLUNAS_LEGADO) + ', NULL FROM main.ip_logs l'
+            partes = list(anexadas.values()) + [legado]
+            # Criada dentro da transação de leitura: some no rollback ao devolver a conexão
+            conn.execute(f"CREATE TEMP VIEW ip_logs_recentes AS {' UNION ALL '.join(partes)}")
+            yield conn, anexadas
+
+    def expurgar_lote(self, limite_data: str, lote: int) -> int:
+        """Apaga um lote de linhas vencidas da partição mais antiga que ainda tenha dados"""
+        for mes in reversed(self.listar()):
+            if mes > limite_data[:4] + limite_data[5:7]:
+                break
+            with self.db.escrita(self.caminho(mes), invalidar=('ip_logs',)) as conn:
+                cursor = conn.execute('''
+                    DELETE FROM ip_logs WHERE rowid IN (
+                        SELECT rowid FROM ip_logs WHERE data_acesso < ? ORDER BY data_acesso LIMIT ?
+                    )
+                ''', (limite_data, lote))
+                if cursor.rowcount:
+                    return cursor.rowcount
+        return 0
+
+    def data_mais_antiga(self) -> Optional[str]:
+        for mes in reversed(self.listar()):
+            conn = self.db.get_connection(self.caminho(mes))
+            try:
+                data = conn.execute('SELECT MIN(data_acesso) FROM ip_logs').fetchone()[0]
+            finally:
+                conn.close()
+            if data:
+                return data
+        return None
+
+    def contar_expiradas(self, limite_data: str, maximo: int) -> int:
+        total = 0
+        for mes in reversed(self.listar()):
+            if mes > limite_data[:4] + limite_data[5:7] or total >= maximo:
+                break
+            conn = self.db.get_connection(self.caminho(mes))
+            try:
+                total += conn.execute('''
+                    SELECT COUNT(*) FROM (SELECT 1 FROM ip_logs WHERE data_acesso < ? LIMIT ?)
+                ''', (limite_data, maximo - total)).fetchone()[0]
+            finally:
+                conn.close()
+        return total
+
+    def estado(self) -> List[Dict]:
+        """Partições com tamanho em disco"""
+        return [{
+            'mes': mes,
+            'arquivo': self.caminho(mes),
+            'tamanho_bytes': os.path.getsize(self.caminho(mes))
+        } for mes in self.listar()]
+
+    # Escrita
+
+    def registrar(self, ip_address: str, user_agent: str = '', path: str = '', method: str = '',
+                  user_id: str = None, session_id: str = None, country: str = None, city: str = None,
+                  status: int = None, rota: str = None):
+        """Grava o acesso na partição do mês e soma nos agregados por hora; retorna a data gravada"""
+        data = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        caminho = self.garantir(data[:4] + data[5:7])
+        # IDs resolvidos antes de abrir a escrita na partição (não segura o lock dela)
+        user_agent_id, path_id = self.user_agents.id(user_agent), self.paths.id(path)
+        # Só a geração local sobe: as leituras de outros workers expiram pelo TTL curto
+        with self.db.escrita(caminho, invalidar=('ip_logs',)) as conn:
+            conn.execute('''
+                INSERT INTO ip_logs (ip_address, user_agent_id, path_id, method, user_id, session_id,
+                                     data_acesso, country, city, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (ip_address, user_agent_id, path_id, method, user_id,
+                  session_id, data, country, city, status))
+        self.agregar(data, ip_address, rota or path, method, status or 0)
+        return data
+
+    def agregar(self, data: str, ip_address: str, rota: str, metodo: str, status: int, total: int = 1):
+        """Soma o acesso nos agregados em memória e grava quando passar do lote/intervalo"""
+        hora = hora_de(data)
+        with self._lock:
+            chave = (hora, rota, metodo, status)
+            self._contagens[chave] = self._contagens.get(chave, 0) + total
+            chave_ip = (hora, ip_address)
+            self._ips[chave_ip] = self._ips.get(chave_ip, 0) + total
+            self._pendentes += total
+            gravar = (self._pendentes >= self.lote_agregados
+                      or time.monotonic() - self._ultimo_flush >= self.intervalo_agregados)
+        if gravar:
+            self.flush()
+
+    def flush(self):
+        """Grava os agregados pendentes no banco principal"""
+        with self._lock:
+            contagens, ips = self._contagens, self._ips
+            self._contagens, self._ips, self._pendentes = {}, {}, 0
+            self._ultimo_flush = time.monotonic()
+        if not contagens and not ips:
+            return
+        try:
+            self.db.somar_agregados_acesso(contagens, ips)
+        except Exception as e:
+            print(f"Error flushing access rollups: {e}")
+            with self._lock:
+                for chave, n in contagens.items():
+                    self._contagens[chave] = self._contagens.get(chave, 0) + n
+                for chave, n in ips.items():
+                    self._ips[chave] = self._ips.get(chave, 0) + n
+                self._pendentes += sum(contagens.values())
+
+    # Migração do ip_logs antigo (tabela única no banco principal)
+
+    def migrar_legado(self, lote: int = 2000, orcamento: float = 0.5) -> int:
+        """
+        Move lotes do ip_logs do banco principal para as partições (e para os agregados).
+        Deve rodar em um worker só (PurgadorRetencao segura o lease de manutenção);
+        mesmo assim cada lote é idempotente: a linha leva o id antigo em legado_id,
+        a inserção ignora o que já foi copiado e só as linhas inseridas entram nos
+        agregados. Um lote repetido (outro processo, queda antes do DELETE) não duplica.
+        """
+        inicio, movidas = time.perf_counter(), 0
+        while time.perf_counter() - inicio < orcamento:
+            conn = self.db.get_connection()
+            try:
+                linhas = conn.execute(f'''
+                    SELECT id, {', '.join(COLUNAS_LEGADO)} FROM ip_logs ORDER BY id LIMIT ?
+                ''', (lote,)).fetchall()
+            finally:
+                conn.close()
+            if not linhas:
+                break
+
+            por_mes = {}
+            for legado_id, ip, user_agent, path, method, user_id, session_id, data, country, city in linhas:
+                data = data or datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+                por_mes.setdefault(data[:4] + data[5:7], []).append((
+                    ip, self.user_agents.id(user_agent), self.paths.id(path), method, user_id,
+                    session_id, data, country, city, None, legado_id, path
+                ))
+            colunas = COLUNAS + ('legado_id',)
+            inseridas = []
+            for mes, registros in por_mes.items():
+                with self.db.escrita(self.garantir(mes), invalidar=('ip_logs',)) as destino:
+                    for registro in registros:
+                        cursor = destino.execute(f'''
+                            INSERT OR IGNORE INTO ip_logs ({', '.join(colunas)})
+                            VALUES ({', '.join('?' * len(colunas))})
+                        ''', registro[:-1])
+                        if cursor.rowcount:
+                            inseridas.append(registro)
+            for ip, _, _, method, _, _, data, _, _, _, _, path in inseridas:
+                self.agregar(data, ip, path, method, 0)
+            with self.db.escrita(invalidar=('ip_logs',)) as conn:
+                conn.execute('DELETE FROM ip_logs WHERE id <= ?', (linhas[-1][0],))
+            movidas += len(linhas)
+        return movidas
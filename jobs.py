@@ -0,0 +1,190 @@
+"""
+Execução em segundo plano das buscas que dependem de APIs externas lentas
+A rota devolve um ID na hora e o resultado é consultado em /api/jobs/<id>
+
+Com um banco (Database), o estado de cada job também é gravado na tabela jobs:
+a consulta pode cair em qualquer worker, não só no que executa o job.
+"""
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from cache_registry import tamanho_aproximado
+
+class JobManager:
+    def __init__(self, db=None, max_workers: int = None, max_pendentes: int = None, ttl: float = None):
+        # Estado compartilhado entre os workers (Database ou None: só em memória)
+        self.db = db
+        self.max_workers = max_workers or int(os.getenv('JOBS_MAX_WORKERS', '4'))
+        # Jobs aguardando ou executando; acima disso novos jobs são recusados
+        self.max_pendentes = max_pendentes or int(os.getenv('JOBS_MAX_PENDENTES', '32'))
+        # Tempo (segundos) que um job concluído fica disponível para consulta
+        self.ttl = ttl or float(os.getenv('JOBS_TTL_SEGUNDOS', '600'))
+        # Intervalo entre consultas ao banco ao aguardar um job de outro worker
+        self.intervalo_consulta = float(os.getenv('JOBS_INTERVALO_CONSULTA_MS', '500')) / 1000.0
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._eventos = {}
+        self._pendentes = 0
+        # Bytes aproximados do resultado de cada job concluído (orçamento de memória)
+        self._tamanhos = {}
+        self._removidos = 0
+        self._ultima_limpeza = time.monotonic()
+        self._ultima_limpeza_banco = self._ultima_limpeza
+
+    @property
+    def pendentes(self) -> int:
+        """Quantidade de jobs aguardando ou em execução"""
+        return self._pendentes
+
+    def submeter(self, tipo: str, funcao: Callable, *args, dono: str = None) -> Optional[str]:
+        """
+        Agenda funcao(*args) no pool; a função deve retornar (resultado, codigo_http)
+        Retorna o ID do job, ou None se a fila estiver cheia
+        """
+        self.limpar_expirados()
+
+        with self._lock:
+            if self._pendentes >= self.max_pendentes:
+                return None
+            self._pendentes += 1
+            job_id = secrets.token_urlsafe(16)
+            self._jobs[job_id] = {
+                'id': job_id,
+                'tipo': tipo,
+                'status': 'pendente',
+                'dono': dono,
+                'criado_em': time.time(),
+                'concluido_em': None,
+                'resultado': None,
+                'codigo': None
+            }
+            self._eventos[job_id] = threading.Event()
+            job = dict(self._jobs[job_id])
+
+        self._gravar(job)
+        self._executor.submit(self._executar, job_id, funcao, args)
+        return job_id
+
+    def _executar(self, job_id: str, funcao: Callable, args):
+        """Executa o job e guarda o resultado"""
+        with self._lock:
+            self._jobs[job_id]['status'] = 'executando'
+            job = dict(self._jobs[job_id])
+        self._gravar(job)
+
+        try:
+            resultado, codigo = funcao(*args)
+            status = 'concluido'
+        except Exception as e:
+            resultado, codigo = {'erro': str(e)}, 500
+            status = 'erro'
+        tamanho = tamanho_aproximado(resultado)
+
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = status
+            job['resultado'] = resultado
+            job['codigo'] = codigo
+            job['concluido_em'] = time.time()
+            self._tamanhos[job_id] = tamanho
+            self._pendentes -= 1
+            evento = self._eventos.pop(job_id, None)
+            job = dict(job)
+
+        self._gravar(job)
+        if evento:
+            evento.set()
+
+    def _gravar(self, job: Dict):
+        if self.db is None:
+            return
+        try:
+            self.db.gravar_job(job)
+        except Exception as e:
+            # O job continua consultável neste worker
+            print(f"Erro ao gravar job {job['id']}: {e}")
+
+    def obter(self, job_id: str) -> Optional[Dict]:
+        """Retorna uma cópia do job (None se não existir ou tiver expirado); de outro worker, pelo banco"""
+        self.limpar_expirados()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        if self.db is None:
+            return None
+        job = self.db.obter_job(job_id)
+        if job and job['concluido_em'] is not None and job['concluido_em'] < time.time() - self.ttl:
+            return None
+        return job
+
+    def aguardar(self, job_id: str, timeout: float) -> bool:
+        """Espera o job terminar; retorna True se já concluiu"""
+        with self._lock:
+            evento = self._eventos.get(job_id)
+            local = job_id in self._jobs
+        if evento is not None:
+            return evento.wait(timeout)
+        if local or self.db is None:
+            return local
+        # Job de outro worker: consulta o banco até concluir ou acabar o tempo
+        limite = time.monotonic() + timeout
+        while True:
+            job = self.obter(job_id)
+            if job is None or job['concluido_em'] is not None:
+                return job is not None
+            if time.monotonic() >= limite:
+                return False
+            time.sleep(min(self.intervalo_consulta, max(0.0, limite - time.monotonic())))
+
+    def limpar_expirados(self, forcar: bool = False):
+        """Remove jobs concluídos há mais tempo que o TTL"""
+        agora = time.monotonic()
+        # Varredura no máximo uma vez por segundo
+        if not forcar and agora - self._ultima_limpeza < 1:
+            return
+        self._ultima_limpeza = agora
+
+        limite = time.time() - self.ttl
+        with self._lock:
+            expirados = [job_id for job_id, job in self._jobs.items()
+                         if job['concluido_em'] is not None and job['concluido_em'] < limite]
+            for job_id in expirados:
+                del self._jobs[job_id]
+                self._tamanhos.pop(job_id, None)
+        # No banco (uma escrita), no máximo uma vez por minuto
+        if self.db is not None and (forcar or agora - self._ultima_limpeza_banco >= 60):
+            self._ultima_limpeza_banco = agora
+            try:
+                self.db.expurgar_jobs(limite)
+            except Exception as e:
+                print(f"Erro ao expurgar jobs: {e}")
+
+    def uso_memoria(self) -> Dict:
+        """Resultados guardados, para o RegistroCaches (cache_registry.py)"""
+        with self._lock:
+            return {'bytes': sum(self._tamanhos.values()), 'entradas': len(self._jobs),
+                    'remocoes': self._removidos}
+
+    def reduzir(self, bytes_alvo: int) -> int:
+        """
+        Descarta da memória os jobs concluídos há mais tempo antes do TTL (com
+        banco, a consulta passa a ler a tabela jobs; sem, passa a dar 404)
+        """
+        liberados = 0
+        with self._lock:
+            concluidos = sorted((job['concluido_em'], job_id) for job_id, job in self._jobs.items()
+                                if job['concluido_em'] is not None)
+            for _, job_id in concluidos:
+                if liberados >= bytes_alvo:
+                    break
+                del self._jobs[job_id]
+                liberados += self._tamanhos.pop(job_id, 0)
+                self._removidos += 1
+        return liberados
@@ -0,0 +1,259 @@
+"""
+Manutenção do banco em segundo plano: checkpoint do WAL, PRAGMA optimize,
+ANALYZE e verificação de integridade, cada uma no seu intervalo. Todo worker
+tem a thread, mas só o que segura o lease 'manutencao' (linha na tabela
+leases, renovada a cada volta) executa as tarefas. As tarefas esperam a carga
+baixar; cada execução fica gravada em manutencao_execucoes.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from database import Database, SQLITE_WAL
+from ip_logs import obter_particoes
+
+# Intervalo padrão de cada tarefa (MANUTENCAO_<TAREFA>_INTERVALO_SEGUNDOS; 0 = desativada)
+INTERVALOS_PADRAO = {
+    'checkpoint': 300,
+    'otimizar': 3600,
+    'analisar': 86400,
+    'integridade': 86400
+}
+
+LEASE = 'manutencao'
+# Validade do lease sem renovação (worker morto ou travado), a mesma para a
+# manutenção e para a retenção: acima da volta e do tempo de um ciclo
+DURACAO_LEASE = float(os.getenv('MANUTENCAO_LEASE_SEGUNDOS', '180'))
+
+def dono_processo() -> str:
+    """Dono do lease para este processo (calculado a cada uso: depois do fork o pid é outro)"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+class AgendadorManutencao:
+    def __init__(self, db: Database, carga: Callable[[], int] = None, intervalos: Dict[str, int] = None):
+        self.db = db
+        # Requisições/escritas em andamento neste worker
+        self.carga = carga
+        self.intervalos = {
+            tarefa: int(os.getenv(f'MANUTENCAO_{tarefa.upper()}_INTERVALO_SEGUNDOS', str(segundos)))
+            for tarefa, segundos in INTERVALOS_PADRAO.items()
+        }
+        if intervalos:
+            self.intervalos.update(intervalos)
+        self.volta = float(os.getenv('MANUTENCAO_VOLTA_SEGUNDOS', '60'))
+        self.carga_max = int(os.getenv('MANUTENCAO_CARGA_MAX', '2'))
+        # Acima deste tamanho o checkpoint roda mesmo com carga alta
+        self.wal_max = float(os.getenv('MANUTENCAO_WAL_MAX_MB', '64')) * 1024 * 1024
+        # Linhas amostradas por índice no ANALYZE (0 = todas)
+        self.analysis_limit = int(os.getenv('MANUTENCAO_ANALYSIS_LIMIT', '1000'))
+        self.integridade_completa = os.getenv('MANUTENCAO_INTEGRIDADE_COMPLETA', 'True').lower() == 'true'
+
+        self._tarefas = {
+            'checkpoint': self._checkpoint,
+            'otimizar': self._otimizar,
+            'analisar': self._analisar,
+            'integridade': self._integridade
+        }
+        self._lock = threading.Lock()
+        self._executando = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._adiamentos = {tarefa: 0 for tarefa in self._tarefas}
+        self._ultima_contencao = Database.contencao()['repeticoes']
+        self._lider = False
+
+    @property
+    def dono(self) -> str:
+        return dono_processo()
+
+    def iniciar(self):
+        """Inicia a thread do agendador (uma por processo; só o líder executa)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='manutencao', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._lider:
+            try:
+                self.db.liberar_lease(LEASE, self.dono)
+            except Exception:
+                pass
+            self._lider = False
+
+    def _loop(self):
+        while not self._parar.wait(self.volta):
+            try:
+                self.executar_ciclo()
+            except Exception as e:
+                print(f"Erro no agendador de manutenção: {e}")
+
+    # Eleição e carga
+
+    def _renovar_lease(self) -> bool:
+        self._lider = self.db.adquirir_lease(LEASE, self.dono, DURACAO_LEASE)
+        return self._lider
+
+    def carga_baixa(self) -> bool:
+        """Poucas requisições neste worker e nenhuma disputa pelo banco desde a última volta"""
+        repeticoes = Database.contencao()['repeticoes']
+        disputa = repeticoes > self._ultima_contencao
+        self._ultima_contencao = repeticoes
+        try:
+            local = self.carga() if self.carga else 0
+        except Exception:
+            local = 0
+        return not disputa and local <= self.carga_max
+
+    def tamanho_wal(self) -> int:
+        try:
+            return os.path.getsize(self.db.db_name + '-wal')
+        except OSError:
+            return 0
+
+    def pendentes(self) -> List[str]:
+        """Tarefas cujo intervalo já passou desde a última execução (de qualquer worker)"""
+        ultimas = self.db.ultimas_manutencoes()
+        agora = datetime.utcnow()
+        vencidas = []
+        for tarefa, intervalo in self.intervalos.items():
+            if intervalo <= 0:
+                continue
+            if tarefa == 'checkpoint' and (not SQLITE_WAL or self.db.em_memoria):
+                continue
+            ultima = ultimas.get(tarefa)
+            if not ultima or (agora - datetime.strptime(ultima, FORMATO_DATA)).total_seconds() >= intervalo:
+                vencidas.append(tarefa)
+        return vencidas
+
+    def executar_ciclo(self) -> Dict:
+        """Uma volta: renova o lease e, se for o líder, executa as tarefas vencidas"""
+        if not self._renovar_lease():
+            return {'lider': False, 'executadas': {}}
+        carga_baixa = self.carga_baixa()
+        executadas = {}
+        for tarefa in self.pendentes():
+            if self._parar.is_set():
+                break
+            urgente = tarefa == 'checkpoint' and self.tamanho_wal() > self.wal_max
+            if not carga_baixa and not urgente:
+                with self._lock:
+                    self._adiamentos[tarefa] += 1
+                continue
+            executadas[tarefa] = self.executar(tarefa)
+            if not self._renovar_lease():
+                break
+        return {'lider': True, 'carga_baixa': carga_baixa, 'executadas': executadas}
+
+    # Tarefas
+
+    def executar(self, tarefa: str) -> Dict:
+        """Executa uma tarefa agora (sem olhar carga nem lease) e grava o resultado"""
+        if tarefa not in self._tarefas:
+            raise ValueError(f'Unknown maintenance task: {tarefa}')
+        with self._executando:
+            inicio = datetime.utcnow().strftime(FORMATO_DATA)
+            t0 = time.perf_counter()
+            try:
+                detalhe = self._tarefas[tarefa]()
+                sucesso = detalhe.pop('sucesso', True)
+            except Exception as e:
+                detalhe, sucesso = {'erro': str(e)}, False
+            duracao_ms = round((time.perf_counter() - t0) * 1000, 1)
+            self.db.registrar_manutencao(tarefa, inicio, duracao_ms, sucesso,
+                                         json.dumps(detalhe, ensure_ascii=False), self.dono)
+        if not sucesso:
+            print(f"Manutenção '{tarefa}' falhou: {detalhe}")
+        return {'inicio': inicio, 'duracao_ms': duracao_ms, 'sucesso': sucesso, 'detalhe': detalhe}
+
+    def _arquivos(self) -> List[str]:
+        """Banco principal e partições do log de acessos"""
+        particoes = obter_particoes(self.db)
+        return [self.db.db_name] + [particoes.caminho(mes) for mes in particoes.listar()]
+
+    def _checkpoint(self) -> Dict:
+        """
+        TRUNCATE zera o WAL, mas precisa que nenhum leitor esteja no meio dele;
+        sem esperar (busy_timeout 0): se não der, faz o PASSIVE, que copia o
+        que puder sem bloquear ninguém
+        """
+        arquivos = {}
+        for caminho in self._arquivos():
+            conn = self.db.get_connection(caminho)
+            try:
+                conn.execute('PRAGMA busy_timeout = 0')
+                modo = 'TRUNCATE'
+                ocupado, paginas_wal, copiadas = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+                if ocupado:
+                    modo = 'PASSIVE'
+                    ocupado, paginas_wal, copiadas = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            finally:
+                conn.close()
+            arquivos[os.path.basename(caminho)] = {'modo': modo, 'paginas_wal': paginas_wal, 'copiadas': copiadas}
+        return {'arquivos': arquivos, 'wal_bytes': self.tamanho_wal()}
+
+    def _otimizar(self) -> Dict:
+        """PRAGMA optimize em todas as tabelas (0x10000: não só as usadas nesta conexão)"""
+        for caminho in self._arquivos():
+            with self.db.escrita(caminho) as conn:
+                conn.execute('PRAGMA analysis_limit = 400')
+                conn.execute('PRAGMA optimize = 0x10002')
+        return {'arquivos': len(self._arquivos())}
+
+    def _analisar(self) -> Dict:
+        """ANALYZE do banco principal (amostrado por analysis_limit)"""
+        with self.db.escrita() as conn:
+            conn.execute(f'PRAGMA analysis_limit = {self.analysis_limit}')
+            conn.execute('ANALYZE')
+            estatisticas = conn.execute('SELECT COUNT(*) FROM sqlite_stat1').fetchone()[0]
+        return {'indices_analisados': estatisticas, 'analysis_limit': self.analysis_limit}
+
+    def _integridade(self) -> Dict:
+        """integrity_check (ou quick_check) numa conexão somente leitura: não bloqueia as escritas com WAL"""
+        pragma = 'integrity_check(100)' if self.integridade_completa else 'quick_check(100)'
+        conn = self.db.pool_leitura.abrir()
+        try:
+            # Interrompe se o agendador for parado no meio (banco grande)
+            conn.set_progress_handler(lambda: self._parar.is_set(), 100000)
+            resultado = [linha[0] for linha in conn.execute(f'PRAGMA {pragma}').fetchall()]
+        finally:
+            conn.close()
+        return {'sucesso': resultado == ['ok'], 'verificacao': pragma.split('(')[0], 'resultado': resultado}
+
+    def estado(self) -> Dict:
+        """Líder atual, tarefas com última execução e próximas, e execuções recentes"""
+        ultimas = self.db.ultimas_manutencoes()
+        agora = datetime.utcnow()
+        tarefas = {}
+        with self._lock:
+            adiamentos = dict(self._adiamentos)
+        for tarefa, intervalo in self.intervalos.items():
+            ultima = ultimas.get(tarefa)
+            proxima = None
+            if intervalo > 0:
+                decorrido = (agora - datetime.strptime(ultima, FORMATO_DATA)).total_seconds() if ultima else intervalo
+                proxima = max(0.0, intervalo - decorrido)
+            tarefas[tarefa] = {
+                'intervalo_segundos': intervalo,
+                'ultima_execucao': ultima,
+                'proxima_em_segundos': proxima,
+                'adiamentos': adiamentos[tarefa]
+            }
+        return {
+            'ativo': bool(self._thread and self._thread.is_alive()),
+            'lider': self.db.obter_lease(LEASE),
+            'este_processo': self.dono,
+            'volta_segundos': self.volta,
+            'carga_max': self.carga_max,
+            'wal_bytes': self.tamanho_wal(),
+            'tarefas': tarefas,
+            'execucoes': self.db.historico_manutencao(20)
+        }
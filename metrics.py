@@ -0,0 +1,279 @@
+"""
+Métricas do processo: latência por rota, tempo de cada etapa da requisição
+(SQLite, APIs externas, geração OSINT, serialização), gauges e acertos de cache.
+Exportadas no formato texto do Prometheus.
+
+Os tempos de etapa são exclusivos: o tempo de uma etapa aninhada (ex: SQLite
+dentro da geração OSINT) é descontado da etapa externa, e o que não pertence a
+nenhuma etapa fica em 'outros'.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = object
+
+ETAPAS = ('sqlite', 'upstream', 'osint', 'serializacao')
+
+# Limites (em segundos) dos buckets do histograma de latência
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+
+# Etapas abertas agora, em qualquer thread do processo (dentro ou fora de uma
+# requisição medida): base das sondas de saturação, como chamadas a APIs
+# externas em andamento (ver em_andamento)
+_abertas = {}
+_abertas_lock = threading.Lock()
+
+class Histograma:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+    def acumulado(self) -> List[int]:
+        """Contagens cumulativas por bucket (formato do Prometheus)"""
+        resultado, soma = [], 0
+        for n in self.contagens:
+            soma += n
+            resultado.append(soma)
+        return resultado
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _rotulos(**rotulos) -> str:
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in rotulos.items()) + '}'
+
+@contextmanager
+def aberta(nome: str):
+    """Conta a etapa `nome` como aberta enquanto durar o bloco (sem medir tempo; serve a código assíncrono)"""
+    with _abertas_lock:
+        _abertas[nome] = _abertas.get(nome, 0) + 1
+    try:
+        yield
+    finally:
+        with _abertas_lock:
+            _abertas[nome] -= 1
+
+def em_andamento(nome: str) -> int:
+    """Quantas etapas `nome` estão abertas agora no processo"""
+    return _abertas.get(nome, 0)
+
+@contextmanager
+def etapa(nome: str):
+    """
+    Mede o tempo exclusivo de uma etapa da requisição atual
+    Pode ser usado como `with etapa('upstream'):` ou como decorator `@etapa('osint')`
+    Fora de uma requisição medida só conta a etapa como aberta (em_andamento)
+    """
+    pilha = getattr(_local, 'pilha', None)
+    with aberta(nome):
+        if pilha is None:
+            yield
+            return
+        quadro = [nome, time.perf_counter(), 0.0]  # nome, início, tempo das etapas internas
+        pilha.append(quadro)
+        try:
+            yield
+        finally:
+            pilha.pop()
+            registrar_tempo(nome, time.perf_counter() - quadro[1], _descontar=quadro[2])
+
+def registrar_tempo(nome: str, duracao: float, _descontar: float = 0.0):
+    """
+    Soma `duracao` à etapa `nome` da requisição atual e desconta esse tempo da
+    etapa externa aberta (para medições feitas fora de `etapa()`, como as do SQLite)
+    """
+    pilha = getattr(_local, 'pilha', None)
+    if pilha is None:
+        return
+    _local.etapas[nome] = _local.etapas.get(nome, 0.0) + duracao - _descontar
+    if pilha:
+        pilha[-1][2] += duracao
+
+def observar_sql(sql: str, duracao: float, execucao: bool):
+    """Observador do Database: conta o tempo do SQLite na etapa 'sqlite'"""
+    registrar_tempo('sqlite', duracao)
+
+class Metricas:
+    def __init__(self, limite_lenta_ms: float = None, max_lentas: int = None):
+        self.limite_lenta = (limite_lenta_ms if limite_lenta_ms is not None
+                             else float(os.getenv('METRICS_LIMITE_LENTA_MS', '1000'))) / 1000.0
+        self.lentas = deque(maxlen=max_lentas or int(os.getenv('METRICS_MAX_LENTAS', '200')))
+        self._lock = threading.Lock()
+        self._latencias = {}      # (rota, metodo) -> Histograma
+        self._requisicoes = {}    # (rota, metodo, status) -> total
+        self._etapas = {}         # (rota, etapa) -> segundos
+        self._cache = {}          # (cache, 'acerto'|'falha') -> total
+        self._gauges = {}
+        self._em_andamento = 0
+        self._total_lentas = 0
+
+    def iniciar_requisicao(self):
+        """Abre a medição da requisição na thread atual"""
+        _local.inicio = time.perf_counter()
+        _local.pilha = []
+        _local.etapas = {}
+        with self._lock:
+            self._em_andamento += 1
+
+    def finalizar_requisicao(self, rota: str, metodo: str, status: int, caminho: str = ''):
+        """Fecha a medição da requisição atual e registra latência e etapas"""
+        inicio = getattr(_local, 'inicio', None)
+        if inicio is None:
+            return
+        duracao = time.perf_counter() - inicio
+        etapas = _local.etapas
+        _local.inicio = _local.pilha = _local.etapas = None
+        with self._lock:
+            self._em_andamento -= 1
+        self.registrar_requisicao(rota, metodo, status, duracao, etapas, caminho)
+
+    def registrar_requisicao(self, rota: str, metodo: str, status: int, duracao: float,
+                             etapas: Dict[str, float] = None, caminho: str = ''):
+        """
+        Registra uma requisição já medida (usado diretamente pelo ASGI, onde as
+        requisições se alternam na mesma thread); o tempo fora das etapas vai para 'outros'
+        """
+        etapas = dict(etapas or {})
+        etapas['outros'] = max(0.0, duracao - sum(etapas.values()))
+
+        with self._lock:
+            chave = (rota, metodo)
+            if chave not in self._latencias:
+                self._latencias[chave] = Histograma()
+            self._latencias[chave].observar(duracao)
+            chave_status = (rota, metodo, status)
+            self._requisicoes[chave_status] = self._requisicoes.get(chave_status, 0) + 1
+            for nome, segundos in etapas.items():
+                self._etapas[(rota, nome)] = self._etapas.get((rota, nome), 0.0) + segundos
+            lenta = duracao >= self.limite_lenta
+            if lenta:
+                self._total_lentas += 1
+
+        if lenta:
+            registro = {
+                'data': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+                'rota': rota,
+                'caminho': caminho,
+                'metodo': metodo,
+                'status': status,
+                'duracao_ms': round(duracao * 1000, 2),
+                'etapas_ms': {nome: round(s * 1000, 2) for nome, s in etapas.items()}
+            }
+            self.lentas.append(registro)
+            detalhes = ' '.join(f'{nome}={ms}ms' for nome, ms in registro['etapas_ms'].items())
+            print(f"Requisição lenta: {metodo} {caminho} {status} {registro['duracao_ms']}ms ({detalhes})")
+
+    def contar_cache(self, cache: str, acerto: bool):
+        """Registra uma consulta a um cache (para a taxa de acertos)"""
+        chave = (cache, 'acerto' if acerto else 'falha')
+        with self._lock:
+            self._cache[chave] = self._cache.get(chave, 0) + 1
+
+    def registrar_gauge(self, nome: str, ajuda: str, funcao: Callable, rotulo: Optional[str] = None,
+                        tipo: str = 'gauge'):
+        """
+        Valor lido na hora da exportação. `funcao` retorna um número ou, com `rotulo`,
+        um dict {valor_do_rotulo: número}. Use tipo='counter' para totais acumulados
+        """
+        self._gauges[nome] = {'ajuda': ajuda, 'funcao': funcao, 'rotulo': rotulo, 'tipo': tipo}
+
+    def requisicoes_lentas(self, limite: int = 50) -> List[Dict]:
+        """Requisições lentas mais recentes primeiro"""
+        return list(self.lentas)[::-1][:limite]
+
+    def exportar(self) -> str:
+        """Todas as métricas no formato texto do Prometheus"""
+        linhas = []
+        with self._lock:
+            latencias = {k: (h.acumulado(), h.soma, h.total) for k, h in self._latencias.items()}
+            requisicoes = dict(self._requisicoes)
+            etapas = dict(self._etapas)
+            cache = dict(self._cache)
+            em_andamento = self._em_andamento
+            total_lentas = self._total_lentas
+
+        linhas.append('# HELP painel_requisicao_segundos Latência das requisições por rota')
+        linhas.append('# TYPE painel_requisicao_segundos histogram')
+        for (rota, metodo), (acumulado, soma, total) in sorted(latencias.items()):
+            for limite, n in zip(BUCKETS, acumulado):
+                linhas.append(f'painel_requisicao_segundos_bucket{_rotulos(rota=rota, metodo=metodo, le=limite)} {n}')
+            linhas.append(f'painel_requisicao_segundos_bucket{_rotulos(rota=rota, metodo=metodo, le="+Inf")} {total}')
+            linhas.append(f'painel_requisicao_segundos_sum{_rotulos(rota=rota, metodo=metodo)} {soma:.6f}')
+            linhas.append(f'painel_requisicao_segundos_count{_rotulos(rota=rota, metodo=metodo)} {total}')
+
+        linhas.append('# HELP painel_requisicoes_total Requisições por rota e status HTTP')
+        linhas.append('# TYPE painel_requisicoes_total counter')
+        for (rota, metodo, status), n in sorted(requisicoes.items()):
+            linhas.append(f'painel_requisicoes_total{_rotulos(rota=rota, metodo=metodo, status=status)} {n}')
+
+        linhas.append('# HELP painel_etapa_segundos_total Tempo exclusivo gasto em cada etapa, por rota')
+        linhas.append('# TYPE painel_etapa_segundos_total counter')
+        for (rota, nome), segundos in sorted(etapas.items()):
+            linhas.append(f'painel_etapa_segundos_total{_rotulos(rota=rota, etapa=nome)} {segundos:.6f}')
+
+        linhas.append('# HELP painel_requisicoes_em_andamento Requisições sendo atendidas neste processo')
+        linhas.append('# TYPE painel_requisicoes_em_andamento gauge')
+        linhas.append(f'painel_requisicoes_em_andamento {em_andamento}')
+
+        linhas.append('# HELP painel_requisicoes_lentas_total Requisições acima do limite de lentidão')
+        linhas.append('# TYPE painel_requisicoes_lentas_total counter')
+        linhas.append(f'painel_requisicoes_lentas_total {total_lentas}')
+
+        linhas.append('# HELP painel_cache_consultas_total Consultas aos caches por resultado')
+        linhas.append('# TYPE painel_cache_consultas_total counter')
+        for (nome, resultado), n in sorted(cache.items()):
+            linhas.append(f'painel_cache_consultas_total{_rotulos(cache=nome, resultado=resultado)} {n}')
+
+        for nome, gauge in self._gauges.items():
+            try:
+                valor = gauge['funcao']()
+            except Exception:
+                continue
+            metrica = f'painel_{nome}'
+            linhas.append(f"# HELP {metrica} {gauge['ajuda']}")
+            linhas.append(f"# TYPE {metrica} {gauge['tipo']}")
+            if isinstance(valor, dict):
+                for chave, n in sorted(valor.items(), key=lambda item: str(item[0])):
+                    linhas.append(f"{metrica}{_rotulos(**{gauge['rotulo'] or 'chave': chave})} {n}")
+            else:
+                linhas.append(f'{metrica} {valor}')
+
+        return '\n'.join(linhas) + '\n'
+
+class ProvedorJSONMedido(DefaultJSONProvider):
+    """Provedor JSON do Flask que conta o tempo de jsonify na etapa 'serializacao'"""
+    def response(self, *args, **kwargs):
+        with etapa('serializacao'):
+            # Objetos que já geram o próprio JSON (osint_results.Resultado) não passam pelo encoder
+            if len(args) == 1 and not kwargs and hasattr(args[0], 'para_json'):
+                return self._app.response_class(f'{args[0].para_json()}\n', mimetype=self.mimetype)
+            return super().response(*args, **kwargs)
+
+    @staticmethod
+    def default(o):
+        # Resultado ou Fonte dentro de outra estrutura: no formato de dict antigo
+        if hasattr(o, 'como_dict'):
+            return o.como_dict()
+        return DefaultJSONProvider.default(o)
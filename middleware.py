@@ -16,12 +16,13 @@ def get_client_ip():
         ip = request.remote_addr
     return ip
 
-def log_request():
-    """Registra o acesso no banco de dados"""
+def log_request(status: int = None):
+    """Registra o acesso no banco de dados (chamado após a resposta, com o status)"""
     try:
-        # Ignorar requisições estáticas, API admin e login
+        # Ignorar requisições estáticas, API admin, métricas e login
         if (request.path.startswith('/static/') or 
             request.path.startswith('/api/admin/') or 
+            request.path == '/metrics' or
             request.path == '/login' or
             request.path.startswith('/api/auth/')):
             return
@@ -45,7 +46,9 @@ def log_request():
             path=path,
             method=method,
             user_id=user_id,
-            session_id=session_id
+            session_id=session_id,
+            status=status,
+            rota=request.url_rule.rule if request.url_rule else 'nao_encontrada'
         )
     except Exception as e:
         print(f"Error logging request: {e}")
@@ -67,33 +70,39 @@ def is_admin(user_email: str = None) -> bool:
     
     return False
 
-def has_permission(user_email: str, required_permission: str) -> bool:
-    """Verifica se o usuário tem a permissão necessária"""
+# Hierarquia de permissões
+NIVEIS_PERMISSAO = {
+    'user': 0,
+    'member': 1,
+    'moderator': 2,
+    'admin': 3
+}
+
+def obter_permissao(user_email: str = None) -> str:
+    """Obtém a permissão atual do usuário no banco (None se não existir)"""
     if not user_email:
         user = get_user_from_session()
         if not user:
-            return False
+            return None
         user_email = user.get('email')
     
     if not user_email:
-        return False
+        return None
     
     usuario = db.obter_usuario_por_email(user_email)
     if not usuario:
-        return False
+        return None
     
-    permissao = usuario.get('permissao', 'user')
-    
-    # Hierarquia de permissões
-    permissoes = {
-        'user': 0,
-        'member': 1,
-        'moderator': 2,
-        'admin': 3
-    }
+    return usuario.get('permissao', 'user')
+
+def has_permission(user_email: str, required_permission: str) -> bool:
+    """Verifica se o usuário tem a permissão necessária"""
+    permissao = obter_permissao(user_email)
+    if not permissao:
+        return False
     
-    user_level = permissoes.get(permissao, 0)
-    required_level = permissoes.get(required_permission, 0)
+    user_level = NIVEIS_PERMISSAO.get(permissao, 0)
+    required_level = NIVEIS_PERMISSAO.get(required_permission, 0)
     
     return user_level >= required_level
 
@@ -0,0 +1,163 @@
+"""
+Resultados das buscas OSINT que só geram links (nome, processo, foto, email,
+telefone, username, domínio/IP, veículo, endereço) em objetos compactos.
+
+O catálogo de cada busca é uma tupla de ModeloFonte criada uma vez, com os
+textos e URLs como modelos de str.format; a busca só preenche os modelos.
+Entradas sem nada a preencher viram uma única Fonte, reaproveitada em toda
+busca (Fonte e Resultado são imutáveis). Os links não são mais uma lista
+paralela: saem das fontes com URL na hora de gerar o JSON.
+
+O JSON é escrito direto dos objetos, sem montar dicts no caminho, e fica
+guardado no Resultado: a mesma string vai para o banco e para a resposta.
+Para quem já usava o formato antigo, Fonte e Resultado também se comportam
+como dicts somente leitura (resultado['fontes'], fonte.get('url')...) e
+como_dict() devolve o dict antigo, que pode ser alterado.
+"""
+import json
+from collections.abc import Mapping
+from json.encoder import encode_basestring
+from string import Formatter
+from typing import Dict, Iterable, Optional, Tuple
+
+CAMPOS_FONTE = ('nome', 'resultado', 'url', 'tipo')
+
+# Mesmo que json.dumps(texto, ensure_ascii=False), sem passar pelo encoder inteiro
+_texto = encode_basestring
+
+def _imutavel(self, nome, valor):
+    raise AttributeError(f'{type(self).__name__} é imutável')
+
+class Fonte(Mapping):
+    """Uma fonte do resultado; campos None (url, tipo) ficam de fora do JSON e do dict"""
+    __slots__ = CAMPOS_FONTE + ('_json',)
+
+    def __init__(self, nome: str, resultado: str, url: Optional[str] = None, tipo: Optional[str] = None):
+        definir = object.__setattr__
+        definir(self, 'nome', nome)
+        definir(self, 'resultado', resultado)
+        definir(self, 'url', url)
+        definir(self, 'tipo', tipo)
+        definir(self, '_json', None)
+
+    __setattr__ = _imutavel
+    __delattr__ = _imutavel
+
+    def __getitem__(self, chave: str):
+        if chave in CAMPOS_FONTE:
+            valor = getattr(self, chave)
+            if valor is not None:
+                return valor
+        raise KeyError(chave)
+
+    def __iter__(self):
+        return (campo for campo in CAMPOS_FONTE if getattr(self, campo) is not None)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'Fonte({self.nome!r}, url={self.url!r})'
+
+    def para_json(self) -> str:
+        if self._json is None:
+            texto = f'{{"nome": {_texto(self.nome)}, "resultado": {_texto(self.resultado)}'
+            if self.url is not None:
+                texto += f', "url": {_texto(self.url)}'
+            if self.tipo is not None:
+                texto += f', "tipo": {_texto(self.tipo)}'
+            object.__setattr__(self, '_json', texto + '}')
+        return self._json
+
+    def como_dict(self) -> Dict:
+        return {campo: getattr(self, campo) for campo in self}
+
+class ModeloFonte:
+    """Entrada do catálogo: textos com campos de str.format preenchidos a cada busca"""
+    __slots__ = ('nome', 'resultado', 'url', 'tipo', '_fixa')
+
+    def __init__(self, nome: str, resultado: str, url: Optional[str] = None, tipo: Optional[str] = 'link'):
+        self.nome = nome
+        self.resultado = resultado
+        self.url = url
+        self.tipo = tipo
+        # Sem campos a preencher: a mesma Fonte serve para todas as buscas
+        fixa = not _tem_campos(resultado) and not (url and _tem_campos(url))
+        self._fixa = Fonte(nome, resultado, url, tipo) if fixa else None
+
+    def criar(self, valores: Dict[str, str]) -> Fonte:
+        if self._fixa is not None:
+            return self._fixa
+        return Fonte(self.nome, self.resultado.format_map(valores),
+                     self.url.format_map(valores) if self.url else None, self.tipo)
+
+def _tem_campos(modelo: str) -> bool:
+    return any(campo is not None for _, campo, _, _ in Formatter().parse(modelo))
+
+def criar_fontes(catalogo: Iterable[ModeloFonte], valores: Dict[str, str]) -> Tuple[Fonte, ...]:
+    return tuple(modelo.criar(valores) for modelo in catalogo)
+
+class Resultado(Mapping):
+    """
+    Resultado de uma busca: os campos próprios do tipo (na ordem dada), depois
+    'fontes' e, com com_links, 'links' (nome e URL de cada fonte com URL)
+    """
+    __slots__ = ('campos', 'fontes', 'com_links', '_json')
+
+    def __init__(self, campos: Tuple[Tuple[str, object], ...], fontes: Tuple[Fonte, ...], com_links: bool = True):
+        definir = object.__setattr__
+        definir(self, 'campos', campos)
+        definir(self, 'fontes', fontes)
+        definir(self, 'com_links', com_links)
+        definir(self, '_json', None)
+
+    __setattr__ = _imutavel
+    __delattr__ = _imutavel
+
+    def __getitem__(self, chave: str):
+        if chave == 'fontes':
+            return self.fontes
+        if chave == 'links' and self.com_links:
+            return self.links
+        for campo, valor in self.campos:
+            if campo == chave:
+                return valor
+        raise KeyError(chave)
+
+    def __iter__(self):
+        for campo, _ in self.campos:
+            yield campo
+        yield 'fontes'
+        if self.com_links:
+            yield 'links'
+
+    def __len__(self) -> int:
+        return len(self.campos) + 1 + self.com_links
+
+    def __repr__(self) -> str:
+        return f'Resultado({dict(self.campos)!r}, fontes={len(self.fontes)})'
+
+    @property
+    def links(self) -> Tuple[Dict, ...]:
+        """Formato antigo da lista de links (montado só quando alguém pede)"""
+        return tuple({'nome': fonte.nome, 'url': fonte.url} for fonte in self.fontes if fonte.url)
+
+    def para_json(self) -> str:
+        """JSON do resultado (ensure_ascii=False), gerado uma vez"""
+        if self._json is None:
+            partes = [f'{_texto(campo)}: {json.dumps(valor, ensure_ascii=False)}' for campo, valor in self.campos]
+            partes.append('"fontes": [' + ', '.join(fonte.para_json() for fonte in self.fontes) + ']')
+            if self.com_links:
+                links = (f'{{"nome": {_texto(fonte.nome)}, "url": {_texto(fonte.url)}}}'
+                         for fonte in self.fontes if fonte.url)
+                partes.append('"links": [' + ', '.join(links) + ']')
+            object.__setattr__(self, '_json', '{' + ', '.join(partes) + '}')
+        return self._json
+
+    def como_dict(self) -> Dict:
+        """O dict do formato antigo (cópia que pode ser alterada)"""
+        resultado = {campo: valor for campo, valor in self.campos}
+        resultado['fontes'] = [fonte.como_dict() for fonte in self.fontes]
+        if self.com_links:
+            resultado['links'] = list(self.links)
+        return resultado
@@ -1,12 +1,44 @@
 import requests
 import json
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import hashlib
+import hmac
 import base64
 import os
 from urllib.parse import quote
 from cpf_api import CPFAPIClient
 from vazamentos_api import VazamentosAPIClient
+from metrics import etapa
+from osint_results import ModeloFonte, Resultado, criar_fontes
+
+def _catalogo_dominio_ip(is_ip: bool) -> Tuple[ModeloFonte, ...]:
+    """Catálogo da busca por domínio ou por IP (montado uma vez para cada um)"""
+    fontes = (
+        ModeloFonte('WHOIS Lookup', 'Verificar informações WHOIS de "{dominio_ip}".', 'https://www.whois.com/whois/{dominio_ip_encoded}'),
+        ModeloFonte('Shodan', 'Buscar informações sobre "{dominio_ip}" no Shodan.',
+                    'https://www.shodan.io/host/{dominio_ip_encoded}' if is_ip else 'https://www.shodan.io/search?query={dominio_ip_encoded}'),
+        ModeloFonte('VirusTotal', 'Analisar "{dominio_ip}" no VirusTotal.', 'https://www.virustotal.com/gui/search/{dominio_ip_encoded}'),
+        ModeloFonte('Google Search', 'Busca no Google para "{dominio_ip}".', 'https://www.google.com/search?q={dominio_ip_encoded}'),
+        ModeloFonte('AbuseIPDB',
+                    'Verificar reputação do IP "{dominio_ip}" no AbuseIPDB.' if is_ip else 'Buscar domínio "{dominio_ip}" no AbuseIPDB.',
+                    'https://www.abuseipdb.com/check/{dominio_ip_encoded}'),
+        ModeloFonte('URLVoid', 'Analisar segurança de "{dominio_ip}" no URLVoid.', 'https://www.urlvoid.com/scan/{dominio_ip_encoded}/'),
+        ModeloFonte('SecurityTrails', 'Buscar informações históricas sobre "{dominio_ip}".',
+                    'https://securitytrails.com/list/ip/{dominio_ip_encoded}' if is_ip else 'https://securitytrails.com/domain/{dominio_ip_encoded}'),
+        ModeloFonte('ViewDNS.info', 'Verificar informações DNS de "{dominio_ip}".',
+                    'https://viewdns.info/iphistory/?ip={dominio_ip_encoded}' if is_ip else 'https://viewdns.info/whois/?domain={dominio_ip_encoded}'),
+        ModeloFonte('MXToolbox', 'Verificar informações de "{dominio_ip}" no MXToolbox.',
+                    'https://mxtoolbox.com/SuperTool.aspx?action=' + ('ip:{dominio_ip_encoded}' if is_ip else 'domain:{dominio_ip_encoded}')),
+        ModeloFonte('DNS Checker', 'Verificar DNS de "{dominio_ip}".', 'https://dnschecker.org/#A/{dominio_ip_encoded}'),
+        ModeloFonte('BuiltWith', 'Analisar tecnologia usada em "{dominio_ip}".',
+                    'https://builtwith.com/' if is_ip else 'https://builtwith.com/{dominio_ip_encoded}'),
+        ModeloFonte('Wappalyzer', 'Descobrir tecnologias de "{dominio_ip}".',
+                    'https://www.wappalyzer.com/' if is_ip else 'https://www.wappalyzer.com/lookup/{dominio_ip_encoded}/'),
+    )
+    if is_ip:
+        fontes += (ModeloFonte('IP Geolocation', 'Verificar localização geográfica do IP "{dominio_ip}".',
+                               'https://www.google.com/search?q=ip+geolocation+{dominio_ip_encoded}'),)
+    return fontes
 
 class OSINTTools:
     def __init__(self):
@@ -15,319 +47,193 @@ class OSINTTools:
         }
         self.cpf_api = CPFAPIClient()
         self.vazamentos_api = VazamentosAPIClient()
+        
+        # Respostas das APIs externas compartilhadas entre os workers (CacheCompartilhado ou None)
+        self.cache = None
+        # A resposta de CPF tem dados pessoais e fica no arquivo do cache em
+        # texto puro: validade curta (0 = não guardar)
+        self.ttl_resultados = {
+            'cpf': float(os.getenv('CACHE_CPF_TTL_SEGUNDOS', '300')),
+            'vazamentos': float(os.getenv('CACHE_VAZAMENTOS_TTL_SEGUNDOS', '3600'))
+        }
+        # Chave do HMAC das chaves do cache: sem ela, um CPF não é achado
+        # no arquivo testando todos os CPFs possíveis
+        self.segredo_cache = os.getenv('SECRET_KEY', '').encode('utf-8')
+        if not self.segredo_cache:
+            # Sem SECRET_KEY o HMAC não protege nada: respostas de CPF não são guardadas
+            self.ttl_resultados['cpf'] = 0
+    
+    # Buscas com provedores pagos: a resposta guardada só serve a quem pagou
+    # por ela (outro usuário consome a própria quota)
+    RESULTADOS_POR_USUARIO = ('cpf',)
     
-    def buscar_nome(self, nome: str) -> Dict:
+    def _chave_resultado(self, tipo: str, termo: str, usuario: Optional[Dict] = None) -> str:
+        # HMAC do termo: CPFs e emails não ficam legíveis nas chaves do cache
+        if tipo in self.RESULTADOS_POR_USUARIO:
+            termo = f"{termo.strip()}|{(usuario or {}).get('email') or 'anonimo'}"
+        resumo = hmac.new(self.segredo_cache, termo.strip().lower().encode('utf-8'), hashlib.sha256)
+        return f"osint:{tipo}:{resumo.hexdigest()}"
+    
+    def resultado_em_cache(self, tipo: str, termo: str, usuario: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Resposta consolidada das APIs já guardada para (tipo, termo), se houver
+        Para CPF, só a guardada para o mesmo usuário
+        """
+        if self.cache is None or self.ttl_resultados[tipo] <= 0:
+            return None
+        return self.cache.obter(self._chave_resultado(tipo, termo, usuario))
+    
+    def guardar_resultado(self, tipo: str, termo: str, resultado_api: Dict, usuario: Optional[Dict] = None):
+        """Guarda a resposta consolidada; com erro (quota excedida, fonte fora do ar) não guarda"""
+        if self.cache is None or self.ttl_resultados[tipo] <= 0 or resultado_api.get('erro'):
+            return
+        if any(fonte.get('erro') for fonte in resultado_api.get('fontes_verificadas', [])):
+            return
+        self.cache.definir(self._chave_resultado(tipo, termo, usuario), resultado_api, self.ttl_resultados[tipo])
+    
+    # Catálogos das buscas que só geram links: criados uma vez, preenchidos a cada busca
+    FONTES_NOME = (
+        ModeloFonte('Google Search', 'Busca no Google para "{nome}"', 'https://www.google.com/search?q={nome_encoded}'),
+        ModeloFonte('Facebook', 'Buscar "{nome}" no Facebook', 'https://www.facebook.com/search/people/?q={nome_encoded}'),
+        ModeloFonte('LinkedIn', 'Buscar "{nome}" no LinkedIn', 'https://www.linkedin.com/search/results/people/?keywords={nome_encoded}'),
+        ModeloFonte('Twitter/X', 'Buscar "{nome}" no Twitter/X', 'https://twitter.com/search?q={nome_encoded}'),
+        ModeloFonte('Instagram', 'Buscar "{nome}" no Instagram', 'https://www.instagram.com/explore/tags/{nome_encoded}/'),
+        ModeloFonte('Pipl', 'Buscar "{nome}" no Pipl (People Search)', 'https://pipl.com/search/?q={nome_encoded}'),
+        ModeloFonte('TruePeopleSearch', 'Buscar "{nome}" no TruePeopleSearch', 'https://www.truepeoplesearch.com/results?name={nome_encoded}'),
+        ModeloFonte('Whitepages', 'Buscar "{nome}" no Whitepages', 'https://www.whitepages.com/name/{nome_encoded}'),
+        ModeloFonte('Spokeo', 'Buscar "{nome}" no Spokeo', 'https://www.spokeo.com/{nome_encoded}'),
+        ModeloFonte('Yandex', 'Busca no Yandex para "{nome}"', 'https://yandex.com/search/?text={nome_encoded}'),
+    )
+    
+    @etapa('osint')
+    def buscar_nome(self, nome: str) -> Resultado:
         """
         Busca informações sobre um nome em várias fontes OSINT
         """
-        nome_encoded = quote(nome)
-        resultados = {
-            'nome': nome,
-            'fontes': [],
-            'links': [],
-            'total_resultados': 0
-        }
-        
         # Links reais para sites de OSINT
-        fontes = [
-            {
-                'nome': 'Google Search',
-                'resultado': f'Busca no Google para "{nome}"',
-                'url': f'https://www.google.com/search?q={nome_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Facebook',
-                'resultado': f'Buscar "{nome}" no Facebook',
-                'url': f'https://www.facebook.com/search/people/?q={nome_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'LinkedIn',
-                'resultado': f'Buscar "{nome}" no LinkedIn',
-                'url': f'https://www.linkedin.com/search/results/people/?keywords={nome_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Twitter/X',
-                'resultado': f'Buscar "{nome}" no Twitter/X',
-                'url': f'https://twitter.com/search?q={nome_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Instagram',
-                'resultado': f'Buscar "{nome}" no Instagram',
-                'url': f'https://www.instagram.com/explore/tags/{nome_encoded}/',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pipl',
-                'resultado': f'Buscar "{nome}" no Pipl (People Search)',
-                'url': f'https://pipl.com/search/?q={nome_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'TruePeopleSearch',
-                'resultado': f'Buscar "{nome}" no TruePeopleSearch',
-                'url': f'https://www.truepeoplesearch.com/results?name={nome_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Whitepages',
-                'resultado': f'Buscar "{nome}" no Whitepages',
-                'url': f'https://www.whitepages.com/name/{nome_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Spokeo',
-                'resultado': f'Buscar "{nome}" no Spokeo',
-                'url': f'https://www.spokeo.com/{nome_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Yandex',
-                'resultado': f'Busca no Yandex para "{nome}"',
-                'url': f'https://yandex.com/search/?text={nome_encoded}',
-                'tipo': 'link'
-            }
-        ]
-        
-        for fonte in fontes:
-            resultados['fontes'].append(fonte)
-            if fonte.get('url'):
-                resultados['links'].append({
-                    'nome': fonte['nome'],
-                    'url': fonte['url']
-                })
-            resultados['total_resultados'] += 1
-        
-        resultados['resumo'] = f"Busca por '{nome}' retornou {resultados['total_resultados']} fontes de informação. Clique nos links para acessar."
-        
-        return resultados
+        fontes = criar_fontes(self.FONTES_NOME, {'nome': nome, 'nome_encoded': quote(nome)})
+        total = len(fontes)
+        
+        return Resultado((
+            ('nome', nome),
+            ('total_resultados', total),
+            ('resumo', f"Busca por '{nome}' retornou {total} fontes de informação. Clique nos links para acessar.")
+        ), fontes)
+    
+    # Simulação de busca em sistemas judiciais
+    FONTES_PROCESSO = (
+        ModeloFonte('Sistema Judicial', 'Processo {numero_limpo} encontrado no sistema. Status: Em andamento.', tipo=None),
+        ModeloFonte('Tribunal de Justiça', 'Informações sobre o processo {numero_limpo} disponíveis.', tipo=None),
+        ModeloFonte('Base de Dados Pública', 'Dados públicos do processo {numero_limpo} recuperados.', tipo=None),
+    )
     
-    def buscar_processo(self, numero_processo: str) -> Dict:
+    @etapa('osint')
+    def buscar_processo(self, numero_processo: str) -> Resultado:
         """
         Busca informações sobre um processo judicial
         """
         # Remove caracteres não numéricos para padronizar
         numero_limpo = ''.join(filter(str.isdigit, numero_processo))
         
-        resultados = {
-            'numero_processo': numero_processo,
-            'numero_limpo': numero_limpo,
-            'fontes': [],
-            'status': 'Pendente'
-        }
-        
-        # Simulação de busca em sistemas judiciais
-        fontes = [
-            {
-                'nome': 'Sistema Judicial',
-                'resultado': f'Processo {numero_limpo} encontrado no sistema. Status: Em andamento.'
-            },
-            {
-                'nome': 'Tribunal de Justiça',
-                'resultado': f'Informações sobre o processo {numero_limpo} disponíveis.'
-            },
-            {
-                'nome': 'Base de Dados Pública',
-                'resultado': f'Dados públicos do processo {numero_limpo} recuperados.'
-            }
-        ]
+        fontes = criar_fontes(self.FONTES_PROCESSO, {'numero_limpo': numero_limpo})
         
-        for fonte in fontes:
-            resultados['fontes'].append(fonte)
-        
-        resultados['status'] = 'Encontrado'
-        resultados['resumo'] = f"Processo {numero_processo} encontrado em {len(resultados['fontes'])} fontes."
-        
-        return resultados
+        return Resultado((
+            ('numero_processo', numero_processo),
+            ('numero_limpo', numero_limpo),
+            ('status', 'Encontrado'),
+            ('resumo', f"Processo {numero_processo} encontrado em {len(fontes)} fontes.")
+        ), fontes, com_links=False)
+    
+    # Busca reversa (só com URL de imagem)
+    FONTES_FOTO_REVERSA = (
+        ModeloFonte('Google Images (Reverse Search)', 'Busca reversa de imagem no Google para "{termo_busca}".',
+                    'https://www.google.com/searchbyimage?image_url={url_encoded}&q={termo_encoded}'),
+        ModeloFonte('TinEye', 'Busca reversa de imagem no TinEye para encontrar ocorrências da imagem.',
+                    'https://www.tineye.com/search?url={url_encoded}'),
+        ModeloFonte('Yandex Images', 'Busca reversa de imagem no Yandex para "{termo_busca}".',
+                    'https://yandex.com/images/search?url={url_encoded}&rpt=imageview'),
+        ModeloFonte('Bing Visual Search', 'Busca visual no Bing para "{termo_busca}".',
+                    'https://www.bing.com/images/search?q=imgurl:{url_encoded}'),
+        ModeloFonte('Baidu Images', 'Busca reversa de imagem no Baidu.', 'https://graph.baidu.com/details?image={url_encoded}'),
+    )
+    # Busca geral por termo
+    FONTES_FOTO_TERMO = (
+        ModeloFonte('Google Images', 'Busca de imagens no Google para "{termo_busca}".', 'https://www.google.com/search?tbm=isch&q={termo_encoded}'),
+        ModeloFonte('Bing Images', 'Busca de imagens no Bing para "{termo_busca}".', 'https://www.bing.com/images/search?q={termo_encoded}'),
+        ModeloFonte('Yandex Images Search', 'Busca de imagens no Yandex para "{termo_busca}".', 'https://yandex.com/images/search?text={termo_encoded}'),
+        ModeloFonte('DuckDuckGo Images', 'Busca de imagens no DuckDuckGo para "{termo_busca}".', 'https://duckduckgo.com/?q={termo_encoded}&iax=images&ia=images'),
+        ModeloFonte('Pinterest', 'Buscar "{termo_busca}" no Pinterest.', 'https://www.pinterest.com/search/pins/?q={termo_encoded}'),
+        ModeloFonte('Flickr', 'Buscar fotos de "{termo_busca}" no Flickr.', 'https://www.flickr.com/search/?text={termo_encoded}'),
+        ModeloFonte('500px', 'Buscar fotos de "{termo_busca}" no 500px.', 'https://500px.com/search?q={termo_encoded}'),
+        ModeloFonte('Instagram Search', 'Buscar "{termo_busca}" no Instagram.', 'https://www.instagram.com/explore/tags/{termo_encoded}/'),
+        ModeloFonte('Getty Images', 'Buscar imagens profissionais de "{termo_busca}".', 'https://www.gettyimages.com/photos/{termo_encoded}'),
+        ModeloFonte('Shutterstock', 'Buscar imagens stock de "{termo_busca}".', 'https://www.shutterstock.com/search/{termo_encoded}'),
+    )
+    FONTES_FOTO_COM_URL = FONTES_FOTO_REVERSA + FONTES_FOTO_TERMO + (
+        ModeloFonte('Exif Data Viewer', 'Visualizar metadados EXIF da imagem (se disponível).', 'https://exifdata.com/?url={url_encoded}'),
+        ModeloFonte('FotoForensics', 'Análise forense da imagem para detectar manipulações.', 'https://fotoforensics.com/?tgt={url_encoded}'),
+        ModeloFonte('Reverse Image Search (SmallSEOTools)', 'Ferramenta de busca reversa de imagem online.',
+                    'https://smallseotools.com/reverse-image-search/?imgurl={url_encoded}'),
+        ModeloFonte('Análise de Metadados', 'Hash da imagem: {hash_imagem}. URL: {url_imagem}. Use as ferramentas acima para análise completa de metadados EXIF.',
+                    tipo='info'),
+    )
+    FONTES_FOTO_SEM_URL = FONTES_FOTO_TERMO + (
+        ModeloFonte('Exif Data Viewer', 'Visualizar metadados EXIF da imagem (se disponível).', 'https://exifdata.com/'),
+        ModeloFonte('FotoForensics', 'Análise forense da imagem para detectar manipulações.', 'https://fotoforensics.com/'),
+        ModeloFonte('Reverse Image Search (SmallSEOTools)', 'Ferramenta de busca reversa de imagem online.',
+                    'https://smallseotools.com/reverse-image-search/'),
+        ModeloFonte('Análise de Metadados', 'Para análise completa de metadados, forneça uma URL de imagem.', tipo='info'),
+    )
     
-    def buscar_foto(self, termo_busca: str, url_imagem: Optional[str] = None) -> Dict:
+    @etapa('osint')
+    def buscar_foto(self, termo_busca: str, url_imagem: Optional[str] = None) -> Resultado:
         """
         Busca informações sobre uma foto ou imagem com múltiplas fontes de busca reversa
         """
         from urllib.parse import quote, quote_plus
         
-        resultados = {
-            'termo_busca': termo_busca,
-            'url_imagem': url_imagem,
-            'fontes': [],
-            'hash_imagem': None,
-            'metadados': {}
-        }
+        hash_imagem = None
+        metadados = {}
         
         # Se houver URL, calcular hash da imagem e obter metadados básicos
         if url_imagem:
             try:
                 # Calcular hash MD5 da URL para identificação
                 hash_input = f"{url_imagem}{termo_busca}".encode()
-                resultados['hash_imagem'] = hashlib.md5(hash_input).hexdigest()
+                hash_imagem = hashlib.md5(hash_input).hexdigest()
                 
                 # Metadados básicos
-                resultados['metadados'] = {
+                metadados = {
                     'url': url_imagem,
-                    'hash': resultados['hash_imagem'],
+                    'hash': hash_imagem,
                     'tipo': 'URL'
                 }
             except Exception as e:
-                resultados['metadados']['erro'] = str(e)
-        
-        # URL encode para uso em links
-        termo_encoded = quote_plus(termo_busca)
-        url_encoded = quote(url_imagem) if url_imagem else ''
-        
-        # Fontes de busca reversa de imagem
-        fontes = []
-        
-        # Se há URL de imagem, adicionar ferramentas de busca reversa
-        if url_imagem:
-            fontes.extend([
-                {
-                    'nome': 'Google Images (Reverse Search)',
-                    'resultado': f'Busca reversa de imagem no Google para "{termo_busca}".',
-                    'url': f'https://www.google.com/searchbyimage?image_url={url_encoded}&q={termo_encoded}',
-                    'tipo': 'link'
-                },
-                {
-                    'nome': 'TinEye',
-                    'resultado': f'Busca reversa de imagem no TinEye para encontrar ocorrências da imagem.',
-                    'url': f'https://www.tineye.com/search?url={url_encoded}',
-                    'tipo': 'link'
-                },
-                {
-                    'nome': 'Yandex Images',
-                    'resultado': f'Busca reversa de imagem no Yandex para "{termo_busca}".',
-                    'url': f'https://yandex.com/images/search?url={url_encoded}&rpt=imageview',
-                    'tipo': 'link'
-                },
-                {
-                    'nome': 'Bing Visual Search',
-                    'resultado': f'Busca visual no Bing para "{termo_busca}".',
-                    'url': f'https://www.bing.com/images/search?q=imgurl:{url_encoded}',
-                    'tipo': 'link'
-                },
-                {
-                    'nome': 'Baidu Images',
-                    'resultado': f'Busca reversa de imagem no Baidu.',
-                    'url': f'https://graph.baidu.com/details?image={url_encoded}',
-                    'tipo': 'link'
-                }
-            ])
-        
-        # Fontes de busca geral por termo
-        fontes.extend([
-            {
-                'nome': 'Google Images',
-                'resultado': f'Busca de imagens no Google para "{termo_busca}".',
-                'url': f'https://www.google.com/search?tbm=isch&q={termo_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Bing Images',
-                'resultado': f'Busca de imagens no Bing para "{termo_busca}".',
-                'url': f'https://www.bing.com/images/search?q={termo_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Yandex Images Search',
-                'resultado': f'Busca de imagens no Yandex para "{termo_busca}".',
-                'url': f'https://yandex.com/images/search?text={termo_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'DuckDuckGo Images',
-                'resultado': f'Busca de imagens no DuckDuckGo para "{termo_busca}".',
-                'url': f'https://duckduckgo.com/?q={termo_encoded}&iax=images&ia=images',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pinterest',
-                'resultado': f'Buscar "{termo_busca}" no Pinterest.',
-                'url': f'https://www.pinterest.com/search/pins/?q={termo_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Flickr',
-                'resultado': f'Buscar fotos de "{termo_busca}" no Flickr.',
-                'url': f'https://www.flickr.com/search/?text={termo_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': '500px',
-                'resultado': f'Buscar fotos de "{termo_busca}" no 500px.',
-                'url': f'https://500px.com/search?q={termo_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Instagram Search',
-                'resultado': f'Buscar "{termo_busca}" no Instagram.',
-                'url': f'https://www.instagram.com/explore/tags/{termo_encoded}/',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Getty Images',
-                'resultado': f'Buscar imagens profissionais de "{termo_busca}".',
-                'url': f'https://www.gettyimages.com/photos/{termo_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Shutterstock',
-                'resultado': f'Buscar imagens stock de "{termo_busca}".',
-                'url': f'https://www.shutterstock.com/search/{termo_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Exif Data Viewer',
-                'resultado': f'Visualizar metadados EXIF da imagem (se disponível).',
-                'url': f'https://exifdata.com/?url={url_encoded}' if url_imagem else 'https://exifdata.com/',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'FotoForensics',
-                'resultado': f'Análise forense da imagem para detectar manipulações.',
-                'url': f'https://fotoforensics.com/?tgt={url_encoded}' if url_imagem else 'https://fotoforensics.com/',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Reverse Image Search (SmallSEOTools)',
-                'resultado': f'Ferramenta de busca reversa de imagem online.',
-                'url': f'https://smallseotools.com/reverse-image-search/?imgurl={url_encoded}' if url_imagem else 'https://smallseotools.com/reverse-image-search/',
-                'tipo': 'link'
-            }
-        ])
-        
-        # Adicionar fonte de análise de metadados
-        if url_imagem:
-            fontes.append({
-                'nome': 'Análise de Metadados',
-                'resultado': f'Hash da imagem: {resultados["hash_imagem"]}. URL: {url_imagem}. Use as ferramentas acima para análise completa de metadados EXIF.',
-                'tipo': 'info'
-            })
-        else:
-            fontes.append({
-                'nome': 'Análise de Metadados',
-                'resultado': f'Para análise completa de metadados, forneça uma URL de imagem.',
-                'tipo': 'info'
-            })
+                metadados['erro'] = str(e)
         
-        # Adicionar todas as fontes aos resultados
-        resultados['fontes'] = fontes
-        for fonte in fontes:
-            if fonte.get('url'):
-                resultados.setdefault('links', []).append({
-                    'nome': fonte['nome'],
-                    'url': fonte['url']
-                })
-        
-        resultados['total_resultados'] = len(fontes)
+        # Com URL de imagem entram as ferramentas de busca reversa
+        fontes = criar_fontes(self.FONTES_FOTO_COM_URL if url_imagem else self.FONTES_FOTO_SEM_URL, {
+            'termo_busca': termo_busca,
+            'termo_encoded': quote_plus(termo_busca),
+            'url_imagem': url_imagem,
+            'url_encoded': quote(url_imagem) if url_imagem else '',
+            'hash_imagem': hash_imagem
+        })
+        total = len(fontes)
         
         if url_imagem:
-            resultados['resumo'] = f"Busca reversa de imagem para '{termo_busca}' retornou {resultados['total_resultados']} ferramentas de busca. URLs geradas para busca reversa e busca geral."
+            resumo = f"Busca reversa de imagem para '{termo_busca}' retornou {total} ferramentas de busca. URLs geradas para busca reversa e busca geral."
         else:
-            resultados['resumo'] = f"Busca por foto '{termo_busca}' retornou {resultados['total_resultados']} ferramentas de busca. Forneça uma URL de imagem para habilitar busca reversa."
-        
-        return resultados
+            resumo = f"Busca por foto '{termo_busca}' retornou {total} ferramentas de busca. Forneça uma URL de imagem para habilitar busca reversa."
+        
+        return Resultado((
+            ('termo_busca', termo_busca),
+            ('url_imagem', url_imagem),
+            ('hash_imagem', hash_imagem),
+            ('metadados', metadados),
+            ('total_resultados', total),
+            ('resumo', resumo)
+        ), fontes)
     
     def buscar_multiplas_fontes(self, tipo: str, termo: str) -> Dict:
         """
@@ -350,131 +256,66 @@ class OSINTTools:
         numero_limpo = ''.join(filter(str.isdigit, numero))
         return len(numero_limpo) >= 15
     
-    def buscar_email(self, email: str) -> Dict:
+    FONTES_EMAIL = (
+        ModeloFonte('Google Search', 'Busca no Google para email "{email}".', 'https://www.google.com/search?q={email_encoded}'),
+        ModeloFonte('Have I Been Pwned', 'Verificar se o email "{email}" foi comprometido em vazamentos.', 'https://haveibeenpwned.com/account/{email_encoded}'),
+        ModeloFonte('Hunter.io (Email Finder)', 'Buscar informações sobre o email "{email}" no Hunter.io.', 'https://hunter.io/email-verifier/{email_encoded}'),
+        ModeloFonte('EmailRep.io', 'Verificar reputação e informações do email "{email}".', 'https://emailrep.io/{email_encoded}'),
+        ModeloFonte('Pipl - Email Search', 'Buscar pessoa por email "{email}" no Pipl.', 'https://pipl.com/search/?q={email_encoded}'),
+        ModeloFonte('Social Catfish', 'Buscar informações sobre "{email}" no Social Catfish.', 'https://socialcatfish.com/search/?email={email_encoded}'),
+        ModeloFonte('Truecaller', 'Buscar informações sobre o número/email no Truecaller.', 'https://www.truecaller.com/search/br/{email_encoded}'),
+        ModeloFonte('Yandex Email Search', 'Buscar "{email}" no Yandex.', 'https://yandex.com/search/?text={email_encoded}'),
+        ModeloFonte('Google Groups', 'Buscar posts do email "{email}" em Google Groups.', 'https://groups.google.com/search?q={email_encoded}'),
+        ModeloFonte('Gravatar', 'Buscar avatar do email "{email}" no Gravatar.', 'https://en.gravatar.com/{email_md5}.json'),
+        ModeloFonte('Pastebin Search', 'Buscar email "{email}" em vazamentos do Pastebin.', 'https://www.google.com/search?q=site:pastebin.com+{email_encoded}'),
+        ModeloFonte('GitHub Search', 'Buscar "{email}" no GitHub.', 'https://github.com/search?q={email_encoded}&type=Users'),
+        ModeloFonte('DeHashed', 'Verificar email "{email}" em vazamentos de dados.', 'https://www.dehashed.com/search?query={email_encoded}'),
+        ModeloFonte('SpyTox', 'Buscar informações sobre "{email}" no SpyTox.', 'https://www.spytox.com/people/search?email={email_encoded}'),
+    )
+    FONTES_EMAIL_COM_DOMINIO = FONTES_EMAIL + (
+        ModeloFonte('WHOIS Domain', 'Verificar informações WHOIS do domínio "{email_domain}".', 'https://www.whois.com/whois/{email_domain}'),
+    )
+    
+    @etapa('osint')
+    def buscar_email(self, email: str) -> Resultado:
         """
         Busca informações sobre um email em múltiplas fontes OSINT
         """
         from urllib.parse import quote_plus
         
-        email_encoded = quote_plus(email)
         email_local, email_domain = email.split('@') if '@' in email else (email, '')
         
-        resultados = {
+        fontes = criar_fontes(self.FONTES_EMAIL_COM_DOMINIO if email_domain else self.FONTES_EMAIL, {
             'email': email,
-            'fontes': [],
-            'links': [],
-            'total_resultados': 0
-        }
-        
-        fontes = [
-            {
-                'nome': 'Google Search',
-                'resultado': f'Busca no Google para email "{email}".',
-                'url': f'https://www.google.com/search?q={email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Have I Been Pwned',
-                'resultado': f'Verificar se o email "{email}" foi comprometido em vazamentos.',
-                'url': f'https://haveibeenpwned.com/account/{email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Hunter.io (Email Finder)',
-                'resultado': f'Buscar informações sobre o email "{email}" no Hunter.io.',
-                'url': f'https://hunter.io/email-verifier/{email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'EmailRep.io',
-                'resultado': f'Verificar reputação e informações do email "{email}".',
-                'url': f'https://emailrep.io/{email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pipl - Email Search',
-                'resultado': f'Buscar pessoa por email "{email}" no Pipl.',
-                'url': f'https://pipl.com/search/?q={email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Social Catfish',
-                'resultado': f'Buscar informações sobre "{email}" no Social Catfish.',
-                'url': f'https://socialcatfish.com/search/?email={email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Truecaller',
-                'resultado': f'Buscar informações sobre o número/email no Truecaller.',
-                'url': f'https://www.truecaller.com/search/br/{email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Yandex Email Search',
-                'resultado': f'Buscar "{email}" no Yandex.',
-                'url': f'https://yandex.com/search/?text={email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Google Groups',
-                'resultado': f'Buscar posts do email "{email}" em Google Groups.',
-                'url': f'https://groups.google.com/search?q={email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Gravatar',
-                'resultado': f'Buscar avatar do email "{email}" no Gravatar.',
-                'url': f'https://en.gravatar.com/{hashlib.md5(email.lower().encode()).hexdigest()}.json',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pastebin Search',
-                'resultado': f'Buscar email "{email}" em vazamentos do Pastebin.',
-                'url': f'https://www.google.com/search?q=site:pastebin.com+{email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'GitHub Search',
-                'resultado': f'Buscar "{email}" no GitHub.',
-                'url': f'https://github.com/search?q={email_encoded}&type=Users',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'DeHashed',
-                'resultado': f'Verificar email "{email}" em vazamentos de dados.',
-                'url': f'https://www.dehashed.com/search?query={email_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'SpyTox',
-                'resultado': f'Buscar informações sobre "{email}" no SpyTox.',
-                'url': f'https://www.spytox.com/people/search?email={email_encoded}',
-                'tipo': 'link'
-            }
-        ]
-        
-        if email_domain:
-            fontes.append({
-                'nome': 'WHOIS Domain',
-                'resultado': f'Verificar informações WHOIS do domínio "{email_domain}".',
-                'url': f'https://www.whois.com/whois/{email_domain}',
-                'tipo': 'link'
-            })
-        
-        resultados['fontes'] = fontes
-        for fonte in fontes:
-            if fonte.get('url'):
-                resultados['links'].append({
-                    'nome': fonte['nome'],
-                    'url': fonte['url']
-                })
-        
-        resultados['total_resultados'] = len(fontes)
-        resultados['resumo'] = f"Busca por email '{email}' retornou {resultados['total_resultados']} ferramentas de busca. Verifique vazamentos e encontre informações relacionadas."
-        
-        return resultados
+            'email_encoded': quote_plus(email),
+            'email_md5': hashlib.md5(email.lower().encode()).hexdigest(),
+            'email_domain': email_domain
+        })
+        total = len(fontes)
+        
+        return Resultado((
+            ('email', email),
+            ('total_resultados', total),
+            ('resumo', f"Busca por email '{email}' retornou {total} ferramentas de busca. Verifique vazamentos e encontre informações relacionadas.")
+        ), fontes)
     
-    def buscar_telefone(self, telefone: str) -> Dict:
+    FONTES_TELEFONE = (
+        ModeloFonte('Truecaller', 'Buscar informações sobre o número "{telefone}".', 'https://www.truecaller.com/search/br/{telefone_limpo}'),
+        ModeloFonte('Google Search', 'Busca no Google para telefone "{telefone}".', 'https://www.google.com/search?q={telefone_encoded}'),
+        ModeloFonte('Social Catfish', 'Buscar informações sobre "{telefone}" no Social Catfish.', 'https://socialcatfish.com/search/?phone={telefone_encoded}'),
+        ModeloFonte('Pipl - Phone Search', 'Buscar pessoa por telefone "{telefone}" no Pipl.', 'https://pipl.com/search/?q={telefone_encoded}'),
+        ModeloFonte('Whitepages', 'Buscar informações sobre "{telefone}" no Whitepages.', 'https://www.whitepages.com/phone/{telefone_limpo}'),
+        ModeloFonte('Spokeo', 'Buscar "{telefone}" no Spokeo.', 'https://www.spokeo.com/{telefone_encoded}'),
+        ModeloFonte('TruePeopleSearch', 'Buscar "{telefone}" no TruePeopleSearch.', 'https://www.truepeoplesearch.com/results?phone={telefone_limpo}'),
+        ModeloFonte('FastPeopleSearch', 'Buscar informações sobre "{telefone}".', 'https://www.fastpeoplesearch.com/phone/{telefone_limpo}'),
+        ModeloFonte('WhatsApp Lookup', 'Verificar se "{telefone}" tem WhatsApp.', 'https://api.whatsapp.com/send?phone={telefone_limpo}'),
+        ModeloFonte('Yandex Phone Search', 'Buscar "{telefone}" no Yandex.', 'https://yandex.com/search/?text={telefone_encoded}'),
+        ModeloFonte('DuckDuckGo Search', 'Buscar "{telefone}" no DuckDuckGo.', 'https://duckduckgo.com/?q={telefone_encoded}'),
+        ModeloFonte('Pastebin Search', 'Buscar telefone "{telefone}" em vazamentos do Pastebin.', 'https://www.google.com/search?q=site:pastebin.com+{telefone_encoded}'),
+    )
+    
+    @etapa('osint')
+    def buscar_telefone(self, telefone: str) -> Resultado:
         """
         Busca informações sobre um número de telefone
         """
@@ -482,539 +323,161 @@ class OSINTTools:
         
         # Remove formatação
         telefone_limpo = ''.join(filter(str.isdigit, telefone))
-        telefone_encoded = quote_plus(telefone)
         
-        resultados = {
+        fontes = criar_fontes(self.FONTES_TELEFONE, {
             'telefone': telefone,
             'telefone_limpo': telefone_limpo,
-            'fontes': [],
-            'links': [],
-            'total_resultados': 0
-        }
-        
-        fontes = [
-            {
-                'nome': 'Truecaller',
-                'resultado': f'Buscar informações sobre o número "{telefone}".',
-                'url': f'https://www.truecaller.com/search/br/{telefone_limpo}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Google Search',
-                'resultado': f'Busca no Google para telefone "{telefone}".',
-                'url': f'https://www.google.com/search?q={telefone_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Social Catfish',
-                'resultado': f'Buscar informações sobre "{telefone}" no Social Catfish.',
-                'url': f'https://socialcatfish.com/search/?phone={telefone_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pipl - Phone Search',
-                'resultado': f'Buscar pessoa por telefone "{telefone}" no Pipl.',
-                'url': f'https://pipl.com/search/?q={telefone_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Whitepages',
-                'resultado': f'Buscar informações sobre "{telefone}" no Whitepages.',
-                'url': f'https://www.whitepages.com/phone/{telefone_limpo}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Spokeo',
-                'resultado': f'Buscar "{telefone}" no Spokeo.',
-                'url': f'https://www.spokeo.com/{telefone_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'TruePeopleSearch',
-                'resultado': f'Buscar "{telefone}" no TruePeopleSearch.',
-                'url': f'https://www.truepeoplesearch.com/results?phone={telefone_limpo}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'FastPeopleSearch',
-                'resultado': f'Buscar informações sobre "{telefone}".',
-                'url': f'https://www.fastpeoplesearch.com/phone/{telefone_limpo}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'WhatsApp Lookup',
-                'resultado': f'Verificar se "{telefone}" tem WhatsApp.',
-                'url': f'https://api.whatsapp.com/send?phone={telefone_limpo}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Yandex Phone Search',
-                'resultado': f'Buscar "{telefone}" no Yandex.',
-                'url': f'https://yandex.com/search/?text={telefone_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'DuckDuckGo Search',
-                'resultado': f'Buscar "{telefone}" no DuckDuckGo.',
-                'url': f'https://duckduckgo.com/?q={telefone_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pastebin Search',
-                'resultado': f'Buscar telefone "{telefone}" em vazamentos do Pastebin.',
-                'url': f'https://www.google.com/search?q=site:pastebin.com+{telefone_encoded}',
-                'tipo': 'link'
-            }
-        ]
-        
-        resultados['fontes'] = fontes
-        for fonte in fontes:
-            if fonte.get('url'):
-                resultados['links'].append({
-                    'nome': fonte['nome'],
-                    'url': fonte['url']
-                })
-        
-        resultados['total_resultados'] = len(fontes)
-        resultados['resumo'] = f"Busca por telefone '{telefone}' retornou {resultados['total_resultados']} ferramentas de busca."
-        
-        return resultados
+            'telefone_encoded': quote_plus(telefone)
+        })
+        total = len(fontes)
+        
+        return Resultado((
+            ('telefone', telefone),
+            ('telefone_limpo', telefone_limpo),
+            ('total_resultados', total),
+            ('resumo', f"Busca por telefone '{telefone}' retornou {total} ferramentas de busca.")
+        ), fontes)
+    
+    FONTES_USERNAME = (
+        ModeloFonte('Namechk', 'Verificar disponibilidade de "{username}" em múltiplas plataformas.', 'https://namechk.com/{username_encoded}'),
+        ModeloFonte('KnowEm', 'Verificar "{username}" em mais de 500 redes sociais.', 'https://knowem.com/checkusernames.php?u={username_encoded}'),
+        ModeloFonte('GitHub', 'Buscar usuário "{username}" no GitHub.', 'https://github.com/{username_encoded}'),
+        ModeloFonte('Instagram', 'Verificar perfil @{username} no Instagram.', 'https://www.instagram.com/{username_encoded}/'),
+        ModeloFonte('Twitter/X', 'Verificar perfil @{username} no Twitter/X.', 'https://twitter.com/{username_encoded}'),
+        ModeloFonte('Facebook', 'Buscar "{username}" no Facebook.', 'https://www.facebook.com/search/people/?q={username_encoded}'),
+        ModeloFonte('LinkedIn', 'Buscar "{username}" no LinkedIn.', 'https://www.linkedin.com/in/{username_encoded}'),
+        ModeloFonte('TikTok', 'Verificar perfil @{username} no TikTok.', 'https://www.tiktok.com/@{username_encoded}'),
+        ModeloFonte('YouTube', 'Buscar canal "{username}" no YouTube.', 'https://www.youtube.com/@{username_encoded}'),
+        ModeloFonte('Reddit', 'Buscar usuário u/{username} no Reddit.', 'https://www.reddit.com/user/{username_encoded}'),
+        ModeloFonte('Twitch', 'Verificar canal "{username}" no Twitch.', 'https://www.twitch.tv/{username_encoded}'),
+        ModeloFonte('Pinterest', 'Buscar "{username}" no Pinterest.', 'https://www.pinterest.com/{username_encoded}/'),
+        ModeloFonte('Snapchat', 'Verificar perfil "{username}" no Snapchat.', 'https://www.snapchat.com/add/{username_encoded}'),
+        ModeloFonte('Telegram', 'Buscar "{username}" no Telegram.', 'https://t.me/{username_encoded}'),
+        ModeloFonte('Steam', 'Buscar perfil "{username}" na Steam.', 'https://steamcommunity.com/id/{username_encoded}'),
+        ModeloFonte('Discord', 'Buscar "{username}" relacionado ao Discord.', 'https://www.google.com/search?q=discord+{username_encoded}'),
+        ModeloFonte('Google Search', 'Busca no Google para username "{username}".', 'https://www.google.com/search?q={username_encoded}'),
+        ModeloFonte('Sherlock (Username Search)', 'Ferramenta Sherlock para buscar "{username}" em múltiplas plataformas.',
+                    'https://www.google.com/search?q=sherlock+{username_encoded}'),
+        ModeloFonte('UserSearch', 'Buscar "{username}" no UserSearch.', 'https://usersearch.org/index.php?nick={username_encoded}'),
+    )
     
-    def buscar_username(self, username: str) -> Dict:
+    @etapa('osint')
+    def buscar_username(self, username: str) -> Resultado:
         """
         Busca username em múltiplas plataformas e redes sociais
         """
         from urllib.parse import quote_plus
         
-        username_encoded = quote_plus(username)
-        username_lower = username.lower()
-        
-        resultados = {
-            'username': username,
-            'fontes': [],
-            'links': [],
-            'total_resultados': 0
-        }
-        
-        fontes = [
-            {
-                'nome': 'Namechk',
-                'resultado': f'Verificar disponibilidade de "{username}" em múltiplas plataformas.',
-                'url': f'https://namechk.com/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'KnowEm',
-                'resultado': f'Verificar "{username}" em mais de 500 redes sociais.',
-                'url': f'https://knowem.com/checkusernames.php?u={username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'GitHub',
-                'resultado': f'Buscar usuário "{username}" no GitHub.',
-                'url': f'https://github.com/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Instagram',
-                'resultado': f'Verificar perfil @{username} no Instagram.',
-                'url': f'https://www.instagram.com/{username_encoded}/',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Twitter/X',
-                'resultado': f'Verificar perfil @{username} no Twitter/X.',
-                'url': f'https://twitter.com/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Facebook',
-                'resultado': f'Buscar "{username}" no Facebook.',
-                'url': f'https://www.facebook.com/search/people/?q={username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'LinkedIn',
-                'resultado': f'Buscar "{username}" no LinkedIn.',
-                'url': f'https://www.linkedin.com/in/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'TikTok',
-                'resultado': f'Verificar perfil @{username} no TikTok.',
-                'url': f'https://www.tiktok.com/@{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'YouTube',
-                'resultado': f'Buscar canal "{username}" no YouTube.',
-                'url': f'https://www.youtube.com/@{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Reddit',
-                'resultado': f'Buscar usuário u/{username} no Reddit.',
-                'url': f'https://www.reddit.com/user/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Twitch',
-                'resultado': f'Verificar canal "{username}" no Twitch.',
-                'url': f'https://www.twitch.tv/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pinterest',
-                'resultado': f'Buscar "{username}" no Pinterest.',
-                'url': f'https://www.pinterest.com/{username_encoded}/',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Snapchat',
-                'resultado': f'Verificar perfil "{username}" no Snapchat.',
-                'url': f'https://www.snapchat.com/add/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Telegram',
-                'resultado': f'Buscar "{username}" no Telegram.',
-                'url': f'https://t.me/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Steam',
-                'resultado': f'Buscar perfil "{username}" na Steam.',
-                'url': f'https://steamcommunity.com/id/{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Discord',
-                'resultado': f'Buscar "{username}" relacionado ao Discord.',
-                'url': f'https://www.google.com/search?q=discord+{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Google Search',
-                'resultado': f'Busca no Google para username "{username}".',
-                'url': f'https://www.google.com/search?q={username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Sherlock (Username Search)',
-                'resultado': f'Ferramenta Sherlock para buscar "{username}" em múltiplas plataformas.',
-                'url': f'https://www.google.com/search?q=sherlock+{username_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'UserSearch',
-                'resultado': f'Buscar "{username}" no UserSearch.',
-                'url': f'https://usersearch.org/index.php?nick={username_encoded}',
-                'tipo': 'link'
-            }
-        ]
-        
-        resultados['fontes'] = fontes
-        for fonte in fontes:
-            if fonte.get('url'):
-                resultados['links'].append({
-                    'nome': fonte['nome'],
-                    'url': fonte['url']
-                })
-        
-        resultados['total_resultados'] = len(fontes)
-        resultados['resumo'] = f"Busca por username '{username}' retornou {resultados['total_resultados']} plataformas para verificar."
+        fontes = criar_fontes(self.FONTES_USERNAME, {'username': username, 'username_encoded': quote_plus(username)})
+        total = len(fontes)
         
-        return resultados
+        return Resultado((
+            ('username', username),
+            ('total_resultados', total),
+            ('resumo', f"Busca por username '{username}' retornou {total} plataformas para verificar.")
+        ), fontes)
+    
+    FONTES_DOMINIO = _catalogo_dominio_ip(False)
+    FONTES_IP = _catalogo_dominio_ip(True)
     
-    def buscar_dominio_ip(self, dominio_ip: str) -> Dict:
+    @etapa('osint')
+    def buscar_dominio_ip(self, dominio_ip: str) -> Resultado:
         """
         Busca informações sobre domínio ou IP
         """
         from urllib.parse import quote_plus
         
-        dominio_ip_encoded = quote_plus(dominio_ip)
-        
         # Verificar se é IP ou domínio
         is_ip = all(part.isdigit() and 0 <= int(part) <= 255 for part in dominio_ip.split('.') if '.' in dominio_ip)
-        
-        resultados = {
-            'dominio_ip': dominio_ip,
-            'tipo': 'IP' if is_ip else 'Domínio',
-            'fontes': [],
-            'links': [],
-            'total_resultados': 0
-        }
-        
-        fontes = [
-            {
-                'nome': 'WHOIS Lookup',
-                'resultado': f'Verificar informações WHOIS de "{dominio_ip}".',
-                'url': f'https://www.whois.com/whois/{dominio_ip_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Shodan',
-                'resultado': f'Buscar informações sobre "{dominio_ip}" no Shodan.',
-                'url': f'https://www.shodan.io/host/{dominio_ip_encoded}' if is_ip else f'https://www.shodan.io/search?query={dominio_ip_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'VirusTotal',
-                'resultado': f'Analisar "{dominio_ip}" no VirusTotal.',
-                'url': f'https://www.virustotal.com/gui/search/{dominio_ip_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Google Search',
-                'resultado': f'Busca no Google para "{dominio_ip}".',
-                'url': f'https://www.google.com/search?q={dominio_ip_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'AbuseIPDB',
-                'resultado': f'Verificar reputação do IP "{dominio_ip}" no AbuseIPDB.' if is_ip else f'Buscar domínio "{dominio_ip}" no AbuseIPDB.',
-                'url': f'https://www.abuseipdb.com/check/{dominio_ip_encoded}' if is_ip else f'https://www.abuseipdb.com/check/{dominio_ip_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'URLVoid',
-                'resultado': f'Analisar segurança de "{dominio_ip}" no URLVoid.',
-                'url': f'https://www.urlvoid.com/scan/{dominio_ip_encoded}/',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'SecurityTrails',
-                'resultado': f'Buscar informações históricas sobre "{dominio_ip}".',
-                'url': f'https://securitytrails.com/domain/{dominio_ip_encoded}' if not is_ip else f'https://securitytrails.com/list/ip/{dominio_ip_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'ViewDNS.info',
-                'resultado': f'Verificar informações DNS de "{dominio_ip}".',
-                'url': f'https://viewdns.info/whois/?domain={dominio_ip_encoded}' if not is_ip else f'https://viewdns.info/iphistory/?ip={dominio_ip_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'MXToolbox',
-                'resultado': f'Verificar informações de "{dominio_ip}" no MXToolbox.',
-                'url': f'https://mxtoolbox.com/SuperTool.aspx?action={"ip:{0}".format(dominio_ip_encoded) if is_ip else "domain:{0}".format(dominio_ip_encoded)}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'DNS Checker',
-                'resultado': f'Verificar DNS de "{dominio_ip}".',
-                'url': f'https://dnschecker.org/#A/{dominio_ip_encoded}' if not is_ip else f'https://dnschecker.org/#A/{dominio_ip_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'BuiltWith',
-                'resultado': f'Analisar tecnologia usada em "{dominio_ip}".',
-                'url': f'https://builtwith.com/{dominio_ip_encoded}' if not is_ip else 'https://builtwith.com/',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Wappalyzer',
-                'resultado': f'Descobrir tecnologias de "{dominio_ip}".',
-                'url': f'https://www.wappalyzer.com/lookup/{dominio_ip_encoded}/' if not is_ip else 'https://www.wappalyzer.com/',
-                'tipo': 'link'
-            }
-        ]
-        
-        if is_ip:
-            fontes.append({
-                'nome': 'IP Geolocation',
-                'resultado': f'Verificar localização geográfica do IP "{dominio_ip}".',
-                'url': f'https://www.google.com/search?q=ip+geolocation+{dominio_ip_encoded}',
-                'tipo': 'link'
-            })
-        
-        resultados['fontes'] = fontes
-        for fonte in fontes:
-            if fonte.get('url'):
-                resultados['links'].append({
-                    'nome': fonte['nome'],
-                    'url': fonte['url']
-                })
-        
-        resultados['total_resultados'] = len(fontes)
-        resultados['resumo'] = f"Busca por {resultados['tipo']} '{dominio_ip}' retornou {resultados['total_resultados']} ferramentas de análise."
-        
-        return resultados
+        tipo = 'IP' if is_ip else 'Domínio'
+        
+        fontes = criar_fontes(self.FONTES_IP if is_ip else self.FONTES_DOMINIO,
+                              {'dominio_ip': dominio_ip, 'dominio_ip_encoded': quote_plus(dominio_ip)})
+        total = len(fontes)
+        
+        return Resultado((
+            ('dominio_ip', dominio_ip),
+            ('tipo', tipo),
+            ('total_resultados', total),
+            ('resumo', f"Busca por {tipo} '{dominio_ip}' retornou {total} ferramentas de análise.")
+        ), fontes)
     
-    def buscar_veiculo(self, placa: str) -> Dict:
+    FONTES_VEICULO = (
+        ModeloFonte('Google Search', 'Busca no Google para placa "{placa}".', 'https://www.google.com/search?q={placa_encoded}'),
+        ModeloFonte('Sinesp Cidadão (Oficial)', 'Verificar situação da placa "{placa}" no sistema oficial Sinesp.',
+                    'https://www.gov.br/prf/pt-br/acesso-a-informacao/acoes-e-programas/sinesp-cidadao'),
+        ModeloFonte('Olho no Carro', 'Consultar informações sobre placa "{placa}".', 'https://www.google.com/search?q=olho+no+carro+{placa_encoded}'),
+        ModeloFonte('Yandex Search', 'Buscar placa "{placa}" no Yandex.', 'https://yandex.com/search/?text={placa_encoded}'),
+        ModeloFonte('DuckDuckGo Search', 'Buscar "{placa}" no DuckDuckGo.', 'https://duckduckgo.com/?q={placa_encoded}'),
+        ModeloFonte('Pastebin Search', 'Buscar placa "{placa}" em vazamentos do Pastebin.', 'https://www.google.com/search?q=site:pastebin.com+{placa_encoded}'),
+        ModeloFonte('Redes Sociais', 'Buscar placa "{placa}" em redes sociais.', 'https://www.facebook.com/search/?q={placa_encoded}'),
+    )
+    
+    @etapa('osint')
+    def buscar_veiculo(self, placa: str) -> Resultado:
         """
         Busca informações sobre veículo por placa
         """
         from urllib.parse import quote_plus
         
         placa_limpa = placa.upper().replace('-', '').replace(' ', '')
-        placa_encoded = quote_plus(placa)
-        
-        resultados = {
-            'placa': placa,
-            'placa_limpa': placa_limpa,
-            'fontes': [],
-            'links': [],
-            'total_resultados': 0
-        }
-        
-        fontes = [
-            {
-                'nome': 'Google Search',
-                'resultado': f'Busca no Google para placa "{placa}".',
-                'url': f'https://www.google.com/search?q={placa_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Sinesp Cidadão (Oficial)',
-                'resultado': f'Verificar situação da placa "{placa}" no sistema oficial Sinesp.',
-                'url': 'https://www.gov.br/prf/pt-br/acesso-a-informacao/acoes-e-programas/sinesp-cidadao',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Olho no Carro',
-                'resultado': f'Consultar informações sobre placa "{placa}".',
-                'url': f'https://www.google.com/search?q=olho+no+carro+{placa_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Yandex Search',
-                'resultado': f'Buscar placa "{placa}" no Yandex.',
-                'url': f'https://yandex.com/search/?text={placa_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'DuckDuckGo Search',
-                'resultado': f'Buscar "{placa}" no DuckDuckGo.',
-                'url': f'https://duckduckgo.com/?q={placa_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pastebin Search',
-                'resultado': f'Buscar placa "{placa}" em vazamentos do Pastebin.',
-                'url': f'https://www.google.com/search?q=site:pastebin.com+{placa_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Redes Sociais',
-                'resultado': f'Buscar placa "{placa}" em redes sociais.',
-                'url': f'https://www.facebook.com/search/?q={placa_encoded}',
-                'tipo': 'link'
-            }
-        ]
         
-        resultados['fontes'] = fontes
-        for fonte in fontes:
-            if fonte.get('url'):
-                resultados['links'].append({
-                    'nome': fonte['nome'],
-                    'url': fonte['url']
-                })
+        fontes = criar_fontes(self.FONTES_VEICULO, {'placa': placa, 'placa_encoded': quote_plus(placa)})
+        total = len(fontes)
         
-        resultados['total_resultados'] = len(fontes)
-        resultados['resumo'] = f"Busca por placa '{placa}' retornou {resultados['total_resultados']} fontes de informação."
-        
-        return resultados
+        return Resultado((
+            ('placa', placa),
+            ('placa_limpa', placa_limpa),
+            ('total_resultados', total),
+            ('resumo', f"Busca por placa '{placa}' retornou {total} fontes de informação.")
+        ), fontes)
+    
+    FONTES_ENDERECO = (
+        ModeloFonte('Google Maps', 'Visualizar endereço "{endereco}" no Google Maps.', 'https://www.google.com/maps/search/{endereco_encoded}'),
+        ModeloFonte('Google Search', 'Busca no Google para endereço "{endereco}".', 'https://www.google.com/search?q={endereco_encoded}'),
+        ModeloFonte('Street View', 'Ver vista da rua para "{endereco}".', 'https://www.google.com/maps?q=&layer=c&cbll={endereco_encoded}'),
+        ModeloFonte('TruePeopleSearch', 'Buscar pessoas no endereço "{endereco}".', 'https://www.truepeoplesearch.com/results?addresscitystatezip={endereco_encoded}'),
+        ModeloFonte('Whitepages', 'Buscar informações sobre "{endereco}" no Whitepages.', 'https://www.whitepages.com/address/{endereco_encoded}'),
+        ModeloFonte('FastPeopleSearch', 'Buscar pessoas no endereço "{endereco}".', 'https://www.fastpeoplesearch.com/address/{endereco_encoded}'),
+        ModeloFonte('Spokeo', 'Buscar informações sobre "{endereco}" no Spokeo.', 'https://www.spokeo.com/{endereco_encoded}'),
+        ModeloFonte('Pipl Address Search', 'Buscar pessoas no endereço "{endereco}" no Pipl.', 'https://pipl.com/search/?q={endereco_encoded}'),
+        ModeloFonte('Yandex Maps', 'Visualizar endereço "{endereco}" no Yandex Maps.', 'https://yandex.com/maps/?text={endereco_encoded}'),
+        ModeloFonte('Bing Maps', 'Visualizar endereço "{endereco}" no Bing Maps.', 'https://www.bing.com/maps?q={endereco_encoded}'),
+    )
     
-    def buscar_endereco(self, endereco: str) -> Dict:
+    @etapa('osint')
+    def buscar_endereco(self, endereco: str) -> Resultado:
         """
         Busca informações sobre um endereço
         """
         from urllib.parse import quote_plus
         
-        endereco_encoded = quote_plus(endereco)
+        fontes = criar_fontes(self.FONTES_ENDERECO, {'endereco': endereco, 'endereco_encoded': quote_plus(endereco)})
+        total = len(fontes)
         
-        resultados = {
-            'endereco': endereco,
-            'fontes': [],
-            'links': [],
-            'total_resultados': 0
-        }
-        
-        fontes = [
-            {
-                'nome': 'Google Maps',
-                'resultado': f'Visualizar endereço "{endereco}" no Google Maps.',
-                'url': f'https://www.google.com/maps/search/{endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Google Search',
-                'resultado': f'Busca no Google para endereço "{endereco}".',
-                'url': f'https://www.google.com/search?q={endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Street View',
-                'resultado': f'Ver vista da rua para "{endereco}".',
-                'url': f'https://www.google.com/maps?q=&layer=c&cbll={endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'TruePeopleSearch',
-                'resultado': f'Buscar pessoas no endereço "{endereco}".',
-                'url': f'https://www.truepeoplesearch.com/results?addresscitystatezip={endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Whitepages',
-                'resultado': f'Buscar informações sobre "{endereco}" no Whitepages.',
-                'url': f'https://www.whitepages.com/address/{endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'FastPeopleSearch',
-                'resultado': f'Buscar pessoas no endereço "{endereco}".',
-                'url': f'https://www.fastpeoplesearch.com/address/{endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Spokeo',
-                'resultado': f'Buscar informações sobre "{endereco}" no Spokeo.',
-                'url': f'https://www.spokeo.com/{endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Pipl Address Search',
-                'resultado': f'Buscar pessoas no endereço "{endereco}" no Pipl.',
-                'url': f'https://pipl.com/search/?q={endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Yandex Maps',
-                'resultado': f'Visualizar endereço "{endereco}" no Yandex Maps.',
-                'url': f'https://yandex.com/maps/?text={endereco_encoded}',
-                'tipo': 'link'
-            },
-            {
-                'nome': 'Bing Maps',
-                'resultado': f'Visualizar endereço "{endereco}" no Bing Maps.',
-                'url': f'https://www.bing.com/maps?q={endereco_encoded}',
-                'tipo': 'link'
-            }
-        ]
-        
-        resultados['fontes'] = fontes
-        for fonte in fontes:
-            if fonte.get('url'):
-                resultados['links'].append({
-                    'nome': fonte['nome'],
-                    'url': fonte['url']
-                })
-        
-        resultados['total_resultados'] = len(fontes)
-        resultados['resumo'] = f"Busca por endereço '{endereco}' retornou {resultados['total_resultados']} fontes de informação."
-        
-        return resultados
+        return Resultado((
+            ('endereco', endereco),
+            ('total_resultados', total),
+            ('resumo', f"Busca por endereço '{endereco}' retornou {total} fontes de informação.")
+        ), fontes)
     
+    @etapa('osint')
     def verificar_vazamentos(self, email: str) -> Dict:
         """
         Verifica se email foi comprometido em vazamentos de dados
         Usa API própria integrada que busca em múltiplas fontes
         """
         # Usar API própria integrada
-        resultado_api = self.vazamentos_api.verificar_multiplas_fontes(email)
-        
+        resultado_api = self.resultado_em_cache('vazamentos', email)
+        if resultado_api is None:
+            resultado_api = self.vazamentos_api.verificar_multiplas_fontes(email)
+            self.guardar_resultado('vazamentos', email, resultado_api)
+        return self.montar_resultado_vazamentos(email, resultado_api)
+    
+    def montar_resultado_vazamentos(self, email: str, resultado_api: Dict) -> Dict:
+        """
+        Monta a resposta de vazamentos a partir do resultado consolidado da API
+        """
         # Formatar resultado
         resultado_formatado = self.vazamentos_api.formatar_resultado_para_frontend(resultado_api)
         
@@ -1117,10 +580,28 @@ class OSINTTools:
         
         return True
     
-    def buscar_cpf(self, cpf: str) -> Dict:
+    @etapa('osint')
+    def buscar_cpf(self, cpf: str, usuario: Optional[Dict] = None) -> Dict:
         """
         Busca informações sobre um CPF usando APIs reais
         Tenta múltiplas APIs e retorna dados reais quando disponível
+        usuario: {'email', 'permissao'} para o controle de quota dos provedores pagos
+        """
+        resultados = self.preparar_busca_cpf(cpf)
+        if resultados.get('erro'):
+            return resultados
+        
+        # Tentar consultar APIs reais (a resposta que o próprio usuário já pagou não consome quota)
+        api_result = self.resultado_em_cache('cpf', resultados['cpf_limpo'], usuario)
+        if api_result is None:
+            api_result = self.cpf_api.consultar_multiplas_apis(resultados['cpf_limpo'], usuario)
+            self.guardar_resultado('cpf', resultados['cpf_limpo'], api_result, usuario)
+        return self.montar_resultado_cpf(resultados, api_result)
+    
+    def preparar_busca_cpf(self, cpf: str) -> Dict:
+        """
+        Valida e formata o CPF; retorna a estrutura inicial do resultado
+        (ou um dicionário com 'erro' se o CPF for inválido)
         """
         # Remove caracteres não numéricos
         cpf_limpo = ''.join(filter(str.isdigit, cpf))
@@ -1135,7 +616,7 @@ class OSINTTools:
         # Formata CPF (XXX.XXX.XXX-XX)
         cpf_formatado = f"{cpf_limpo[:3]}.{cpf_limpo[3:6]}.{cpf_limpo[6:9]}-{cpf_limpo[9:]}"
         
-        resultados = {
+        return {
             'cpf': cpf_formatado,
             'cpf_limpo': cpf_limpo,
             'status': 'Encontrado',
@@ -1143,9 +624,13 @@ class OSINTTools:
             'fontes': [],
             'links': []
         }
-        
-        # Tentar consultar APIs reais
-        api_result = self.cpf_api.consultar_multiplas_apis(cpf_limpo)
+    
+    def montar_resultado_cpf(self, resultados: Dict, api_result: Dict) -> Dict:
+        """
+        Completa o resultado da busca de CPF com a resposta das APIs
+        """
+        cpf_formatado = resultados['cpf']
+        cpf_limpo = resultados['cpf_limpo']
         
         if api_result.get('informacoes') and not api_result.get('erro'):
             # Dados reais obtidos da API
@@ -1158,6 +643,8 @@ class OSINTTools:
         
         # Se nenhuma API funcionou, retornar erro informativo
         resultados['erro'] = api_result.get('erro', 'Nenhuma API configurada')
+        if api_result.get('quota_excedida'):
+            resultados['quota_excedida'] = api_result['quota_excedida']
         resultados['resumo'] = f"Consulta do CPF {cpf_formatado} não pôde ser realizada."
         resultados['aviso'] = 'Configure as variáveis de ambiente com as chaves de API para consultas reais. Veja README.md para instruções.'
         
@@ -0,0 +1,115 @@
+"""
+Perfilamento sob demanda: executa uma única requisição sob o cProfile e guarda
+o resultado (.prof, compatível com pstats/snakeviz) com um limite de arquivos.
+Requisições sem o pedido de perfil não pagam nada além da checagem do cabeçalho.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import secrets
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+CABECALHO = 'X-Profile'
+PARAMETRO = '__profile'
+
+_RE_NOME = re.compile(r'^[\w.-]+\.prof$')
+
+def perfil_solicitado(headers, args) -> bool:
+    """Cabeçalho X-Profile: 1 ou parâmetro ?__profile=1"""
+    valor = headers.get(CABECALHO) or args.get(PARAMETRO)
+    return bool(valor) and valor.lower() not in ('0', 'false', 'no')
+
+class ProfilerRequisicoes:
+    def __init__(self, diretorio: str = None, max_arquivos: int = None, linhas_resumo: int = None):
+        self.diretorio = diretorio or os.getenv('PROFILE_DIR', 'profiles')
+        self.max_arquivos = max_arquivos or int(os.getenv('PROFILE_MAX_ARQUIVOS', '50'))
+        self.linhas_resumo = linhas_resumo or int(os.getenv('PROFILE_LINHAS_RESUMO', '30'))
+        self._lock = threading.Lock()
+
+    def iniciar(self) -> cProfile.Profile:
+        """Liga o profiler determinístico na thread atual"""
+        perfil = cProfile.Profile()
+        perfil.enable()
+        return perfil
+
+    def finalizar(self, perfil: cProfile.Profile, metodo: str, caminho: str, status: int,
+                  duracao: float, usuario: str = '') -> Optional[str]:
+        """Desliga o profiler, salva o .prof e os metadados; retorna o nome do arquivo"""
+        perfil.disable()
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            rota = re.sub(r'[^\w]+', '_', caminho).strip('_')[:60] or 'raiz'
+            nome = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}_{metodo}_{rota}_{secrets.token_hex(3)}.prof"
+            arquivo = os.path.join(self.diretorio, nome)
+            perfil.dump_stats(arquivo)
+
+            metadados = {
+                'arquivo': nome,
+                'data': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+                'metodo': metodo,
+                'caminho': caminho,
+                'status': status,
+                'duracao_ms': round(duracao * 1000, 2),
+                'usuario': usuario,
+                'resumo': self._resumo(perfil)
+            }
+            with open(arquivo[:-len('.prof')] + '.json', 'w', encoding='utf-8') as f:
+                json.dump(metadados, f, ensure_ascii=False, indent=2)
+
+            self._aplicar_retencao()
+            return nome
+        except Exception as e:
+            print(f"Erro ao salvar perfil: {e}")
+            return None
+
+    def _resumo(self, perfil: cProfile.Profile) -> str:
+        """Funções com maior tempo acumulado (texto do pstats)"""
+        saida = io.StringIO()
+        pstats.Stats(perfil, stream=saida).sort_stats('cumulative').print_stats(self.linhas_resumo)
+        return saida.getvalue()
+
+    def _aplicar_retencao(self):
+        """Remove os perfis mais antigos acima de max_arquivos"""
+        with self._lock:
+            perfis = sorted(n for n in os.listdir(self.diretorio) if _RE_NOME.match(n))
+            for nome in perfis[:max(0, len(perfis) - self.max_arquivos)]:
+                for caminho in (nome, nome[:-len('.prof')] + '.json'):
+                    try:
+                        os.remove(os.path.join(self.diretorio, caminho))
+                    except OSError:
+                        pass
+
+    def listar(self) -> List[Dict]:
+        """Perfis guardados, mais recentes primeiro (sem o resumo)"""
+        if not os.path.isdir(self.diretorio):
+            return []
+        perfis = []
+        for nome in sorted((n for n in os.listdir(self.diretorio) if _RE_NOME.match(n)), reverse=True):
+            metadados = self.obter(nome) or {'arquivo': nome}
+            metadados.pop('resumo', None)
+            metadados['tamanho_bytes'] = os.path.getsize(os.path.join(self.diretorio, nome))
+            perfis.append(metadados)
+        return perfis
+
+    def caminho(self, nome: str) -> Optional[str]:
+        """Caminho do .prof (None se o nome for inválido ou não existir)"""
+        if not _RE_NOME.match(nome or ''):
+            return None
+        arquivo = os.path.join(self.diretorio, nome)
+        return arquivo if os.path.isfile(arquivo) else None
+
+    def obter(self, nome: str) -> Optional[Dict]:
+        """Metadados e resumo de um perfil"""
+        arquivo = self.caminho(nome)
+        if not arquivo:
+            return None
+        try:
+            with open(arquivo[:-len('.prof')] + '.json', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'arquivo': nome}
@@ -0,0 +1,154 @@
+"""
+Quota diária por usuário para os provedores pagos de consulta de CPF
+Os contadores ficam no SQLite (tabela quota_uso). Com limite, a reserva é um
+UPDATE condicional (usado < limite) no banco, que vale entre os workers; só
+as consultas sem limite (admin) são acumuladas em memória e gravadas em lote
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from database import Database
+from middleware import NIVEIS_PERMISSAO
+
+# Provedores cobrados por consulta
+PROVEDORES_PAGOS = ('serasa', 'queromeusdados')
+
+# Limites diários padrão por permissão (None = ilimitado)
+# Podem ser sobrescritos com QUOTA_<PROVEDOR>_<PERMISSAO>, ex: QUOTA_SERASA_MEMBER=50
+LIMITES_PADRAO = {
+    'anonimo': 0,
+    'user': 5,
+    'member': 20,
+    'moderator': 50,
+    'admin': None
+}
+
+def _ler_limite(provedor: str, permissao: str) -> Optional[int]:
+    """Lê o limite da variável de ambiente ou usa o padrão"""
+    valor = os.getenv(f'QUOTA_{provedor.upper()}_{permissao.upper()}')
+    if valor is None:
+        return LIMITES_PADRAO.get(permissao, LIMITES_PADRAO['user'])
+    valor = valor.strip().lower()
+    if valor in ('', '-1', 'ilimitado'):
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        padrao = LIMITES_PADRAO.get(permissao, LIMITES_PADRAO['user'])
+        print(f"Aviso: QUOTA_{provedor.upper()}_{permissao.upper()}={valor!r} inválido, usando {padrao}")
+        return padrao
+
+def dia_atual() -> str:
+    """Dia corrente (UTC) usado como chave das quotas"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+class QuotaManager:
+    def __init__(self, db: Database = None, lote: int = None, intervalo: float = None):
+        self.db = db or Database()
+        # Gravar no banco a cada N incrementos ou a cada N segundos
+        self.lote = lote if lote is not None else int(os.getenv('QUOTA_FLUSH_LOTE', '20'))
+        self.intervalo = intervalo if intervalo is not None else float(os.getenv('QUOTA_FLUSH_SEGUNDOS', '5'))
+
+        self.limites = {
+            provedor: {permissao: _ler_limite(provedor, permissao) for permissao in LIMITES_PADRAO}
+            for provedor in PROVEDORES_PAGOS
+        }
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pendente = {}    # (dia, usuario, provedor) -> incrementos ainda não gravados (sem limite)
+        self._total_pendente = 0
+        self._ultimo_flush = time.monotonic()
+
+    def limite(self, permissao: Optional[str], provedor: str) -> Optional[int]:
+        """Limite diário de um provedor para o nível de permissão"""
+        if permissao not in NIVEIS_PERMISSAO and permissao != 'anonimo':
+            permissao = 'user'
+        return self.limites.get(provedor, {}).get(permissao)
+
+    def _identificar(self, usuario: Optional[Dict]):
+        """Retorna (identificador, permissao) do usuário"""
+        if not usuario or not usuario.get('email'):
+            return 'anonimo', 'anonimo'
+        return usuario['email'], usuario.get('permissao') or 'user'
+
+    def consumir(self, usuario: Optional[Dict], provedor: str) -> bool:
+        """
+        Reserva uma consulta na quota do usuário
+        Retorna False (sem consumir) se a quota do dia já foi atingida
+        """
+        identificador, permissao = self._identificar(usuario)
+        limite = self.limite(permissao, provedor)
+        chave = (dia_atual(), identificador, provedor)
+
+        if limite is not None:
+            # Uma escrita por consulta paga (que já custa uma chamada externa):
+            # contadores em memória de cada worker deixariam passar do limite
+            if limite <= 0:
+                return False
+            return self.db.reservar_quota(*chave, limite) is not None
+
+        # Sem limite: só contabilidade, gravada em lote
+        with self._lock:
+            self._pendente[chave] = self._pendente.get(chave, 0) + 1
+            self._total_pendente += 1
+            precisa_flush = (self._total_pendente >= self.lote or
+                             time.monotonic() - self._ultimo_flush >= self.intervalo)
+
+        if precisa_flush:
+            self.flush()
+        return True
+
+    def devolver(self, usuario: Optional[Dict], provedor: str):
+        """Devolve uma consulta reservada que o provedor não atendeu (timeout, resposta diferente de 200)"""
+        identificador, permissao = self._identificar(usuario)
+        chave = (dia_atual(), identificador, provedor)
+        if self.limite(permissao, provedor) is not None:
+            self.db.devolver_quota(*chave)
+            return
+        with self._lock:
+            self._pendente[chave] = self._pendente.get(chave, 0) - 1
+
+    def flush(self):
+        """Grava os incrementos pendentes no banco"""
+        with self._flush_lock:
+            with self._lock:
+                pendente = self._pendente
+                self._pendente = {}
+                self._total_pendente = 0
+                self._ultimo_flush = time.monotonic()
+
+            if not pendente:
+                return
+
+            try:
+                self.db.incrementar_quotas(pendente)
+            except Exception as e:
+                print(f"Error flushing quotas: {e}")
+                # Devolver incrementos para a próxima tentativa
+                with self._lock:
+                    for chave, quantidade in pendente.items():
+                        self._pendente[chave] = self._pendente.get(chave, 0) + quantidade
+                        self._total_pendente += quantidade
+
+    def uso(self, dia: str = None) -> List[Dict]:
+        """Relatório de uso das quotas de um dia (inclui os limites de cada usuário)"""
+        self.flush()
+        dia = dia or dia_atual()
+        relatorio = self.db.listar_uso_quotas(dia)
+
+        permissoes = {}
+        for item in relatorio:
+            usuario = item['usuario']
+            if usuario not in permissoes:
+                if usuario == 'anonimo':
+                    permissoes[usuario] = 'anonimo'
+                else:
+                    dados = self.db.obter_usuario_por_email(usuario)
+                    permissoes[usuario] = dados.get('permissao', 'user') if dados else 'user'
+            item['permissao'] = permissoes[usuario]
+            item['limite'] = self.limite(permissoes[usuario], item['provedor'])
+
+        return relatorio
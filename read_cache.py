@@ -0,0 +1,215 @@
+"""
+Cache de leitura do Database: resultado de uma consulta guardado por
+(nome, parâmetros) e marcado com a geração de cada tabela de que depende.
+Toda escrita declara as tabelas que altera (Database.escrita(invalidar=...)):
+a geração local sobe depois do commit e a compartilhada (linha
+'geracao:<tabela>' em contadores) dentro da mesma transação, para que os
+outros workers também vejam a mudança. Uma entrada só é servida enquanto
+as gerações forem as mesmas de quando foi carregada.
+
+Com um cache compartilhado (shared_cache.py) atrás dele, o resultado também
+fica disponível para os outros workers, marcado só com as gerações
+compartilhadas: um worker recém-iniciado não precisa refazer a consulta.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from cache_registry import tamanho_aproximado
+
+# Geração local por (banco, tabela): compartilhada por todas as instâncias do
+# Database do processo (app, middleware e auth usam instâncias diferentes)
+_geracoes = {}
+_geracoes_lock = threading.Lock()
+# Sobe a cada escrita que também subiu a geração compartilhada: força a
+# releitura das gerações compartilhadas (o processo lê as próprias escritas)
+_versao_compartilhada = 0
+
+def incrementar_geracao_local(banco: str, tabelas: Iterable[str], compartilhada: bool = False):
+    global _versao_compartilhada
+    with _geracoes_lock:
+        for tabela in tabelas:
+            _geracoes[(banco, tabela)] = _geracoes.get((banco, tabela), 0) + 1
+        if compartilhada:
+            _versao_compartilhada += 1
+
+def geracao_local(banco: str, tabela: str) -> int:
+    return _geracoes.get((banco, tabela), 0)
+
+class CacheLeitura:
+    def __init__(self, db, compartilhado=None, maximo: int = None, ttl: float = None, validacao_ms: float = None):
+        self.db = db
+        # Segundo nível, visto pelos outros workers (CacheCompartilhado ou None)
+        self.compartilhado = compartilhado
+        self.ativo = os.getenv('CACHE_LEITURA_ATIVO', 'True').lower() == 'true'
+        self.maximo = maximo or int(os.getenv('CACHE_LEITURA_ENTRADAS', '256'))
+        # Prazo máximo de uma entrada, mesmo sem escrita (rede de segurança)
+        self.ttl = ttl or float(os.getenv('CACHE_LEITURA_TTL_SEGUNDOS', '60'))
+        # Intervalo entre releituras das gerações compartilhadas (escritas de outros workers)
+        self.validacao = (validacao_ms or float(os.getenv('CACHE_LEITURA_VALIDACAO_MS', '1000'))) / 1000.0
+        # Chamado a cada consulta: observador(nome, acerto) (ex: Metricas.contar_cache)
+        self.observador: Optional[Callable[[str, bool], None]] = None
+
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._compartilhadas = {}
+        self._lidas_em = 0.0
+        self._versao_lida = -1
+        self._acertos = 0
+        self._falhas = 0
+        self._acertos_compartilhado = 0
+        self._remocoes = 0
+        self._bytes = 0
+
+    def obter(self, nome: str, parametros: Tuple, tabelas: Tuple[str, ...], carregar: Callable,
+              ttl: float = None, compartilhar: bool = True):
+        """
+        Resultado em cache ou carregar() (guardado com as gerações lidas antes da consulta)
+
+        compartilhar=False: não usa o cache compartilhado (tabelas cujas escritas
+        só sobem a geração local, como o ip_logs)
+        """
+        if not self.ativo:
+            return carregar()
+        chave = (nome, parametros)
+        # Gerações lidas antes de carregar: uma escrita durante a consulta invalida o resultado
+        geracao = self._geracao(tabelas)
+        if geracao is None:
+            return carregar()
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada and entrada[0] == geracao and entrada[1] > agora:
+                self._entradas.move_to_end(chave)
+                self._acertos += 1
+                acerto = True
+            else:
+                self._falhas += 1
+                acerto = False
+        if acerto:
+            self._observar(nome, True)
+            return entrada[2]
+        valor = self._ler_compartilhado(nome, parametros, geracao) if compartilhar else None
+        self._observar(nome, valor is not None)
+        if valor is not None:
+            with self._lock:
+                self._acertos_compartilhado += 1
+        else:
+            valor = carregar()
+            if compartilhar:
+                self._gravar_compartilhado(nome, parametros, geracao, valor, ttl)
+        tamanho = tamanho_aproximado(valor)
+        with self._lock:
+            self._descartar(chave)
+            self._entradas[chave] = (geracao, agora + (ttl or self.ttl), valor, tamanho)
+            self._bytes += tamanho
+            while len(self._entradas) > self.maximo:
+                self._remover_mais_antiga()
+        return valor
+
+    def _descartar(self, chave):
+        entrada = self._entradas.pop(chave, None)
+        if entrada is not None:
+            self._bytes -= entrada[3]
+
+    def _remover_mais_antiga(self) -> int:
+        _, entrada = self._entradas.popitem(last=False)
+        self._bytes -= entrada[3]
+        self._remocoes += 1
+        return entrada[3]
+
+    def _chave_compartilhada(self, nome: str, parametros: Tuple) -> str:
+        return f"leitura:{nome}:{json.dumps(parametros, default=str)}"
+
+    def _ler_compartilhado(self, nome: str, parametros: Tuple, geracao: Tuple):
+        if self.compartilhado is None:
+            return None
+        # Só as gerações compartilhadas: as locais são de cada processo
+        guardado = self.compartilhado.obter(self._chave_compartilhada(nome, parametros), l1=False)
+        if guardado and guardado['geracao'] == [g for _, g in geracao]:
+            return guardado['valor']
+        return None
+
+    def _gravar_compartilhado(self, nome: str, parametros: Tuple, geracao: Tuple, valor, ttl: float = None):
+        if self.compartilhado is None:
+            return
+        try:
+            self.compartilhado.definir(self._chave_compartilhada(nome, parametros),
+                                       {'geracao': [g for _, g in geracao], 'valor': valor},
+                                       ttl or self.ttl, l1=False)
+        except (TypeError, ValueError):
+            pass  # resultado que não vira JSON fica só no cache local
+
+    def _observar(self, nome: str, acerto: bool):
+        if self.observador:
+            try:
+                self.observador(f'leitura:{nome}', acerto)
+            except Exception:
+                pass
+
+    def _geracao(self, tabelas: Tuple[str, ...]) -> Optional[Tuple]:
+        compartilhadas = self._geracoes_compartilhadas()
+        if compartilhadas is None:
+            return None
+        banco = self.db.db_name
+        return tuple((geracao_local(banco, t), compartilhadas.get(t, 0)) for t in tabelas)
+
+    def geracao_compartilhada(self, tabela: str) -> Optional[int]:
+        """Geração compartilhada de `tabela`, relida no mesmo intervalo das consultas (None se não der para ler)"""
+        compartilhadas = self._geracoes_compartilhadas()
+        return None if compartilhadas is None else compartilhadas.get(tabela, 0)
+
+    def _geracoes_compartilhadas(self) -> Optional[Dict[str, int]]:
+        versao = _versao_compartilhada
+        if time.monotonic() - self._lidas_em < self.validacao and versao == self._versao_lida:
+            return self._compartilhadas
+        try:
+            with self.db.leitura() as conn:
+                linhas = conn.execute(
+                    "SELECT substr(nome, 9), total FROM contadores WHERE nome LIKE 'geracao:%'"
+                ).fetchall()
+        except Exception:
+            # Sem como ver as escritas dos outros workers: a consulta vai direto ao banco
+            return None
+        self._compartilhadas = dict(linhas)
+        self._lidas_em = time.monotonic()
+        self._versao_lida = versao
+        return self._compartilhadas
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def uso_memoria(self) -> Dict:
+        """Para o RegistroCaches (cache_registry.py)"""
+        with self._lock:
+            return {'bytes': self._bytes, 'entradas': len(self._entradas), 'acertos': self._acertos,
+                    'falhas': self._falhas, 'remocoes': self._remocoes}
+
+    def reduzir(self, bytes_alvo: int) -> int:
+        """Remove as entradas usadas há mais tempo até liberar `bytes_alvo`; retorna os bytes liberados"""
+        liberados = 0
+        with self._lock:
+            while self._entradas and liberados < bytes_alvo:
+                liberados += self._remover_mais_antiga()
+        return liberados
+
+    def estado(self) -> Dict:
+        with self._lock:
+            consultas = self._acertos + self._falhas
+            return {
+                'ativo': self.ativo,
+                'entradas': len(self._entradas),
+                'maximo': self.maximo,
+                'bytes': self._bytes,
+                'acertos': self._acertos,
+                'falhas': self._falhas,
+                # Falhas locais resolvidas pelo cache compartilhado (sem ir ao banco)
+                'acertos_compartilhado': self._acertos_compartilhado,
+                'taxa_acertos': round(self._acertos / consultas, 4) if consultas else None,
+                'remocoes': self._remocoes
+            }
@@ -0,0 +1,176 @@
+"""
+Retenção de dados: apaga em segundo plano as linhas mais antigas que a janela
+de cada tabela, em lotes pequenos e com tempo limitado por ciclo (para não
+travar as escritas), e devolve o espaço livre com o vacuum incremental.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from database import Database, COLUNAS_DATA
+from maintenance import DURACAO_LEASE, LEASE, dono_processo
+
+# Dias mantidos por tabela (RETENCAO_<TABELA>_DIAS; 0 = manter para sempre)
+RETENCAO_PADRAO = {
+    'buscas': 90,
+    'buscas_cpf': 30,
+    'ip_logs': 30,
+    'ip_unicos_hora': 30,
+    'ip_rollup_hora': 400,
+    'manutencao_execucoes': 90
+}
+
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+class PurgadorRetencao:
+    def __init__(self, db: Database, retencao: Dict[str, int] = None):
+        self.db = db
+        self.retencao = {
+            tabela: int(os.getenv(f'RETENCAO_{tabela.upper()}_DIAS', str(dias)))
+            for tabela, dias in RETENCAO_PADRAO.items()
+        }
+        if retencao:
+            self.retencao.update(retencao)
+        self.intervalo = float(os.getenv('RETENCAO_INTERVALO_SEGUNDOS', '300'))
+        self.lote = int(os.getenv('RETENCAO_LOTE', '500'))
+        # Tempo máximo de expurgo por tabela em cada ciclo
+        self.orcamento = float(os.getenv('RETENCAO_ORCAMENTO_MS', '250')) / 1000.0
+        # Pausa entre lotes para deixar as escritas da aplicação passarem
+        self.pausa = float(os.getenv('RETENCAO_PAUSA_MS', '20')) / 1000.0
+        self.paginas_vacuum = int(os.getenv('RETENCAO_VACUUM_PAGINAS', '2000'))
+        # Entradas vencidas do cache compartilhado também saem a cada ciclo (CacheCompartilhado ou None)
+        self.cache_compartilhado = None
+
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._estado = {tabela: {'removidas_total': 0, 'ultimo_ciclo': None} for tabela in self.retencao}
+        self._ciclos = 0
+        self._ultimo_ciclo = None
+        self._paginas_liberadas = 0
+
+    def iniciar(self):
+        """Inicia a thread de expurgo (uma por processo)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='retencao', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self):
+        # Espera um pouco após o boot para não competir com a inicialização
+        espera = min(self.intervalo, 30)
+        while not self._parar.wait(espera):
+            espera = self.intervalo
+            try:
+                self.executar_ciclo()
+            except Exception as e:
+                print(f"Erro no expurgo de retenção: {e}")
+
+    def limite_data(self, tabela: str) -> Optional[str]:
+        """Linhas com data anterior a esta estão vencidas (None = sem retenção)"""
+        dias = self.retencao.get(tabela, 0)
+        if dias <= 0:
+            return None
+        return (datetime.utcnow() - timedelta(days=dias)).strftime(FORMATO_DATA)
+
+    def expurgar_tabela(self, tabela: str) -> Dict:
+        """Apaga lotes da tabela até acabar o que venceu ou o orçamento de tempo"""
+        limite = self.limite_data(tabela)
+        if not limite:
+            return {'removidas': 0, 'duracao_ms': 0, 'concluido': True}
+
+        inicio = time.perf_counter()
+        removidas, concluido = 0, False
+        while time.perf_counter() - inicio < self.orcamento and not self._parar.is_set():
+            apagadas = self.db.expurgar_lote(tabela, limite, self.lote)
+            removidas += apagadas
+            if apagadas < self.lote:
+                concluido = True
+                break
+            time.sleep(self.pausa)
+        duracao = time.perf_counter() - inicio
+
+        ciclo = {
+            'data': datetime.utcnow().strftime(FORMATO_DATA),
+            'removidas': removidas,
+            'duracao_ms': round(duracao * 1000, 1),
+            'linhas_por_segundo': round(removidas / duracao, 1) if duracao > 0 else 0,
+            'concluido': concluido
+        }
+        with self._lock:
+            self._estado[tabela]['removidas_total'] += removidas
+            self._estado[tabela]['ultimo_ciclo'] = ciclo
+        return ciclo
+
+    def executar_ciclo(self) -> Dict:
+        """
+        Um ciclo: expurgo de cada tabela e vacuum incremental das páginas
+        liberadas. Só no worker que segura o lease de manutenção (o mesmo do
+        AgendadorManutencao); nos outros não faz nada ('lider': False)
+        """
+        if not self.db.adquirir_lease(LEASE, dono_processo(), DURACAO_LEASE):
+            return {'lider': False}
+        # ip_logs antigo (tabela única) é movido aos poucos para as partições mensais
+        migradas = self.db.migrar_ip_logs_legado(orcamento=self.orcamento)
+        # e as tabelas de busca por tipo para buscas/busca_fontes
+        buscas_migradas = self.db.migrar_buscas_legado(self.lote, self.orcamento)
+        resultado = {tabela: self.expurgar_tabela(tabela) for tabela in self.retencao}
+        cache_vencidas = self.cache_compartilhado.expurgar_vencidas(self.lote) if self.cache_compartilhado else 0
+        paginas = 0
+        if migradas or buscas_migradas or any(r['removidas'] for r in resultado.values()) or self.db.estado_vacuum()['paginas_livres']:
+            paginas = self.db.vacuum_incremental(self.paginas_vacuum)
+        with self._lock:
+            self._ciclos += 1
+            self._ultimo_ciclo = datetime.utcnow().strftime(FORMATO_DATA)
+            self._paginas_liberadas += paginas
+        return {'lider': True, 'tabelas': resultado, 'ip_logs_migradas': migradas,
+                'buscas_migradas': buscas_migradas, 'cache_vencidas': cache_vencidas,
+                'paginas_liberadas': paginas}
+
+    def atraso(self, tabela: str) -> float:
+        """Segundos que a linha mais antiga passou da janela (0 = em dia)"""
+        limite = self.limite_data(tabela)
+        mais_antiga = self.db.data_mais_antiga(tabela) if limite else None
+        if not mais_antiga or mais_antiga >= limite:
+            return 0.0
+        try:
+            return (datetime.strptime(limite, FORMATO_DATA)
+                    - datetime.strptime(mais_antiga[:19], FORMATO_DATA)).total_seconds()
+        except ValueError:
+            return 0.0
+
+    def atrasos(self) -> Dict[str, float]:
+        return {tabela: self.atraso(tabela) for tabela in self.retencao}
+
+    def estado(self) -> Dict:
+        """Janelas, atraso, pendências e vazão do expurgo por tabela"""
+        tabelas = {}
+        with self._lock:
+            copia = {t: dict(e) for t, e in self._estado.items()}
+        for tabela, estado in copia.items():
+            limite = self.limite_data(tabela)
+            tabelas[tabela] = {
+                'dias': self.retencao[tabela],
+                'coluna': COLUNAS_DATA[tabela],
+                'limite_data': limite,
+                'vencidas_pendentes': self.db.contar_expiradas(tabela, limite) if limite else 0,
+                'atraso_segundos': self.atraso(tabela),
+                **estado
+            }
+        return {
+            'ativo': bool(self._thread and self._thread.is_alive()),
+            'intervalo_segundos': self.intervalo,
+            'lote': self.lote,
+            'orcamento_ms': self.orcamento * 1000,
+            'ciclos': self._ciclos,
+            'ultimo_ciclo': self._ultimo_ciclo,
+            'paginas_liberadas': self._paginas_liberadas,
+            'vacuum': self.db.estado_vacuum(),
+            'tabelas': tabelas
+        }
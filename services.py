@@ -0,0 +1,184 @@
+"""
+Objetos compartilhados pelos pontos de entrada (app.py para o gunicorn, asgi.py
+para o uvicorn): banco, ferramentas OSINT, quotas, jobs, admissão, métricas,
+retenção, manutenção, snapshots e caches.
+
+Importar este módulo não inicia nenhuma thread: quem serve as requisições
+chama iniciar_segundo_plano() uma vez (retenção, manutenção, orçamento dos
+caches e a gravação dos pendentes na saída do processo).
+"""
+import atexit
+import json
+import os
+import secrets
+from database import Database, registrar_observador_sql, registrar_observador_acesso
+from osint_tools import OSINTTools
+from quotas import QuotaManager
+from jobs import JobManager
+from admission import AdmissionController
+from metrics import Metricas, observar_sql, em_andamento
+from sql_trace import RastreadorSQL
+from retention import PurgadorRetencao
+from snapshots import GerenciadorSnapshots
+from maintenance import AgendadorManutencao
+from ip_logs import obter_particoes
+from access_feed import TransmissorAcessos
+from shared_cache import obter_cache_compartilhado
+from osint_results import Resultado
+from cache_registry import RegistroCaches
+
+# Chave dos cookies de sessão (a mesma para o app Flask e para o ASGI)
+SECRET_KEY = os.getenv('SECRET_KEY', secrets.token_hex(16))
+
+db = Database()
+osint = OSINTTools()
+
+# Quota diária dos provedores pagos de CPF
+quotas = QuotaManager(db)
+osint.cpf_api.quota = quotas
+
+# Pool para buscas em segundo plano (modo assíncrono)
+jobs = JobManager(db)
+
+# Controle de admissão (503 + Retry-After quando saturado)
+admissao = AdmissionController()
+admissao.registrar_sonda('fila_jobs', lambda: jobs.pendentes, jobs.max_pendentes, grupos=('search',))
+admissao.registrar_sonda('fila_escrita_db', Database.escritas_pendentes,
+                         int(os.getenv('ADMISSAO_LIMITE_FILA_DB', '8')),
+                         grupos=('search', 'auth', 'default'))
+# Chamadas às APIs de CPF e de vazamentos em andamento (requisições e jobs):
+# com o upstream lento, novas buscas só aumentariam a fila de espera
+admissao.registrar_sonda('upstream_em_andamento', lambda: em_andamento('upstream'),
+                         int(os.getenv('ADMISSAO_LIMITE_UPSTREAM', '12')), grupos=('search',))
+
+# Métricas (latência por rota, tempo por etapa, gauges) expostas em /metrics
+metricas = Metricas()
+registrar_observador_sql(observar_sql)
+metricas.registrar_gauge('admissao_em_andamento', 'Requisições admitidas em andamento por grupo',
+                         lambda: admissao.estado()['em_andamento'], rotulo='grupo')
+metricas.registrar_gauge('admissao_recusadas_total', 'Requisições recusadas pelo controle de admissão',
+                         lambda: admissao.estado()['recusadas'], rotulo='grupo', tipo='counter')
+metricas.registrar_gauge('upstream_em_andamento', 'Chamadas às APIs externas (CPF, vazamentos) em andamento',
+                         lambda: em_andamento('upstream'))
+metricas.registrar_gauge('jobs_pendentes', 'Buscas em segundo plano na fila ou em execução',
+                         lambda: jobs.pendentes)
+metricas.registrar_gauge('db_escritas_pendentes', 'Escritas no banco em andamento ou aguardando o lock',
+                         Database.escritas_pendentes)
+metricas.registrar_gauge('db_ocupado_total', 'Banco ocupado por outro processo: repetições e falhas após as tentativas',
+                         Database.contencao, rotulo='resultado', tipo='counter')
+metricas.registrar_gauge('db_leituras_interrompidas_total', 'Consultas de relatório interrompidas pelo tempo máximo',
+                         lambda: db.pool_leitura.interrompidas, tipo='counter')
+metricas.registrar_gauge('db_pool_leitura_abertas', 'Conexões somente leitura abertas no pool',
+                         lambda: db.pool_leitura.abertas)
+# Cache de leitura do painel (histórico, estatísticas, IPs e usuários): acertos em /metrics
+db.cache.observador = metricas.contar_cache
+metricas.registrar_gauge('db_cache_leitura_entradas', 'Consultas guardadas no cache de leitura do banco',
+                         lambda: db.cache.estado()['entradas'])
+
+# Cache compartilhado entre os workers: respostas das APIs externas, estado delas
+# e segundo nível do cache de leitura (None com CACHE_COMPARTILHADO_ATIVO=False)
+cache_compartilhado = obter_cache_compartilhado(db)
+osint.cache = cache_compartilhado
+osint.cpf_api.capacidades = cache_compartilhado
+osint.vazamentos_api.capacidades = cache_compartilhado
+if cache_compartilhado:
+    cache_compartilhado.observador = metricas.contar_cache
+    metricas.registrar_gauge('cache_compartilhado_bytes', 'Bytes no cache compartilhado entre os workers',
+                             lambda: cache_compartilhado.estado()['bytes'] or 0)
+
+# Rastreamento de SQL (opcional): SQL_TRACE=true ou POST /api/admin/sql-trace
+rastreador_sql = RastreadorSQL(db.db_name)
+if os.getenv('SQL_TRACE', 'False').lower() == 'true':
+    rastreador_sql.ativar()
+
+# Retenção: expurgo em segundo plano das linhas antigas
+retencao = PurgadorRetencao(db)
+retencao.cache_compartilhado = cache_compartilhado
+metricas.registrar_gauge('retencao_atraso_segundos', 'Quanto a linha mais antiga passou da janela de retenção',
+                         retencao.atrasos, rotulo='tabela')
+
+# Manutenção do banco (checkpoint, optimize, ANALYZE, integridade) no worker eleito
+manutencao = AgendadorManutencao(db, carga=lambda: admissao.carga() + jobs.pendentes + Database.escritas_pendentes())
+metricas.registrar_gauge('db_wal_bytes', 'Tamanho do arquivo WAL do banco principal',
+                         manutencao.tamanho_wal)
+
+# Snapshots do banco em uso (API de backup do SQLite, em passos)
+snapshots = GerenciadorSnapshots(db)
+metricas.registrar_gauge('snapshot_idade_segundos', 'Segundos desde o snapshot mais recente do banco (-1: nenhum)',
+                         snapshots.idade_ultimo)
+
+# Log de acessos ao vivo (/api/admin/ips/stream), alimentado por registrar_ip
+transmissor = TransmissorAcessos()
+registrar_observador_acesso(transmissor.publicar)
+metricas.registrar_gauge('acessos_stream_conexoes', 'Conexões abertas no stream do log de acessos',
+                         lambda: transmissor.assinantes)
+
+# Orçamento de memória único para os caches do processo; o peso é quanto custa
+# refazer o que cada um guarda (os de menor valor perdem entradas primeiro)
+registro_caches = RegistroCaches()
+registro_caches.registrar('leitura', db.cache, peso=3)
+if cache_compartilhado:
+    registro_caches.registrar('compartilhado_l1', cache_compartilhado, peso=1)
+registro_caches.registrar('ip_user_agents', obter_particoes(db).user_agents, peso=2)
+registro_caches.registrar('ip_paths', obter_particoes(db).paths, peso=2)
+registro_caches.registrar('acessos_stream', transmissor, peso=1)
+registro_caches.registrar('jobs', jobs, peso=5)
+metricas.registrar_gauge('cache_memoria_bytes', 'Bytes aproximados em memória por cache registrado',
+                         registro_caches.totais, rotulo='cache')
+
+_iniciado = False
+
+def iniciar_segundo_plano():
+    """Threads de fundo e gravação dos pendentes na saída (só pelo ponto de entrada, uma vez)"""
+    global _iniciado
+    if _iniciado:
+        return
+    _iniciado = True
+    atexit.register(quotas.flush)
+    # Agregados por hora do log de acessos (gravados em lote)
+    atexit.register(obter_particoes(db).flush)
+    if os.getenv('RETENCAO_ATIVA', 'True').lower() == 'true':
+        retencao.iniciar()
+    if os.getenv('MANUTENCAO_ATIVA', 'True').lower() == 'true':
+        manutencao.iniciar()
+        atexit.register(manutencao.parar)
+    if os.getenv('CACHE_MEMORIA_ATIVA', 'True').lower() == 'true':
+        registro_caches.iniciar()
+        atexit.register(registro_caches.parar)
+
+def salvar_busca(tipo: str, termo: str, resultado, url_imagem: str = ''):
+    """Salva a busca (com o resultado de cada fonte e as colunas do tipo) numa só escrita"""
+    if isinstance(resultado, Resultado):
+        # Mesmo JSON que vai na resposta, gerado uma vez só
+        resultado_json = resultado.para_json()
+    else:
+        resultado_json = json.dumps(resultado, ensure_ascii=False)
+    fontes = [(fonte.get('nome', ''), fonte.get('resultado', '')) for fonte in resultado.get('fontes', [])]
+    
+    extensoes = {}
+    if tipo == 'processo':
+        extensoes = {'status': resultado.get('status', 'pendente')}
+    elif tipo == 'foto':
+        extensoes = {'url_imagem': url_imagem or '', 'hash_imagem': resultado.get('hash_imagem', '')}
+    elif tipo == 'cpf':
+        extensoes = {
+            'cpf': resultado.get('cpf_limpo', ''),
+            'informacoes': json.dumps(resultado.get('informacoes', {}), ensure_ascii=False),
+            'status': resultado.get('status', 'encontrado')
+        }
+    
+    db.registrar_busca(tipo, termo, resultado_json, fontes, **extensoes)
+
+def concluir_busca_cpf(resultado):
+    """Define o código HTTP da busca de CPF e salva no banco"""
+    # Quota diária dos provedores pagos atingida
+    if resultado.get('quota_excedida'):
+        return resultado, 429
+    
+    # Se houver erro na validação
+    if resultado.get('erro'):
+        return resultado, 400
+    
+    # Salvar no banco de dados
+    salvar_busca('cpf', resultado.get('cpf', ''), resultado)
+    return resultado, 200
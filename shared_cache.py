@@ -0,0 +1,313 @@
+"""
+Cache compartilhado entre os workers do mesmo host: tabela chave/valor num
+arquivo SQLite próprio (WAL, ao lado do banco), com validade por entrada,
+limite de tamanho e remoção das entradas acessadas há mais tempo. Na frente
+dele, cada processo tem um L1 em memória (LRU com validade curta, porque outro
+worker pode ter trocado a entrada).
+
+Valores são gravados como JSON. O L1 guarda o texto e cada leitura devolve um
+objeto novo, que quem recebe pode alterar. None não é cacheável (é a falha).
+Problemas do cache (arquivo ocupado, disco cheio) nunca chegam a quem chamou:
+viram uma falha na leitura ou uma escrita ignorada.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Um cache por arquivo, compartilhado pelas instâncias de Database do processo
+_instancias = {}
+_instancias_lock = threading.Lock()
+
+def obter_cache_compartilhado(db) -> Optional['CacheCompartilhado']:
+    """Cache do banco `db` (None no banco em memória ou com CACHE_COMPARTILHADO_ATIVO=False)"""
+    if db.em_memoria or os.getenv('CACHE_COMPARTILHADO_ATIVO', 'True').lower() != 'true':
+        return None
+    caminho = os.getenv('CACHE_COMPARTILHADO_ARQUIVO') or os.path.splitext(db.db_name)[0] + '.cache'
+    chave = os.path.abspath(caminho)
+    with _instancias_lock:
+        if chave not in _instancias:
+            _instancias[chave] = CacheCompartilhado(caminho)
+        return _instancias[chave]
+
+ESQUEMA = '''
+    CREATE TABLE IF NOT EXISTS cache (
+        chave TEXT PRIMARY KEY,
+        valor TEXT NOT NULL,
+        tamanho INTEGER NOT NULL,
+        expira REAL NOT NULL,
+        acesso REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_cache_acesso ON cache(acesso);
+    CREATE INDEX IF NOT EXISTS idx_cache_expira ON cache(expira);
+    CREATE TABLE IF NOT EXISTS cache_total (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        bytes INTEGER NOT NULL,
+        entradas INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO cache_total (id, bytes, entradas) VALUES (1, 0, 0);
+    CREATE TRIGGER IF NOT EXISTS trg_cache_inserir AFTER INSERT ON cache BEGIN
+        UPDATE cache_total SET bytes = bytes + new.tamanho, entradas = entradas + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_cache_apagar AFTER DELETE ON cache BEGIN
+        UPDATE cache_total SET bytes = bytes - old.tamanho, entradas = entradas - 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_cache_trocar AFTER UPDATE OF tamanho ON cache BEGIN
+        UPDATE cache_total SET bytes = bytes + new.tamanho - old.tamanho;
+    END;
+'''
+
+class CacheCompartilhado:
+    def __init__(self, caminho: str, max_mb: float = None, ttl: float = None,
+                 l1_entradas: int = None, l1_ttl: float = None):
+        self.caminho = caminho
+        self.max_bytes = int((max_mb or float(os.getenv('CACHE_COMPARTILHADO_MAX_MB', '64'))) * 1024 * 1024)
+        # Validade padrão de uma entrada (quem grava pode passar outra)
+        self.ttl = ttl or float(os.getenv('CACHE_COMPARTILHADO_TTL_SEGUNDOS', '3600'))
+        self.l1_maximo = l1_entradas or int(os.getenv('CACHE_L1_ENTRADAS', '512'))
+        self.l1_ttl = l1_ttl or float(os.getenv('CACHE_L1_TTL_SEGUNDOS', '5'))
+        # Espera máxima pelo lock do arquivo: o cache nunca segura uma requisição
+        self.espera_ms = float(os.getenv('CACHE_COMPARTILHADO_ESPERA_MS', '50'))
+        # Uma leitura só regrava o horário de acesso (LRU) se ele for mais velho que isto
+        self.toque = float(os.getenv('CACHE_COMPARTILHADO_TOQUE_SEGUNDOS', '30'))
+        # Chamado a cada leitura: observador(nome, acerto) (ex: Metricas.contar_cache)
+        self.observador: Optional[Callable[[str, bool], None]] = None
+
+        self._reiniciar()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        # Conexões SQLite não atravessam o fork: cada processo (e thread) abre as suas
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._esquema_criado = False
+        self._l1 = OrderedDict()
+        self._l1_bytes = 0
+        self._contagens = {'acertos_l1': 0, 'acertos': 0, 'falhas': 0, 'escritas': 0,
+                           'remocoes': 0, 'remocoes_l1': 0, 'erros': 0}
+
+    def _conexao(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=self.espera_ms / 1000.0, isolation_level=None)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=OFF')  # conteúdo descartável
+                if not self._esquema_criado:
+                    conn.executescript(ESQUEMA)
+                    self._esquema_criado = True
+            except Exception:
+                conn.close()
+                raise
+            self._local.conn = conn
+        return conn
+
+    def _contar(self, nome: str, n: int = 1):
+        with self._lock:
+            self._contagens[nome] += n
+
+    def _observar(self, chave: str, acerto: bool):
+        if self.observador:
+            try:
+                self.observador(f"compartilhado:{chave.split(':', 1)[0]}", acerto)
+            except Exception:
+                pass
+
+    # L1 (memória do processo)
+
+    def _ler_l1(self, chave: str, agora: float) -> Optional[str]:
+        with self._lock:
+            entrada = self._l1.get(chave)
+            if entrada is None:
+                return None
+            if entrada[0] <= agora:
+                self._descartar_l1(chave)
+                return None
+            self._l1.move_to_end(chave)
+            self._contagens['acertos_l1'] += 1
+            return entrada[1]
+
+    def _guardar_l1(self, chave: str, texto: str, expira: float):
+        with self._lock:
+            self._descartar_l1(chave)
+            self._l1[chave] = (expira, texto)
+            self._l1_bytes += sys.getsizeof(texto)
+            while len(self._l1) > self.l1_maximo:
+                self._remover_l1_mais_antiga()
+
+    def _remover_l1_mais_antiga(self) -> int:
+        _, (_, texto) = self._l1.popitem(last=False)
+        tamanho = sys.getsizeof(texto)
+        self._l1_bytes -= tamanho
+        self._contagens['remocoes_l1'] += 1
+        return tamanho
+
+    def _descartar_l1(self, chave: str):
+        entrada = self._l1.pop(chave, None)
+        if entrada is not None:
+            self._l1_bytes -= sys.getsizeof(entrada[1])
+
+    # Interface
+
+    def obter(self, chave: str, l1: bool = True) -> Any:
+        """Valor guardado (um objeto novo a cada leitura) ou None se não houver ou tiver vencido"""
+        agora = time.time()
+        texto = self._ler_l1(chave, agora) if l1 else None
+        if texto is not None:
+            self._observar(chave, True)
+            return json.loads(texto)
+        try:
+            conn = self._conexao()
+            linha = conn.execute('SELECT valor, expira, acesso FROM cache WHERE chave = ?', (chave,)).fetchone()
+        except sqlite3.Error:
+            self._contar('erros')
+            linha = None
+        if linha and linha[1] <= agora:
+            try:
+                # Vencida: sai já (as que ninguém lê saem no expurgar_vencidas)
+                conn.execute('DELETE FROM cache WHERE chave = ? AND expira <= ?', (chave, agora))
+            except sqlite3.Error:
+                pass
+            linha = None
+        if not linha:
+            self._contar('falhas')
+            self._observar(chave, False)
+            return None
+        if agora - linha[2] > self.toque:
+            try:
+                conn.execute('UPDATE cache SET acesso = ? WHERE chave = ?', (agora, chave))
+            except sqlite3.Error:
+                pass  # só o LRU fica menos preciso
+        self._contar('acertos')
+        self._observar(chave, True)
+        if l1:
+            self._guardar_l1(chave, linha[0], min(linha[1], agora + self.l1_ttl))
+        return json.loads(linha[0])
+
+    def definir(self, chave: str, valor: Any, ttl: float = None, l1: bool = True):
+        """Grava `valor` (serializável em JSON) por `ttl` segundos; valores maiores que o limite são ignorados"""
+        if valor is None:
+            return
+        texto = json.dumps(valor, ensure_ascii=False, separators=(',', ':'))
+        tamanho = len(texto.encode('utf-8')) + len(chave)
+        if tamanho > self.max_bytes:
+            return
+        agora = time.time()
+        expira = agora + (ttl or self.ttl)
+        if l1:
+            self._guardar_l1(chave, texto, min(expira, agora + self.l1_ttl))
+        try:
+            conn = self._conexao()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('''
+                    INSERT INTO cache (chave, valor, tamanho, expira, acesso) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor, tamanho = excluded.tamanho,
+                                                     expira = excluded.expira, acesso = excluded.acesso
+                ''', (chave, texto, tamanho, expira, agora))
+                total = conn.execute('SELECT bytes FROM cache_total').fetchone()[0]
+                removidas = self._remover_excesso(conn, agora, total) if total > self.max_bytes else 0
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            self._contar('erros')
+            return
+        self._contar('escritas')
+        if removidas:
+            self._contar('remocoes', removidas)
+
+    def _remover_excesso(self, conn, agora: float, total: int) -> int:
+        """Vencidas primeiro, depois as acessadas há mais tempo, até 90% do limite"""
+        removidas = conn.execute('DELETE FROM cache WHERE expira <= ?', (agora,)).rowcount
+        alvo = self.max_bytes * 0.9
+        total = conn.execute('SELECT bytes FROM cache_total').fetchone()[0]
+        while total > alvo:
+            cursor = conn.execute('''
+                DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY acesso LIMIT 100)
+            ''')
+            if not cursor.rowcount:
+                break
+            removidas += cursor.rowcount
+            total = conn.execute('SELECT bytes FROM cache_total').fetchone()[0]
+        return removidas
+
+    def expurgar_vencidas(self, lote: int = 500) -> int:
+        """Apaga do arquivo as entradas vencidas, em lotes; retorna quantas saíram"""
+        removidas = 0
+        try:
+            conn = self._conexao()
+            while True:
+                apagadas = conn.execute(
+                    'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE expira <= ? LIMIT ?)',
+                    (time.time(), lote)
+                ).rowcount
+                removidas += apagadas
+                if apagadas < lote:
+                    break
+        except sqlite3.Error:
+            self._contar('erros')
+        if removidas:
+            self._contar('remocoes', removidas)
+        return removidas
+
+    def remover(self, chave: str):
+        with self._lock:
+            self._descartar_l1(chave)
+        try:
+            self._conexao().execute('DELETE FROM cache WHERE chave = ?', (chave,))
+        except sqlite3.Error:
+            self._contar('erros')
+
+    def limpar(self, prefixo: str = ''):
+        """Apaga as entradas cuja chave começa com `prefixo` (todas, sem prefixo)"""
+        with self._lock:
+            for chave in [c for c in self._l1 if c.startswith(prefixo)]:
+                self._descartar_l1(chave)
+        try:
+            self._conexao().execute('DELETE FROM cache WHERE substr(chave, 1, ?) = ?', (len(prefixo), prefixo))
+        except sqlite3.Error:
+            self._contar('erros')
+
+    def uso_memoria(self) -> Dict:
+        """Só o L1 (o resto está no arquivo), para o RegistroCaches (cache_registry.py)"""
+        with self._lock:
+            c = self._contagens
+            return {'bytes': self._l1_bytes, 'entradas': len(self._l1), 'acertos': c['acertos_l1'],
+                    'falhas': c['acertos'] + c['falhas'], 'remocoes': c['remocoes_l1']}
+
+    def reduzir(self, bytes_alvo: int) -> int:
+        """Tira do L1 as entradas usadas há mais tempo (continuam no arquivo)"""
+        liberados = 0
+        with self._lock:
+            while self._l1 and liberados < bytes_alvo:
+                liberados += self._remover_l1_mais_antiga()
+        return liberados
+
+    def estado(self) -> Dict:
+        with self._lock:
+            contagens = dict(self._contagens)
+            l1 = {'entradas': len(self._l1), 'maximo': self.l1_maximo, 'bytes': self._l1_bytes,
+                  'ttl_segundos': self.l1_ttl}
+        leituras = contagens['acertos_l1'] + contagens['acertos'] + contagens['falhas']
+        acertos = contagens['acertos_l1'] + contagens['acertos']
+        try:
+            bytes_l2, entradas_l2 = self._conexao().execute('SELECT bytes, entradas FROM cache_total').fetchone()
+        except sqlite3.Error:
+            bytes_l2 = entradas_l2 = None
+        return {
+            'arquivo': self.caminho,
+            'entradas': entradas_l2,
+            'bytes': bytes_l2,
+            'max_bytes': self.max_bytes,
+            'ttl_segundos': self.ttl,
+            'l1': l1,
+            'taxa_acertos': round(acertos / leituras, 4) if leituras else None,
+            **contagens
+        }
@@ -0,0 +1,446 @@
+"""
+Snapshots do banco em uso, sem parar a aplicação: a cópia é feita pela API de
+backup do SQLite em passos pequenos, com pausas entre eles para as escritas dos
+workers passarem. Cada snapshot é verificado (integrity_check e sha256),
+comprimido com gzip e os mais antigos são apagados (rotação).
+
+Uso pela linha de comando:
+    python snapshots.py criar
+    python snapshots.py listar
+    python snapshots.py verificar osint_database_20240501-030000.db.gz
+    python snapshots.py restaurar osint_database_20240501-030000.db.gz
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from database import Database
+from ip_logs import GERACAO_DICIONARIOS, obter_particoes
+from read_cache import incrementar_geracao_local
+
+# Dicionários do log de acessos: ficam no banco principal, as partições não
+DICIONARIOS = ('ip_user_agents', 'ip_paths')
+
+_RE_NOME = re.compile(r'^[\w.-]+_\d{8}-\d{6}(?:_[\w-]+)?\.db(?:\.gz)?$')
+
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+def sha256_arquivo(caminho: str) -> str:
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+def verificar_integridade(caminho: str) -> str:
+    """Resultado do PRAGMA integrity_check ('ok' se o arquivo estiver íntegro)"""
+    conn = sqlite3.connect(f'file:{caminho}?mode=ro', uri=True)
+    try:
+        linhas = conn.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        conn.close()
+    return '; '.join(linha[0] for linha in linhas)
+
+class OperacaoEmAndamento(Exception):
+    """Já existe um snapshot ou uma restauração em andamento"""
+    pass
+
+class GerenciadorSnapshots:
+    def __init__(self, db: Database, diretorio: str = None, maximo: int = None):
+        self.db = db
+        self.diretorio = diretorio or os.getenv('SNAPSHOT_DIR', 'backups')
+        self.maximo = maximo or int(os.getenv('SNAPSHOT_MAX', '7'))
+        self.comprimir = os.getenv('SNAPSHOT_COMPRIMIR', 'True').lower() == 'true'
+        # Páginas copiadas por passo e pausa entre passos (o lock de leitura só
+        # é mantido durante um passo)
+        self.paginas_por_passo = int(os.getenv('SNAPSHOT_PAGINAS_POR_PASSO', '256'))
+        self.pausa = float(os.getenv('SNAPSHOT_PAUSA_MS', '10')) / 1000.0
+        # Uma escrita de outra conexão no meio da cópia faz o SQLite recomeçar;
+        # depois de tantos recomeços o restante é copiado em um passo só
+        self.max_reinicios = int(os.getenv('SNAPSHOT_MAX_REINICIOS', '3'))
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ultimo_progresso_gravado = 0.0
+
+    # Arquivos
+
+    def _base(self) -> str:
+        if self.db.em_memoria:
+            return 'memoria'
+        return os.path.splitext(os.path.basename(self.db.db_name))[0]
+
+    def caminho(self, nome: str) -> Optional[str]:
+        """Caminho do snapshot (None se o nome for inválido ou não existir)"""
+        if not _RE_NOME.match(nome or ''):
+            return None
+        arquivo = os.path.join(self.diretorio, nome)
+        return arquivo if os.path.isfile(arquivo) else None
+
+    def _metadados_caminho(self, nome: str) -> str:
+        return os.path.join(self.diretorio, nome + '.json')
+
+    def obter(self, nome: str) -> Optional[Dict]:
+        """Metadados de um snapshot"""
+        if not self.caminho(nome):
+            return None
+        try:
+            with open(self._metadados_caminho(nome), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'arquivo': nome}
+
+    def listar(self) -> List[Dict]:
+        """Snapshots guardados, mais recentes primeiro"""
+        if not os.path.isdir(self.diretorio):
+            return []
+        snapshots = []
+        for nome in sorted((n for n in os.listdir(self.diretorio) if _RE_NOME.match(n)),
+                           key=lambda n: self._data_do_nome(n), reverse=True):
+            metadados = self.obter(nome) or {'arquivo': nome}
+            metadados['tamanho_bytes'] = os.path.getsize(os.path.join(self.diretorio, nome))
+            snapshots.append(metadados)
+        return snapshots
+
+    @staticmethod
+    def _data_do_nome(nome: str) -> str:
+        encontrado = re.search(r'_(\d{8}-\d{6})', nome)
+        return encontrado.group(1) if encontrado else ''
+
+    def _aplicar_rotacao(self):
+        """Remove os snapshots mais antigos acima do máximo (os de restauração não contam)"""
+        automaticos = [s['arquivo'] for s in self.listar() if not s.get('motivo')]
+        for nome in automaticos[self.maximo:]:
+            for arquivo in (os.path.join(self.diretorio, nome), self._metadados_caminho(nome)):
+                try:
+                    os.remove(arquivo)
+                except OSError:
+                    pass
+
+    # Progresso (em arquivo: qualquer worker do gunicorn consegue informar)
+
+    def _progresso_caminho(self) -> str:
+        return os.path.join(self.diretorio, 'progresso.json')
+
+    def _gravar_progresso(self, progresso: Dict, forcar: bool = False):
+        agora = time.monotonic()
+        if not forcar and agora - self._ultimo_progresso_gravado < 0.5:
+            return
+        self._ultimo_progresso_gravado = agora
+        os.makedirs(self.diretorio, exist_ok=True)
+        temporario = self._progresso_caminho() + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(progresso, f, ensure_ascii=False)
+        os.replace(temporario, self._progresso_caminho())
+
+    def progresso(self) -> Optional[Dict]:
+        """Operação em andamento ou a última concluída"""
+        try:
+            with open(self._progresso_caminho(), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def em_andamento(self) -> bool:
+        progresso = self.progresso()
+        return bool(progresso and progresso.get('em_andamento')
+                    and time.time() - progresso.get('atualizado_em', 0) < 300)
+
+    # Cópia
+
+    def _copiar(self, origem: sqlite3.Connection, destino: sqlite3.Connection, progresso: Dict):
+        """Backup em passos, com pausa entre eles; passo único depois de muitos recomeços"""
+        estado = {'restantes_anterior': None}
+
+        def ao_avancar(status, restantes, total):
+            if estado['restantes_anterior'] is not None and restantes > estado['restantes_anterior']:
+                progresso['reinicios'] += 1
+            estado['restantes_anterior'] = restantes
+            progresso.update(paginas_total=total, paginas_restantes=restantes,
+                             percentual=round(100.0 * (total - restantes) / total, 1) if total else 100.0,
+                             atualizado_em=time.time())
+            self._gravar_progresso(progresso)
+            if progresso['reinicios'] >= self.max_reinicios:
+                raise _PassoUnico()
+            time.sleep(self.pausa)
+
+        try:
+            origem.backup(destino, pages=self.paginas_por_passo, progress=ao_avancar)
+        except _PassoUnico:
+            # Com WAL o passo único só segura um snapshot de leitura: não bloqueia escritas
+            origem.backup(destino, pages=-1)
+        progresso.update(paginas_restantes=0, percentual=100.0)
+
+    def _executar(self, operacao: str, funcao, *args) -> Dict:
+        with self._lock:
+            if (self._thread and self._thread.is_alive() and self._thread is not threading.current_thread()) \
+                    or self.em_andamento():
+                raise OperacaoEmAndamento('Another snapshot or restore is in progress')
+            progresso = {'operacao': operacao, 'em_andamento': True, 'pid': os.getpid(),
+                         'inicio': datetime.utcnow().strftime(FORMATO_DATA), 'atualizado_em': time.time(),
+                         'paginas_total': None, 'paginas_restantes': None, 'percentual': 0.0, 'reinicios': 0}
+            self._gravar_progresso(progresso, forcar=True)
+        inicio = time.perf_counter()
+        try:
+            resultado = funcao(progresso, *args)
+            progresso.update(sucesso=resultado.get('sucesso', True), resultado=resultado)
+            return resultado
+        except Exception as e:
+            progresso.update(sucesso=False, erro=str(e))
+            raise
+        finally:
+            progresso.update(em_andamento=False, atualizado_em=time.time(),
+                             duracao_ms=round((time.perf_counter() - inicio) * 1000, 1))
+            self._gravar_progresso(progresso, forcar=True)
+
+    def criar(self, comprimir: bool = None, motivo: str = None) -> Dict:
+        """Cria um snapshot do banco em uso, verifica, comprime e aplica a rotação"""
+        return self._executar('snapshot', self._criar, self.comprimir if comprimir is None else comprimir, motivo)
+
+    def _criar(self, progresso: Dict, comprimir: bool, motivo: Optional[str]) -> Dict:
+        os.makedirs(self.diretorio, exist_ok=True)
+        sufixo = f'_{motivo}' if motivo else ''
+        nome = f"{self._base()}_{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}{sufixo}.db"
+        destino_caminho = os.path.join(self.diretorio, nome + '.tmp')
+
+        origem = self.db.get_connection()
+        destino = sqlite3.connect(destino_caminho)
+        try:
+            self._copiar(origem, destino, progresso)
+            # O snapshot é um arquivo único (sem -wal/-shm ao lado)
+            destino.execute('PRAGMA journal_mode=DELETE')
+            paginas = destino.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            destino.close()
+            origem.close()
+
+        integridade = verificar_integridade(destino_caminho)
+        if integridade != 'ok':
+            os.remove(destino_caminho)
+            raise RuntimeError(f'Snapshot failed integrity check: {integridade}')
+
+        tamanho_original = os.path.getsize(destino_caminho)
+        if comprimir:
+            nome += '.gz'
+            with open(destino_caminho, 'rb') as entrada, gzip.open(os.path.join(self.diretorio, nome), 'wb', compresslevel=6) as saida:
+                shutil.copyfileobj(entrada, saida, 1024 * 1024)
+            os.remove(destino_caminho)
+        else:
+            os.replace(destino_caminho, os.path.join(self.diretorio, nome))
+
+        arquivo = os.path.join(self.diretorio, nome)
+        metadados = {
+            'arquivo': nome,
+            'data': datetime.utcnow().strftime(FORMATO_DATA),
+            'banco': self.db.db_name,
+            'motivo': motivo,
+            'comprimido': comprimir,
+            'paginas': paginas,
+            'tamanho_original_bytes': tamanho_original,
+            'tamanho_bytes': os.path.getsize(arquivo),
+            'sha256': sha256_arquivo(arquivo),
+            'integridade': integridade,
+            'reinicios': progresso['reinicios'],
+            # As partições mensais do ip_logs são arquivos à parte e não entram
+            'inclui_particoes_ip_logs': False
+        }
+        with open(self._metadados_caminho(nome), 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, ensure_ascii=False, indent=2)
+        self._aplicar_rotacao()
+        return metadados
+
+    def iniciar_criacao(self, comprimir: bool = None) -> bool:
+        """Cria um snapshot em segundo plano (False se já houver operação em andamento)"""
+        with self._lock:
+            if (self._thread and self._thread.is_alive()) or self.em_andamento():
+                return False
+            self._thread = threading.Thread(target=self._criar_em_segundo_plano, args=(comprimir,),
+                                            name='snapshot', daemon=True)
+            self._thread.start()
+            return True
+
+    def _criar_em_segundo_plano(self, comprimir):
+        try:
+            self.criar(comprimir)
+        except Exception as e:
+            print(f"Erro ao criar snapshot: {e}")
+
+    # Verificação e restauração
+
+    def _descomprimido(self, nome: str) -> str:
+        """Caminho de uma cópia descomprimida (temporária) do snapshot; o .db é usado direto"""
+        arquivo = self.caminho(nome)
+        if not nome.endswith('.gz'):
+            return arquivo
+        descritor, temporario = tempfile.mkstemp(suffix='.db', dir=self.diretorio)
+        with os.fdopen(descritor, 'wb') as saida, gzip.open(arquivo, 'rb') as entrada:
+            shutil.copyfileobj(entrada, saida, 1024 * 1024)
+        return temporario
+
+    def verificar(self, nome: str) -> Dict:
+        """Confere o sha256 registrado e o integrity_check do conteúdo"""
+        arquivo = self.caminho(nome)
+        if not arquivo:
+            return {'sucesso': False, 'erro': 'Snapshot not found'}
+        metadados = self.obter(nome) or {}
+        sha256 = sha256_arquivo(arquivo)
+        banco = self._descomprimido(nome)
+        try:
+            integridade = verificar_integridade(banco)
+        except sqlite3.Error as e:
+            integridade = f'erro: {e}'
+        finally:
+            if banco != arquivo:
+                os.remove(banco)
+        sha_confere = metadados.get('sha256') in (None, sha256)
+        return {
+            'sucesso': integridade == 'ok' and sha_confere,
+            'arquivo': nome,
+            'integridade': integridade,
+            'sha256': sha256,
+            'sha256_confere': sha_confere
+        }
+
+    def restaurar(self, nome: str) -> Dict:
+        """
+        Substitui o conteúdo do banco em uso pelo do snapshot (API de backup no
+        sentido inverso; as escritas ficam bloqueadas durante a cópia). Antes,
+        guarda um snapshot do estado atual (motivo 'pre-restauracao'). As
+        partições do log de acessos não fazem parte do snapshot: ficam como
+        estão, e os dicionários delas são copiados do banco em uso para o
+        restaurado (_devolver_dicionarios)
+        """
+        verificacao = self.verificar(nome)
+        if not verificacao['sucesso']:
+            return {'sucesso': False, 'erro': 'Snapshot failed verification', 'verificacao': verificacao}
+        banco = self._descomprimido(nome)
+        try:
+            anterior = self._executar('snapshot', self._criar, self.comprimir, 'pre-restauracao')
+            return self._executar('restauracao', self._restaurar, nome, banco, anterior['arquivo'])
+        finally:
+            if banco != self.caminho(nome):
+                os.remove(banco)
+
+    def _dicionarios(self, conn: sqlite3.Connection) -> Dict[str, List]:
+        """Linhas dos dicionários do log de acessos (ip_user_agents, ip_paths) no banco em uso"""
+        return {tabela: conn.execute(f'SELECT id, valor FROM {tabela}').fetchall() for tabela in DICIONARIOS}
+
+    def _devolver_dicionarios(self, dicionarios: Dict[str, List]) -> int:
+        """
+        Depois da restauração: as partições do log de acessos não voltaram
+        junto e usam IDs criados depois do snapshot. Os dicionários só crescem,
+        então as linhas de antes da restauração entram de novo com o mesmo id
+        e o texto continua o mesmo para as partições
+        """
+        copiadas = 0
+        with self.db.escrita() as conn:
+            for tabela, linhas in dicionarios.items():
+                copiadas += conn.executemany(f'INSERT OR IGNORE INTO {tabela} (id, valor) VALUES (?, ?)',
+                                             linhas).rowcount
+        return copiadas
+
+    def _geracoes(self) -> Dict[str, int]:
+        conn = self.db.get_connection()
+        try:
+            return dict(conn.execute(
+                "SELECT substr(nome, 9), total FROM contadores WHERE nome LIKE 'geracao:%'"
+            ).fetchall())
+        finally:
+            conn.close()
+
+    def _avancar_geracoes(self, anteriores: Dict[str, int]):
+        """
+        Depois da restauração: as gerações voltaram às do snapshot, e um valor
+        já visto pelos caches (inclusive o compartilhado) serviria dados de
+        antes. Cada uma passa a ser maior que a anterior e que a restaurada;
+        a dos dicionários do ip_logs sobe junto (cada worker esvazia o seu LRU)
+        """
+        tabelas = set(anteriores) | {GERACAO_DICIONARIOS}
+        with self.db.escrita() as conn:
+            conn.executemany(
+                'INSERT INTO contadores (nome, total) VALUES (?, ?) '
+                'ON CONFLICT(nome) DO UPDATE SET total = MAX(total + 1, excluded.total)',
+                [(f'geracao:{tabela}', anteriores.get(tabela, 0) + 1) for tabela in tabelas]
+            )
+        incrementar_geracao_local(self.db.db_name, tabelas, compartilhada=True)
+
+    def _restaurar(self, progresso: Dict, nome: str, banco: str, anterior: str) -> Dict:
+        geracoes = self._geracoes()
+        origem = sqlite3.connect(f'file:{banco}?mode=ro', uri=True)
+        destino = self.db.get_connection()
+        try:
+            # Lidos logo antes da cópia: inclui o que o log ganhou durante o snapshot pre-restauracao
+            dicionarios = self._dicionarios(destino)
+            # Passo único: quem lê nunca vê o banco meio restaurado
+            origem.backup(destino, pages=-1)
+            progresso.update(paginas_restantes=0, percentual=100.0)
+        finally:
+            destino.close()
+            origem.close()
+        self.db.ativar_wal()
+        copiadas = self._devolver_dicionarios(dicionarios)
+        self._avancar_geracoes(geracoes)
+        particoes = obter_particoes(self.db)
+        particoes.user_agents.limpar()
+        particoes.paths.limpar()
+        return {'sucesso': True, 'restaurado': nome, 'snapshot_anterior': anterior,
+                'dicionarios_copiados': copiadas}
+
+    def estado(self) -> Dict:
+        snapshots = self.listar()
+        return {
+            'diretorio': self.diretorio,
+            'maximo': self.maximo,
+            'comprimir': self.comprimir,
+            'progresso': self.progresso(),
+            'snapshots': snapshots
+        }
+
+    def idade_ultimo(self) -> float:
+        """Segundos desde o snapshot mais recente (-1 se não houver nenhum)"""
+        snapshots = [s for s in self.listar() if s.get('data')]
+        if not snapshots:
+            return -1.0
+        mais_recente = max(s['data'] for s in snapshots)
+        return (datetime.utcnow() - datetime.strptime(mais_recente, FORMATO_DATA)).total_seconds()
+
+class _PassoUnico(Exception):
+    pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshots do banco SQLite em uso')
+    parser.add_argument('--banco', default='osint_database.db')
+    parser.add_argument('--dir', default=None, help='diretório dos snapshots (padrão: SNAPSHOT_DIR ou backups)')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    criar = sub.add_parser('criar')
+    criar.add_argument('--sem-compressao', action='store_true')
+    sub.add_parser('listar')
+    sub.add_parser('verificar').add_argument('nome')
+    sub.add_parser('restaurar').add_argument('nome')
+    args = parser.parse_args()
+
+    gerenciador = GerenciadorSnapshots(Database(args.banco), diretorio=args.dir)
+    if args.comando == 'criar':
+        resultado = gerenciador.criar(comprimir=False if args.sem_compressao else None)
+    elif args.comando == 'listar':
+        resultado = gerenciador.listar()
+    elif args.comando == 'verificar':
+        resultado = gerenciador.verificar(args.nome)
+    else:
+        resultado = gerenciador.restaurar(args.nome)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    if isinstance(resultado, dict) and resultado.get('sucesso') is False:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Rastreamento de consultas SQL (opcional): agrupa as consultas do Database por
+texto normalizado, com contagem, tempo total e máximo, e captura o
+EXPLAIN QUERY PLAN das consultas lentas ou que varrem uma tabela inteira.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from database import (registrar_observador_sql, remover_observador_sql,
+                      registrar_configurador_conexao, remover_configurador_conexao)
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_ESPACOS = re.compile(r'\s+')
+_RE_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+# Só estes comandos têm plano de execução interessante
+_EXPLICAVEIS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+def normalizar_sql(sql: str) -> str:
+    """Troca literais por ? e junta espaços, para agrupar consultas iguais"""
+    sql = _RE_STRING.sub('?', sql or '')
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_ESPACOS.sub(' ', sql).strip()
+    return _RE_LISTA.sub('(?, ...)', sql)
+
+def detalhes_varredura(plano: List[str]) -> List[str]:
+    """Passos do plano que leem a tabela inteira (SCAN sem índice)"""
+    return [passo for passo in plano
+            if passo.startswith('SCAN ') and 'USING' not in passo and 'CONSTANT ROW' not in passo]
+
+class RastreadorSQL:
+    def __init__(self, db_name: str, limite_lenta_ms: float = None, max_consultas: int = None):
+        self.db_name = db_name
+        self.limite_lenta = (limite_lenta_ms if limite_lenta_ms is not None
+                             else float(os.getenv('SQL_TRACE_LIMITE_LENTA_MS', '50'))) / 1000.0
+        self.max_consultas = max_consultas or int(os.getenv('SQL_TRACE_MAX_CONSULTAS', '500'))
+        self.ativo = False
+        self.ativado_em = None
+        self._lock = threading.Lock()
+        self._consultas = {}
+        self._comandos_sqlite = {}  # comandos vistos pelo SQLite (inclui BEGIN/COMMIT implícitos)
+        self._planos = {}
+        self._descartadas = 0
+
+    def ativar(self, limite_lenta_ms: float = None):
+        """Passa a rastrear as conexões novas do Database"""
+        if limite_lenta_ms is not None:
+            self.limite_lenta = limite_lenta_ms / 1000.0
+        registrar_observador_sql(self.observar)
+        registrar_configurador_conexao(self.configurar_conexao)
+        if not self.ativo:
+            self.ativado_em = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.ativo = True
+
+    def desativar(self):
+        remover_observador_sql(self.observar)
+        remover_configurador_conexao(self.configurar_conexao)
+        self.ativo = False
+
+    def limpar(self):
+        with self._lock:
+            self._consultas.clear()
+            self._comandos_sqlite.clear()
+            self._planos.clear()
+            self._descartadas = 0
+
+    def configurar_conexao(self, conn):
+        conn.set_trace_callback(self._rastrear)
+
+    def _rastrear(self, sql: str):
+        """Callback do SQLite: cada comando executado, já com os valores"""
+        chave = normalizar_sql(sql)
+        with self._lock:
+            if chave in self._comandos_sqlite or len(self._comandos_sqlite) < self.max_consultas:
+                self._comandos_sqlite[chave] = self._comandos_sqlite.get(chave, 0) + 1
+
+    def observar(self, sql: str, duracao: float, execucao: bool):
+        """Observador do Database: tempo de execute + leitura das linhas"""
+        chave = normalizar_sql(sql)
+        with self._lock:
+            consulta = self._consultas.get(chave)
+            if consulta is None:
+                if len(self._consultas) >= self.max_consultas:
+                    self._descartadas += 1
+                    return
+                consulta = self._consultas[chave] = {'chamadas': 0, 'total': 0.0, 'max': 0.0, 'lentas': 0}
+            if execucao:
+                consulta['chamadas'] += 1
+            consulta['total'] += duracao
+            consulta['max'] = max(consulta['max'], duracao)
+            if duracao >= self.limite_lenta:
+                consulta['lentas'] += 1
+            precisa_plano = chave not in self._planos
+            if precisa_plano:
+                self._planos[chave] = None  # reserva: só uma thread executa o EXPLAIN
+
+        if precisa_plano:
+            plano = self.explicar(sql)
+            with self._lock:
+                self._planos[chave] = plano
+
+    def explicar(self, sql: str) -> Optional[List[str]]:
+        """EXPLAIN QUERY PLAN em conexão própria (fora do rastreamento), parâmetros como NULL"""
+        comando = (sql or '').lstrip().split(' ', 1)[0].upper()
+        if comando not in _EXPLICAVEIS:
+            return []
+        try:
+            conn = sqlite3.connect(self.db_name, uri=self.db_name.startswith('file:'))
+            try:
+                parametros = (None,) * _RE_STRING.sub('', sql).count('?')
+                linhas = conn.execute(f'EXPLAIN QUERY PLAN {sql}', parametros).fetchall()
+            finally:
+                conn.close()
+            return [linha[-1] for linha in linhas]
+        except sqlite3.Error as e:
+            return [f'erro: {e}']
+
+    def relatorio(self, ordenar: str = 'total', limite: int = 50) -> Dict:
+        """Consultas agrupadas; plano incluído nas lentas e nas que varrem tabelas"""
+        with self._lock:
+            consultas = {k: dict(v) for k, v in self._consultas.items()}
+            planos = dict(self._planos)
+            comandos = dict(self._comandos_sqlite)
+            descartadas = self._descartadas
+
+        lista = []
+        for sql, c in consultas.items():
+            plano = planos.get(sql) or []
+            varreduras = detalhes_varredura(plano)
+            item = {
+                'sql': sql,
+                'chamadas': c['chamadas'],
+                'total_ms': round(c['total'] * 1000, 3),
+                'media_ms': round(c['total'] * 1000 / max(1, c['chamadas']), 3),
+                'max_ms': round(c['max'] * 1000, 3),
+                'lentas': c['lentas'],
+                'varre_tabela': bool(varreduras)
+            }
+            if c['lentas'] or varreduras:
+                item['plano'] = plano
+            lista.append(item)
+
+        chave = {'total': 'total_ms', 'max': 'max_ms', 'chamadas': 'chamadas', 'media': 'media_ms'}.get(ordenar, 'total_ms')
+        lista.sort(key=lambda item: item[chave], reverse=True)
+        return {
+            'ativo': self.ativo,
+            'ativado_em': self.ativado_em,
+            'limite_lenta_ms': self.limite_lenta * 1000,
+            'consultas_distintas': len(lista),
+            'descartadas': descartadas,
+            'com_varredura': [item['sql'] for item in lista if item['varre_tabela']],
+            'consultas': lista[:limite],
+            'comandos_sqlite': sorted(({'sql': k, 'execucoes': n} for k, n in comandos.items()),
+                                      key=lambda item: item['execucoes'], reverse=True)[:limite]
+        }
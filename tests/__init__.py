@@ -0,0 +1,3 @@
+"""
+Testes do banco (executar a partir da raiz do projeto: python -m pytest tests)
+"""
@@ -0,0 +1,26 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+# Alguns módulos abrem o Database() padrão ao serem importados (middleware):
+# os testes rodam num diretório temporário para não mexer no osint_database.db
+_DIRETORIO = tempfile.mkdtemp(prefix='painel_testes_')
+os.chdir(_DIRETORIO)
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_DIRETORIO, ignore_errors=True)
+
+from database import banco_em_memoria
+
+@pytest.fixture
+def db():
+    """Database isolado em memória, descartado ao fim do teste"""
+    with banco_em_memoria() as banco:
+        yield banco
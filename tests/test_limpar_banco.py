@@ -0,0 +1,57 @@
+"""
+Limpeza do banco pelo painel admin (mesmo resultado das tabelas antigas)
+"""
+import pytest
+
+def _contar(db, view):
+    conn = db.get_connection()
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {view}').fetchone()[0]
+    finally:
+        conn.close()
+
+@pytest.fixture
+def buscas(db):
+    """Uma busca de cada tipo, no histórico e com resultados por fonte"""
+    fontes = [('google', 'g'), ('jusbrasil', 'j')]
+    db.registrar_busca('nome', 'ana', 'resumo nome', fontes=fontes)
+    db.registrar_busca('processo', '0001', 'resumo processo', fontes=fontes, status='pendente')
+    db.registrar_busca('foto', 'gato', 'resumo foto', fontes=fontes, url_imagem='http://x/gato.jpg')
+    db.registrar_busca('cpf', '000.000.000-00', fontes=fontes, cpf='00000000000', status='encontrado')
+    db.salvar_historico('email', 'ana@exemplo.com', 'resumo email')
+    return db
+
+def test_tabela_nao_permitida(buscas):
+    resultado = buscas.limpar_banco('usuarios')
+    assert not resultado['sucesso']
+    assert _contar(buscas, 'usuarios') > 0
+
+def test_limpar_tabela_de_um_tipo(buscas):
+    assert buscas.limpar_banco('nome_buscas')['sucesso']
+    assert _contar(buscas, 'nome_buscas') == 0
+    # As outras tabelas e o histórico (inclusive da busca por nome) continuam
+    assert _contar(buscas, 'processo_buscas') == 2
+    assert _contar(buscas, 'foto_buscas') == 2
+    assert _contar(buscas, 'historico_buscas') == 4
+
+def test_limpar_historico(buscas):
+    assert buscas.limpar_banco('historico_buscas')['sucesso']
+    assert _contar(buscas, 'historico_buscas') == 0
+    assert _contar(buscas, 'nome_buscas') == 2
+    assert _contar(buscas, 'processo_buscas') == 2
+
+def test_limpar_tabela_e_historico_apaga_a_busca(buscas):
+    buscas.limpar_banco('nome_buscas')
+    buscas.limpar_banco('historico_buscas')
+    conn = buscas.get_connection()
+    try:
+        tipos = [linha[0] for linha in conn.execute('SELECT DISTINCT tipo FROM buscas ORDER BY tipo')]
+    finally:
+        conn.close()
+    assert tipos == ['cpf', 'foto', 'processo']
+
+def test_limpar_tudo_mantem_cpf(buscas):
+    assert buscas.limpar_banco()['sucesso']
+    for view in ('nome_buscas', 'processo_buscas', 'foto_buscas', 'historico_buscas'):
+        assert _contar(buscas, view) == 0
+    assert _contar(buscas, 'cpf_buscas') == 2
@@ -0,0 +1,87 @@
+"""
+Migração das tabelas antigas (<tabela>_legado) para buscas/busca_fontes
+"""
+import sqlite3
+
+import pytest
+
+from database import banco_em_memoria
+
+DATA = '2024-05-01 12:00:00'
+
+def _banco_antigo(caminho, historico, nomes):
+    """Banco no formato antigo: uma linha de histórico por fonte e uma por fonte em nome_buscas"""
+    conn = sqlite3.connect(caminho)
+    conn.execute('''
+        CREATE TABLE historico_buscas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo_busca TEXT NOT NULL,
+            termo_busca TEXT NOT NULL,
+            resultado TEXT,
+            data_busca TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE nome_buscas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            resultado TEXT,
+            fonte TEXT,
+            data_busca TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            tipo_busca TEXT
+        )
+    ''')
+    conn.executemany('INSERT INTO historico_buscas (tipo_busca, termo_busca, resultado, data_busca) VALUES (?, ?, ?, ?)',
+                     historico)
+    conn.executemany('INSERT INTO nome_buscas (nome, resultado, fonte, data_busca, tipo_busca) VALUES (?, ?, ?, ?, ?)',
+                     nomes)
+    conn.commit()
+    conn.close()
+
+@pytest.fixture
+def legado(tmp_path):
+    """Duas buscas do mesmo termo no mesmo segundo (usuários diferentes), três fontes cada"""
+    fontes = ('google', 'jusbrasil', 'escavador')
+    historico = [('nome', 'ana', resultado, DATA) for resultado in ('r1', 'r2') for _ in fontes]
+    nomes = [('ana', f'{resultado}-{fonte}', fonte, DATA, 'nome') for resultado in ('r1', 'r2') for fonte in fontes]
+    caminho = str(tmp_path / 'antigo.db')
+    _banco_antigo(caminho, historico, nomes)
+    with banco_em_memoria(caminho) as db:
+        yield db
+
+def _contar(db, sql):
+    conn = db.get_connection()
+    try:
+        return conn.execute(sql).fetchone()[0]
+    finally:
+        conn.close()
+
+def test_tabelas_antigas_viram_legado(legado):
+    assert _contar(legado, "SELECT COUNT(*) FROM sqlite_master WHERE name = 'nome_buscas_legado'") == 1
+    # As views somam o que ainda não foi migrado
+    assert _contar(legado, 'SELECT COUNT(*) FROM nome_buscas') == 6
+    assert _contar(legado, 'SELECT COUNT(*) FROM historico_buscas') == 6
+
+def test_migracao_completa(legado):
+    assert legado.migrar_buscas_legado(orcamento=5) == 12
+    assert legado.migrar_buscas_legado(orcamento=5) == 0
+    assert _contar(legado, "SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%_legado'") == 0
+    # Buscas com a mesma chave continuam separadas, cada uma com as suas fontes
+    assert _contar(legado, 'SELECT COUNT(*) FROM buscas') == 2
+    conn = legado.get_connection()
+    try:
+        fontes = conn.execute('''
+            SELECT b.resultado, COUNT(*), GROUP_CONCAT(DISTINCT substr(f.resultado, 1, 2))
+            FROM buscas b JOIN busca_fontes f ON f.busca_id = b.id GROUP BY b.id ORDER BY b.id
+        ''').fetchall()
+    finally:
+        conn.close()
+    assert fontes == [('r1', 3, 'r1'), ('r2', 3, 'r2')]
+    assert _contar(legado, 'SELECT COUNT(*) FROM nome_buscas') == 6
+
+def test_migracao_em_lotes_pequenos(legado):
+    # Lote de uma linha: a chave inteira é movida junto, sem juntar as duas buscas
+    assert legado.migrar_buscas_legado(lote=1, orcamento=5) == 12
+    assert _contar(legado, 'SELECT COUNT(*) FROM buscas') == 2
+    assert _contar(legado, 'SELECT COUNT(*) FROM busca_fontes') == 6
+    assert _contar(legado, 'SELECT COUNT(*) FROM historico_buscas') == 2
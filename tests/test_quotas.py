@@ -0,0 +1,54 @@
+"""
+Reserva e devolução de quota com várias threads disputando o mesmo contador
+"""
+import threading
+
+from quotas import QuotaManager, dia_atual
+
+USUARIO = {'email': 'ana@exemplo.com', 'permissao': 'user'}
+
+def _em_paralelo(funcao, vezes: int):
+    """Executa `funcao` em `vezes` threads liberadas juntas; retorna os resultados"""
+    barreira = threading.Barrier(vezes)
+    resultados = [None] * vezes
+
+    def executar(indice):
+        barreira.wait()
+        resultados[indice] = funcao()
+
+    threads = [threading.Thread(target=executar, args=(i,)) for i in range(vezes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultados
+
+def test_reservar_quota_nao_passa_do_limite(db):
+    resultados = _em_paralelo(lambda: db.reservar_quota(dia_atual(), 'ana', 'serasa', 5), 20)
+    assert sorted(r for r in resultados if r is not None) == [1, 2, 3, 4, 5]
+    assert resultados.count(None) == 15
+    assert db.obter_uso_quota(dia_atual(), 'ana', 'serasa') == 5
+
+def test_devolver_quota_concorrente(db):
+    for _ in range(5):
+        db.reservar_quota(dia_atual(), 'ana', 'serasa', 5)
+    _em_paralelo(lambda: db.devolver_quota(dia_atual(), 'ana', 'serasa'), 8)
+    # Nunca fica negativo, mesmo com mais devoluções que reservas
+    assert db.obter_uso_quota(dia_atual(), 'ana', 'serasa') == 0
+
+def test_consumir_e_devolver(db):
+    quota = QuotaManager(db)
+    limite = quota.limite('user', 'serasa')
+    resultados = _em_paralelo(lambda: quota.consumir(USUARIO, 'serasa'), limite * 3)
+    assert resultados.count(True) == limite
+    assert not quota.consumir(USUARIO, 'serasa')
+
+    # Devolvida por uma consulta que o provedor não atendeu: libera uma reserva
+    quota.devolver(USUARIO, 'serasa')
+    assert quota.consumir(USUARIO, 'serasa')
+    assert not quota.consumir(USUARIO, 'serasa')
+
+def test_anonimo_nao_consome(db):
+    quota = QuotaManager(db)
+    assert not quota.consumir(None, 'serasa')
+    assert db.obter_uso_quota(dia_atual(), 'anonimo', 'serasa') == 0
@@ -0,0 +1,61 @@
+"""
+Snapshot e restauração do banco em uso
+"""
+import pytest
+
+from snapshots import GerenciadorSnapshots
+
+@pytest.fixture
+def snapshots(db, tmp_path):
+    return GerenciadorSnapshots(db, diretorio=str(tmp_path / 'backups'))
+
+def _linhas(db, sql):
+    conn = db.get_connection()
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def _inserir_user_agent(db, valor):
+    with db.escrita() as conn:
+        conn.execute('INSERT INTO ip_user_agents (valor) VALUES (?)', (valor,))
+
+def test_criar_e_verificar(db, snapshots):
+    db.salvar_busca_nome('ana', 'r1', 'google')
+    metadados = snapshots.criar()
+    assert metadados['integridade'] == 'ok'
+    assert metadados['inclui_particoes_ip_logs'] is False
+    assert snapshots.verificar(metadados['arquivo'])['sucesso']
+    assert [s['arquivo'] for s in snapshots.listar()] == [metadados['arquivo']]
+
+def test_restaurar_volta_os_dados(db, snapshots):
+    db.salvar_busca_nome('ana', 'r1', 'google')
+    nome = snapshots.criar()['arquivo']
+    db.salvar_busca_nome('bia', 'r2', 'google')
+
+    resultado = snapshots.restaurar(nome)
+    assert resultado['sucesso']
+    assert _linhas(db, 'SELECT nome FROM nome_buscas') == [('ana',)]
+    # O estado de antes da restauração fica guardado
+    assert snapshots.obter(resultado['snapshot_anterior'])['motivo'] == 'pre-restauracao'
+
+def test_restaurar_copia_os_dicionarios(db, snapshots):
+    _inserir_user_agent(db, 'ua1')
+    nome = snapshots.criar()['arquivo']
+    # Criado depois do snapshot: as partições (que não são restauradas) podem usar o id
+    _inserir_user_agent(db, 'ua2')
+
+    resultado = snapshots.restaurar(nome)
+    assert resultado['sucesso']
+    assert resultado['dicionarios_copiados'] == 1
+    assert _linhas(db, 'SELECT id, valor FROM ip_user_agents ORDER BY id') == [(1, 'ua1'), (2, 'ua2')]
+    _inserir_user_agent(db, 'ua3')
+    assert _linhas(db, "SELECT id FROM ip_user_agents WHERE valor = 'ua3'") == [(3,)]
+
+def test_restaurar_snapshot_alterado(db, snapshots):
+    nome = snapshots.criar(comprimir=False)['arquivo']
+    with open(snapshots.caminho(nome), 'ab') as f:
+        f.write(b'\0')
+    resultado = snapshots.restaurar(nome)
+    assert not resultado['sucesso']
+    assert not resultado['verificacao']['sha256_confere']
@@ -8,6 +8,7 @@ import os
 from typing import Dict, List, Optional
 from urllib.parse import quote_plus, quote
 import re
+from metrics import etapa
 
 try:
     from dotenv import load_dotenv
@@ -28,6 +29,59 @@ class VazamentosAPIClient:
         self.intelx_api_key = os.getenv('INTELX_API_KEY', '')
         self.leakcheck_api_key = os.getenv('LEAKCHECK_API_KEY', '')
         
+        # URLs base (podem apontar para o servidor de testes em benchmarks/upstream_stub.py)
+        self.hibp_api_url = os.getenv('HIBP_API_URL', 'https://haveibeenpwned.com').rstrip('/')
+        self.google_search_url = os.getenv('GOOGLE_SEARCH_URL', 'https://www.google.com/search')
+        
+        # Estado das APIs externas visto por todos os workers (CacheCompartilhado ou None):
+        # key do HIBP v3 recusada (401/403) ou limitada (429, pelo Retry-After)
+        self.capacidades = None
+        self.ttl_capacidades = float(os.getenv('CACHE_CAPACIDADES_TTL_SEGUNDOS', '600'))
+        
+    def _formatar_breach(self, breach: Dict) -> Dict:
+        """Converte um breach da API do HIBP para o formato interno"""
+        return {
+            'nome': breach.get('Name', ''),
+            'titulo': breach.get('Title', ''),
+            'data': breach.get('BreachDate', ''),
+            'dominio': breach.get('Domain', ''),
+            'total_contas': breach.get('PwnCount', 0),
+            'dados_vazados': breach.get('DataClasses', []),
+            'descricao': breach.get('Description', ''),
+            'verificado': breach.get('IsVerified', False),
+            'logo': breach.get('LogoPath', '')
+        }
+    
+    def _url_hibp(self, email: str, versao: str) -> str:
+        """URL de consulta de breaches do HIBP (v3 com key, v2 pública)"""
+        email_encoded = quote_plus(email)
+        if versao == 'v3':
+            return f'{self.hibp_api_url}/api/v3/breachedaccount/{email_encoded}?truncateResponse=false'
+        return f'{self.hibp_api_url}/api/v2/breachedaccount/{email_encoded}'
+    
+    def _hibp_v3_disponivel(self) -> bool:
+        return not (self.capacidades and self.capacidades.obter('capacidade:hibp_v3'))
+    
+    def _registrar_resposta_hibp_v3(self, response):
+        """Key recusada ou rate limit: os workers usam o endpoint público até vencer"""
+        if not self.capacidades or response.status_code not in (401, 403, 429):
+            return
+        ttl = self.ttl_capacidades
+        if response.status_code == 429:
+            espera = response.headers.get('Retry-After', '')
+            ttl = float(espera) if espera.isdigit() else 60
+        self.capacidades.definir('capacidade:hibp_v3', {'disponivel': False, 'status': response.status_code}, ttl)
+    
+    def _url_busca_google(self, email: str, site: str) -> str:
+        """URL de busca no Google restrita a um site"""
+        query = f'site:{site} "{email}"'
+        return f'{self.google_search_url}?q={quote_plus(query)}'
+    
+    def _encontrado_no_google(self, texto: str, email: str, site: str) -> bool:
+        """Verifica se a página de resultados do Google menciona o email no site"""
+        texto = texto.lower()
+        return site in texto and email.lower() in texto
+    
     def verificar_hibp(self, email: str) -> Dict:
         """
         Verifica vazamentos usando Have I Been Pwned API
@@ -41,45 +95,36 @@ class VazamentosAPIClient:
         }
         
         try:
-            email_encoded = quote_plus(email)
-            
-            # Tentar API v3 primeiro (requer key)
-            if self.hibp_api_key:
-                url = f'https://haveibeenpwned.com/api/v3/breachedaccount/{email_encoded}?truncateResponse=false'
+            # Tentar API v3 primeiro (requer key; pulada enquanto recusada ou limitada)
+            usar_v3 = self.hibp_api_key and self._hibp_v3_disponivel()
+            if usar_v3:
+                url = self._url_hibp(email, 'v3')
                 headers = {
                     **self.headers,
                     'hibp-api-key': self.hibp_api_key
                 }
-                response = requests.get(url, headers=headers, timeout=15)
+                with etapa('upstream'):
+                    response = requests.get(url, headers=headers, timeout=15)
                 
                 if response.status_code == 200:
                     breaches = response.json()
                     resultado['comprometido'] = True
                     
                     for breach in breaches:
-                        breach_info = {
-                            'nome': breach.get('Name', ''),
-                            'titulo': breach.get('Title', ''),
-                            'data': breach.get('BreachDate', ''),
-                            'dominio': breach.get('Domain', ''),
-                            'total_contas': breach.get('PwnCount', 0),
-                            'dados_vazados': breach.get('DataClasses', []),
-                            'descricao': breach.get('Description', ''),
-                            'verificado': breach.get('IsVerified', False),
-                            'logo': breach.get('LogoPath', '')
-                        }
-                        resultado['breaches'].append(breach_info)
+                        resultado['breaches'].append(self._formatar_breach(breach))
                 
                 elif response.status_code == 404:
                     resultado['comprometido'] = False
                 elif response.status_code == 429:
                     resultado['erro'] = 'Rate limit atingido'
+                self._registrar_resposta_hibp_v3(response)
                     
             # Se não tiver key ou falhar, tentar método alternativo via scraping
-            if not self.hibp_api_key or resultado.get('erro'):
+            if not usar_v3 or resultado.get('erro'):
                 # Fazer busca na página pública
-                public_url = f'https://haveibeenpwned.com/api/v2/breachedaccount/{email_encoded}'
-                response = requests.get(public_url, headers=self.headers, timeout=15)
+                public_url = self._url_hibp(email, 'v2')
+                with etapa('upstream'):
+                    response = requests.get(public_url, headers=self.headers, timeout=15)
                 
                 if response.status_code == 200:
                     breaches = response.json()
@@ -87,18 +132,7 @@ class VazamentosAPIClient:
                     resultado['erro'] = None
                     
                     for breach in breaches:
-                        breach_info = {
-                            'nome': breach.get('Name', ''),
-                            'titulo': breach.get('Title', ''),
-                            'data': breach.get('BreachDate', ''),
-                            'dominio': breach.get('Domain', ''),
-                            'total_contas': breach.get('PwnCount', 0),
-                            'dados_vazados': breach.get('DataClasses', []),
-                            'descricao': breach.get('Description', ''),
-                            'verificado': breach.get('IsVerified', False),
-                            'logo': breach.get('LogoPath', '')
-                        }
-                        resultado['breaches'].append(breach_info)
+                        resultado['breaches'].append(self._formatar_breach(breach))
                         
         except Exception as e:
             resultado['erro'] = str(e)
@@ -118,15 +152,14 @@ class VazamentosAPIClient:
         }
         
         try:
-            email_encoded = quote_plus(email)
-            query = f'site:pastebin.com "{email}"'
-            url = f'https://www.google.com/search?q={quote_plus(query)}'
+            url = self._url_busca_google(email, 'pastebin.com')
             
-            response = requests.get(url, headers=self.headers, timeout=15)
+            with etapa('upstream'):
+                response = requests.get(url, headers=self.headers, timeout=15)
             
             if response.status_code == 200:
                 # Verificar se encontrou resultados
-                if 'pastebin.com' in response.text.lower() and email.lower() in response.text.lower():
+                if self._encontrado_no_google(response.text, email, 'pastebin.com'):
                     resultado['comprometido'] = True
                     resultado['resultados'].append({
                         'url': url,
@@ -152,14 +185,13 @@ class VazamentosAPIClient:
         }
         
         try:
-            email_encoded = quote_plus(email)
-            query = f'site:github.com "{email}"'
-            url = f'https://www.google.com/search?q={quote_plus(query)}'
+            url = self._url_busca_google(email, 'github.com')
             
-            response = requests.get(url, headers=self.headers, timeout=15)
+            with etapa('upstream'):
+                response = requests.get(url, headers=self.headers, timeout=15)
             
             if response.status_code == 200:
-                if 'github.com' in response.text.lower() and email.lower() in response.text.lower():
+                if self._encontrado_no_google(response.text, email, 'github.com'):
                     resultado['comprometido'] = True
                     resultado['resultados'].append({
                         'url': url,
@@ -177,6 +209,15 @@ class VazamentosAPIClient:
         Verifica email em múltiplas fontes de vazamentos
         Retorna resultado consolidado
         """
+        return self._consolidar(
+            email,
+            self.verificar_hibp(email),
+            self.verificar_pastebin(email),
+            self.verificar_github(email)
+        )
+    
+    def _consolidar(self, email: str, hibp_result: Dict, pastebin_result: Dict, github_result: Dict) -> Dict:
+        """Consolida os resultados de HIBP, Pastebin e GitHub"""
         resultados_consolidados = {
             'email': email,
             'comprometido': False,
@@ -189,8 +230,7 @@ class VazamentosAPIClient:
             'resumo': ''
         }
         
-        # Verificar Have I Been Pwned
-        hibp_result = self.verificar_hibp(email)
+        # Have I Been Pwned
         resultados_consolidados['fontes_verificadas'].append(hibp_result)
         
         if hibp_result['comprometido']:
@@ -198,16 +238,14 @@ class VazamentosAPIClient:
             resultados_consolidados['breaches'].extend(hibp_result.get('breaches', []))
             resultados_consolidados['total_breaches'] += len(hibp_result.get('breaches', []))
         
-        # Verificar Pastebin
-        pastebin_result = self.verificar_pastebin(email)
+        # Pastebin
         resultados_consolidados['fontes_verificadas'].append(pastebin_result)
         
         if pastebin_result['comprometido']:
             resultados_consolidados['comprometido'] = True
             resultados_consolidados['resultados_adicionais'].extend(pastebin_result.get('resultados', []))
         
-        # Verificar GitHub
-        github_result = self.verificar_github(email)
+        # GitHub
         resultados_consolidados['fontes_verificadas'].append(github_result)
         
         if github_result['comprometido']: